@@ -0,0 +1,29 @@
+"""add archive_files indexes for the paginated admin listing
+
+Revision ID: a5c7e2f1b9d4
+Revises: f4b6d3c9e0a5
+Create Date: 2026-10-19 17:00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a5c7e2f1b9d4"
+down_revision: Union[str, None] = "f4b6d3c9e0a5"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Фільтри адмінського списку архівів: відділ та користувач + сортування за часом
+    op.create_index(op.f("ix_archive_files_department"), "archive_files", ["department"], unique=False)
+    op.create_index("ix_archive_files_user_id_created_at", "archive_files", ["user_id", "created_at"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_archive_files_user_id_created_at", table_name="archive_files")
+    op.drop_index(op.f("ix_archive_files_department"), table_name="archive_files")
@@ -0,0 +1,48 @@
+"""add archive_files index table
+
+Revision ID: a7c1e9d2b4f0
+Revises: f3e4d5c6b7a8
+Create Date: 2026-10-19 10:00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a7c1e9d2b4f0"
+down_revision: Union[str, None] = "f3e4d5c6b7a8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Індекс архівних файлів замість сканування archives/active на кожен запит.
+    # Після міграції наповнити: python -m scripts.reconcile_archive_index
+    op.create_table(
+        "archive_files",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("filename", sa.String(length=255), nullable=False),
+        sa.Column("user_id", sa.BigInteger(), nullable=False),
+        sa.Column("department", sa.String(length=50), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("size", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("is_surplus", sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column("is_trashed", sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column("trashed_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("filename"),
+    )
+    op.create_index(op.f("ix_archive_files_user_id"), "archive_files", ["user_id"], unique=False)
+    op.create_index(op.f("ix_archive_files_created_at"), "archive_files", ["created_at"], unique=False)
+    op.create_index(op.f("ix_archive_files_is_trashed"), "archive_files", ["is_trashed"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_archive_files_is_trashed"), table_name="archive_files")
+    op.drop_index(op.f("ix_archive_files_created_at"), table_name="archive_files")
+    op.drop_index(op.f("ix_archive_files_user_id"), table_name="archive_files")
+    op.drop_table("archive_files")
@@ -0,0 +1,28 @@
+"""add products.content_hash for change-detection imports
+
+Revision ID: b6d8f3a2c1e7
+Revises: a5c7e2f1b9d4
+Create Date: 2026-10-19 18:00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b6d8f3a2c1e7"
+down_revision: Union[str, None] = "a5c7e2f1b9d4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # NULL для наявних товарів — перший імпорт після міграції оновить усі рядки
+    op.add_column("products", sa.Column("content_hash", sa.String(length=32), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("products", "content_hash")
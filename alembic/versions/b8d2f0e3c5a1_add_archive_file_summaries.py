@@ -0,0 +1,31 @@
+"""add items_count and total_sum to archive_files
+
+Revision ID: b8d2f0e3c5a1
+Revises: a7c1e9d2b4f0
+Create Date: 2026-10-19 11:00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b8d2f0e3c5a1"
+down_revision: Union[str, None] = "a7c1e9d2b4f0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Підсумки архівного файлу, щоб статистика не перечитувала xlsx.
+    # Для існуючих файлів: python scripts/reconcile_archive_index.py --backfill-summaries
+    op.add_column("archive_files", sa.Column("items_count", sa.Integer(), nullable=True))
+    op.add_column("archive_files", sa.Column("total_sum", sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("archive_files", "total_sum")
+    op.drop_column("archive_files", "items_count")
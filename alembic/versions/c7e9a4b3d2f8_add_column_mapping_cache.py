@@ -0,0 +1,37 @@
+"""add column_mapping_cache for header-fingerprint import mappings
+
+Revision ID: c7e9a4b3d2f8
+Revises: b6d8f3a2c1e7
+Create Date: 2026-10-19 20:00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c7e9a4b3d2f8"
+down_revision: Union[str, None] = "b6d8f3a2c1e7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "column_mapping_cache",
+        sa.Column("fingerprint", sa.String(length=64), nullable=False),
+        sa.Column("headers", sa.JSON(), nullable=False),
+        sa.Column("mapping", sa.JSON(), nullable=False),
+        sa.Column("synonyms_hash", sa.String(length=32), nullable=False),
+        sa.Column("pinned", sa.Boolean(), server_default=sa.text("false"), nullable=False),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+        sa.PrimaryKeyConstraint("fingerprint"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("column_mapping_cache")
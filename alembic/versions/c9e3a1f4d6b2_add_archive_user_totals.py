@@ -0,0 +1,49 @@
+"""add archive_user_totals rollup table
+
+Revision ID: c9e3a1f4d6b2
+Revises: b8d2f0e3c5a1
+Create Date: 2026-10-19 12:00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c9e3a1f4d6b2"
+down_revision: Union[str, None] = "b8d2f0e3c5a1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Підсумки архівів по користувачах для /api/admin/users/all
+    op.create_table(
+        "archive_user_totals",
+        sa.Column("user_id", sa.BigInteger(), autoincrement=False, nullable=False),
+        sa.Column("archives_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("total_amount", sa.Float(), nullable=False, server_default="0"),
+        sa.Column("last_activity", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("user_id"),
+    )
+    op.create_index(
+        op.f("ix_archive_user_totals_archives_count"), "archive_user_totals", ["archives_count"], unique=False
+    )
+    # Початкове наповнення з індексу архіву
+    op.execute(
+        """
+        INSERT INTO archive_user_totals (user_id, archives_count, total_amount, last_activity)
+        SELECT user_id, count(*), coalesce(sum(total_sum), 0), max(created_at)
+        FROM archive_files
+        WHERE NOT is_trashed
+        GROUP BY user_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_archive_user_totals_archives_count"), table_name="archive_user_totals")
+    op.drop_table("archive_user_totals")
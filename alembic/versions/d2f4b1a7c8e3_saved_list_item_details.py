@@ -0,0 +1,65 @@
+"""store product, price and surplus flag on saved_list_items
+
+Revision ID: d2f4b1a7c8e3
+Revises: c9e3a1f4d6b2
+Create Date: 2026-10-19 14:00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d2f4b1a7c8e3"
+down_revision: Union[str, None] = "c9e3a1f4d6b2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Позиції збереженого списку пишуться в транзакції збереження,
+    # тож звіт про зібране рахується SQL-агрегатом, а не з xlsx.
+    op.add_column("saved_list_items", sa.Column("product_id", sa.Integer(), nullable=True))
+    op.add_column("saved_list_items", sa.Column("price", sa.Float(), nullable=True))
+    op.add_column(
+        "saved_list_items",
+        sa.Column("is_surplus", sa.Boolean(), nullable=False, server_default=sa.false()),
+    )
+    # Доступний залишок може бути дробовим — кількість у списку теж
+    op.alter_column(
+        "saved_list_items", "quantity",
+        existing_type=sa.Integer(), type_=sa.Float(), postgresql_using="quantity::double precision",
+    )
+    op.create_foreign_key(
+        "fk_saved_list_items_product_id", "saved_list_items", "products",
+        ["product_id"], ["id"], ondelete="SET NULL",
+    )
+    # Позиції тепер пишуться для кожного збереженого списку — без каскаду
+    # видалення списків (очищення архіву, «видалити всі») падало б на FK
+    op.drop_constraint("saved_list_items_list_id_fkey", "saved_list_items", type_="foreignkey")
+    op.create_foreign_key(
+        "saved_list_items_list_id_fkey", "saved_list_items", "saved_lists",
+        ["list_id"], ["id"], ondelete="CASCADE",
+    )
+    op.create_index(op.f("ix_saved_list_items_list_id"), "saved_list_items", ["list_id"], unique=False)
+    op.create_index(op.f("ix_saved_list_items_product_id"), "saved_list_items", ["product_id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_saved_list_items_product_id"), table_name="saved_list_items")
+    op.drop_index(op.f("ix_saved_list_items_list_id"), table_name="saved_list_items")
+    op.drop_constraint("saved_list_items_list_id_fkey", "saved_list_items", type_="foreignkey")
+    op.create_foreign_key(
+        "saved_list_items_list_id_fkey", "saved_list_items", "saved_lists", ["list_id"], ["id"],
+    )
+    op.drop_constraint("fk_saved_list_items_product_id", "saved_list_items", type_="foreignkey")
+    op.alter_column(
+        "saved_list_items", "quantity",
+        existing_type=sa.Float(), type_=sa.Integer(), postgresql_using="round(quantity)::integer",
+    )
+    op.drop_column("saved_list_items", "is_surplus")
+    op.drop_column("saved_list_items", "price")
+    op.drop_column("saved_list_items", "product_id")
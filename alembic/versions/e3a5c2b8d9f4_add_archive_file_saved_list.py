@@ -0,0 +1,34 @@
+"""link archive_files to saved_lists for deferred xlsx rendering
+
+Revision ID: e3a5c2b8d9f4
+Revises: d2f4b1a7c8e3
+Create Date: 2026-10-19 15:00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e3a5c2b8d9f4"
+down_revision: Union[str, None] = "d2f4b1a7c8e3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Список, з якого можна відрендерити файл, якщо його немає на диску
+    # (ARCHIVE_STORAGE_MODE=deferred)
+    op.add_column("archive_files", sa.Column("saved_list_id", sa.Integer(), nullable=True))
+    op.create_foreign_key(
+        "fk_archive_files_saved_list_id", "archive_files", "saved_lists",
+        ["saved_list_id"], ["id"], ondelete="SET NULL",
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint("fk_archive_files_saved_list_id", "archive_files", type_="foreignkey")
+    op.drop_column("archive_files", "saved_list_id")
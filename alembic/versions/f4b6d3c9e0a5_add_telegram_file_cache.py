@@ -0,0 +1,34 @@
+"""add telegram_file_cache for file_id reuse
+
+Revision ID: f4b6d3c9e0a5
+Revises: e3a5c2b8d9f4
+Create Date: 2026-10-19 16:00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f4b6d3c9e0a5"
+down_revision: Union[str, None] = "e3a5c2b8d9f4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # file_id документів, уже завантажених у Telegram, за хешем маніфесту файлів
+    op.create_table(
+        "telegram_file_cache",
+        sa.Column("cache_key", sa.String(length=100), nullable=False),
+        sa.Column("file_id", sa.String(length=255), nullable=False),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+        sa.PrimaryKeyConstraint("cache_key"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("telegram_file_cache")
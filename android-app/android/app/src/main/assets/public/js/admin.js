@@ -287,14 +287,54 @@ const EpicAdmin = (function() {
         if (btn) btn.disabled = false;
     }
 
+    var IMPORT_STAGE_LABELS = {
+        mapping: 'розпізнавання колонок',
+        parsing: 'читання файлу',
+        merging: 'злиття з базою',
+        committing: 'фіксація змін',
+        notifying: 'розсилка сповіщень'
+    };
+
+    function _importProgressHtml(job) {
+        var stage = IMPORT_STAGE_LABELS[job.stage] || job.stage || '';
+        var text = '⏳ ' + _esc(stage) + ': ' + (job.rows || 0) + (job.total_rows ? ' з ~' + job.total_rows : '') + ' рядків';
+        if (job.eta_seconds !== null && job.eta_seconds !== undefined) text += ', залишилось ≈ ' + job.eta_seconds + ' с';
+        return '<div style="font-size:13px">' + text + '</div>' +
+            '<button class="btn btn-secondary" style="margin-top:6px" onclick="EpicAdmin.cancelImport(\'' + _esc(job.job_id) + '\')">⛔ Скасувати</button>';
+    }
+
+    // Імпорт іде у фоні (202 + job_id): опитуємо задачу до завершення
+    async function _pollImportJob(jobId, onProgress) {
+        var user = App.getUser();
+        var token = App.getToken();
+        while (true) {
+            var job = await EpicAPI.get('/api/admin/jobs/' + jobId + '?user_id=' + user.id, token);
+            if (job.status !== 'pending' && job.status !== 'running') return job;
+            onProgress(job);
+            await new Promise(function(resolve) { setTimeout(resolve, 1000); });
+        }
+    }
+
+    async function cancelImport(jobId) {
+        var user = App.getUser();
+        var token = App.getToken();
+        var resp = await fetch(SERVER + '/api/admin/jobs/' + jobId + '/cancel?user_id=' + user.id, {
+            method: 'POST',
+            headers: { 'Authorization': 'Bearer ' + token }
+        });
+        if (resp.status === 409) App.toast('Імпорт уже завершено — скасувати неможливо', 'error');
+    }
+
     async function uploadFile() {
         if (!_selectedFile) { App.toast('Оберіть файл', 'error'); return; }
         var alertEl = document.getElementById('import-alert');
+        var btn = document.getElementById('import-upload-btn');
         var notify = document.getElementById('import-notify-users') ? document.getElementById('import-notify-users').checked : false;
         var user = App.getUser();
         var token = App.getToken();
         var formData = new FormData();
         formData.append('file', _selectedFile);
+        if (btn) btn.disabled = true;
         try {
             var resp = await fetch(SERVER + '/api/admin/import?user_id=' + user.id + '&notify_users=' + notify, {
                 method: 'POST',
@@ -302,15 +342,26 @@ const EpicAdmin = (function() {
                 body: formData
             });
             var data = await resp.json();
-            if (!resp.ok) throw new Error(data.detail || data.message || 'HTTP ' + resp.status);
-            if (alertEl) alertEl.innerHTML = '<div style="color:var(--success);font-size:13px">✅ Додано: ' + (data.added || 0) + ', Оновлено: ' + (data.updated || 0) + ', Деактивовано: ' + (data.deactivated || 0) + '</div>';
-            App.toast('Імпорт завершено', 'success');
-            _selectedFile = null;
-            var btn = document.getElementById('import-upload-btn');
-            if (btn) btn.disabled = true;
+            if (!resp.ok || !data.job_id) throw new Error(data.detail || data.error || data.message || 'HTTP ' + resp.status);
+            var job = await _pollImportJob(data.job_id, function(progress) {
+                if (alertEl) alertEl.innerHTML = _importProgressHtml(progress);
+            });
+            if (job.status === 'done' && job.result && job.result.success) {
+                var r = job.result;
+                if (alertEl) alertEl.innerHTML = '<div style="color:var(--success);font-size:13px">✅ Додано: ' + (r.added || 0) + ', Оновлено: ' + (r.updated || 0) + ', Без змін: ' + (r.unchanged || 0) + ', Деактивовано: ' + (r.deactivated || 0) + '</div>';
+                App.toast('Імпорт завершено', 'success');
+                _selectedFile = null;
+            } else if (job.status === 'cancelled') {
+                if (alertEl) alertEl.innerHTML = '<div style="font-size:13px">⛔ Імпорт скасовано, зміни в базі відкочено</div>';
+                App.toast('Імпорт скасовано', 'error');
+            } else {
+                throw new Error(job.error || 'Помилка імпорту');
+            }
         } catch (e) {
-            if (alertEl) alertEl.innerHTML = '<div style="color:var(--danger);font-size:13px">❌ ' + e.message + '</div>';
+            if (alertEl) alertEl.innerHTML = '<div style="color:var(--danger);font-size:13px">❌ ' + _esc(e.message) + '</div>';
             App.toast(e.message || 'Помилка імпорту', 'error');
+        } finally {
+            if (btn) btn.disabled = !_selectedFile;
         }
     }
 
@@ -371,7 +422,7 @@ const EpicAdmin = (function() {
         showAllUsers, showActiveUsers, showProductsInfo, showReservedByDepartment,
         closeStatsModal,
         showAdminArchives, downloadAdminArchive, downloadAllAdminArchives, closeAdminArchivesModal,
-        sendBroadcast, handleFileSelect, uploadFile, exportStock,
+        sendBroadcast, handleFileSelect, uploadFile, cancelImport, exportStock,
         clearDatabase, deleteAllPhotos, resetModeration, deleteAllArchives, fullWipe,
     };
 })();
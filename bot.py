@@ -34,7 +34,7 @@ async def scheduled_cleanup():
     logger = logging.getLogger(__name__)
     try:
         logger.info("Запуск щодобового очищення trash...")
-        cleanup_trash(days=14)
+        await asyncio.to_thread(cleanup_trash, days=14)
     except Exception as e:
         logger.error(f"Помилка при щодобовому очищенні trash: {e}", exc_info=True)
 
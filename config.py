@@ -140,3 +140,23 @@ else:
 # Абсолютний шлях до папки archives відносно кореня проекту
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 ARCHIVES_PATH = os.path.join(BASE_DIR, "archives")
+
+# Кількість потоків для рендерингу Excel-файлів списків (поза event loop)
+EXCEL_RENDER_WORKERS = int(os.getenv("EXCEL_RENDER_WORKERS", 2))
+
+# Режим зберігання архіву списків:
+#   eager    — xlsx рендериться одразу при збереженні (за замовчуванням);
+#   deferred — список зберігається лише в БД (saved_list_items), xlsx
+#              рендериться при першому завантаженні в дисковий кеш.
+ARCHIVE_STORAGE_MODE = os.getenv("ARCHIVE_STORAGE_MODE", "eager").lower()
+# Ліміт дискового кешу відрендерених xlsx (deferred), МБ; старі файли витісняються (LRU)
+ARCHIVE_CACHE_MAX_MB = int(os.getenv("ARCHIVE_CACHE_MAX_MB", 512))
+
+# Запис імпорту залишків у каталог:
+#   shadow  — зміни готуються в тіньовій таблиці короткими транзакціями, а в
+#             products застосовуються однією короткою фінальною (за замовчуванням);
+#   inplace — staging і злиття в одній транзакції на весь імпорт.
+IMPORT_WRITE_MODE = os.getenv("IMPORT_WRITE_MODE", "shadow").lower()
+
+# Скільки списків одночасно зберігається під час масового примусового збереження
+FORCE_SAVE_CONCURRENCY = int(os.getenv("FORCE_SAVE_CONCURRENCY", 5))
@@ -8,7 +8,9 @@ from sqlalchemy import (
     DateTime,
     Float,
     ForeignKey,
+    Index,
     Integer,
+    JSON,
     String,
     func,
 )
@@ -74,6 +76,9 @@ class Product(Base):
     сума_залишку: Mapped[float] = mapped_column(Float, nullable=True, default=0.0)
     ціна: Mapped[float] = mapped_column(Float, nullable=True, default=0.0)
     активний: Mapped[bool] = mapped_column(Boolean, default=True, index=True)
+    # md5 нормалізованого рядка файлу останнього імпорту: незмінені рядки не перезаписуються.
+    # NULL — значення змінювались поза імпортом (віднімання зібраного), рядок буде оновлено.
+    content_hash: Mapped[str | None] = mapped_column(String(32), nullable=True)
 
 
 class ProductPhoto(Base):
@@ -111,7 +116,7 @@ class SavedList(Base):
     created_at: Mapped[DateTime] = mapped_column(DateTime, default=func.now())
 
     items: Mapped[List["SavedListItem"]] = relationship(
-        back_populates="saved_list", cascade="all, delete-orphan"
+        back_populates="saved_list", cascade="all, delete-orphan", passive_deletes=True
     )
     user: Mapped["User"] = relationship(back_populates="saved_lists")
 
@@ -121,13 +126,85 @@ class SavedListItem(Base):
 
     __tablename__ = "saved_list_items"
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    list_id: Mapped[int] = mapped_column(ForeignKey("saved_lists.id"))
+    # Позиції видаляються разом зі списком (очищення архіву, «видалити всі»)
+    list_id: Mapped[int] = mapped_column(ForeignKey("saved_lists.id", ondelete="CASCADE"), index=True)
     article_name: Mapped[str] = mapped_column(String(255))
-    quantity: Mapped[int] = mapped_column(Integer)
+    quantity: Mapped[float] = mapped_column(Float)
+    # NULL для списків з мобільного застосунку (лише текст артикулу)
+    # та для товарів, видалених після збереження
+    product_id: Mapped[int | None] = mapped_column(
+        ForeignKey("products.id", ondelete="SET NULL"), nullable=True, index=True
+    )
+    price: Mapped[float | None] = mapped_column(Float, nullable=True)
+    # Позиція потрапила у файл «лишки_» (не було на залишку)
+    is_surplus: Mapped[bool] = mapped_column(Boolean, default=False)
 
     saved_list: Mapped["SavedList"] = relationship(back_populates="items")
 
 
+class ArchiveFile(Base):
+    """Індекс файлів архіву (archives/active та archives/trash)."""
+
+    __tablename__ = "archive_files"
+    __table_args__ = (Index("ix_archive_files_user_id_created_at", "user_id", "created_at"),)
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    filename: Mapped[str] = mapped_column(String(255), unique=True)
+    # Без FK на users: у архіві можуть лежати файли вже видалених користувачів
+    user_id: Mapped[int] = mapped_column(BigInteger, index=True)
+    # Рядок, бо для списків без відділу в імені файлу стоїть "list"
+    department: Mapped[str] = mapped_column(String(50), index=True)
+    created_at: Mapped[DateTime] = mapped_column(DateTime, index=True)
+    size: Mapped[int] = mapped_column(BigInteger, default=0)
+    is_surplus: Mapped[bool] = mapped_column(Boolean, default=False)
+    # Підсумки файлу (NULL — ще не пораховано, див. backfill у reconcile)
+    items_count: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    total_sum: Mapped[float | None] = mapped_column(Float, nullable=True)
+    is_trashed: Mapped[bool] = mapped_column(Boolean, default=False, index=True)
+    trashed_at: Mapped[DateTime | None] = mapped_column(DateTime, nullable=True)
+    # Збережений список-джерело: файл можна відрендерити з saved_list_items,
+    # якщо його немає на диску (ARCHIVE_STORAGE_MODE=deferred)
+    saved_list_id: Mapped[int | None] = mapped_column(
+        ForeignKey("saved_lists.id", ondelete="SET NULL"), nullable=True
+    )
+
+
+class ArchiveUserTotals(Base):
+    """Підсумки активних архівів користувача (агрегат archive_files)."""
+
+    __tablename__ = "archive_user_totals"
+    user_id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)
+    archives_count: Mapped[int] = mapped_column(Integer, default=0, index=True)
+    total_amount: Mapped[float] = mapped_column(Float, default=0.0)
+    last_activity: Mapped[DateTime | None] = mapped_column(DateTime, nullable=True)
+
+
+class TelegramFileCache(Base):
+    """file_id документів, уже завантажених у Telegram (повторна відправка без завантаження)."""
+
+    __tablename__ = "telegram_file_cache"
+    # "archive:<sha256>" / "zip:<sha256>" — хеш маніфесту файлів (див. utils/telegram_files.py)
+    cache_key: Mapped[str] = mapped_column(String(100), primary_key=True)
+    file_id: Mapped[str] = mapped_column(String(255))
+    created_at: Mapped[DateTime] = mapped_column(DateTime, default=func.now())
+
+
+class ColumnMappingCache(Base):
+    """Мапінг колонок імпорту для відомого макета заголовків (див. SmartColumnMapper)."""
+
+    __tablename__ = "column_mapping_cache"
+    # sha256 нормалізованих заголовків у порядку файлу
+    fingerprint: Mapped[str] = mapped_column(String(64), primary_key=True)
+    headers: Mapped[list] = mapped_column(JSON)
+    # {поле: позиція колонки} — позиції стабільні для того самого макета
+    mapping: Mapped[dict] = mapped_column(JSON)
+    # Хеш column_synonyms.json, з яким мапінг обчислено (для закріплених не важливий)
+    synonyms_hash: Mapped[str] = mapped_column(String(32))
+    # Закріплений адміном мапінг не перераховується евристиками
+    pinned: Mapped[bool] = mapped_column(Boolean, default=False)
+    created_at: Mapped[DateTime] = mapped_column(DateTime, default=func.now())
+    updated_at: Mapped[DateTime] = mapped_column(DateTime, default=func.now(), onupdate=func.now())
+
+
 class TempList(Base):
     """Модель, що представляє тимчасовий (поточний) список товарів користувача."""
 
@@ -4,7 +4,7 @@
 Пакет ORM (Object-Relational Mapping).
 
 Цей __init__.py файл збирає всі публічні ORM-функції з окремих модулів
-(products, temp_lists, archives, users, reports) в єдиний простір імен `database.orm`.
+(products, temp_lists, archives, archive_files, users, reports) в єдиний простір імен `database.orm`.
 
 Це дозволяє іншим частинам програми (наприклад, обробникам) імпортувати
 будь-яку ORM-функцію напряму, не знаючи про її точне розташування у файлі:
@@ -22,7 +22,10 @@ from .products import (
     orm_find_products,
     orm_get_all_products_sync,
     orm_get_product_by_id,
+    orm_lock_products_for_update,
     orm_smart_import,
+    orm_smart_import_file,
+    orm_smart_import_sources,
     orm_subtract_collected,
 )
 from .temp_lists import (
@@ -43,11 +46,43 @@ from .archives import (
     orm_delete_lists_older_than_sync,
     orm_get_all_collected_items_sync,
     orm_get_all_files_for_user,
+    orm_get_saved_list_items_sync,
     orm_get_user_lists_archive,
+    orm_get_user_saved_lists_summary,
     orm_get_users_for_warning_sync,
     orm_get_users_with_archives,
     orm_update_reserved_quantity,
 )
+from .archive_files import (
+    orm_delete_archive_files,
+    orm_delete_archive_files_sync,
+    orm_get_all_archive_files,
+    orm_get_all_archive_files_sync,
+    orm_get_archive_files_page,
+    orm_get_archive_file,
+    orm_get_archive_file_sync,
+    orm_get_archive_files_without_summary_sync,
+    orm_get_trashed_archive_files_before_sync,
+    orm_get_user_archive_files,
+    orm_get_user_archive_files_sync,
+    orm_get_users_with_archive_totals,
+    orm_mark_archive_files_trashed_sync,
+    orm_set_archive_file_summary_sync,
+    orm_upsert_archive_file_sync,
+)
+from .column_mappings import (
+    orm_delete_column_mapping,
+    orm_get_column_mapping,
+    orm_get_column_mapping_sync,
+    orm_get_column_mappings,
+    orm_pin_column_mapping,
+    orm_save_column_mapping_sync,
+)
+from .telegram_files import (
+    orm_delete_telegram_file_id,
+    orm_get_telegram_file_id,
+    orm_save_telegram_file_id,
+)
 from .users import (
     orm_approve_user,
     orm_block_user,
@@ -68,7 +103,10 @@ __all__ = [
     # products
     "orm_find_products",
     "orm_get_product_by_id",
+    "orm_lock_products_for_update",
     "orm_smart_import",
+    "orm_smart_import_file",
+    "orm_smart_import_sources",
     "orm_subtract_collected",
     "orm_get_all_products_sync",
     # temp_lists
@@ -89,9 +127,38 @@ __all__ = [
     "orm_get_all_files_for_user",
     "orm_get_users_with_archives",
     "orm_get_all_collected_items_sync",
+    "orm_get_user_saved_lists_summary",
+    "orm_get_saved_list_items_sync",
     "orm_delete_all_saved_lists_sync",
     "orm_delete_lists_older_than_sync",
     "orm_get_users_for_warning_sync",
+    # archive_files
+    "orm_upsert_archive_file_sync",
+    "orm_get_user_archive_files",
+    "orm_get_user_archive_files_sync",
+    "orm_get_users_with_archive_totals",
+    "orm_get_all_archive_files",
+    "orm_get_all_archive_files_sync",
+    "orm_get_archive_files_page",
+    "orm_get_archive_file",
+    "orm_get_archive_file_sync",
+    "orm_get_archive_files_without_summary_sync",
+    "orm_set_archive_file_summary_sync",
+    "orm_mark_archive_files_trashed_sync",
+    "orm_get_trashed_archive_files_before_sync",
+    "orm_delete_archive_files",
+    "orm_delete_archive_files_sync",
+    # column_mappings
+    "orm_get_column_mappings",
+    "orm_get_column_mapping",
+    "orm_get_column_mapping_sync",
+    "orm_save_column_mapping_sync",
+    "orm_pin_column_mapping",
+    "orm_delete_column_mapping",
+    # telegram_files
+    "orm_get_telegram_file_id",
+    "orm_save_telegram_file_id",
+    "orm_delete_telegram_file_id",
     # users
     "orm_upsert_user",
     "orm_get_user_by_id",
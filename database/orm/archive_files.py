@@ -0,0 +1,306 @@
+# epicservice/database/orm/archive_files.py
+
+import logging
+from datetime import datetime
+from typing import Iterable, List
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+
+from database.engine import async_session, sync_session
+from database.models import ArchiveFile, ArchiveUserTotals, User
+
+logger = logging.getLogger(__name__)
+
+
+def _user_totals_refresh_statements(user_ids: Iterable[int] | None):
+    """
+    Інструкції перерахунку archive_user_totals з archive_files
+    для вказаних користувачів (None — для всіх).
+    Видалення + INSERT ... SELECT ... ON CONFLICT: користувачі без активних
+    архівів зникають з агрегату, решта отримують свіжі підсумки.
+    """
+    cleanup = delete(ArchiveUserTotals)
+    aggregate = (
+        select(
+            ArchiveFile.user_id,
+            func.count(ArchiveFile.id),
+            func.coalesce(func.sum(ArchiveFile.total_sum), 0.0),
+            func.max(ArchiveFile.created_at),
+        )
+        .where(ArchiveFile.is_trashed.is_(False))
+        .group_by(ArchiveFile.user_id)
+    )
+    if user_ids is not None:
+        user_ids = sorted(set(user_ids))
+        cleanup = cleanup.where(ArchiveUserTotals.user_id.in_(user_ids))
+        aggregate = aggregate.where(ArchiveFile.user_id.in_(user_ids))
+    upsert = insert(ArchiveUserTotals).from_select(
+        ["user_id", "archives_count", "total_amount", "last_activity"], aggregate
+    )
+    upsert = upsert.on_conflict_do_update(
+        index_elements=["user_id"],
+        set_={
+            "archives_count": upsert.excluded.archives_count,
+            "total_amount": upsert.excluded.total_amount,
+            "last_activity": upsert.excluded.last_activity,
+        },
+    )
+    return cleanup, upsert
+
+
+# --- Запис (синхронно: викликається з потоків рендерингу/ротації та скриптів) ---
+
+def orm_upsert_archive_file_sync(
+    filename: str,
+    user_id: int,
+    department: str,
+    created_at: datetime,
+    size: int,
+    is_surplus: bool,
+    is_trashed: bool = False,
+    trashed_at: datetime | None = None,
+    items_count: int | None = None,
+    total_sum: float | None = None,
+    saved_list_id: int | None = None,
+) -> None:
+    """
+    Додає файл до індексу архіву або оновлює існуючий запис (за filename).
+    items_count / total_sum — підсумки файлу (None, якщо невідомі).
+    saved_list_id — список-джерело; None не перезаписує вже збережений зв'язок.
+    """
+    values = {
+        "user_id": user_id,
+        "department": str(department),
+        "created_at": created_at,
+        "size": size,
+        "is_surplus": is_surplus,
+        "items_count": items_count,
+        "total_sum": total_sum,
+        "is_trashed": is_trashed,
+        "trashed_at": trashed_at,
+    }
+    if saved_list_id is not None:
+        values["saved_list_id"] = saved_list_id
+    with sync_session() as session:
+        stmt = insert(ArchiveFile).values(filename=filename, **values)
+        stmt = stmt.on_conflict_do_update(index_elements=["filename"], set_=values)
+        session.execute(stmt)
+        for totals_stmt in _user_totals_refresh_statements([user_id]):
+            session.execute(totals_stmt)
+        session.commit()
+
+
+def orm_get_archive_file_sync(filename: str) -> ArchiveFile | None:
+    with sync_session() as session:
+        result = session.execute(select(ArchiveFile).where(ArchiveFile.filename == filename))
+        return result.scalar_one_or_none()
+
+
+def orm_get_user_archive_files_sync(user_id: int) -> List[ArchiveFile]:
+    """Активні (не в trash) файли користувача, новіші спочатку."""
+    with sync_session() as session:
+        result = session.execute(
+            select(ArchiveFile)
+            .where(ArchiveFile.user_id == user_id, ArchiveFile.is_trashed.is_(False))
+            .order_by(ArchiveFile.created_at.desc(), ArchiveFile.filename)
+        )
+        return result.scalars().all()
+
+
+def orm_mark_archive_files_trashed_sync(filenames: Iterable[str]) -> None:
+    """Позначає файли як переміщені в trash."""
+    filenames = list(filenames)
+    if not filenames:
+        return
+    with sync_session() as session:
+        result = session.execute(
+            update(ArchiveFile)
+            .where(ArchiveFile.filename.in_(filenames))
+            .values(is_trashed=True, trashed_at=datetime.now())
+            .returning(ArchiveFile.user_id)
+        )
+        for totals_stmt in _user_totals_refresh_statements(result.scalars().all()):
+            session.execute(totals_stmt)
+        session.commit()
+
+
+def orm_get_trashed_archive_files_before_sync(cutoff: datetime) -> List[ArchiveFile]:
+    """Файли в trash, переміщені туди раніше за cutoff."""
+    with sync_session() as session:
+        result = session.execute(
+            select(ArchiveFile)
+            .where(ArchiveFile.is_trashed.is_(True), ArchiveFile.trashed_at < cutoff)
+        )
+        return result.scalars().all()
+
+
+def orm_get_all_archive_files_sync() -> List[ArchiveFile]:
+    """Всі записи індексу (active + trash) — для звірки з файловою системою."""
+    with sync_session() as session:
+        result = session.execute(select(ArchiveFile))
+        return result.scalars().all()
+
+
+def orm_get_archive_files_without_summary_sync() -> List[ArchiveFile]:
+    """Записи індексу без підсумків (для backfill)."""
+    with sync_session() as session:
+        result = session.execute(select(ArchiveFile).where(ArchiveFile.items_count.is_(None)))
+        return result.scalars().all()
+
+
+def orm_set_archive_file_summary_sync(filename: str, items_count: int, total_sum: float) -> None:
+    with sync_session() as session:
+        result = session.execute(
+            update(ArchiveFile)
+            .where(ArchiveFile.filename == filename)
+            .values(items_count=items_count, total_sum=total_sum)
+            .returning(ArchiveFile.user_id)
+        )
+        for totals_stmt in _user_totals_refresh_statements(result.scalars().all()):
+            session.execute(totals_stmt)
+        session.commit()
+
+
+def orm_delete_archive_files_sync(filenames: Iterable[str]) -> None:
+    """Видаляє записи індексу для вказаних файлів."""
+    filenames = list(filenames)
+    if not filenames:
+        return
+    with sync_session() as session:
+        result = session.execute(
+            delete(ArchiveFile)
+            .where(ArchiveFile.filename.in_(filenames))
+            .returning(ArchiveFile.user_id)
+        )
+        for totals_stmt in _user_totals_refresh_statements(result.scalars().all()):
+            session.execute(totals_stmt)
+        session.commit()
+
+
+# --- Читання (асинхронно: для ендпоїнтів та хендлерів) ---
+
+async def orm_get_user_archive_files(user_id: int) -> List[ArchiveFile]:
+    """Активні (не в trash) файли користувача, новіші спочатку."""
+    async with async_session() as session:
+        result = await session.execute(
+            select(ArchiveFile)
+            .where(ArchiveFile.user_id == user_id, ArchiveFile.is_trashed.is_(False))
+            .order_by(ArchiveFile.created_at.desc(), ArchiveFile.filename)
+        )
+        return result.scalars().all()
+
+
+async def orm_get_all_archive_files() -> List[ArchiveFile]:
+    """Всі активні файли архіву, новіші спочатку."""
+    async with async_session() as session:
+        result = await session.execute(
+            select(ArchiveFile)
+            .where(ArchiveFile.is_trashed.is_(False))
+            .order_by(ArchiveFile.created_at.desc(), ArchiveFile.filename)
+        )
+        return result.scalars().all()
+
+
+async def orm_get_archive_files_page(
+    limit: int,
+    offset: int = 0,
+    user_id: int | None = None,
+    department: str | None = None,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    is_surplus: bool | None = None,
+    newest_first: bool = True,
+) -> tuple[List[ArchiveFile], int]:
+    """
+    Сторінка активних файлів архіву з фільтрами (None — без фільтра).
+    date_from включно, date_to — не включно. Повертає (файли, загальна кількість);
+    загальна кількість рахується окремим COUNT з тими ж умовами.
+    """
+    conditions = [ArchiveFile.is_trashed.is_(False)]
+    if user_id is not None:
+        conditions.append(ArchiveFile.user_id == user_id)
+    if department is not None:
+        conditions.append(ArchiveFile.department == department)
+    if date_from is not None:
+        conditions.append(ArchiveFile.created_at >= date_from)
+    if date_to is not None:
+        conditions.append(ArchiveFile.created_at < date_to)
+    if is_surplus is not None:
+        conditions.append(ArchiveFile.is_surplus.is_(is_surplus))
+
+    order = ArchiveFile.created_at.desc() if newest_first else ArchiveFile.created_at.asc()
+    async with async_session() as session:
+        total = await session.scalar(select(func.count()).select_from(ArchiveFile).where(*conditions))
+        if not total:
+            return [], 0
+        result = await session.execute(
+            select(ArchiveFile)
+            .where(*conditions)
+            .order_by(order, ArchiveFile.filename)
+            .limit(limit)
+            .offset(offset)
+        )
+        return result.scalars().all(), total
+
+
+async def orm_get_archive_file(filename: str) -> ArchiveFile | None:
+    async with async_session() as session:
+        result = await session.execute(select(ArchiveFile).where(ArchiveFile.filename == filename))
+        return result.scalar_one_or_none()
+
+
+async def orm_delete_archive_files(filenames: Iterable[str] | None = None) -> int:
+    """
+    Видаляє записи індексу для вказаних файлів.
+    filenames=None — видаляє записи ВСІХ активних файлів (danger zone).
+    """
+    stmt = delete(ArchiveFile)
+    if filenames is None:
+        stmt = stmt.where(ArchiveFile.is_trashed.is_(False))
+    else:
+        filenames = list(filenames)
+        if not filenames:
+            return 0
+        stmt = stmt.where(ArchiveFile.filename.in_(filenames))
+    async with async_session() as session:
+        result = await session.execute(stmt.returning(ArchiveFile.user_id))
+        user_ids = result.scalars().all()
+        # Видалення всіх активних — перераховуємо агрегат повністю
+        for totals_stmt in _user_totals_refresh_statements(None if filenames is None else user_ids):
+            await session.execute(totals_stmt)
+        await session.commit()
+        return len(user_ids)
+
+
+async def orm_get_users_with_archive_totals(limit: int, offset: int = 0) -> tuple[list, int]:
+    """
+    Сторінка користувачів з підсумками архівів (archive_user_totals),
+    відсортована за кількістю архівів. Повертає (рядки, загальна кількість).
+    Рядок: (user_id, username, first_name, archives_count, total_amount, last_activity).
+    Загальна кількість рахується вікном у тому ж запиті.
+    """
+    archives_count = func.coalesce(ArchiveUserTotals.archives_count, 0)
+    async with async_session() as session:
+        result = await session.execute(
+            select(
+                User.id,
+                User.username,
+                User.first_name,
+                archives_count,
+                func.coalesce(ArchiveUserTotals.total_amount, 0.0),
+                ArchiveUserTotals.last_activity,
+                func.count().over(),
+            )
+            .outerjoin(ArchiveUserTotals, ArchiveUserTotals.user_id == User.id)
+            .order_by(archives_count.desc(), User.id)
+            .limit(limit)
+            .offset(offset)
+        )
+        rows = result.all()
+        if rows:
+            return [tuple(row[:6]) for row in rows], rows[0][6]
+        if offset:
+            # Сторінка за межами списку — загальну кількість беремо окремо
+            return [], (await session.execute(select(func.count(User.id)))).scalar_one()
+        return [], 0
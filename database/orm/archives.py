@@ -3,17 +3,16 @@
 import asyncio
 import logging
 from datetime import datetime, timedelta
-from io import BytesIO
 from typing import Any, Dict, List
 
-import pandas as pd
-from sqlalchemy import delete, func, select, update
+from sqlalchemy import Integer, column, delete, exists, func, insert, select, update, values
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from database.engine import async_session, sync_session
-from database.models import Product, SavedList, SavedListItem, User
+from database.models import ArchiveFile, Product, SavedList, SavedListItem, User
 from database.orm.products import _extract_article_and_name
 from database.orm.temp_lists import orm_add_item_to_temp_list
+from utils.excel_reader import iter_excel_batches
 
 logger = logging.getLogger(__name__)
 
@@ -21,48 +20,34 @@ logger = logging.getLogger(__name__)
 async def orm_add_saved_list(
     session: AsyncSession,
     user_id: int,
-    filename: str,
-    filepath: str,
+    file_name: str,
+    file_path: str,
     items: List[Dict[str, Any]]
-):
+) -> int:
     """
-    Зберігає інформацію про збережений файл списку в рамках переданої сесії.
-    items: список словників {"product_id": int, "quantity": float}
+    Зберігає заголовок списку та всі його позиції в рамках переданої сесії
+    (одна вставка заголовка + один пакетний INSERT позицій).
+    items: [{"product_id", "article_name", "quantity", "price", "is_surplus"}, ...]
+    Повертає id збереженого списку. Commit/rollback — на викликаючому.
     """
     try:
-        new_list = SavedList(
-            user_id=user_id,
-            filename=filename,
-            filepath=filepath,
-            created_at=datetime.utcnow()
-        )
-        session.add(new_list)
-        await session.flush()
-
-        logger.info(f"Створено SavedList id={new_list.id} для user_id={user_id}, файл={filename}")
-
-        items_added = 0
-        for item in items:
-            product_id = item.get("product_id")
-            qty = item.get("quantity")
-
-            if not product_id:
-                logger.warning(f"Пропущено item без product_id: {item}")
-                continue
-
-            saved_item = SavedListItem(
-                saved_list_id=new_list.id,
-                product_id=product_id,
-                quantity=qty
+        list_id = (await session.execute(
+            insert(SavedList)
+            .values(user_id=user_id, file_name=file_name, file_path=file_path, created_at=datetime.utcnow())
+            .returning(SavedList.id)
+        )).scalar_one()
+
+        if items:
+            await session.execute(
+                insert(SavedListItem),
+                [{"list_id": list_id, **item} for item in items],
             )
-            session.add(saved_item)
-            items_added += 1
 
-        logger.info(f"Успішно збережено архів: {items_added} items для user_id={user_id}")
-        return True
+        logger.info(f"Збережено список id={list_id} для user_id={user_id}: {len(items)} позицій")
+        return list_id
     except Exception as e:
-        logger.error(f"Помилка при збереженні архіву в БД: {e}", exc_info=True)
-        return False
+        logger.error(f"Помилка при збереженні списку в БД: {e}", exc_info=True)
+        raise
 
 
 async def orm_get_user_lists_archive(user_id: int):
@@ -84,7 +69,18 @@ async def orm_get_archived_list_items(list_id: int):
     """
     async with async_session() as session:
         result = await session.execute(
-            select(SavedListItem).where(SavedListItem.saved_list_id == list_id)
+            select(SavedListItem).where(SavedListItem.list_id == list_id)
+        )
+        return result.scalars().all()
+
+
+def orm_get_saved_list_items_sync(list_id: int, is_surplus: bool) -> List[SavedListItem]:
+    """Позиції збереженого списку (основні або лишки) у порядку збереження."""
+    with sync_session() as session:
+        result = session.execute(
+            select(SavedListItem)
+            .where(SavedListItem.list_id == list_id, SavedListItem.is_surplus.is_(is_surplus))
+            .order_by(SavedListItem.id)
         )
         return result.scalars().all()
 
@@ -93,30 +89,46 @@ async def orm_restore_list_from_archive(user_id: int, list_id: int):
     """
     Відновлює список з архіву в поточний тимчасовий список.
     """
-    items = await orm_get_archived_list_items(list_id)
+    items = [item for item in await orm_get_archived_list_items(list_id) if item.product_id]
     if not items:
         return False
     for item in items:
-        await orm_add_item_to_temp_list(user_id, item.product_id, item.quantity)
+        await orm_add_item_to_temp_list(user_id, item.product_id, int(item.quantity))
     return True
 
 
+def _not_backing_deferred_archive():
+    """
+    Умова для видалення збережених списків: на список не посилається живий
+    архів без файлу (deferred, size=0, не в trash) — інакше його вже не
+    відрендерити. Такі списки видаляються, коли архів піде в trash.
+    """
+    return ~exists().where(
+        ArchiveFile.saved_list_id == SavedList.id,
+        ArchiveFile.size == 0,
+        ArchiveFile.is_trashed == False,
+    )
+
+
 async def orm_delete_archived_list(list_id: int):
     """
-    Видаляє збережений список.
+    Видаляє збережений список (якщо з нього не рендериться deferred-архів).
     """
     async with async_session() as session:
-        await session.execute(delete(SavedList).where(SavedList.id == list_id))
+        await session.execute(
+            delete(SavedList).where(SavedList.id == list_id, _not_backing_deferred_archive())
+        )
         await session.commit()
 
 
 def orm_delete_all_saved_lists_sync():
     """
-    Видаляє ВСІ збережені списки всіх користувачів (синхронно, для адмінки).
+    Видаляє ВСІ збережені списки всіх користувачів (синхронно, для адмінки),
+    крім тих, з яких рендеряться deferred-архіви.
     """
     try:
         with sync_session() as session:
-            session.execute(delete(SavedList))
+            session.execute(delete(SavedList).where(_not_backing_deferred_archive()))
             session.commit()
             return True
     except Exception as e:
@@ -126,12 +138,15 @@ def orm_delete_all_saved_lists_sync():
 
 def orm_delete_lists_older_than_sync(hours: int):
     """
-    Видаляє списки, які старіші за вказану кількість годин.
+    Видаляє списки, які старіші за вказану кількість годин
+    (крім тих, з яких рендеряться deferred-архіви).
     """
     try:
         cutoff_time = datetime.utcnow() - timedelta(hours=hours)
         with sync_session() as session:
-            session.execute(delete(SavedList).where(SavedList.created_at < cutoff_time))
+            session.execute(
+                delete(SavedList).where(SavedList.created_at < cutoff_time, _not_backing_deferred_archive())
+            )
             session.commit()
             return True
     except Exception as e:
@@ -139,25 +154,62 @@ def orm_delete_lists_older_than_sync(hours: int):
         return False
 
 
-def orm_get_all_collected_items_sync():
+def orm_get_all_collected_items_sync() -> List[Dict[str, Any]]:
     """
-    Отримує всі зібрані товари з усіх збережених списків.
+    Зведення зібраних товарів з усіх збережених списків — один агрегат
+    по saved_list_items (лишки не враховуються: їх не було на залишку).
+    Рядок: {"department", "group", "article", "name", "quantity"}.
     """
     try:
         with sync_session() as session:
             stmt = (
-                select(Product, func.sum(SavedListItem.quantity))
-                .join(SavedListItem, Product.id == SavedListItem.product_id)
-                .join(SavedList, SavedListItem.saved_list_id == SavedList.id)
+                select(
+                    Product.відділ.label("department"),
+                    Product.група.label("group"),
+                    Product.артикул.label("article"),
+                    Product.назва.label("name"),
+                    func.sum(SavedListItem.quantity).label("quantity"),
+                )
+                .join(SavedListItem, SavedListItem.product_id == Product.id)
+                .where(SavedListItem.is_surplus.is_(False))
                 .group_by(Product.id)
+                .order_by(Product.відділ, Product.група, Product.назва)
             )
-            result = session.execute(stmt).all()
-            return result
+            return [dict(row._mapping) for row in session.execute(stmt)]
     except Exception as e:
         logger.error(f"Помилка отримання зібраних товарів: {e}", exc_info=True)
         return []
 
 
+async def orm_get_user_saved_lists_summary(user_id: int, limit: int | None = None) -> List[Dict[str, Any]]:
+    """
+    Історія збережених списків користувача з підсумками, порахованими
+    агрегатом по saved_list_items (без читання файлів), новіші спочатку.
+    """
+    in_stock = SavedListItem.is_surplus.is_(False)
+    line_sum = SavedListItem.quantity * func.coalesce(SavedListItem.price, 0.0)
+    stmt = (
+        select(
+            SavedList.id,
+            SavedList.file_name,
+            SavedList.created_at,
+            func.count(SavedListItem.id).filter(in_stock).label("items_count"),
+            func.coalesce(func.sum(line_sum).filter(in_stock), 0.0).label("total_sum"),
+            func.count(SavedListItem.id).filter(~in_stock).label("surplus_count"),
+            func.coalesce(func.sum(line_sum).filter(~in_stock), 0.0).label("surplus_sum"),
+        )
+        .outerjoin(SavedListItem, SavedListItem.list_id == SavedList.id)
+        .where(SavedList.user_id == user_id)
+        .group_by(SavedList.id)
+        .order_by(SavedList.created_at.desc())
+    )
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    async with async_session() as session:
+        result = await session.execute(stmt)
+        return [dict(row._mapping) for row in result]
+
+
 async def orm_get_all_files_for_user(user_id: int):
     return await orm_get_user_lists_archive(user_id)
 
@@ -193,18 +245,31 @@ async def orm_update_reserved_quantity(session: AsyncSession, updates: List[Dict
     """
     Збільшує поле 'відкладено' для списку товарів на відповідну кількість.
     updates: [{"product_id": int, "quantity": float}, ...]
+    Виконується одним запитом UPDATE ... FROM (VALUES ...) незалежно від розміру списку.
     Приймає активну сесію — commit/rollback на відповідальності викликаючого.
     """
     try:
+        # Агрегуємо дублікати: UPDATE ... FROM застосовує лише один рядок на товар
+        totals: Dict[int, float] = {}
         for update_data in updates:
             pid = update_data["product_id"]
-            qty = update_data["quantity"]
-            stmt = (
-                update(Product)
-                .where(Product.id == pid)
-                .values(відкладено=func.coalesce(Product.відкладено, 0) + qty)
-            )
-            await session.execute(stmt)
+            totals[pid] = totals.get(pid, 0) + update_data["quantity"]
+        if not totals:
+            return True
+
+        reservations = values(
+            column("product_id", Integer),
+            column("quantity", Integer),
+            name="reservations",
+        ).data(sorted(totals.items()))
+
+        stmt = (
+            update(Product)
+            .where(Product.id == reservations.c.product_id)
+            .values(відкладено=func.coalesce(Product.відкладено, 0) + reservations.c.quantity)
+            .execution_options(synchronize_session=False)
+        )
+        await session.execute(stmt)
         return True
     except Exception as e:
         logger.error(f"Помилка оновлення резерву: {e}", exc_info=True)
@@ -213,12 +278,12 @@ async def orm_update_reserved_quantity(session: AsyncSession, updates: List[Dict
 
 def _sync_process_collected_file(file_content: bytes, user_id: int) -> dict:
     try:
-        df = pd.read_excel(BytesIO(file_content))
+        columns, batches = iter_excel_batches(file_content)
 
         found_items = []
         not_found_count = 0
 
-        headers = {str(col).lower(): col for col in df.columns}
+        headers = {str(col).lower(): col for col in columns}
 
         col_name = None
         for candidate in ["назва", "name", "товар", "product"]:
@@ -233,23 +298,22 @@ def _sync_process_collected_file(file_content: bytes, user_id: int) -> dict:
                 break
 
         if not col_name or not col_qty:
+            batches.close()
             return {"error": "Не знайдено колонки 'Назва' або 'Кількість'"}
 
         with sync_session() as session:
-            for _, row in df.iterrows():
-                val = row[col_name]
-                qty = row[col_qty]
-
-                article, _ = _extract_article_and_name(val)
-
-                if article:
-                    product = session.execute(
-                        select(Product).where(Product.артикул == article)
-                    ).scalar_one_or_none()
-                    if product:
-                        found_items.append((product.id, qty))
-                    else:
-                        not_found_count += 1
+            for df in batches:
+                for val, qty in zip(df[col_name], df[col_qty]):
+                    article, _ = _extract_article_and_name(val)
+
+                    if article:
+                        product = session.execute(
+                            select(Product).where(Product.артикул == article)
+                        ).scalar_one_or_none()
+                        if product:
+                            found_items.append((product.id, qty))
+                        else:
+                            not_found_count += 1
 
         return {"items": found_items, "not_found": not_found_count}
 
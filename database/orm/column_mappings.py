@@ -0,0 +1,87 @@
+# epicservice/database/orm/column_mappings.py
+"""
+Збережені мапінги колонок імпорту за відбитком заголовків файлу.
+
+Синхронні функції викликає SmartColumnMapper (він працює і в потоках
+імпорту, і в обробниках); асинхронні — адмінські ендпоїнти перегляду,
+закріплення та видалення мапінгів.
+"""
+
+import logging
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+
+from database.engine import async_session, sync_session
+from database.models import ColumnMappingCache
+
+logger = logging.getLogger(__name__)
+
+
+def _as_dict(row: ColumnMappingCache) -> dict:
+    return {
+        "fingerprint": row.fingerprint,
+        "headers": row.headers,
+        "mapping": row.mapping,
+        "synonyms_hash": row.synonyms_hash,
+        "pinned": row.pinned,
+        "updated_at": row.updated_at.isoformat() if row.updated_at else None,
+    }
+
+
+def orm_get_column_mapping_sync(fingerprint: str) -> dict | None:
+    with sync_session() as session:
+        row = session.get(ColumnMappingCache, fingerprint)
+        return _as_dict(row) if row else None
+
+
+def orm_save_column_mapping_sync(fingerprint: str, headers: list, mapping: dict, synonyms_hash: str) -> None:
+    """Зберігає обчислений мапінг; закріплений адміном не перезаписується."""
+    stmt = insert(ColumnMappingCache).values(
+        fingerprint=fingerprint, headers=headers, mapping=mapping, synonyms_hash=synonyms_hash, pinned=False
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["fingerprint"],
+        set_={"mapping": mapping, "synonyms_hash": synonyms_hash, "updated_at": func.now()},
+        where=~ColumnMappingCache.pinned,
+    )
+    with sync_session() as session:
+        session.execute(stmt)
+        session.commit()
+
+
+async def orm_get_column_mappings() -> list[dict]:
+    async with async_session() as session:
+        result = await session.execute(
+            select(ColumnMappingCache).order_by(ColumnMappingCache.updated_at.desc())
+        )
+        return [_as_dict(row) for row in result.scalars()]
+
+
+async def orm_get_column_mapping(fingerprint: str) -> dict | None:
+    async with async_session() as session:
+        row = await session.get(ColumnMappingCache, fingerprint)
+        return _as_dict(row) if row else None
+
+
+async def orm_pin_column_mapping(fingerprint: str, mapping: dict) -> dict | None:
+    """Закріплює (перевизначає) мапінг макета. None — макет ще не траплявся."""
+    async with async_session() as session:
+        row = await session.get(ColumnMappingCache, fingerprint)
+        if row is None:
+            return None
+        row.mapping = mapping
+        row.pinned = True
+        await session.commit()
+        await session.refresh(row)
+        return _as_dict(row)
+
+
+async def orm_delete_column_mapping(fingerprint: str) -> bool:
+    """Забуває мапінг — наступний файл з цим макетом пройде евристики заново."""
+    async with async_session() as session:
+        result = await session.execute(
+            delete(ColumnMappingCache).where(ColumnMappingCache.fingerprint == fingerprint)
+        )
+        await session.commit()
+        return result.rowcount > 0
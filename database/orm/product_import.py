@@ -0,0 +1,413 @@
+# epicservice/database/orm/product_import.py
+"""
+Злиття імпортованого залишку з каталогом products через staging-таблицю.
+
+Нормалізовані рядки файлу пакетами завантажуються у тимчасову таблицю
+командою COPY (psycopg2 copy_expert) — по мірі читання файлу, тож увесь
+файл у пам'яті не тримається. Далі кілька set-based запитів у тій самій
+транзакції:
+  0. прибирають дублікати артикулів (виграє останній рядок файлу);
+  1. деактивують товари, яких немає у файлі;
+  2. оновлюють наявні, лише якщо рядок файлу змінився (content_hash) або товар
+     був неактивний; ціну та місяці без руху беруть з БД, якщо у файлі 0 / порожньо;
+  3. додають нові;
+  4. рахують статистику по відділах.
+
+Python не тримає ORM-об'єктів каталогу і не будує величезних IN (...),
+тож час і пам'ять імпорту визначаються самим файлом, а не розміром таблиці.
+
+Пробний прогін (dry-run) будує ту саму staging-таблицю, але лише порівнює її
+з каталогом за артикулом, активністю та content_hash (diff_staged_products) —
+products не змінюється, транзакція відкочується.
+
+Тіньовий режим (IMPORT_WRITE_MODE=shadow): staging наповнюється короткими
+транзакціями, build_shadow готує тіньову таблицю з новим станом лише тих
+товарів, що змінюються (нові значення, як їх записало б злиття), і тільки
+apply_shadow торкається products — однією короткою транзакцією за id.
+Заміна таблиці перейменуванням тут не годиться: на products.id і
+products.артикул посилаються temp_lists, saved_list_items і product_photos,
+і їхні FK лишились би на старій таблиці.
+
+Будь-який запис імпорту бере advisory-блокування IMPORT_LOCK_KEY — два
+імпорти одночасно не виконуються (другий отримує ImportInProgressError).
+"""
+
+import csv
+import hashlib
+import io
+import logging
+from typing import Dict, Iterator, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+STAGING_TABLE = "products_import_staging"
+SHADOW_TABLE = "products_import_shadow"
+# Ключ advisory-блокування імпорту каталогу
+IMPORT_LOCK_KEY = 7_310_413_000
+# Рядків в одному COPY: обмежує розмір буфера в пам'яті
+COPY_BATCH_SIZE = 20_000
+
+# Порядок колонок у COPY і в CREATE TABLE
+STAGING_COLUMNS = (
+    "seq", "артикул", "назва", "відділ", "група", "кількість",
+    "кількість_число", "місяці_без_руху", "сума_залишку", "ціна", "content_hash",
+)
+
+_CREATE_STAGING_SQL = f"""
+    CREATE TEMP TABLE {STAGING_TABLE} (
+        seq BIGINT NOT NULL,
+        артикул VARCHAR(20) NOT NULL,
+        назва VARCHAR(255) NOT NULL,
+        відділ BIGINT NOT NULL,
+        група VARCHAR(100) NOT NULL,
+        кількість VARCHAR(50) NOT NULL,
+        кількість_число DOUBLE PRECISION NOT NULL,
+        місяці_без_руху INTEGER,
+        сума_залишку DOUBLE PRECISION NOT NULL,
+        ціна DOUBLE PRECISION NOT NULL,
+        content_hash CHAR(32) NOT NULL
+    ) ON COMMIT {{on_commit}}
+"""
+
+# Рядки CSV: рядкові значення в лапках, числа без, None → "" (FORCE_NULL → NULL)
+_COPY_SQL = (
+    f"COPY {STAGING_TABLE} ({', '.join(STAGING_COLUMNS)}) FROM STDIN "
+    f"WITH (FORMAT csv, FORCE_NULL (місяці_без_руху))"
+)
+
+# Артикул може повторюватись у різних пакетах — лишається рядок з більшим seq
+_DEDUPLICATE_SQL = f"""
+    DELETE FROM {STAGING_TABLE} s USING {STAGING_TABLE} t
+    WHERE s.артикул = t.артикул AND s.seq < t.seq
+"""
+
+_INDEX_STAGING_SQL = f"CREATE UNIQUE INDEX ON {STAGING_TABLE} (артикул)"
+
+_DEACTIVATE_SQL = f"""
+    UPDATE products p SET активний = FALSE
+    WHERE p.активний
+      AND NOT EXISTS (SELECT 1 FROM {STAGING_TABLE} s WHERE s.артикул = p.артикул)
+"""
+
+_COUNT_REACTIVATED_SQL = f"""
+    SELECT count(*) FROM products p JOIN {STAGING_TABLE} s ON s.артикул = p.артикул
+    WHERE NOT p.активний
+"""
+
+# У SET праві частини бачать старі значення рядка products
+_UPDATE_SQL = f"""
+    UPDATE products p SET
+        назва = s.назва,
+        відділ = s.відділ,
+        група = s.група,
+        кількість = s.кількість,
+        ціна = CASE WHEN s.ціна = 0 AND COALESCE(p.ціна, 0) > 0 THEN p.ціна ELSE s.ціна END,
+        сума_залишку = CASE WHEN s.ціна = 0 AND COALESCE(p.ціна, 0) > 0
+                            THEN s.кількість_число * p.ціна ELSE s.сума_залишку END,
+        місяці_без_руху = COALESCE(s.місяці_без_руху, p.місяці_без_руху, 0),
+        активний = TRUE,
+        content_hash = s.content_hash
+    FROM {STAGING_TABLE} s
+    WHERE p.артикул = s.артикул
+      AND (p.content_hash IS DISTINCT FROM s.content_hash OR NOT p.активний)
+"""
+
+_INSERT_SQL = f"""
+    INSERT INTO products (артикул, назва, відділ, група, кількість, відкладено,
+                          місяці_без_руху, сума_залишку, ціна, активний, content_hash)
+    SELECT s.артикул, s.назва, s.відділ, s.група, s.кількість, 0,
+           COALESCE(s.місяці_без_руху, 0), s.сума_залишку, s.ціна, TRUE, s.content_hash
+    FROM {STAGING_TABLE} s
+    WHERE NOT EXISTS (SELECT 1 FROM products p WHERE p.артикул = s.артикул)
+"""
+
+_DEPARTMENT_STATS_SQL = f"SELECT відділ, count(*) FROM {STAGING_TABLE} GROUP BY відділ"
+
+# Новий стан товарів, які змінить імпорт (тіньовий режим). Ціна й місяці без
+# руху — за тими ж правилами, що й _UPDATE_SQL; id NULL — новий товар
+_BUILD_SHADOW_SQL = f"""
+    CREATE TEMP TABLE {SHADOW_TABLE} ON COMMIT PRESERVE ROWS AS
+    SELECT CASE WHEN p.id IS NULL THEN 'added'
+                WHEN NOT p.активний THEN 'reactivated'
+                ELSE 'updated' END AS дія,
+           p.id, s.артикул, s.назва, s.відділ, s.група, s.кількість,
+           CASE WHEN s.ціна = 0 AND COALESCE(p.ціна, 0) > 0 THEN p.ціна ELSE s.ціна END AS ціна,
+           CASE WHEN s.ціна = 0 AND COALESCE(p.ціна, 0) > 0
+                THEN s.кількість_число * p.ціна ELSE s.сума_залишку END AS сума_залишку,
+           COALESCE(s.місяці_без_руху, p.місяці_без_руху, 0) AS місяці_без_руху,
+           s.content_hash
+    FROM {STAGING_TABLE} s LEFT JOIN products p ON p.артикул = s.артикул
+    WHERE p.id IS NULL OR NOT p.активний OR p.content_hash IS DISTINCT FROM s.content_hash
+    UNION ALL
+    SELECT 'deactivated', p.id, p.артикул, NULL, NULL, NULL, NULL, NULL, NULL, NULL, NULL
+    FROM products p
+    WHERE p.активний
+      AND NOT EXISTS (SELECT 1 FROM {STAGING_TABLE} s WHERE s.артикул = p.артикул)
+"""
+
+_SHADOW_COUNTS_SQL = f"SELECT дія, count(*) FROM {SHADOW_TABLE} GROUP BY дія"
+
+_APPLY_DEACTIVATE_SQL = f"""
+    UPDATE products p SET активний = FALSE
+    FROM {SHADOW_TABLE} d
+    WHERE p.id = d.id AND d.дія = 'deactivated' AND p.активний
+"""
+
+_APPLY_UPDATE_SQL = f"""
+    UPDATE products p SET
+        назва = d.назва,
+        відділ = d.відділ,
+        група = d.група,
+        кількість = d.кількість,
+        ціна = d.ціна,
+        сума_залишку = d.сума_залишку,
+        місяці_без_руху = d.місяці_без_руху,
+        активний = TRUE,
+        content_hash = d.content_hash
+    FROM {SHADOW_TABLE} d
+    WHERE p.id = d.id AND d.дія IN ('updated', 'reactivated')
+"""
+
+_APPLY_INSERT_SQL = f"""
+    INSERT INTO products (артикул, назва, відділ, група, кількість, відкладено,
+                          місяці_без_руху, сума_залишку, ціна, активний, content_hash)
+    SELECT d.артикул, d.назва, d.відділ, d.група, d.кількість, 0,
+           d.місяці_без_руху, d.сума_залишку, d.ціна, TRUE, d.content_hash
+    FROM {SHADOW_TABLE} d
+    WHERE d.дія = 'added' AND NOT EXISTS (SELECT 1 FROM products p WHERE p.артикул = d.артикул)
+"""
+
+_DROP_IMPORT_TABLES_SQL = f"DROP TABLE IF EXISTS {SHADOW_TABLE}, {STAGING_TABLE}"
+
+# Дії dry-run; порядок — як у звіті
+DIFF_ACTIONS = ("added", "updated", "reactivated", "deactivated", "unchanged")
+
+# Класифікація кожного артикулу так само, як її виконають UPDATE/INSERT/деактивація
+_DIFF_SQL = f"""
+    SELECT CASE WHEN p.артикул IS NULL THEN 'added'
+                WHEN NOT p.активний THEN 'reactivated'
+                WHEN p.content_hash IS DISTINCT FROM s.content_hash THEN 'updated'
+                ELSE 'unchanged' END AS дія,
+           s.артикул, s.назва, s.відділ,
+           p.кількість AS кількість_було, s.кількість AS кількість_стане
+    FROM {STAGING_TABLE} s LEFT JOIN products p ON p.артикул = s.артикул
+    UNION ALL
+    SELECT 'deactivated', p.артикул, p.назва, p.відділ, p.кількість, NULL
+    FROM products p
+    WHERE p.активний
+      AND NOT EXISTS (SELECT 1 FROM {STAGING_TABLE} s WHERE s.артикул = p.артикул)
+"""
+
+_DIFF_SUMMARY_SQL = f"SELECT дія, відділ, count(*) FROM ({_DIFF_SQL}) d GROUP BY дія, відділ"
+
+# CSV змін (без незмінених рядків) пишеться сервером Postgres через COPY TO STDOUT
+_DIFF_COPY_SQL = (
+    f"COPY (SELECT * FROM ({_DIFF_SQL}) d WHERE дія <> 'unchanged' "
+    f"ORDER BY дія, відділ, артикул) TO STDOUT WITH (FORMAT csv, HEADER)"
+)
+
+
+def content_hash(data: Dict) -> str:
+    """md5 нормалізованих значень рядка файлу (без артикулу та активності)."""
+    payload = "\x1f".join((
+        data["назва"],
+        str(data["відділ"]),
+        data["група"],
+        data["кількість"],
+        str(data["місяці_без_руху"]),
+        repr(data["сума_залишку"]),
+        repr(data["ціна"]),
+    ))
+    return hashlib.md5(payload.encode(), usedforsecurity=False).hexdigest()
+
+
+def _staging_row(seq: int, article: str, data: Dict) -> list:
+    return [
+        seq,
+        article,
+        data["назва"],
+        data["відділ"],
+        data["група"],
+        data["кількість"],
+        float(data["кількість"]),
+        data["місяці_без_руху"],
+        data["сума_залишку"],
+        data["ціна"],
+        content_hash(data),
+    ]
+
+
+def iter_copy_batches(
+    rows: Dict[str, Dict], start_seq: int = 0, batch_size: int = COPY_BATCH_SIZE
+) -> Iterator[io.StringIO]:
+    """CSV-буфери для COPY, не більше batch_size рядків у кожному; seq — з start_seq."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC, lineterminator="\n")
+    count = 0
+    for seq, (article, data) in enumerate(rows.items(), start=start_seq):
+        writer.writerow(_staging_row(seq, article, data))
+        count += 1
+        if count == batch_size:
+            buffer.seek(0)
+            yield buffer
+            buffer = io.StringIO()
+            writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC, lineterminator="\n")
+            count = 0
+    if count:
+        buffer.seek(0)
+        yield buffer
+
+
+class ImportInProgressError(RuntimeError):
+    """Каталог уже імпортується іншим процесом (advisory-блокування зайняте)."""
+
+    def __init__(self):
+        super().__init__("Інший імпорт залишків уже виконується. Спробуйте пізніше.")
+
+
+def acquire_import_lock(session: Session, for_transaction: bool = False) -> None:
+    """
+    Бере advisory-блокування імпорту без очікування або піднімає
+    ImportInProgressError. for_transaction=True — до кінця транзакції,
+    інакше — до release_import_lock на цьому ж з'єднанні.
+    """
+    function = "pg_try_advisory_xact_lock" if for_transaction else "pg_try_advisory_lock"
+    if not session.execute(text(f"SELECT {function}(:key)"), {"key": IMPORT_LOCK_KEY}).scalar_one():
+        raise ImportInProgressError()
+
+
+def release_import_lock(session: Session) -> None:
+    session.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": IMPORT_LOCK_KEY})
+
+
+def create_staging(session: Session, keep_on_commit: bool = False) -> None:
+    """
+    Створює staging-таблицю: до кінця транзакції або, з keep_on_commit,
+    до drop_import_tables (тіньовий режим комітить між пакетами).
+    """
+    on_commit = "PRESERVE ROWS" if keep_on_commit else "DROP"
+    session.execute(text(_CREATE_STAGING_SQL.format(on_commit=on_commit)))
+
+
+def copy_rows(session: Session, rows: Dict[str, Dict], start_seq: int = 0) -> int:
+    """COPY пакета нормалізованих рядків у staging. Повертає наступний seq."""
+    cursor = session.connection().connection.cursor()
+    try:
+        for batch in iter_copy_batches(rows, start_seq):
+            cursor.copy_expert(_COPY_SQL, batch)
+    finally:
+        cursor.close()
+    return start_seq + len(rows)
+
+
+def _prepare_staging(session: Session) -> None:
+    session.execute(text(_DEDUPLICATE_SQL))
+    session.execute(text(_INDEX_STAGING_SQL))
+    session.execute(text(f"ANALYZE {STAGING_TABLE}"))
+
+
+def merge_staged_products(session: Session) -> Dict:
+    """
+    Set-based злиття staging-таблиці з products (без коміту).
+    Повертає лічильники (updated — лише змінені рядки, unchanged — збіг хешу)
+    та статистику по відділах файлу.
+    """
+    _prepare_staging(session)
+    deactivated = session.execute(text(_DEACTIVATE_SQL)).rowcount
+    reactivated = session.execute(text(_COUNT_REACTIVATED_SQL)).scalar_one()
+    updated = session.execute(text(_UPDATE_SQL)).rowcount
+    added = session.execute(text(_INSERT_SQL)).rowcount
+    department_stats = {dep: count for dep, count in session.execute(text(_DEPARTMENT_STATS_SQL))}
+    total_in_file = sum(department_stats.values())
+    return {
+        "added": added,
+        "updated": updated,
+        "unchanged": total_in_file - added - updated,
+        "deactivated": deactivated,
+        "reactivated": reactivated,
+        "total_in_file": total_in_file,
+        "department_stats": department_stats,
+    }
+
+
+def build_shadow(session: Session) -> Dict[str, int]:
+    """
+    Тіньовий режим, крок 1: з staging і поточного каталогу будує тіньову
+    таблицю змін. products лише читається. Повертає {дія: кількість}.
+    """
+    _prepare_staging(session)
+    session.execute(text(_BUILD_SHADOW_SQL))
+    session.execute(text(f"ANALYZE {SHADOW_TABLE}"))
+    return {action: count for action, count in session.execute(text(_SHADOW_COUNTS_SQL))}
+
+
+def apply_shadow(session: Session) -> Dict:
+    """
+    Тіньовий режим, крок 2 (без коміту): застосовує тіньову таблицю до
+    products за id. Повертає те саме, що merge_staged_products.
+    """
+    reactivated = session.execute(
+        text(f"SELECT count(*) FROM {SHADOW_TABLE} WHERE дія = 'reactivated'")
+    ).scalar_one()
+    deactivated = session.execute(text(_APPLY_DEACTIVATE_SQL)).rowcount
+    updated = session.execute(text(_APPLY_UPDATE_SQL)).rowcount
+    added = session.execute(text(_APPLY_INSERT_SQL)).rowcount
+    department_stats = {dep: count for dep, count in session.execute(text(_DEPARTMENT_STATS_SQL))}
+    total_in_file = sum(department_stats.values())
+    return {
+        "added": added,
+        "updated": updated,
+        "unchanged": total_in_file - added - updated,
+        "deactivated": deactivated,
+        "reactivated": reactivated,
+        "total_in_file": total_in_file,
+        "department_stats": department_stats,
+    }
+
+
+def drop_import_tables(session: Session) -> None:
+    """Тимчасові таблиці тіньового режиму живуть до кінця з'єднання — прибираємо явно."""
+    session.execute(text(_DROP_IMPORT_TABLES_SQL))
+
+
+def diff_staged_products(session: Session, diff_path: Optional[str] = None) -> Dict:
+    """
+    Dry-run: що зробило б merge_staged_products, без змін у products.
+    Лічильники збігаються з реальним імпортом (updated включає reactivated);
+    affected_departments — {відділ: {дія: кількість}} без незмінених.
+    Якщо задано diff_path, туди пишеться CSV змін (дія, артикул, назва,
+    відділ, кількість_було, кількість_стане).
+    """
+    _prepare_staging(session)
+    counts = dict.fromkeys(DIFF_ACTIONS, 0)
+    affected: Dict[int, Dict[str, int]] = {}
+    department_stats: Dict[int, int] = {}
+    for action, department, count in session.execute(text(_DIFF_SUMMARY_SQL)):
+        counts[action] += count
+        if action != "deactivated":
+            department_stats[department] = department_stats.get(department, 0) + count
+        if action != "unchanged":
+            affected.setdefault(department, {})[action] = count
+
+    if diff_path:
+        cursor = session.connection().connection.cursor()
+        try:
+            with open(diff_path, "w", encoding="utf-8", newline="") as f:
+                cursor.copy_expert(_DIFF_COPY_SQL, f)
+        finally:
+            cursor.close()
+
+    updated = counts["updated"] + counts["reactivated"]
+    return {
+        "added": counts["added"],
+        "updated": updated,
+        "unchanged": counts["unchanged"],
+        "deactivated": counts["deactivated"],
+        "reactivated": counts["reactivated"],
+        "total_in_file": sum(department_stats.values()),
+        "department_stats": department_stats,
+        "affected_departments": {dep: affected[dep] for dep in sorted(affected)},
+    }
@@ -1,16 +1,33 @@
 import asyncio
+import hashlib
+import itertools
 import json
 import logging
+import multiprocessing
 import os
 import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from difflib import SequenceMatcher
+from typing import Callable, Iterable, Optional
 
+import numpy as np
 import pandas as pd
 from sqlalchemy import delete, func, select, update
 from thefuzz import fuzz
 
-from database.engine import async_session, sync_session
+from config import IMPORT_WRITE_MODE
+from database.engine import async_session, sync_engine, sync_session
 from database.models import Product
+from database.orm.column_mappings import orm_get_column_mapping_sync, orm_save_column_mapping_sync
+from database.orm.product_import import (ImportInProgressError, acquire_import_lock, apply_shadow,
+                                         build_shadow, copy_rows, create_staging, diff_staged_products,
+                                         drop_import_tables, merge_staged_products, release_import_lock)
+from utils.excel_reader import iter_excel_batches, read_excel_headers
+from utils.import_sources import list_import_sheets
+from utils.jobs import JobCancelled
 
 logger = logging.getLogger(__name__)
 
@@ -33,6 +50,19 @@ class SmartColumnMapper:
     """
 
     COLUMN_SYNONYMS = _COLUMN_SYNONYMS
+    # Мапінги з кешу стають недійсними після редагування column_synonyms.json
+    SYNONYMS_HASH = hashlib.md5(
+        json.dumps(_COLUMN_SYNONYMS, sort_keys=True, ensure_ascii=False).encode(), usedforsecurity=False
+    ).hexdigest()
+    TARGET_FIELDS = (
+        "article", "name", "department", "group",
+        "quantity", "price", "stock_sum", "months_without_sale"
+    )
+    # Скільки процес довіряє своїй копії мапінгу, перш ніж перечитати БД
+    # (закріплення на іншому воркері стає видимим не пізніше)
+    CACHE_TTL_SECONDS = 60
+    # {відбиток: (діє_до, {поле: позиція})}
+    _cache: dict = {}
 
     @staticmethod
     def normalize_header(header: str) -> str:
@@ -81,22 +111,75 @@ class SmartColumnMapper:
     @classmethod
     def map_columns(cls, df: pd.DataFrame) -> dict[str, str]:
         """Створює словник мапінгу {внутрішнє_поле: колонка_файлу}."""
-        headers = list(df.columns)
+        return cls.map_headers(list(df.columns))
+
+    @classmethod
+    def fingerprint(cls, headers: list) -> str:
+        """Відбиток макета: sha256 нормалізованих заголовків у порядку файлу."""
+        payload = "\x1f".join(cls.normalize_header(h) for h in headers)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    @classmethod
+    def map_headers(cls, headers: list) -> dict[str, str]:
+        """
+        Мапінг лише за рядком заголовків (без читання даних файлу).
+        Відомі макети беруться з кешу за відбитком (пам'ять процесу → БД),
+        евристики запускаються лише для нового макета або після зміни синонімів.
+        """
+        headers = list(headers)
+        fingerprint = cls.fingerprint(headers)
+        positions = cls._cached_positions(fingerprint)
+        if positions is None:
+            matched = cls._match_headers(headers)
+            positions = {field: headers.index(column) for field, column in matched.items()}
+            cls._remember_positions(fingerprint, headers, positions)
+        mapping = {field: headers[pos] for field, pos in positions.items() if pos < len(headers)}
+        logger.info("Результат маппінгу колонок: %s", mapping)
+        return mapping
+
+    @classmethod
+    def _match_headers(cls, headers: list) -> dict[str, str]:
+        """Евристики: точний збіг, підрядок, нечіткий пошук — поле за полем."""
         mapping = {}
-        target_fields = [
-            "article", "name", "department", "group",
-            "quantity", "price", "stock_sum", "months_without_sale"
-        ]
         used_headers = set()
-        for field in target_fields:
+        for field in cls.TARGET_FIELDS:
             available_headers = [h for h in headers if h not in used_headers]
             match = cls.find_best_match(available_headers, field)
             if match:
                 mapping[field] = match
                 used_headers.add(match)
-        logger.info("Результат маппінгу колонок: %s", mapping)
         return mapping
 
+    @classmethod
+    def _cached_positions(cls, fingerprint: str) -> dict[str, int] | None:
+        cached = cls._cache.get(fingerprint)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        try:
+            stored = orm_get_column_mapping_sync(fingerprint)
+        except Exception as e:
+            logger.warning("Кеш мапінгу колонок недоступний: %s", e)
+            return None
+        # Незакріплений мапінг, обчислений зі старими синонімами, перераховуємо
+        if not stored or not (stored["pinned"] or stored["synonyms_hash"] == cls.SYNONYMS_HASH):
+            return None
+        positions = {field: int(pos) for field, pos in stored["mapping"].items()}
+        cls._cache[fingerprint] = (time.monotonic() + cls.CACHE_TTL_SECONDS, positions)
+        return positions
+
+    @classmethod
+    def _remember_positions(cls, fingerprint: str, headers: list, positions: dict[str, int]) -> None:
+        cls._cache[fingerprint] = (time.monotonic() + cls.CACHE_TTL_SECONDS, positions)
+        try:
+            orm_save_column_mapping_sync(fingerprint, [str(h) for h in headers], positions, cls.SYNONYMS_HASH)
+        except Exception as e:
+            logger.warning("Не вдалося зберегти мапінг колонок: %s", e)
+
+    @classmethod
+    def forget(cls, fingerprint: str) -> None:
+        """Скидає кеш процесу для макета (після закріплення чи видалення мапінгу)."""
+        cls._cache.pop(fingerprint, None)
+
 
 def _extract_article_and_name(row_val: str) -> tuple[str | None, str | None]:
     """
@@ -104,11 +187,12 @@ def _extract_article_and_name(row_val: str) -> tuple[str | None, str | None]:
     """
     if not isinstance(row_val, str):
         row_val = str(row_val)
+    # Лише цифри — це артикул без назви (інакше regex нижче відрізав би останню цифру як «назву»)
+    if re.match(r"^\d+$", row_val.strip()):
+        return row_val.strip(), None
     match = re.match(r"^(\d{5,})\s*[-–.]?\s*(.+)$", row_val.strip())
     if match:
         return match.group(1), match.group(2)
-    if re.match(r"^\d+$", row_val.strip()):
-        return row_val.strip(), None
     return None, row_val.strip()
 
 
@@ -130,240 +214,522 @@ def _normalize_value(value, is_float: bool = True):
 
 # --- Функції імпорту та оновлення даних ---
 
-def _sync_smart_import(dataframe: pd.DataFrame) -> dict:
+# Ті самі регулярні вирази, що й у _extract_article_and_name / _normalize_value
+_ARTICLE_NAME_RE = r"^(\d{5,})\s*[-–.]?\s*(.+)$"
+_DIGITS_RE = r"\d+"
+# Що приймає float() після очищення від усього, крім цифр, крапки та мінуса
+_NUMBER_RE = r"-?(?:\d+\.?\d*|\.\d+)"
+
+
+def _as_str(column: pd.Series) -> pd.Series:
+    """str() кожного значення (через object, щоб дати/числа форматувались як у Python)."""
+    return column.astype(object).astype(str)
+
+
+def _split_article_and_name(text: pd.Series) -> tuple[pd.Series, pd.Series]:
+    """Векторний _extract_article_and_name: (артикул, назва), None замість відсутніх."""
+    text = text.str.strip()
+    parts = text.str.extract(_ARTICLE_NAME_RE)
+    matched = parts[0].notna()
+    digits_only = ~matched & text.str.fullmatch(_DIGITS_RE)
+    article = parts[0].where(matched, text.where(digits_only))
+    name = parts[1].where(matched, text.where(~digits_only))
+    return article.astype(object).where(article.notna(), None), name.astype(object).where(name.notna(), None)
+
+
+def _normalize_numbers(column: pd.Series) -> pd.Series:
+    """Векторний _normalize_value(..., is_float=True): float64, 0.0 для порожніх і нечислових."""
+    cleaned = (
+        _as_str(column)
+        .str.replace(",", ".", regex=False)
+        .str.replace("\xa0", "", regex=False)
+        .str.replace(" ", "", regex=False)
+        .str.replace(r"[^0-9.-]", "", regex=True)
+    )
+    valid = column.notna() & cleaned.str.fullmatch(_NUMBER_RE)
+    result = pd.Series(0.0, index=column.index)
+    if valid.any():
+        # object → float64 викликає float() для кожного рядка: округлення як у _normalize_value
+        result[valid] = cleaned[valid].astype(object).astype("float64")
+    return result
+
+
+def _to_int(values: pd.Series) -> pd.Series:
+    """int(float) з відкиданням дробової частини; нескінченності → 0."""
+    values = values.where(np.isfinite(values), 0.0)
+    return np.trunc(values).astype("int64")
+
+
+def _format_quantity(qty: float) -> str:
+    return str(qty) if qty % 1 != 0 else str(int(qty))
+
+
+def _parse_import_rows(dataframe: pd.DataFrame, mapping: dict[str, str]) -> dict[str, dict]:
+    """
+    Нормалізує рядки файлу залишків: {артикул: значення колонок products}.
+    Рядки без артикулу пропускаються, дублікати артикулу — виграє останній.
+
+    Обробка по колонках (pandas/NumPy), результат ідентичний построковому
+    розбору через _extract_article_and_name / _normalize_value.
+    """
+    index = dataframe.index
+    empty = pd.Series(None, index=index, dtype=object)
+    article, name = empty, empty
+
+    if "article" in mapping:
+        column = dataframe[mapping["article"]]
+        present = column.notna()
+        split_article, split_name = _split_article_and_name(_as_str(column))
+        article = split_article.where(present, None)
+        if "name" not in mapping:
+            name = split_name.where(present & split_name.notna() & (split_name != ""), None)
+
+    if "name" in mapping:
+        column = dataframe[mapping["name"]]
+        present = column.notna()
+        text = _as_str(column)
+        has_article = article.notna()
+        # Артикул уже є — назва береться як є
+        name = name.where(~(present & has_article), text)
+        # Артикулу немає — шукаємо його в назві
+        from_name = present & ~has_article
+        split_article, split_name = _split_article_and_name(text)
+        article = article.where(~from_name, split_article)
+        split_name = split_name.where(split_name.notna() & (split_name != ""), text)
+        name = name.where(~from_name, split_name)
+
+    keep = article.notna()
+    if not keep.any():
+        return {}
+    frame = dataframe[keep]
+    article, name = article[keep], name[keep]
+
+    def numbers(field: str) -> pd.Series:
+        if field in mapping:
+            return _normalize_numbers(frame[mapping[field]])
+        return pd.Series(0.0, index=frame.index)
+
+    department = _to_int(numbers("department"))
+
+    if "group" in mapping:
+        group = _as_str(frame[mapping["group"]]).str.strip()
+    else:
+        group = pd.Series("", index=frame.index, dtype=object)
+
+    no_name = name.isna() | (name == "")
+    fallback = group.where(group != "", "Товар " + article.astype(str))
+    name = name.where(~no_name, fallback).str.strip()
+
+    qty, price, stock_sum = numbers("quantity"), numbers("price"), numbers("stock_sum")
+
+    # Евристика розрахунку відсутніх даних (порядок важливий — як у построковій версії)
+    price = price.where(~((price == 0) & (qty > 0) & (stock_sum > 0)), stock_sum / qty)
+    stock_sum = stock_sum.where(~((stock_sum == 0) & (price > 0) & (qty > 0)), price * qty)
+    qty = qty.where(~((qty == 0) & (stock_sum > 0) & (price > 0)), stock_sum / price)
+
+    if "months_without_sale" in mapping:
+        months = _to_int(numbers("months_without_sale")).tolist()
+    else:
+        months = [None] * len(frame)
+
+    return {
+        art: {
+            "назва": nm,
+            "відділ": dep,
+            "група": grp,
+            "кількість": _format_quantity(q),
+            "місяці_без_руху": mon,
+            "сума_залишку": sm,
+            "ціна": pr,
+            "активний": True
+        }
+        for art, nm, dep, grp, q, mon, sm, pr in zip(
+            article.tolist(), name.tolist(), department.tolist(), group.tolist(),
+            qty.tolist(), months, stock_sum.tolist(), price.tolist(),
+        )
+    }
+
+
+def _has_import_columns(mapping: dict[str, str]) -> bool:
+    has_qty_or_sum = "quantity" in mapping or "stock_sum" in mapping
+    has_identity = "article" in mapping or "name" in mapping
+    return has_qty_or_sum and has_identity
+
+
+# Колбек прогресу імпорту: progress(stage, rows_read[, sheets=...]). Може підняти
+# виняток (напр. JobCancelled) — тоді транзакція відкочується до коміту.
+ImportProgressCallback = Callable[..., None]
+
+# Скільки процесів розбирають аркуші паралельно (імпорт кількох аркушів/книг)
+IMPORT_WORKERS = os.cpu_count() or 1
+
+
+def _sync_import_batches(
+    batches: Iterable[pd.DataFrame],
+    mapping: dict[str, str],
+    progress: Optional[ImportProgressCallback] = None,
+    dry_run: bool = False,
+    diff_path: Optional[str] = None,
+) -> dict:
+    """
+    Імпорт пакетів рядків: кожен пакет нормалізується і одразу COPY-ться
+    у staging, злиття з каталогом — set-based запитами (див. product_import).
+    """
+    parsed = ((_parse_import_rows(frame, mapping), len(frame)) for frame in batches)
+    return _sync_import_parsed(parsed, progress, dry_run, diff_path)
+
+
+def _sync_import_parsed(
+    parsed: Iterable[tuple[dict, int]],
+    progress: Optional[ImportProgressCallback] = None,
+    dry_run: bool = False,
+    diff_path: Optional[str] = None,
+) -> dict:
     """
-    Синхронно виконує "розумний" імпорт товарів з DataFrame у базу даних.
+    Спільна частина імпорту: пакети вже нормалізованих рядків (rows, rows_read)
+    COPY-ться у staging у порядку надходження, далі злиття в одній транзакції
+    (або тіньовим режимом — див. _sync_import_shadow).
+    progress викликається після кожного пакета ("parsing"), перед злиттям
+    ("merging") і востаннє перед комітом ("committing" — далі не скасовується).
+    dry_run=True лише порівнює staging з каталогом (і пише CSV змін у
+    diff_path) — транзакція відкочується, products не змінюється.
+    """
+    report = progress or (lambda stage, rows: None)
+    if not dry_run and IMPORT_WRITE_MODE == "shadow":
+        return _sync_import_shadow(parsed, report)
+
+    with sync_session() as session:
+        if not dry_run:
+            acquire_import_lock(session, for_transaction=True)
+        create_staging(session)
+        seq = 0
+        rows_read = 0
+        for rows, read in parsed:
+            seq = copy_rows(session, rows, seq)
+            rows_read += read
+            report("parsing", rows_read)
+        report("merging", rows_read)
+
+        if dry_run:
+            diff = diff_staged_products(session, diff_path)
+            session.rollback()
+            return {**diff, 'dry_run': True}
+
+        stats = merge_staged_products(session)
+        # Скидаємо резерви лише там, де вони є — без перезапису всієї таблиці
+        session.execute(update(Product).where(Product.відкладено != 0).values(відкладено=0))
+        # Остання точка скасування; стадія committing більше не скасовується
+        report("committing", rows_read)
+        session.commit()
+
+        return _import_result(session, stats)
+
+
+@contextmanager
+def _pinned_sync_session():
+    """Сесія на власному з'єднанні: тимчасові таблиці й advisory-блокування переживають коміти."""
+    with sync_engine.connect() as connection, sync_session(bind=connection) as session:
+        yield session
+
+
+def _sync_import_shadow(parsed: Iterable[tuple[dict, int]], report: ImportProgressCallback) -> dict:
+    """
+    Тіньовий режим: кожен пакет COPY-ться у staging окремою транзакцією,
+    тіньова таблиця змін будується без блокувань products, і лише її
+    застосування разом зі скиданням резервів — коротка фінальна транзакція.
+    Пошук, фільтри й SELECT ... FOR UPDATE при збереженні списків чекають
+    щонайбільше на неї, а не на весь імпорт.
+    """
+    with _pinned_sync_session() as session:
+        acquire_import_lock(session)
+        try:
+            create_staging(session, keep_on_commit=True)
+            session.commit()
+            seq = 0
+            rows_read = 0
+            for rows, read in parsed:
+                seq = copy_rows(session, rows, seq)
+                session.commit()
+                rows_read += read
+                report("parsing", rows_read)
+            report("merging", rows_read)
+
+            build_shadow(session)
+            session.commit()
+            report("merging", rows_read)
+
+            stats = apply_shadow(session)
+            session.execute(update(Product).where(Product.відкладено != 0).values(відкладено=0))
+            # Остання точка скасування; стадія committing більше не скасовується
+            report("committing", rows_read)
+            session.commit()
+
+            return _import_result(session, stats)
+        finally:
+            session.rollback()
+            try:
+                drop_import_tables(session)
+                session.commit()
+            finally:
+                release_import_lock(session)
+
+
+def _import_result(session, stats: dict) -> dict:
+    total_in_db = session.execute(
+        select(func.count(Product.id)).where(Product.активний == True)
+    ).scalar_one()
+    return {
+        'added': stats['added'], 'updated': stats['updated'], 'unchanged': stats['unchanged'],
+        'deactivated': stats['deactivated'], 'reactivated': stats['reactivated'],
+        'total_in_db': total_in_db, 'total_in_file': stats['total_in_file'],
+        'department_stats': stats['department_stats']
+    }
+
+
+def _sync_smart_import(dataframe: pd.DataFrame, dry_run: bool = False, diff_path: Optional[str] = None) -> dict:
+    """
+    Синхронно виконує "розумний" імпорт товарів з DataFrame у базу даних
+    (або лише рахує зміни — dry_run, див. _sync_import_batches).
     """
     try:
         mapping = SmartColumnMapper.map_columns(dataframe)
+        if not _has_import_columns(mapping):
+            logger.error("Не вистачає колонок для імпорту. Mapping: %s", mapping)
+            return {}
+        return _sync_import_batches([dataframe], mapping, dry_run=dry_run, diff_path=diff_path)
+
+    except Exception as e:
+        logger.error("Помилка під час синхронного імпорту: %s", e, exc_info=True)
+        return {}
 
-        has_qty_or_sum = "quantity" in mapping or "stock_sum" in mapping
-        has_identity = "article" in mapping or "name" in mapping
 
-        if not has_qty_or_sum or not has_identity:
+def _sync_smart_import_file(
+    file_path: str,
+    progress: Optional[ImportProgressCallback] = None,
+    dry_run: bool = False,
+    diff_path: Optional[str] = None,
+) -> dict:
+    """
+    Імпорт безпосередньо з Excel-файлу: рядки читаються потоково пакетами
+    (utils.excel_reader), мапінг колонок — лише за рядком заголовків.
+    JobCancelled з progress прокидається далі (імпорт відкочено).
+    """
+    try:
+        if progress:
+            progress("mapping", 0)
+        headers, batches = iter_excel_batches(file_path)
+        mapping = SmartColumnMapper.map_headers(headers)
+        if not _has_import_columns(mapping):
+            batches.close()
             logger.error("Не вистачає колонок для імпорту. Mapping: %s", mapping)
             return {}
+        return _sync_import_batches(batches, mapping, progress, dry_run, diff_path)
 
-        file_articles_data = {}
-
-        for index, row in dataframe.iterrows():
-            article = None
-            name = None
-
-            if "article" in mapping:
-                val = row[mapping["article"]]
-                if pd.notna(val):
-                    a, n = _extract_article_and_name(str(val))
-                    article = a
-                    if n and "name" not in mapping:
-                        name = n
-
-            if "name" in mapping:
-                val = row[mapping["name"]]
-                if pd.notna(val):
-                    if article:
-                        if not name:
-                            name = str(val)
-                    else:
-                        a, n = _extract_article_and_name(str(val))
-                        article = a
-                        name = n or str(val)
-
-            if not article:
-                continue
-
-            department = 0
-            if "department" in mapping:
-                try:
-                    dep_val = row[mapping["department"]]
-                    department = int(_normalize_value(dep_val))
-                except (ValueError, TypeError):
-                    department = 0
-
-            group = ""
-            if "group" in mapping:
-                group = str(row[mapping["group"]]).strip()
-
-            if not name:
-                name = group or f"Товар {article}"
-
-            qty = 0.0
-            price = 0.0
-            stock_sum = 0.0
-
-            if "quantity" in mapping:
-                qty = float(_normalize_value(row[mapping["quantity"]]))
-            if "stock_sum" in mapping:
-                stock_sum = float(_normalize_value(row[mapping["stock_sum"]]))
-            if "price" in mapping:
-                price = float(_normalize_value(row[mapping["price"]]))
-
-            # Евристика розрахунку відсутніх даних
-            if price == 0 and qty > 0 and stock_sum > 0:
-                price = stock_sum / qty
-            if stock_sum == 0 and price > 0 and qty > 0:
-                stock_sum = price * qty
-            if qty == 0 and stock_sum > 0 and price > 0:
-                qty = stock_sum / price
-
-            months = None
-            if "months_without_sale" in mapping:
-                months = int(_normalize_value(row[mapping["months_without_sale"]]))
-
-            file_articles_data[article] = {
-                "назва": name.strip(),
-                "відділ": department,
-                "група": group,
-                "кількість": str(qty) if qty % 1 != 0 else str(int(qty)),
-                "місяці_без_руху": months,
-                "сума_залишку": stock_sum,
-                "ціна": price,
-                "активний": True
-            }
-
-        # --- Upsert / Soft Delete ---
-        file_articles = set(file_articles_data.keys())
-        updated_count, added_count, deactivated_count, reactivated_count = 0, 0, 0, 0
-        department_stats = {}
-
-        with sync_session() as session:
-            existing_products = {p.артикул: p for p in session.execute(select(Product)).scalars()}
-            db_articles = set(existing_products.keys())
-
-            articles_to_add = file_articles - db_articles
-            articles_to_update = db_articles.intersection(file_articles)
-            articles_to_deactivate = db_articles - file_articles
-
-            # 1. Деактивація (Soft Delete)
-            if articles_to_deactivate:
-                stmt = update(Product).where(
-                    Product.артикул.in_(articles_to_deactivate),
-                    Product.активний == True
-                ).values(активний=False)
-                result = session.execute(stmt)
-                deactivated_count = result.rowcount
-
-            # 2. Оновлення існуючих
-            if articles_to_update:
-                products_to_update_mappings = []
-                for article in articles_to_update:
-                    product_db = existing_products[article]
-                    new_data = file_articles_data[article]
-
-                    if not product_db.активний:
-                        reactivated_count += 1
-
-                    if new_data["ціна"] == 0.0 and product_db.ціна and product_db.ціна > 0.0:
-                        new_data["ціна"] = product_db.ціна
-                        try:
-                            qty_float = float(new_data["кількість"])
-                            new_data["сума_залишку"] = qty_float * new_data["ціна"]
-                        except (ValueError, TypeError) as e:
-                            logger.warning("Не вдалося перерахувати суму залишку для '%s': %s", article, e)
-
-                    if new_data["місяці_без_руху"] is None:
-                        new_data["місяці_без_руху"] = product_db.місяці_без_руху or 0
-
-                    update_entry = {"id": product_db.id, "артикул": article, **new_data}
-                    products_to_update_mappings.append(update_entry)
-
-                if products_to_update_mappings:
-                    session.bulk_update_mappings(Product, products_to_update_mappings)
-                    updated_count = len(products_to_update_mappings)
-
-            # 3. Додавання нових
-            if articles_to_add:
-                products_to_add_objects = []
-                for article in articles_to_add:
-                    data = file_articles_data[article]
-                    if data["місяці_без_руху"] is None:
-                        data["місяці_без_руху"] = 0
-                    products_to_add_objects.append(Product(артикул=article, **data))
-
-                if products_to_add_objects:
-                    session.bulk_save_objects(products_to_add_objects)
-                    added_count = len(products_to_add_objects)
-
-            session.execute(update(Product).values(відкладено=0))
-            session.commit()
+    except (JobCancelled, ImportInProgressError):
+        raise
+    except Exception as e:
+        logger.error("Помилка під час синхронного імпорту: %s", e, exc_info=True)
+        return {}
 
-            total_in_db = session.execute(
-                select(func.count(Product.id)).where(Product.активний == True)
-            ).scalar_one()
 
-            for data in file_articles_data.values():
-                dep = data["відділ"]
-                department_stats[dep] = department_stats.get(dep, 0) + 1
+def _parse_sheet_rows(path: str, sheet: int, mapping: dict[str, str]) -> tuple[dict, int]:
+    """
+    Воркер пулу процесів: читає й нормалізує один аркуш цілком.
+    Повертає (нормалізовані рядки, прочитано рядків). БД не торкається —
+    мапінг обчислює батьківський процес.
+    """
+    _, batches = iter_excel_batches(path, sheet=sheet)
+    rows: dict = {}
+    rows_read = 0
+    for frame in batches:
+        rows.update(_parse_import_rows(frame, mapping))
+        rows_read += len(frame)
+    return rows, rows_read
+
+
+def _sync_smart_import_sheets(
+    sheets: list[dict],
+    progress: Optional[ImportProgressCallback] = None,
+    dry_run: bool = False,
+    diff_path: Optional[str] = None,
+) -> dict:
+    """
+    Імпорт кількох аркушів (книга з аркушем на відділ або ZIP книг):
+    аркуші розбираються паралельно в пулі процесів, результати COPY-ться
+    у staging у порядку аркушів, злиття — одна транзакція на все.
+    У результаті та прогресі — sheets: рядки/товари/статус по аркушах;
+    аркуші без потрібних колонок пропускаються (status="skipped").
+    """
+    def report(stage: str, rows: int) -> None:
+        if progress:
+            progress(stage, rows, sheets=breakdown)
+
+    breakdown = []
+    usable = []
+    for sheet in sheets:
+        headers = read_excel_headers(sheet["path"], sheet=sheet["sheet"])
+        mapping = SmartColumnMapper.map_headers(headers) if headers else {}
+        entry = {"sheet": sheet["label"], "rows": 0, "products": 0, "status": "pending"}
+        if _has_import_columns(mapping):
+            usable.append((sheet, mapping, entry))
+        else:
+            entry["status"] = "skipped"
+            logger.warning("Аркуш '%s' пропущено: не вистачає колонок. Mapping: %s", sheet["label"], mapping)
+        breakdown.append(entry)
+    report("mapping", 0)
+    if not usable:
+        return {}
 
-            return {
-                'added': added_count, 'updated': updated_count,
-                'deactivated': deactivated_count, 'reactivated': reactivated_count,
-                'total_in_db': total_in_db, 'total_in_file': len(file_articles),
-                'department_stats': department_stats
-            }
+    # spawn: дочірні процеси не успадковують з'єднання з БД і потоки батька
+    workers = max(1, min(len(usable), IMPORT_WORKERS))
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        # Не більше workers аркушів у роботі чи в черзі на COPY: наступний
+        # аркуш подається, лише коли попередній забрано, тож у пам'яті
+        # одночасно — до workers нормалізованих аркушів, а не вся книга.
+        pending = iter(usable)
+        futures = deque()
+
+        def submit_next() -> None:
+            item = next(pending, None)
+            if item is not None:
+                sheet, mapping, entry = item
+                futures.append((entry, pool.submit(_parse_sheet_rows, sheet["path"], sheet["sheet"], mapping)))
+
+        for _ in range(workers):
+            submit_next()
+
+        def parsed():
+            while futures:
+                entry, future = futures.popleft()
+                rows, rows_read = future.result()
+                submit_next()
+                entry.update(rows=rows_read, products=len(rows), status="done")
+                yield rows, rows_read
+
+        result = _sync_import_parsed(parsed(), report, dry_run, diff_path)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return {**result, 'sheets': breakdown}
+
+
+def _sync_smart_import_sources(
+    paths: list[str],
+    progress: Optional[ImportProgressCallback] = None,
+    dry_run: bool = False,
+    diff_path: Optional[str] = None,
+) -> dict:
+    """
+    Імпорт з однієї чи кількох книг (див. utils.import_sources). Один аркуш
+    іде потоковим шляхом _sync_smart_import_file, кілька — пулом процесів.
+    """
+    try:
+        sheets = list_import_sheets(paths)
+        if len(sheets) == 1:
+            return _sync_smart_import_file(sheets[0]["path"], progress, dry_run, diff_path)
+        return _sync_smart_import_sheets(sheets, progress, dry_run, diff_path)
 
+    except (JobCancelled, ImportInProgressError):
+        raise
     except Exception as e:
         logger.error("Помилка під час синхронного імпорту: %s", e, exc_info=True)
         return {}
 
 
-async def orm_smart_import(dataframe: pd.DataFrame) -> dict:
+async def orm_smart_import(dataframe: pd.DataFrame, dry_run: bool = False, diff_path: Optional[str] = None) -> dict:
     loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(None, _sync_smart_import, dataframe)
+    return await loop.run_in_executor(None, _sync_smart_import, dataframe, dry_run, diff_path)
 
 
-def _sync_subtract_collected_from_stock(dataframe: pd.DataFrame) -> dict:
-    processed_count, not_found_count, error_count = 0, 0, 0
-    mapping = SmartColumnMapper.map_columns(dataframe)
+async def orm_smart_import_file(
+    file_path: str,
+    progress: Optional[ImportProgressCallback] = None,
+    dry_run: bool = False,
+    diff_path: Optional[str] = None,
+) -> dict:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, _sync_smart_import_file, file_path, progress, dry_run, diff_path)
+
 
+async def orm_smart_import_sources(
+    paths: list[str],
+    progress: Optional[ImportProgressCallback] = None,
+    dry_run: bool = False,
+    diff_path: Optional[str] = None,
+) -> dict:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, _sync_smart_import_sources, paths, progress, dry_run, diff_path)
+
+
+def _sync_subtract_collected_from_stock(frames: Iterable[pd.DataFrame]) -> dict:
+    """
+    Віднімає зібране від залишків. frames — DataFrame або пакети з однаковими
+    колонками: мапінг визначається один раз за першим пакетом, усі пакети
+    застосовуються в одній транзакції (виняток із генератора пакетів — відкат).
+    """
+    processed_count, not_found_count, error_count = 0, 0, 0
+    changed_ids = []
+    if isinstance(frames, pd.DataFrame):
+        frames = [frames]
+    frames = iter(frames)
+    first = next(frames, None)
+    if first is None:
+        return {'processed': 0, 'not_found': 0, 'errors': 0, 'product_ids': []}
+
+    mapping = SmartColumnMapper.map_columns(first)
     col_article = mapping.get("article") or mapping.get("name")
     col_qty = mapping.get("quantity")
 
     if not col_article or not col_qty:
+        if hasattr(frames, "close"):
+            frames.close()
         logger.error("Віднімання: не знайдено колонки артикулу/назви або кількості.")
-        return {'processed': 0, 'not_found': 0, 'errors': 0, 'msg': 'Колонки не знайдено'}
+        return {'processed': 0, 'not_found': 0, 'errors': 0, 'product_ids': [], 'msg': 'Колонки не знайдено'}
 
     with sync_session() as session:
-        for _, row in dataframe.iterrows():
-            val = row[col_article]
-            article_cand, _ = _extract_article_and_name(val)
-            article = article_cand if article_cand else str(val).strip()
+        for dataframe in itertools.chain([first], frames):
+            for val, qty in zip(dataframe[col_article], dataframe[col_qty]):
+                article_cand, _ = _extract_article_and_name(val)
+                article = article_cand if article_cand else str(val).strip()
 
-            if not article:
-                continue
+                if not article:
+                    continue
 
-            product = session.execute(
-                select(Product).where(Product.артикул == article, Product.активний == True)
-            ).scalar_one_or_none()
+                product = session.execute(
+                    select(Product).where(Product.артикул == article, Product.активний == True)
+                ).scalar_one_or_none()
 
-            if not product:
-                not_found_count += 1
-                continue
+                if not product:
+                    not_found_count += 1
+                    continue
 
-            try:
-                current_stock = float(str(product.кількість).replace(',', '.'))
-                quantity_to_subtract = float(_normalize_value(row[col_qty]))
-                new_stock = current_stock - quantity_to_subtract
-                price = product.ціна or 0.0
-                new_stock_sum = new_stock * price
-
-                session.execute(
-                    update(Product)
-                    .where(Product.id == product.id)
-                    .values(кількість=str(new_stock), сума_залишку=new_stock_sum)
-                )
-                processed_count += 1
-            except (ValueError, TypeError) as e:
-                error_count += 1
-                logger.error("Помилка конвертації числа для артикула %s: %s", article, e)
-                continue
+                try:
+                    current_stock = float(str(product.кількість).replace(',', '.'))
+                    quantity_to_subtract = float(_normalize_value(qty))
+                    new_stock = current_stock - quantity_to_subtract
+                    price = product.ціна or 0.0
+                    new_stock_sum = new_stock * price
+
+                    session.execute(
+                        update(Product)
+                        .where(Product.id == product.id)
+                        # content_hash=None: наступний імпорт перезапише рядок, навіть якщо файл не змінився
+                        .values(кількість=str(new_stock), сума_залишку=new_stock_sum, content_hash=None)
+                    )
+                    processed_count += 1
+                    changed_ids.append(product.id)
+                except (ValueError, TypeError) as e:
+                    error_count += 1
+                    logger.error("Помилка конвертації числа для артикула %s: %s", article, e)
+                    continue
         session.commit()
-    return {'processed': processed_count, 'not_found': not_found_count, 'errors': error_count}
+    return {'processed': processed_count, 'not_found': not_found_count, 'errors': error_count,
+            'product_ids': changed_ids}
 
 
-async def orm_subtract_collected(dataframe: pd.DataFrame) -> dict:
+async def orm_subtract_collected(frames: Iterable[pd.DataFrame]) -> dict:
     loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(None, _sync_subtract_collected_from_stock, dataframe)
+    return await loop.run_in_executor(None, _sync_subtract_collected_from_stock, frames)
 
 
 # --- Функції пошуку та отримання товарів ---
@@ -421,6 +787,26 @@ async def orm_get_product_by_id(session, product_id: int, for_update: bool = Fal
     return result.scalar_one_or_none()
 
 
+async def orm_lock_products_for_update(session, product_ids) -> dict[int, Product]:
+    """
+    Блокує набір товарів одним запитом SELECT ... WHERE id IN (...) ORDER BY id FOR UPDATE.
+    Фіксований порядок блокування (за id) виключає взаємні блокування між
+    паралельними збереженнями. Повертає {product_id: Product} з актуальними значеннями.
+    """
+    ids = sorted(set(product_ids))
+    if not ids:
+        return {}
+    query = (
+        select(Product)
+        .where(Product.id.in_(ids))
+        .order_by(Product.id)
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    )
+    result = await session.execute(query)
+    return {product.id: product for product in result.scalars()}
+
+
 def orm_get_all_products_sync() -> list[Product]:
     with sync_session() as session:
         query = select(Product).where(Product.активний == True).order_by(Product.відділ, Product.назва)
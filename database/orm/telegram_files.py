@@ -0,0 +1,34 @@
+# epicservice/database/orm/telegram_files.py
+
+import logging
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+
+from database.engine import async_session
+from database.models import TelegramFileCache
+
+logger = logging.getLogger(__name__)
+
+
+async def orm_get_telegram_file_id(cache_key: str) -> str | None:
+    async with async_session() as session:
+        result = await session.execute(
+            select(TelegramFileCache.file_id).where(TelegramFileCache.cache_key == cache_key)
+        )
+        return result.scalar_one_or_none()
+
+
+async def orm_save_telegram_file_id(cache_key: str, file_id: str) -> None:
+    """Запам'ятовує file_id для ключа (перезаписує попередній)."""
+    stmt = insert(TelegramFileCache).values(cache_key=cache_key, file_id=file_id)
+    stmt = stmt.on_conflict_do_update(index_elements=["cache_key"], set_={"file_id": file_id})
+    async with async_session() as session:
+        await session.execute(stmt)
+        await session.commit()
+
+
+async def orm_delete_telegram_file_id(cache_key: str) -> None:
+    async with async_session() as session:
+        await session.execute(delete(TelegramFileCache).where(TelegramFileCache.cache_key == cache_key))
+        await session.commit()
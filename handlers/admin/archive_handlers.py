@@ -1,18 +1,23 @@
 # epicservice/handlers/admin/archive_handlers.py
 
+import asyncio
 import logging
 import os
-import zipfile
 from collections import defaultdict
 from datetime import datetime
+from typing import List, Optional
 
 from aiogram import Bot, F, Router
 from aiogram.fsm.context import FSMContext
-from aiogram.types import CallbackQuery, FSInputFile, InlineKeyboardButton, InlineKeyboardMarkup
+from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
 
 from config import ADMIN_IDS, ARCHIVES_PATH
+from database.orm import orm_get_archive_file, orm_get_user_archive_files
 from lexicon.lexicon import LEXICON
-from utils.archive_manager import ACTIVE_DIR, get_all_archives, get_user_archives
+from utils.archive_manager import get_all_archives, get_user_archives
+from utils.list_processor import materialize_archive, materialize_archive_sync
+from utils.telegram_files import manifest_key, send_cached_document
+from utils.zip_stream import iter_zip
 
 logger = logging.getLogger(__name__)
 
@@ -30,7 +35,7 @@ async def show_users_archives_list(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
     try:
         logger.info("Адмін запитує список усіх архівів")
-        all_files = get_all_archives()
+        all_files = await get_all_archives()
 
         if not all_files:
             await callback.answer(LEXICON.NO_USERS_WITH_ARCHIVES, show_alert=True)
@@ -73,7 +78,7 @@ async def view_user_archive(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
     try:
         user_id = int(callback.data.split(":")[-1])
-        files = get_user_archives(user_id)
+        files = await get_user_archives(user_id)
 
         if not files:
             await callback.answer(LEXICON.USER_HAS_NO_ARCHIVES, show_alert=True)
@@ -116,62 +121,88 @@ async def view_user_archive(callback: CallbackQuery, state: FSMContext):
 async def admin_send_file(callback: CallbackQuery, bot: Bot):
     """
     Адмін отримує окремий файл користувача.
+    Повторні запити того самого файлу відправляються за file_id без завантаження.
     """
     filename = callback.data.split("admin:send:", 1)[1]
-    file_path = os.path.join(ACTIVE_DIR, filename)
     await callback.answer()
 
-    if not os.path.exists(file_path):
+    archive = await orm_get_archive_file(filename)
+    if archive is None or archive.is_trashed:
         await callback.answer("❌ Файл не знайдено", show_alert=True)
         return
 
     try:
-        await bot.send_document(
+        sent = await send_cached_document(
+            bot,
             chat_id=callback.message.chat.id,
-            document=FSInputFile(file_path),
-            caption=f"📄 {filename}"
+            cache_key=manifest_key("archive", [archive]),
+            build=lambda: materialize_archive(filename),
+            caption=f"📄 {filename}",
         )
+        if not sent:
+            await callback.answer("❌ Файл не знайдено", show_alert=True)
     except Exception as e:
         logger.error(f"Помилка відправки файлу адміну {filename}: {e}", exc_info=True)
         await callback.answer(LEXICON.UNEXPECTED_ERROR, show_alert=True)
 
 
+def _build_user_zip(user_id: int, filenames: List[str]) -> Optional[str]:
+    """
+    Пише ZIP з файлів користувача на диск (виконується в пулі потоків).
+    Повертає шлях до тимчасового ZIP або None, якщо жодного файлу немає.
+    """
+    entries = []
+    for filename in filenames:
+        path = materialize_archive_sync(filename)
+        if path:
+            entries.append((path, filename))
+    if not entries:
+        return None
+    zip_path = os.path.join(ARCHIVES_PATH, f"user_{user_id}_{datetime.now().strftime('%d-%m-%Y_%H-%M-%S')}.zip")
+    with open(zip_path, "wb") as f:
+        for chunk in iter_zip(entries):
+            f.write(chunk)
+    return zip_path
+
+
 @router.callback_query(F.data.startswith("download_zip:"))
 async def download_zip_handler(callback: CallbackQuery, state: FSMContext, bot: Bot):
     """
     Пакує всі файли користувача в ZIP і відправляє адміну.
+    ZIP збирається лише коли набір файлів змінився — інакше повторно
+    відправляється вже завантажений у Telegram архів за file_id.
     """
     zip_path = None
     await callback.answer()
     try:
         user_id = int(callback.data.split(":")[-1])
-        files = get_user_archives(user_id)
+        archives = await orm_get_user_archive_files(user_id)
 
-        if not files:
+        if not archives:
             await callback.answer("❌ Файлів немає", show_alert=True)
             return
 
         await callback.message.edit_text(
-            f"⌛️ Пакую {len(files)} файлів для user {user_id}...",
+            f"⌛️ Пакую {len(archives)} файлів для user {user_id}...",
             reply_markup=None
         )
 
-        # Створюємо ZIP
-        zip_filename = f"user_{user_id}_{datetime.now().strftime('%d-%m-%Y_%H-%M')}.zip"
-        zip_path = os.path.join(ARCHIVES_PATH, zip_filename)
-
-        with zipfile.ZipFile(zip_path, 'w') as zipf:
-            for filename, _ in files:
-                fp = os.path.join(ACTIVE_DIR, filename)
-                if os.path.exists(fp):
-                    zipf.write(fp, filename)
+        async def build() -> Optional[str]:
+            nonlocal zip_path
+            zip_path = await asyncio.to_thread(_build_user_zip, user_id, [a.filename for a in archives])
+            return zip_path
 
-        await bot.send_document(
+        sent = await send_cached_document(
+            bot,
             chat_id=callback.message.chat.id,
-            document=FSInputFile(zip_path),
-            caption=f"📦 Архів user {user_id} ({len(files)} файлів)"
+            cache_key=manifest_key(f"zip:{user_id}", archives),
+            build=build,
+            caption=f"📦 Архів user {user_id} ({len(archives)} файлів)",
         )
-        
+        if not sent:
+            await callback.message.answer("❌ Файли не знайдено на диску.")
+            return
+
         # Просто повідомляємо про успіх - БЕЗ КНОПОК
         await callback.message.answer("✅ Архів успішно надіслано.")
 
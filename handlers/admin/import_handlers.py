@@ -3,25 +3,27 @@
 import asyncio
 import logging
 import os
+import shutil
 import tempfile
 from typing import List
 
-import pandas as pd
 from aiogram import Bot, F, Router
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import (CallbackQuery, InlineKeyboardButton,
                            InlineKeyboardMarkup, Message, WebAppInfo)
-from sqlalchemy.exc import SQLAlchemyError
 
 from config import ADMIN_IDS, WEBAPP_URL
 from database.orm import (orm_get_all_products_sync, orm_get_all_users_sync,
-                          orm_get_users_with_active_lists, orm_smart_import)
+                          orm_get_users_with_active_lists)
 from database.orm.products import SmartColumnMapper
 from handlers.admin.lock_common import handle_lock_notify_common, handle_lock_force_save_common
-from keyboards.inline import get_admin_lock_kb, get_notify_confirmation_kb
+from keyboards.inline import get_admin_lock_kb, get_import_cancel_kb, get_notify_confirmation_kb
 from lexicon.lexicon import LEXICON
 from utils.force_save_helper import force_save_user_list
+from utils.import_jobs import CANCELLABLE_STAGES, IMPORT_JOB_KIND, STAGE_MAPPING, run_import_job
+from utils.import_sources import UPLOAD_EXTENSIONS, ImportSourceError, prepare_import_files, read_import_headers
+from utils.jobs import ACTIVE_STATUSES, JobCancelled, create_job, get_job, request_cancel, run_job
 
 logger = logging.getLogger(__name__)
 
@@ -33,12 +35,13 @@ router.callback_query.filter(F.from_user.id.in_(ADMIN_IDS))
 class AdminImportStates(StatesGroup):
     waiting_for_import_file = State()
     lock_confirmation = State()
+    import_in_progress = State()
     notify_confirmation = State()
 
 
-def _validate_excel_columns(df: pd.DataFrame) -> tuple[bool, str]:
+def _validate_excel_columns(headers: List) -> tuple[bool, str]:
     """Використовує SmartColumnMapper для перевірки наявності необхідних колонок."""
-    mapping = SmartColumnMapper.map_columns(df)
+    mapping = SmartColumnMapper.map_headers(headers)
     has_identity = "article" in mapping or "name" in mapping
     has_quantity = "quantity" in mapping or "stock_sum" in mapping
     if not has_identity:
@@ -48,6 +51,26 @@ def _validate_excel_columns(df: pd.DataFrame) -> tuple[bool, str]:
     return True, ""
 
 
+def _validate_import_sheets(header_rows: List[List]) -> tuple[bool, str]:
+    """Імпорт можливий, якщо хоча б один аркуш має потрібні колонки."""
+    error_msg = "Файл не містить аркушів з даними."
+    for headers in header_rows:
+        is_valid, error_msg = _validate_excel_columns(headers)
+        if is_valid:
+            return True, ""
+    return False, error_msg
+
+
+def _format_sheet_lines(sheets: List[dict]) -> List[str]:
+    return [
+        LEXICON.IMPORT_SHEET_LINE.format(
+            status=LEXICON.IMPORT_SHEET_STATUSES.get(entry["status"], entry["status"]),
+            sheet=entry["sheet"], rows=entry["rows"],
+        )
+        for entry in sheets
+    ]
+
+
 def _format_admin_report(result: dict) -> str:
     if not result:
         return "❌ Помилка імпорту. Перевірте формат файлу."
@@ -55,6 +78,7 @@ def _format_admin_report(result: dict) -> str:
         LEXICON.IMPORT_REPORT_TITLE,
         LEXICON.IMPORT_REPORT_ADDED.format(added=result.get('added', 0)),
         LEXICON.IMPORT_REPORT_UPDATED.format(updated=result.get('updated', 0)),
+        LEXICON.IMPORT_REPORT_UNCHANGED.format(unchanged=result.get('unchanged', 0)),
         LEXICON.IMPORT_REPORT_DEACTIVATED.format(deactivated=result.get('deactivated', 0)),
         LEXICON.IMPORT_REPORT_REACTIVATED.format(reactivated=result.get('reactivated', 0)),
         LEXICON.IMPORT_REPORT_TOTAL.format(total=result.get('total_in_db', 0)),
@@ -64,6 +88,9 @@ def _format_admin_report(result: dict) -> str:
         report_lines.append("\n📁 *По відділах:*")
         for dep, count in sorted(dep_stats.items()):
             report_lines.append(f"  • Відділ {dep}: {count} шт.")
+    if sheets := result.get('sheets'):
+        report_lines.append(LEXICON.IMPORT_REPORT_SHEETS_TITLE)
+        report_lines.extend(_format_sheet_lines(sheets))
     return "\n".join(report_lines)
 
 
@@ -184,9 +211,23 @@ async def handle_lock_force_save(callback: CallbackQuery, state: FSMContext, bot
         await callback.answer(LEXICON.UNEXPECTED_ERROR, show_alert=True)
 
 
+def _format_import_progress(job: dict) -> str:
+    total = job.get("total_rows")
+    eta = job.get("eta_seconds")
+    text = LEXICON.IMPORT_PROGRESS.format(
+        stage=LEXICON.IMPORT_STAGES.get(job.get("stage"), job.get("stage") or ""),
+        rows=job.get("rows", 0),
+        total=LEXICON.IMPORT_PROGRESS_TOTAL.format(total=total) if total else "",
+        eta=LEXICON.IMPORT_PROGRESS_ETA.format(eta=eta) if eta is not None else "",
+    )
+    if sheets := job.get("sheets"):
+        text += "\n\n" + "\n".join(_format_sheet_lines(sheets))
+    return text
+
+
 @router.message(AdminImportStates.waiting_for_import_file, F.document)
 async def process_import_file(message: Message, state: FSMContext, bot: Bot):
-    if not message.document.file_name.endswith((".xlsx", ".xls")):
+    if not message.document.file_name.lower().endswith(UPLOAD_EXTENSIONS):
         await message.answer(LEXICON.IMPORT_WRONG_FORMAT)
         return
 
@@ -198,47 +239,90 @@ async def process_import_file(message: Message, state: FSMContext, bot: Bot):
 
     await message.answer(LEXICON.IMPORT_PROCESSING)
 
-    # Використовуємо tempfile для надійного іменування тимчасових файлів
-    tmp_fd, temp_file_path = tempfile.mkstemp(suffix=".xlsx", prefix=f"import_{message.from_user.id}_")
-    os.close(tmp_fd)
+    # Власна тимчасова тека: у ній і завантаження, і книги, розпаковані з ZIP
+    workdir = tempfile.mkdtemp(prefix=f"import_{message.from_user.id}_")
+    upload_path = os.path.join(workdir, "upload" + os.path.splitext(message.document.file_name)[1].lower())
+    job_started = False
 
     try:
-        await bot.download(message.document, destination=temp_file_path)
-        df = await asyncio.to_thread(pd.read_excel, temp_file_path)
+        await bot.download(message.document, destination=upload_path)
+        paths = await asyncio.to_thread(prepare_import_files, upload_path, workdir)
+        header_rows = await asyncio.to_thread(read_import_headers, paths)
 
-        is_valid, missing_cols = _validate_excel_columns(df)
+        is_valid, missing_cols = await asyncio.to_thread(_validate_import_sheets, header_rows)
         if not is_valid:
             await message.answer(LEXICON.IMPORT_INVALID_COLUMNS.format(columns=missing_cols))
             return
 
-        await message.answer(LEXICON.IMPORT_STARTING)
-        result = await orm_smart_import(df)
-        if not result:
-            await message.answer(LEXICON.IMPORT_SYNC_ERROR.format(error="не вдалося розпізнати дані."))
-            return
+        # Імпорт — фонова задача utils.jobs (та сама, що й у Mini App):
+        # хендлер не блокується, прогрес оновлюється в одному повідомленні
+        job = await create_job(IMPORT_JOB_KIND, message.from_user.id, stage=STAGE_MAPPING, rows=0)
+        status_message = await message.answer(
+            LEXICON.IMPORT_STARTING, reply_markup=get_import_cancel_kb(job["id"])
+        )
+
+        async def show_progress(job_state: dict) -> None:
+            await status_message.edit_text(
+                _format_import_progress(job_state),
+                reply_markup=get_import_cancel_kb(job["id"]) if job_state.get("stage") in CANCELLABLE_STAGES else None,
+            )
 
-        admin_report = _format_admin_report(result)
-        await message.answer(admin_report)
+        async def work() -> dict:
+            try:
+                result = await run_import_job(job["id"], paths, on_update=show_progress)
+            except JobCancelled:
+                await state.clear()
+                await status_message.edit_text(LEXICON.IMPORT_CANCELLED)
+                raise
+            except Exception as e:
+                logger.critical("Помилка фонового імпорту: %s", e, exc_info=True)
+                await state.clear()
+                await message.answer(LEXICON.IMPORT_SYNC_ERROR.format(error=str(e)))
+                raise
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
 
-        await state.update_data(import_result=result)
-        sent_message = await message.answer(
-            LEXICON.IMPORT_ASK_FOR_NOTIFICATION,
-            reply_markup=get_notify_confirmation_kb()
-        )
-        await state.set_state(AdminImportStates.notify_confirmation)
-        await state.update_data(main_message_id=sent_message.message_id)
+            try:
+                await status_message.delete()
+            except Exception:
+                pass
+            await message.answer(_format_admin_report(result))
+
+            await state.update_data(import_result=result)
+            sent_message = await message.answer(
+                LEXICON.IMPORT_ASK_FOR_NOTIFICATION,
+                reply_markup=get_notify_confirmation_kb()
+            )
+            await state.set_state(AdminImportStates.notify_confirmation)
+            await state.update_data(main_message_id=sent_message.message_id)
+            return {"result": result}
+
+        await state.set_state(AdminImportStates.import_in_progress)
+        run_job(job, work)
+        job_started = True
 
-    except SQLAlchemyError as e:
-        logger.critical("Помилка БД під час імпорту: %s", e, exc_info=True)
-        await message.answer(LEXICON.IMPORT_SYNC_ERROR.format(error=str(e)))
+    except ImportSourceError as e:
+        await message.answer(f"❌ {e}")
         await state.clear()
     except Exception as e:
         logger.error("Критична помилка при обробці файлу імпорту: %s", e, exc_info=True)
         await message.answer(LEXICON.IMPORT_CRITICAL_READ_ERROR.format(error=str(e)))
         await state.clear()
     finally:
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
+        # Після запуску задачі теку видаляє вона сама
+        if not job_started:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+@router.callback_query(F.data.startswith("import_cancel:"))
+async def cancel_import_handler(callback: CallbackQuery):
+    job_id = callback.data.split(":", 1)[1]
+    job = await get_job(job_id)
+    if not job or job["status"] not in ACTIVE_STATUSES or job.get("stage") not in CANCELLABLE_STAGES:
+        await callback.answer(LEXICON.IMPORT_CANCEL_TOO_LATE, show_alert=True)
+        return
+    await request_cancel(job_id)
+    await callback.answer(LEXICON.IMPORT_CANCELLING)
 
 
 @router.callback_query(AdminImportStates.notify_confirmation, F.data == "notify_confirm:yes")
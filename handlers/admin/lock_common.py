@@ -4,17 +4,21 @@
 Використовується в import_handlers.py та report_handlers.py для уникнення дублювання.
 """
 import logging
+import time
 
 from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
-from aiogram.fsm.storage.base import StorageKey
 from aiogram.types import CallbackQuery
 
 from lexicon.lexicon import LEXICON
-from utils.force_save_helper import force_save_user_list
+from utils.force_save_helper import force_save_all
 
 logger = logging.getLogger(__name__)
 
+# Мінімальний інтервал між редагуваннями повідомлення з прогресом (ліміти Telegram)
+PROGRESS_EDIT_INTERVAL = 1.0
+
 
 async def handle_lock_notify_common(callback: CallbackQuery, state: FSMContext, bot: Bot) -> None:
     """
@@ -35,15 +39,26 @@ async def handle_lock_force_save_common(callback: CallbackQuery, state: FSMConte
     Примусово зберігає списки всіх заблокованих користувачів.
     Повертає список bool-результатів для кожного користувача.
     Спільна реалізація для import та report handlers.
+
+    Збереження виконуються паралельно (force_save_all), а прогрес
+    показується в повідомленні адміністратора.
     """
     await callback.message.edit_text("Почав примусове збереження списків...")
     data = await state.get_data()
     user_ids = data.get('locked_user_ids', [])
 
-    results = []
-    for user_id in user_ids:
-        user_state_key = StorageKey(bot_id=bot.id, chat_id=user_id, user_id=user_id)
-        user_state = FSMContext(storage=state.storage, key=user_state_key)
-        results.append(await force_save_user_list(user_id, bot, user_state))
+    last_edit = 0.0
+
+    async def report_progress(done: int, total: int) -> None:
+        nonlocal last_edit
+        now = time.monotonic()
+        if done < total and now - last_edit < PROGRESS_EDIT_INTERVAL:
+            return
+        last_edit = now
+        try:
+            await callback.message.edit_text(f"Примусове збереження списків: {done}/{total}...")
+        except TelegramBadRequest as e:
+            logger.debug("Не вдалося оновити прогрес збереження: %s", e)
 
-    return results
+    results = await force_save_all(user_ids, bot, storage=state.storage, progress=report_progress)
+    return [results[user_id] for user_id in dict.fromkeys(user_ids)]
@@ -5,7 +5,7 @@ import logging
 import os
 import tempfile
 from datetime import datetime
-from typing import Optional
+from typing import Iterator, Optional
 
 import pandas as pd
 from aiogram import Bot, F, Router
@@ -24,6 +24,8 @@ from database.orm import (orm_get_all_collected_items_sync,
 from handlers.admin.lock_common import handle_lock_notify_common, handle_lock_force_save_common
 from keyboards.inline import get_admin_lock_kb
 from lexicon.lexicon import LEXICON
+from utils.availability_events import publish_products_availability
+from utils.excel_reader import iter_excel_batches
 
 logger = logging.getLogger(__name__)
 
@@ -80,29 +82,60 @@ def _create_stock_report_sync() -> Optional[str]:
         return None
 
 
-def _parse_and_validate_subtract_file(df: pd.DataFrame) -> Optional[pd.DataFrame]:
-    try:
-        df_columns_lower = {str(c).lower() for c in df.columns}
-        if {"назва", "кількість"}.issubset(df_columns_lower):
-            df.rename(columns={col: str(col).lower() for col in df.columns}, inplace=True)
-            df_prepared = df[['назва', 'кількість']].copy()
-            df_prepared['артикул'] = df_prepared['назва'].astype(str).str.extract(r'(\d{8,})')
-            df_prepared = df_prepared.dropna(subset=['артикул'])
-            if pd.to_numeric(df_prepared['кількість'], errors='coerce').notna().all():
-                return df_prepared[['артикул', 'кількість']]
-
-        if len(df.columns) == 2:
-            header_as_data = pd.DataFrame([df.columns.values], columns=['артикул', 'кількість'])
-            df.columns = ['артикул', 'кількість']
-            df_simple = pd.concat([header_as_data, df], ignore_index=True)
-            if pd.to_numeric(df_simple['артикул'], errors='coerce').notna().all() and \
-               pd.to_numeric(df_simple['кількість'], errors='coerce').notna().all():
-                return df_simple[['артикул', 'кількість']]
-    except Exception as e:
-        logger.error("Помилка парсингу файлу для віднімання: %s", e)
+class SubtractFileError(ValueError):
+    """Файл для віднімання не відповідає жодному з підтримуваних форматів."""
+
+
+def _subtract_file_format(headers: list) -> Optional[str]:
+    """
+    Формат за рядком заголовків: "named" — колонки "Назва" і "Кількість"
+    (артикул береться з назви), "plain" — рівно дві колонки артикул/кількість
+    без заголовка (перший рядок — теж дані).
+    """
+    if {"назва", "кількість"}.issubset({str(c).lower() for c in headers}):
+        return "named"
+    if len(headers) == 2:
+        return "plain"
     return None
 
 
+def _standardize_subtract_batch(df: pd.DataFrame, file_format: str) -> pd.DataFrame:
+    """Пакет файлу → DataFrame[артикул, кількість]; невалідний пакет — SubtractFileError."""
+    if file_format == "named":
+        df = df.rename(columns={col: str(col).lower() for col in df.columns})
+        df_prepared = df[['назва', 'кількість']].copy()
+        df_prepared['артикул'] = df_prepared['назва'].astype(str).str.extract(r'(\d{8,})')
+        df_prepared = df_prepared.dropna(subset=['артикул'])
+        if not pd.to_numeric(df_prepared['кількість'], errors='coerce').notna().all():
+            raise SubtractFileError("нечислова кількість")
+        return df_prepared[['артикул', 'кількість']]
+
+    df_simple = df.set_axis(['артикул', 'кількість'], axis=1)
+    if not (pd.to_numeric(df_simple['артикул'], errors='coerce').notna().all() and
+            pd.to_numeric(df_simple['кількість'], errors='coerce').notna().all()):
+        raise SubtractFileError("нечислові артикул або кількість")
+    return df_simple
+
+
+def _iter_subtract_batches(file_path: str) -> Iterator[pd.DataFrame]:
+    """
+    Стандартизовані пакети файлу для віднімання. Заголовки читаються і
+    розпізнаються один раз; у форматі без заголовка перший рядок додається
+    до першого пакета. Пам'ять обмежена розміром пакета, а не файлу.
+    """
+    headers, batches = iter_excel_batches(file_path)
+    try:
+        file_format = _subtract_file_format(headers)
+        if file_format is None:
+            raise SubtractFileError("невідомий формат колонок")
+        if file_format == "plain":
+            yield _standardize_subtract_batch(pd.DataFrame([headers], columns=headers), file_format)
+        for df in batches:
+            yield _standardize_subtract_batch(df, file_format)
+    finally:
+        batches.close()
+
+
 async def proceed_with_stock_export(callback: CallbackQuery, bot: Bot, state: FSMContext):
     try:
         await callback.answer(LEXICON.EXPORTING_STOCK)
@@ -144,7 +177,10 @@ async def proceed_with_collected_export(callback: CallbackQuery, bot: Bot, state
         else:
             df = pd.DataFrame(collected_items)
             df.rename(
-                columns={"department": "Відділ", "group": "Група", "name": "Назва", "quantity": "Кількість"},
+                columns={
+                    "department": "Відділ", "group": "Група", "article": "Артикул",
+                    "name": "Назва", "quantity": "Кількість",
+                },
                 inplace=True
             )
             os.makedirs(ARCHIVES_PATH, exist_ok=True)
@@ -263,21 +299,20 @@ async def process_subtract_file(message: Message, state: FSMContext, bot: Bot):
 
     try:
         await bot.download(message.document, destination=temp_file_path)
-        df = await asyncio.to_thread(pd.read_excel, temp_file_path)
-
-        standardized_df = _parse_and_validate_subtract_file(df)
-        if standardized_df is None:
-            await message.answer(LEXICON.SUBTRACT_INVALID_COLUMNS)
-        else:
-            result = await orm_subtract_collected(standardized_df)
-            report_text = "\n".join([
-                LEXICON.SUBTRACT_REPORT_TITLE,
-                LEXICON.SUBTRACT_REPORT_PROCESSED.format(processed=result['processed']),
-                LEXICON.SUBTRACT_REPORT_NOT_FOUND.format(not_found=result['not_found']),
-                LEXICON.SUBTRACT_REPORT_ERROR.format(errors=result['errors']),
-            ])
-            await message.answer(report_text)
-
+        # Пакети читаються в потоці ORM; невалідний пакет відкочує всю транзакцію
+        result = await orm_subtract_collected(_iter_subtract_batches(temp_file_path))
+        await publish_products_availability(result['product_ids'])
+        report_text = "\n".join([
+            LEXICON.SUBTRACT_REPORT_TITLE,
+            LEXICON.SUBTRACT_REPORT_PROCESSED.format(processed=result['processed']),
+            LEXICON.SUBTRACT_REPORT_NOT_FOUND.format(not_found=result['not_found']),
+            LEXICON.SUBTRACT_REPORT_ERROR.format(errors=result['errors']),
+        ])
+        await message.answer(report_text)
+
+    except SubtractFileError as e:
+        logger.warning("Файл для віднімання відхилено: %s", e)
+        await message.answer(LEXICON.SUBTRACT_INVALID_COLUMNS)
     except SQLAlchemyError as e:
         logger.critical("Помилка БД під час віднімання залишків: %s", e, exc_info=True)
         await message.answer(LEXICON.IMPORT_SYNC_ERROR.format(error=str(e)))
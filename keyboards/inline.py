@@ -37,6 +37,20 @@ def get_admin_lock_kb(action: str) -> InlineKeyboardMarkup:
     )
 
 
+def get_import_cancel_kb(job_id: str) -> InlineKeyboardMarkup:
+    """
+    Кнопка скасування під повідомленням з прогресом фонового імпорту.
+    """
+    return InlineKeyboardMarkup(
+        inline_keyboard=[[
+            InlineKeyboardButton(
+                text=LEXICON.BUTTON_CANCEL_IMPORT,
+                callback_data=f"import_cancel:{job_id}"
+            )
+        ]]
+    )
+
+
 def get_notify_confirmation_kb() -> InlineKeyboardMarkup:
     """
     Клавіатура запиту розсилки користувачам.
@@ -12,15 +12,36 @@ class Lexicon:
     BUTTON_YES_NOTIFY = "✅ Так, сповістити"
     BUTTON_NO_NOTIFY = "❌ Ні, тихий режим"
     BUTTON_BACK_TO_ADMIN_PANEL = "⬅️ Назад до адмін-панелі"
+    BUTTON_CANCEL_IMPORT = "⛔ Скасувати імпорт"
 
     # --- Імпорт ---
-    IMPORT_PROMPT = "Будь ласка, надішліть мені файл Excel (`.xlsx`) з оновленими залишками.\n\nДля скасування натисніть кнопку нижче."
-    IMPORT_WRONG_FORMAT = "❌ Помилка. Будь ласка, надішліть файл у форматі `.xlsx`."
+    IMPORT_PROMPT = "Будь ласка, надішліть мені файл Excel (`.xlsx`) з оновленими залишками.\nМожна книгу з кількома аркушами або `.zip` з кількома книгами.\n\nДля скасування натисніть кнопку нижче."
+    IMPORT_WRONG_FORMAT = "❌ Помилка. Будь ласка, надішліть файл у форматі `.xlsx` або `.zip` з файлами `.xlsx`."
     IMPORT_PROCESSING = "Завантажую та перевіряю файл..."
     IMPORT_INVALID_COLUMNS = "❌ *Помилка валідації!*\nНазви колонок у файлі неправильні.\nОчікується: `в, г, н, к`.\nУ вашому файлі відсутні: `{columns}`."
     IMPORT_CRITICAL_READ_ERROR = "❌ Критична помилка при читанні файлу: {error}"
     IMPORT_STARTING = "Файл виглядає добре. Починаю імпорт та обнулення старих резервів..."
     IMPORT_SYNC_ERROR = "❌ Сталася критична помилка під час синхронізації з базою даних: {error}"
+    IMPORT_PROGRESS = "⏳ *Імпорт:* {stage}\n🔄 Прочитано рядків: {rows}{total}{eta}"
+    IMPORT_PROGRESS_TOTAL = " з ~{total}"
+    IMPORT_PROGRESS_ETA = "\n⏱️ Залишилось ≈ {eta} с"
+    IMPORT_STAGES = {
+        "mapping": "розпізнавання колонок",
+        "parsing": "читання файлу",
+        "merging": "злиття з базою",
+        "committing": "фіксація змін",
+        "notifying": "розсилка сповіщень",
+    }
+    IMPORT_SHEET_STATUSES = {
+        "pending": "⏳",
+        "done": "✅",
+        "skipped": "⏭️",
+    }
+    IMPORT_SHEET_LINE = "{status} {sheet}: {rows} рядків"
+    IMPORT_REPORT_SHEETS_TITLE = "\n📑 *По аркушах:*"
+    IMPORT_CANCELLING = "Скасовую імпорт..."
+    IMPORT_CANCELLED = "⛔ Імпорт скасовано, зміни в базі відкочено."
+    IMPORT_CANCEL_TOO_LATE = "Імпорт уже завершено — скасувати неможливо."
     IMPORT_ASK_FOR_NOTIFICATION = "Сповістити всіх користувачів про це оновлення?"
     BROADCAST_STARTING = "✅ Імпорт завершено. Починаю розсилку сповіщень користувачам..."
     BROADCAST_SKIPPED = "✅ Імпорт завершено. Сповіщення користувачам не надсилались ('тихий режим')."
@@ -28,6 +49,7 @@ class Lexicon:
     IMPORT_REPORT_TITLE = "✅ *Синхронізацію завершено!*\n"
     IMPORT_REPORT_ADDED = "➕ *Додано нових:* {added}"
     IMPORT_REPORT_UPDATED = "🔄 *Оновлено існуючих:* {updated}"
+    IMPORT_REPORT_UNCHANGED = "⏸️ *Без змін:* {unchanged}"
     IMPORT_REPORT_DEACTIVATED = "➖ *Деактивовано (зникли з файлу):* {deactivated}"
     IMPORT_REPORT_REACTIVATED = "♻️ *Повторно активовано:* {reactivated}\n"
     IMPORT_REPORT_TOTAL = "🗃️ *Всього активних артикулів у базі:* {total}"
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк імпорту залишків: час і пам'ять по стадіях.
+
+Генерує реалістичні файли залишків (.xlsx) на 10k / 100k / 500k рядків —
+«брудні» заголовки, десяткові з комою, клітинки «артикул - назва»,
+нульові залишки-хвости, проміжні підсумки — і проганяє їх тим самим
+конвеєром, що й імпорт (_sync_smart_import_file), з окремим таймером
+на кожну стадію:
+
+    read       потокове читання пакетів (utils.excel_reader)
+    map        евристики SmartColumnMapper (без кешу мапінгів)
+    normalize  _parse_import_rows по пакетах
+    diff       diff_staged_products (лише з --db)
+    write      COPY у staging + merge_staged_products (лише з --db)
+
+Кожен файл проганяється двічі: спершу лише час, потім під tracemalloc
+(пік пам'яті по стадіях; tracemalloc сповільнює код, тому час з цього
+проходу не береться). Алокації python-calamine (Rust) tracemalloc не
+бачить — для них є peak_rss_mb процесу.
+
+З --db стадії diff/write виконуються в транзакції, яка завжди
+відкочується: каталог не змінюється. Результати — JSON; з --baseline
+скрипт порівнює час стадій з попереднім запуском і завершується з
+кодом 1, якщо якась стадія повільніша за поріг:
+
+    python scripts/benchmark_import.py --sizes 10000 100000 -o bench.json
+    python scripts/benchmark_import.py --db --baseline bench.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from openpyxl import Workbook
+
+from utils import excel_reader
+
+DEFAULT_SIZES = (10_000, 100_000, 500_000)
+STAGES = ("read", "map", "normalize", "diff", "write")
+# Коротші стадії при порівнянні з baseline ігноруються — там лише шум
+MIN_COMPARABLE_SECONDS = 0.05
+
+# Заголовки, як їх віддає облікова система: пробіли, двокрапки, коми, регістр
+MESSY_HEADERS = [
+    " Артикул ", "Назва товару", "Відділ:", "ГРУПА", "Залишок, к-ть",
+    "Сума залишку", "Ціна", "Міс. без продажу",
+]
+DEPARTMENTS = [7, 9, 12, 15, 21, 33, 40, 52]
+GROUPS = ["Посуд", "Текстиль", "Сантехніка", "Освітлення", "Декор", "Інструмент"]
+
+
+def _comma(value: float) -> str:
+    """1234.5 → '1 234,50' — як у вивантаженнях з обліку."""
+    return f"{value:,.2f}".replace(",", " ").replace(".", ",")
+
+
+def generate_stock_file(path: str, rows: int, seed: int = 42) -> None:
+    """Файл залишків на rows рядків даних (плюс проміжні підсумки)."""
+    rnd = random.Random(seed)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Залишки")
+    sheet.append(MESSY_HEADERS)
+    department = DEPARTMENTS[0]
+    for i in range(rows):
+        if i and i % 5_000 == 0:
+            sheet.append([None, f"Разом по відділу {department}", None, None, None, None, None, None])
+            department = rnd.choice(DEPARTMENTS)
+        article = str(10_000_000 + i)
+        name = f"Товар {rnd.choice(GROUPS).lower()} {i}"
+        leftover = rnd.random() < 0.05
+        quantity = 0 if leftover else round(rnd.uniform(1, 500), rnd.choice((0, 0, 1)))
+        price = round(rnd.uniform(5, 5_000), 2)
+        stock_sum = round(quantity * price, 2)
+        sheet.append([
+            # Частина артикулів — «артикул - назва» в одній клітинці
+            f"{article} - {name}" if rnd.random() < 0.4 else article,
+            name,
+            department,
+            rnd.choice(GROUPS),
+            # Частина чисел — рядки з комою замість крапки
+            _comma(quantity) if rnd.random() < 0.3 else quantity,
+            _comma(stock_sum) if rnd.random() < 0.3 else stock_sum,
+            _comma(price) if rnd.random() < 0.3 else price,
+            rnd.randint(0, 24) if rnd.random() < 0.5 else None,
+        ])
+    sheet.append([None, "Разом", None, None, None, None, None, None])
+    workbook.save(path)
+
+
+def ensure_stock_file(data_dir: str, rows: int, seed: int) -> str:
+    """Згенерований файл кешується в data_dir між запусками."""
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"stock_{rows}_{seed}.xlsx")
+    if not os.path.exists(path):
+        print(f"Генерую {path}...", flush=True)
+        generate_stock_file(path, rows, seed)
+    return path
+
+
+class StageMeter:
+    """Сумарний час і пік tracemalloc по стадіях (стадії можуть чергуватись)."""
+
+    def __init__(self, trace_memory: bool):
+        self.trace_memory = trace_memory
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+        self.peak_bytes = dict.fromkeys(STAGES, 0)
+        self.ran = set()
+
+    @contextmanager
+    def stage(self, name: str):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - started
+            self.ran.add(name)
+            if self.trace_memory:
+                self.peak_bytes[name] = max(self.peak_bytes[name], tracemalloc.get_traced_memory()[1])
+
+
+def run_pipeline(path: str, meter: StageMeter, use_db: bool) -> dict:
+    """Один прогін конвеєра імпорту з вимірюванням стадій."""
+    from database.orm import product_import, products
+
+    with meter.stage("read"):
+        headers, batches = excel_reader.iter_excel_batches(path)
+    with meter.stage("map"):
+        mapping = products.SmartColumnMapper._match_headers(headers)
+    if not products._has_import_columns(mapping):
+        raise SystemExit(f"Мапінг не знайшов потрібних колонок: {mapping}")
+
+    session = None
+    rows_read = products_total = seq = 0
+    try:
+        if use_db:
+            from database.engine import sync_session
+
+            session = sync_session()
+            product_import.create_staging(session)
+
+        while True:
+            with meter.stage("read"):
+                frame = next(batches, None)
+            if frame is None:
+                break
+            with meter.stage("normalize"):
+                rows = products._parse_import_rows(frame, mapping)
+            rows_read += len(frame)
+            products_total += len(rows)
+            if session is not None:
+                with meter.stage("write"):
+                    seq = product_import.copy_rows(session, rows, seq)
+
+        summary = {}
+        if session is not None:
+            # diff — у savepoint: його індекс і ANALYZE не впливають на злиття
+            with meter.stage("diff"):
+                savepoint = session.begin_nested()
+                summary = product_import.diff_staged_products(session)
+                savepoint.rollback()
+            with meter.stage("write"):
+                product_import.merge_staged_products(session)
+    finally:
+        batches.close()
+        if session is not None:
+            session.rollback()  # каталог не змінюється
+            session.close()
+
+    return {"rows_read": rows_read, "products": products_total,
+            **{k: summary[k] for k in ("added", "updated", "unchanged", "deactivated") if k in summary}}
+
+
+def benchmark_file(path: str, rows: int, use_db: bool, trace_memory: bool) -> dict:
+    timing = StageMeter(trace_memory=False)
+    counts = run_pipeline(path, timing, use_db)
+
+    result = {
+        "rows": rows,
+        "file_size_bytes": os.path.getsize(path),
+        **counts,
+        "stages": {
+            name: {"seconds": round(timing.seconds[name], 4)} if name in timing.ran else None
+            for name in STAGES
+        },
+        "total_seconds": round(sum(timing.seconds.values()), 4),
+    }
+
+    if trace_memory:
+        memory = StageMeter(trace_memory=True)
+        tracemalloc.start()
+        try:
+            run_pipeline(path, memory, use_db)
+        finally:
+            tracemalloc.stop()
+        for name in memory.ran:
+            result["stages"][name]["peak_mb"] = round(memory.peak_bytes[name] / 2**20, 1)
+        result["peak_mb"] = round(max(memory.peak_bytes.values()) / 2**20, 1)
+
+    # ru_maxrss — кілобайти на Linux; пік за весь процес до цього моменту
+    result["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return result
+
+
+def compare_with_baseline(report: dict, baseline_path: str, threshold: float) -> list[str]:
+    """Стадії, що сповільнились більш ніж у threshold разів відносно baseline."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {entry["rows"]: entry for entry in json.load(f)["results"]}
+
+    regressions = []
+    for entry in report["results"]:
+        base = baseline.get(entry["rows"])
+        if not base:
+            continue
+        for name in STAGES:
+            current, previous = entry["stages"].get(name), base["stages"].get(name)
+            if not current or not previous:
+                continue
+            if max(current["seconds"], previous["seconds"]) < MIN_COMPARABLE_SECONDS:
+                continue
+            ratio = current["seconds"] / previous["seconds"]
+            print(f"  {entry['rows']:>7} {name:<9} {previous['seconds']:>8.3f}s → {current['seconds']:>8.3f}s (×{ratio:.2f})")
+            if ratio > threshold:
+                regressions.append(f"{entry['rows']} рядків, {name}: ×{ratio:.2f}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарк імпорту залишків по стадіях")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="кількість рядків у згенерованих файлах")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "epicservice_import_benchmark"),
+                        help="тека для згенерованих файлів (кешуються між запусками)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", action="store_true",
+                        help="виміряти також diff/write на БД з .env (транзакція відкочується)")
+    parser.add_argument("--no-memory", action="store_true", help="без проходу під tracemalloc")
+    parser.add_argument("-o", "--output", default="import_benchmark.json")
+    parser.add_argument("--baseline", help="попередній JSON для порівняння")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="допустиме сповільнення стадії відносно baseline")
+    args = parser.parse_args()
+
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "reader": "calamine" if excel_reader.CalamineWorkbook is not None else "openpyxl",
+        "batch_size": excel_reader.BATCH_SIZE,
+        "db": args.db,
+        "results": [],
+    }
+    for rows in args.sizes:
+        path = ensure_stock_file(args.data_dir, rows, args.seed)
+        entry = benchmark_file(path, rows, args.db, trace_memory=not args.no_memory)
+        report["results"].append(entry)
+        stages = ", ".join(f"{name} {data['seconds']:.2f}s" for name, data in entry["stages"].items() if data)
+        print(f"{rows:>7} рядків: {entry['total_seconds']:.2f}s ({stages})", flush=True)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Результати: {args.output}")
+
+    if args.baseline:
+        regressions = compare_with_baseline(report, args.baseline, args.threshold)
+        if regressions:
+            print("Регресії:")
+            for item in regressions:
+                print("-", item)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Перенесення файлів архіву зі старої пласкої структури (archives/active/*.xlsx,
+archives/trash/*.xlsx) у шардовану:
+
+    <active|trash>/<user_id % 256>/<user_id>/<yyyy-mm>/<filename>
+
+Індекс archive_files не змінюється (зберігає лише назви файлів), URL
+завантаження лишаються тими самими. Запускати один раз після оновлення;
+повторний запуск безпечний:
+
+    python scripts/migrate_archive_layout.py
+"""
+
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.archive_manager import migrate_to_sharded_layout
+
+
+def main() -> int:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(name)s - %(message)s")
+    stats = migrate_to_sharded_layout()
+    print(f"moved={stats['moved']} skipped={stats['skipped']}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
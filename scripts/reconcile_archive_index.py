@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Звірка індексу archive_files з файлами archives/active та archives/trash.
+
+Запускати після міграції (первинне наповнення індексу) та за потреби,
+якщо файли архіву змінювались вручну:
+
+    python scripts/reconcile_archive_index.py
+    python scripts/reconcile_archive_index.py --backfill-summaries
+"""
+
+import argparse
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.archive_manager import backfill_archive_summaries, reconcile_archive_index
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Звірка індексу архіву з файловою системою")
+    parser.add_argument(
+        "--backfill-summaries", action="store_true",
+        help="дорахувати items_count/total_sum для записів без підсумків"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(name)s - %(message)s")
+    stats = reconcile_archive_index()
+    print(
+        f"added={stats['added']} updated={stats['updated']} "
+        f"removed={stats['removed']} skipped={stats['skipped']}"
+    )
+    if args.backfill_summaries:
+        print(f"summaries={backfill_archive_summaries()}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,53 @@
+"""Paginated, filterable /api/admin/archives backed by the archive_files index."""
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+from fastapi.testclient import TestClient
+
+
+def _archive(filename, created_at, is_surplus=False):
+    return SimpleNamespace(
+        filename=filename, user_id=42, department="7", size=0, items_count=3,
+        total_sum=150.0, is_surplus=is_surplus, created_at=created_at,
+    )
+
+
+def test_admin_archives_passes_filters_and_paginates():
+    from webapp.api import app
+
+    page = [_archive("7_42_02-02-2026_10-00.xlsx", datetime(2026, 2, 2, 10, 0))]
+    with patch("webapp.routers.admin.ADMIN_IDS", [1]), \
+         patch("webapp.routers.admin.orm_get_archive_files_page", new_callable=AsyncMock, return_value=(page, 3)) as orm:
+        resp = TestClient(app).get(
+            "/api/admin/archives",
+            params={
+                "user_id": 1, "limit": 1, "offset": 1, "owner_id": 42, "department": " 7 ",
+                "date_from": "2026-02-01", "date_to": "2026-02-02", "surplus": "false", "order": "asc",
+            },
+        )
+
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["total"] == 3 and data["has_more"] is True
+    assert data["files"][0]["created_at"] == "2026-02-02T10:00:00"
+    assert orm.await_args.kwargs == {
+        "limit": 1,
+        "offset": 1,
+        "user_id": 42,
+        "department": "7",
+        "date_from": datetime(2026, 2, 1),
+        # date_to включно: межа — початок наступного дня
+        "date_to": datetime(2026, 2, 3),
+        "is_surplus": False,
+        "newest_first": False,
+    }
+
+
+def test_admin_archives_rejects_unknown_order_and_non_admin():
+    from webapp.api import app
+
+    client = TestClient(app)
+    with patch("webapp.routers.admin.ADMIN_IDS", [1]):
+        assert client.get("/api/admin/archives", params={"user_id": 1, "order": "size"}).status_code == 422
+        assert client.get("/api/admin/archives", params={"user_id": 2}).status_code == 403
@@ -0,0 +1,98 @@
+"""Deferred archive storage: index-only save, render on download, LRU disk cache."""
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+from openpyxl import load_workbook
+
+FILENAME = "7_42_01-02-2026_10-30.xlsx"
+
+
+def _patch_storage(monkeypatch, tmp_path):
+    from utils import archive_cache, archive_manager
+
+    monkeypatch.setattr(archive_manager, "ACTIVE_DIR", str(tmp_path / "active"))
+    monkeypatch.setattr(archive_manager, "TRASH_DIR", str(tmp_path / "trash"))
+    monkeypatch.setattr(archive_cache, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(archive_cache, "_cache_bytes", None)
+
+
+@pytest.mark.asyncio
+async def test_deferred_save_writes_no_file_and_renders_on_download(tmp_path, monkeypatch):
+    from utils import list_processor
+
+    _patch_storage(monkeypatch, tmp_path)
+    monkeypatch.setattr(list_processor, "ARCHIVE_STORAGE_MODE", "deferred")
+    monkeypatch.setattr(list_processor, "rotate_user_files", lambda uid, limit: None)
+    deferred = []
+    monkeypatch.setattr(list_processor, "register_deferred_archive", lambda name, **kw: deferred.append((name, kw)))
+
+    snapshot = {
+        "user_id": 42,
+        "department_id": 7,
+        "timestamp": "01-02-2026_10-30",
+        "in_stock_items": [{"Артикул": "111", "Кількість": 2, "Ціна": 10.0, "Сума": 20.0}],
+        "surplus_items": [],
+        "total_in_stock_sum": 20.0,
+        "total_surplus_sum": 0.0,
+        "product_ids": [1],
+        "list_id": 5,
+    }
+    main_path, _ = await list_processor.render_saved_list(snapshot)
+
+    assert not os.path.exists(main_path)
+    assert deferred == [(FILENAME, {"items_count": 1, "total_sum": 20.0, "saved_list_id": 5})]
+
+    archive = SimpleNamespace(saved_list_id=5, is_surplus=False, is_trashed=False)
+    monkeypatch.setattr(list_processor, "orm_get_archive_file_sync", lambda name: archive)
+    item_queries = []
+
+    def fake_items(list_id, is_surplus):
+        item_queries.append((list_id, is_surplus))
+        return [SimpleNamespace(article_name="111", quantity=2.0, price=10.0)]
+
+    monkeypatch.setattr(list_processor, "orm_get_saved_list_items_sync", fake_items)
+
+    path = await list_processor.materialize_archive(FILENAME)
+    assert path == os.path.join(str(tmp_path / "cache"), "42", "42", "2026-02", FILENAME)
+    rows = list(load_workbook(path).active.iter_rows(values_only=True))
+    assert rows[0] == ("Артикул", "Кількість", "Ціна", "Сума")
+    assert rows[1] == ("111", 2, 10, 20)
+    assert rows[-1][3] == "20.00 грн"
+
+    # Повторне завантаження — з кешу, без запиту позицій
+    assert await list_processor.materialize_archive(FILENAME) == path
+    assert item_queries == [(5, False)]
+
+    archive.is_trashed = True
+    os.remove(path)
+    assert await list_processor.materialize_archive(FILENAME) is None
+
+
+def test_cache_evicts_least_recently_used(tmp_path, monkeypatch):
+    from utils import archive_cache
+
+    _patch_storage(monkeypatch, tmp_path)
+    monkeypatch.setattr(archive_cache, "CACHE_MAX_BYTES", 250)
+
+    names = [f"5_1_0{day}-01-2026_10-00.xlsx" for day in (1, 2, 3)]
+    paths = []
+    for offset, name in enumerate(names):
+        path = archive_cache.cache_path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"x" * 100)
+        stamp = time.time() - 100 + offset
+        os.utime(path, (stamp, stamp))
+        paths.append(path)
+
+    # Доступ до найстарішого робить його «свіжим», не змінюючи mtime (валідатори HTTP)
+    rendered_at = os.stat(paths[0]).st_mtime_ns
+    assert archive_cache.get_cached(names[0]) == paths[0]
+    assert os.stat(paths[0]).st_mtime_ns == rendered_at
+    archive_cache.register_cached(paths[2])
+
+    assert os.path.exists(paths[0]) and os.path.exists(paths[2])
+    assert not os.path.exists(paths[1])
+    assert archive_cache.get_cached(names[1]) is None
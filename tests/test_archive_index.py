@@ -0,0 +1,147 @@
+"""Archive index: rotation and filesystem reconciliation (ORM calls mocked)."""
+import os
+from datetime import datetime
+from types import SimpleNamespace
+
+
+def _touch(directory, name, size=10):
+    path = os.path.join(directory, name)
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    return path
+
+
+def _patch_dirs(monkeypatch, archive_manager, tmp_path):
+    active, trash = tmp_path / "active", tmp_path / "trash"
+    active.mkdir()
+    trash.mkdir()
+    monkeypatch.setattr(archive_manager, "ACTIVE_DIR", str(active))
+    monkeypatch.setattr(archive_manager, "TRASH_DIR", str(trash))
+    return str(active), str(trash)
+
+
+def test_rotate_moves_oldest_indexed_files_to_trash(tmp_path, monkeypatch):
+    from utils import archive_manager
+
+    active, trash = _patch_dirs(monkeypatch, archive_manager, tmp_path)
+    names = [f"5_1_0{day}-01-2026_10-00.xlsx" for day in (3, 2, 1)]
+    for name in names:
+        _touch(active, name)
+
+    monkeypatch.setattr(
+        archive_manager, "orm_get_user_archive_files_sync",
+        lambda user_id: [SimpleNamespace(filename=name) for name in names],
+    )
+    trashed = []
+    monkeypatch.setattr(archive_manager, "orm_mark_archive_files_trashed_sync", trashed.extend)
+
+    archive_manager.rotate_user_files(1, limit=2)
+
+    assert trashed == [names[2]]
+    assert sorted(os.listdir(active)) == sorted(names[:2])
+    assert os.listdir(os.path.join(trash, "1", "1", "2026-01")) == [names[2]]
+    assert archive_manager.resolve_archive_path(names[2], trashed=True) == archive_manager.archive_path(
+        names[2], trashed=True
+    )
+
+
+def test_migrate_to_sharded_layout_moves_flat_files(tmp_path, monkeypatch):
+    from utils import archive_manager
+
+    active, trash = _patch_dirs(monkeypatch, archive_manager, tmp_path)
+    _touch(active, "5_300_01-01-2026_10-00.xlsx")
+    _touch(trash, "лишки_5_300_15-12-2025_10-00.xlsx")
+    _touch(active, "notes.xlsx")
+    assert archive_manager.resolve_archive_path("5_300_01-01-2026_10-00.xlsx") == os.path.join(
+        active, "5_300_01-01-2026_10-00.xlsx"
+    )
+
+    assert archive_manager.migrate_to_sharded_layout() == {"moved": 2, "skipped": 1}
+    assert archive_manager.migrate_to_sharded_layout() == {"moved": 0, "skipped": 1}
+
+    assert archive_manager.resolve_archive_path("5_300_01-01-2026_10-00.xlsx") == os.path.join(
+        active, "44", "300", "2026-01", "5_300_01-01-2026_10-00.xlsx"
+    )
+    assert archive_manager.resolve_archive_path("лишки_5_300_15-12-2025_10-00.xlsx", trashed=True) == os.path.join(
+        trash, "44", "300", "2025-12", "лишки_5_300_15-12-2025_10-00.xlsx"
+    )
+    assert archive_manager.resolve_archive_path("../5_300_01-01-2026_10-00.xlsx") is None
+
+    assert archive_manager.purge_active_archives() == 2
+    assert os.listdir(active) == []
+
+
+def test_reconcile_adds_missing_and_drops_stale_rows(tmp_path, monkeypatch):
+    from utils import archive_manager
+
+    active, trash = _patch_dirs(monkeypatch, archive_manager, tmp_path)
+    _touch(active, "5_1_01-01-2026_10-00.xlsx", size=7)
+    _touch(active, "лишки_5_1_01-01-2026_10-00.xlsx")
+    os.makedirs(os.path.join(trash, "2", "2", "2025-12"))
+    _touch(os.path.join(trash, "2", "2", "2025-12"), "list_2_01-12-2025_09-30.xlsx")
+    _touch(active, "notes.xlsx")
+
+    unchanged = SimpleNamespace(
+        filename="лишки_5_1_01-01-2026_10-00.xlsx", size=10, is_trashed=False, trashed_at=None, saved_list_id=None
+    )
+    stale = SimpleNamespace(
+        filename="5_9_01-01-2025_10-00.xlsx", size=1, is_trashed=False, trashed_at=None, saved_list_id=None
+    )
+    # Без файлу, але з джерелом у БД (deferred) — не видаляється
+    deferred = SimpleNamespace(
+        filename="5_9_02-01-2025_10-00.xlsx", size=0, is_trashed=False, trashed_at=None, saved_list_id=3
+    )
+    monkeypatch.setattr(archive_manager, "orm_get_all_archive_files_sync", lambda: [unchanged, stale, deferred])
+    upserts, deleted = [], []
+    monkeypatch.setattr(archive_manager, "orm_upsert_archive_file_sync", lambda **kw: upserts.append(kw))
+    monkeypatch.setattr(archive_manager, "orm_delete_archive_files_sync", deleted.extend)
+
+    stats = archive_manager.reconcile_archive_index()
+
+    assert stats == {"added": 2, "updated": 0, "removed": 1, "skipped": 1}
+    assert deleted == [stale.filename]
+    by_name = {u["filename"]: u for u in upserts}
+    main = by_name["5_1_01-01-2026_10-00.xlsx"]
+    assert (main["user_id"], main["department"], main["size"], main["is_trashed"]) == (1, "5", 7, False)
+    assert main["created_at"] == datetime(2026, 1, 1, 10, 0)
+    trashed = by_name["list_2_01-12-2025_09-30.xlsx"]
+    assert trashed["is_trashed"] is True and trashed["trashed_at"] is not None
+
+
+def test_read_archive_summary_matches_rendered_file(tmp_path):
+    from openpyxl import Workbook
+
+    from utils.archive_manager import read_archive_summary
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(["Артикул", "Кількість", "Ціна", "Сума"])
+    ws.append(["111", 2, 10.0, 20.0])
+    ws.append(["222", 3, 1.5, None])
+    ws.append([])
+    ws.append(["К-ть артикулів:", 2])
+    ws.append(["Зібрано на суму:", None, None, "24.50 грн"])
+    path = tmp_path / "5_1_01-01-2026_10-00.xlsx"
+    wb.save(path)
+
+    assert read_archive_summary(str(path)) == (2, 24.5)
+
+
+def test_user_totals_refresh_is_scoped_aggregate_upsert():
+    from sqlalchemy.dialects import postgresql
+
+    from database.orm.archive_files import _user_totals_refresh_statements
+
+    cleanup, upsert = _user_totals_refresh_statements([3, 1, 3])
+    cleanup_sql = str(cleanup.compile(dialect=postgresql.dialect()))
+    upsert_sql = str(upsert.compile(dialect=postgresql.dialect()))
+
+    assert cleanup_sql.startswith("DELETE FROM archive_user_totals")
+    assert "INSERT INTO archive_user_totals" in upsert_sql
+    assert "FROM archive_files" in upsert_sql
+    assert "GROUP BY archive_files.user_id" in upsert_sql
+    assert "ON CONFLICT (user_id) DO UPDATE" in upsert_sql
+    assert cleanup.compile().params["user_id_1"] == [1, 3]
+
+    full_cleanup, _ = _user_totals_refresh_statements(None)
+    assert "WHERE" not in str(full_cleanup.compile(dialect=postgresql.dialect()))
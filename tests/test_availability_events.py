@@ -0,0 +1,129 @@
+"""Tests for live availability updates (SSE fan-out without Redis)."""
+import asyncio
+import json
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+
+@pytest.mark.asyncio
+async def test_local_publish_reaches_only_subscribed_department():
+    from utils import availability_events as ev
+
+    async with ev.availability_subscription([310]) as q310, \
+            ev.availability_subscription([20]) as q20:
+        await ev.publish_availability(310, [{"product_id": 1, "available": 4.0}])
+
+        payload = await asyncio.wait_for(q310.get(), timeout=1)
+        assert payload == {"department": 310, "updates": [{"product_id": 1, "available": 4.0}]}
+        assert q20.empty()
+
+    # Після виходу з контексту підписники прибрані
+    assert 310 not in ev._subscribers
+    assert 20 not in ev._subscribers
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_drops_oldest_payload(monkeypatch):
+    from utils import availability_events as ev
+
+    monkeypatch.setattr(ev, "SUBSCRIBER_QUEUE_SIZE", 2)
+    async with ev.availability_subscription([5]) as queue:
+        for pid in (1, 2, 3):
+            await ev.publish_availability(5, [{"product_id": pid, "available": 1.0}])
+
+        first = queue.get_nowait()
+        second = queue.get_nowait()
+    assert [first["updates"][0]["product_id"], second["updates"][0]["product_id"]] == [2, 3]
+
+
+def test_stream_rejects_invalid_departments():
+    from fastapi.testclient import TestClient
+    from webapp.api import app
+
+    client = TestClient(app)
+    resp = client.get("/api/stream/availability", params={"departments": "abc"})
+    assert resp.status_code == 400
+
+
+# search.js у node: мінімальні заглушки DOM/Telegram замість браузера
+_SEARCH_JS_HARNESS = r"""
+const fs = require('fs'), vm = require('vm');
+const stub = new Proxy(function () {}, {
+    get: (t, key) => key === Symbol.toPrimitive ? () => '' : key === 'then' ? undefined : stub,
+    set: () => true,
+    apply: () => stub,
+});
+const ctx = vm.createContext({
+    document: stub, tg: stub, window: {}, console, setTimeout, requestAnimationFrame: () => {},
+    userId: 42, isAdmin: false, currentDepartment: null,
+    loadList: () => {}, watchSaveJob: () => {},
+    fetch: async () => ({ json: async () => ({ success: true, cleared: true }) }),
+    cachedProducts: [{
+        id: 1, article: 'A1', name: 'Товар', department: 7, group: 'Г', price: 10,
+        balance_sum: 100, months_without_movement: 0,
+        available: 6, user_reserved: 4, user_reserved_sum: 40,
+    }],
+});
+vm.runInContext(fs.readFileSync(process.argv[2], 'utf8'), ctx);
+(async () => {
+    const seen = [];
+    await vm.runInContext('saveList()', ctx);
+    // Подія від збереження цього ж користувача: 10 − відкладено(4)
+    ctx.applyAvailabilityUpdates([{ product_id: 1, available: 6 }]);
+    seen.push({ ...ctx.cachedProducts[0] });
+    // Далі інший користувач зберіг ще 1 шт.
+    ctx.applyAvailabilityUpdates([{ product_id: 1, available: 5 }]);
+    seen.push({ ...ctx.cachedProducts[0] });
+    console.log(JSON.stringify(seen));
+})();
+"""
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="node не встановлено")
+def test_own_save_event_does_not_subtract_reservation_twice(tmp_path):
+    harness = tmp_path / "harness.js"
+    harness.write_text(_SEARCH_JS_HARNESS, encoding="utf-8")
+    search_js = Path(__file__).resolve().parent.parent / "webapp" / "static" / "js" / "search.js"
+
+    out = subprocess.run(["node", str(harness), str(search_js)], capture_output=True, text=True, check=True)
+    after_own_save, after_other_save = json.loads(out.stdout)
+
+    assert (after_own_save["available"], after_own_save["user_reserved"], after_own_save["user_reserved_sum"]) == (6, 0, 0)
+    assert after_other_save["available"] == 5
+
+
+@pytest.mark.asyncio
+async def test_refresh_reaches_every_department_subscriber():
+    from utils import availability_events as ev
+
+    async with ev.availability_subscription([7]) as q7, ev.availability_subscription([7, 9]) as q79:
+        await ev.publish_availability_refresh()
+
+        assert q7.get_nowait() == {"refresh": True}
+        assert q79.get_nowait() == {"refresh": True}
+        assert q79.empty()
+
+
+def test_temp_list_changes_publish_nothing(monkeypatch):
+    """Тимчасовий список не змінює available інших користувачів — подій немає."""
+    from fastapi.testclient import TestClient
+    from unittest.mock import AsyncMock
+
+    from webapp.api import app
+    from webapp.routers import client as client_router
+
+    publish = AsyncMock()
+    monkeypatch.setattr(client_router, "publish_products_availability", publish)
+    for name in ("orm_add_item_to_temp_list", "orm_update_temp_list_item_quantity",
+                 "orm_delete_temp_list_item", "orm_clear_temp_list"):
+        monkeypatch.setattr(client_router, name, AsyncMock())
+
+    client = TestClient(app)
+    assert client.post("/api/add", json={"user_id": 1, "product_id": 5, "quantity": 2}).status_code == 200
+    assert client.post("/api/update", json={"user_id": 1, "product_id": 5, "quantity": 3}).status_code == 200
+    assert client.post("/api/delete", json={"user_id": 1, "product_id": 5}).status_code == 200
+    assert client.post("/api/clear/1").status_code == 200
+    publish.assert_not_awaited()
@@ -0,0 +1,105 @@
+"""Header-fingerprint cache for SmartColumnMapper and the pin/override endpoints."""
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+
+@pytest.fixture
+def mapper(monkeypatch):
+    from database.orm import products
+
+    stored = {}
+    saved = []
+    heuristic_calls = []
+    original_match = products.SmartColumnMapper._match_headers.__func__
+
+    def fake_get(fingerprint):
+        return stored.get(fingerprint)
+
+    def fake_save(fingerprint, headers, mapping, synonyms_hash):
+        saved.append((fingerprint, headers, mapping))
+
+    def counting_match(cls, headers):
+        heuristic_calls.append(list(headers))
+        return original_match(cls, headers)
+
+    monkeypatch.setattr(products, "orm_get_column_mapping_sync", fake_get)
+    monkeypatch.setattr(products, "orm_save_column_mapping_sync", fake_save)
+    monkeypatch.setattr(products.SmartColumnMapper, "_cache", {})
+    monkeypatch.setattr(products.SmartColumnMapper, "_match_headers", classmethod(counting_match))
+    return products.SmartColumnMapper, stored, saved, heuristic_calls
+
+
+def test_repeat_layout_skips_heuristics_and_resolves_current_header_names(mapper):
+    SmartColumnMapper, _, saved, heuristic_calls = mapper
+    headers = ["Артикул", "Назва", "Кількість", "Сума залишку"]
+
+    first = SmartColumnMapper.map_headers(headers)
+    assert first["article"] == "Артикул" and first["quantity"] == "Кількість"
+    assert saved[0][2] == {field: headers.index(col) for field, col in first.items()}
+
+    # Той самий макет з іншою пунктуацією — той самий відбиток, назви з поточного файлу
+    variant = ["Артикул:", "Назва", "Кількість,", "Сума залишку"]
+    assert SmartColumnMapper.fingerprint(variant) == SmartColumnMapper.fingerprint(headers)
+    second = SmartColumnMapper.map_headers(variant)
+    assert second["article"] == "Артикул:" and second["quantity"] == "Кількість,"
+    assert len(heuristic_calls) == 1 and len(saved) == 1
+
+
+def test_pinned_mapping_wins_and_stale_unpinned_is_recomputed(mapper):
+    SmartColumnMapper, stored, saved, heuristic_calls = mapper
+    headers = ["Код", "Опис", "Залишок", "Кількість"]
+    fingerprint = SmartColumnMapper.fingerprint(headers)
+
+    stored[fingerprint] = {"mapping": {"article": 0, "name": 1, "quantity": 2},
+                           "synonyms_hash": "old", "pinned": True, "headers": headers}
+    assert SmartColumnMapper.map_headers(headers) == {"article": "Код", "name": "Опис", "quantity": "Залишок"}
+    assert heuristic_calls == []
+
+    SmartColumnMapper.forget(fingerprint)
+    stored[fingerprint]["pinned"] = False
+    SmartColumnMapper.map_headers(headers)
+    assert len(heuristic_calls) == 1 and saved
+
+
+def test_unavailable_store_falls_back_to_heuristics(mapper, monkeypatch):
+    from database.orm import products
+
+    SmartColumnMapper, _, _, heuristic_calls = mapper
+
+    def broken(*args):
+        raise ConnectionError("db down")
+
+    monkeypatch.setattr(products, "orm_get_column_mapping_sync", broken)
+    monkeypatch.setattr(products, "orm_save_column_mapping_sync", broken)
+
+    assert SmartColumnMapper.map_headers(["Артикул", "Кількість"]) == {"article": "Артикул", "quantity": "Кількість"}
+    assert len(heuristic_calls) == 1
+
+
+def test_pin_endpoint_validates_and_stores_positions():
+    from fastapi.testclient import TestClient
+
+    from webapp.api import app
+
+    headers = ["Код", "Опис", "Залишок"]
+    stored = {"fingerprint": "f" * 64, "headers": headers, "mapping": {"name": 1},
+              "synonyms_hash": "x", "pinned": False, "updated_at": None}
+    pin = AsyncMock(return_value={**stored, "pinned": True})
+
+    with patch("webapp.routers.admin.ADMIN_IDS", [333]), \
+         patch("webapp.routers.admin.orm_get_column_mapping", new_callable=AsyncMock, return_value=stored), \
+         patch("webapp.routers.admin.orm_pin_column_mapping", pin):
+        client = TestClient(app)
+        url = f"/api/admin/column-mappings/{'f' * 64}"
+
+        bad = client.put(url, json={"user_id": 333, "mapping": {"article": "Нема", "quantity": "Залишок"}})
+        assert bad.status_code == 400 and bad.json()["unknown_headers"] == ["Нема"]
+        no_qty = client.put(url, json={"user_id": 333, "mapping": {"article": "Код"}})
+        assert no_qty.status_code == 400
+
+        ok = client.put(url, json={"user_id": 333, "mapping": {"article": "Код", "quantity": "Залишок"}})
+        assert ok.status_code == 200 and ok.json()["pinned"] is True
+        pin.assert_awaited_once_with("f" * 64, {"article": 0, "quantity": 2})
+
+        assert client.put(url, json={"user_id": 1, "mapping": {}}).status_code == 403
@@ -0,0 +1,48 @@
+"""Streaming Excel reader: batches, headers and values compared with pd.read_excel."""
+import pandas as pd
+from openpyxl import Workbook
+
+
+def _write_stock(path):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["Артикул", "Назва", None, "Назва", "Кількість"])
+    ws.append([52250196, "Склянка", None, "x", 2.0])
+    ws.append([None, None, None, None, None])  # порожній рядок пропускається
+    ws.append(["11111 - Тарілка", None, "примітка", "y", "1,5"])
+    ws.append([22222, "Ложка", None, None, 3.25])
+    wb.save(path)
+
+
+def test_reader_matches_read_excel_values(tmp_path):
+    from utils.excel_reader import iter_excel_batches, read_excel_frame, read_excel_headers
+
+    path = tmp_path / "stock.xlsx"
+    _write_stock(path)
+    # pd.read_excel лишає порожні рядки як NaN; потоковий читач їх пропускає
+    expected = pd.read_excel(path).dropna(how="all")
+
+    assert read_excel_headers(str(path)) == list(expected.columns)
+    actual = read_excel_frame(str(path))
+    assert list(actual.columns) == list(expected.columns)
+    assert actual.astype(object).where(actual.notna(), None).values.tolist() == \
+        expected.astype(object).where(expected.notna(), None).values.tolist()
+
+    headers, batches = iter_excel_batches(path.read_bytes(), batch_size=2)
+    assert headers == ["Артикул", "Назва", "Unnamed: 2", "Назва.1", "Кількість"]
+    assert [len(batch) for batch in batches] == [2, 1]
+
+
+def test_read_excel_frame_limits_rows_and_handles_header_only(tmp_path):
+    from utils.excel_reader import read_excel_frame
+
+    path = tmp_path / "stock.xlsx"
+    _write_stock(path)
+    assert len(read_excel_frame(str(path), max_rows=1)) == 1
+
+    wb = Workbook()
+    wb.active.append(["Артикул", "Кількість"])
+    empty = tmp_path / "empty.xlsx"
+    wb.save(empty)
+    frame = read_excel_frame(str(empty))
+    assert frame.empty and list(frame.columns) == ["Артикул", "Кількість"]
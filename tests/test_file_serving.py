@@ -0,0 +1,74 @@
+"""Conditional GET and byte ranges for archive downloads."""
+import os
+from datetime import datetime
+from email.utils import formatdate
+
+from fastapi.testclient import TestClient
+
+FILENAME = "лишки_5_1_01-01-2026_10-00.xlsx"
+
+
+def _client(tmp_path, monkeypatch, indexed=True):
+    from webapp.api import app
+    from webapp.routers import client as client_router
+
+    path = tmp_path / FILENAME
+    path.write_bytes(bytes(range(256)) * 4)
+    async def fake_materialize_archive(name):
+        return str(path) if name == FILENAME else None
+
+    async def fake_validators(name):
+        return {"size": 1024, "last_modified": datetime(2026, 1, 1, 10, 0)} if indexed else {}
+
+    monkeypatch.setattr(client_router, "materialize_archive", fake_materialize_archive)
+    monkeypatch.setattr(client_router, "archive_download_validators", fake_validators)
+    return TestClient(app), f"/api/archive/download/{FILENAME}", path.read_bytes()
+
+
+def test_archive_download_validators_and_not_modified(tmp_path, monkeypatch):
+    client, url, content = _client(tmp_path, monkeypatch)
+
+    resp = client.get(url)
+    assert resp.status_code == 200
+    assert resp.content == content
+    assert resp.headers["accept-ranges"] == "bytes"
+    assert resp.headers["last-modified"] == formatdate(datetime(2026, 1, 1, 10, 0).timestamp(), usegmt=True)
+    assert "filename*=utf-8''" in resp.headers["content-disposition"]
+    etag = resp.headers["etag"]
+
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(url, headers={"If-None-Match": '"other"'}).status_code == 200
+    assert client.get(url, headers={"If-Modified-Since": resp.headers["last-modified"]}).status_code == 304
+    assert client.get("/api/archive/download/missing.xlsx").status_code == 404
+
+
+def test_archive_download_byte_ranges(tmp_path, monkeypatch):
+    client, url, content = _client(tmp_path, monkeypatch)
+    etag = client.get(url).headers["etag"]
+
+    resp = client.get(url, headers={"Range": "bytes=100-199"})
+    assert resp.status_code == 206
+    assert resp.content == content[100:200]
+    assert resp.headers["content-range"] == "bytes 100-199/1024"
+
+    resp = client.get(url, headers={"Range": "bytes=-24", "If-Range": etag})
+    assert resp.status_code == 206
+    assert resp.content == content[-24:]
+
+    # If-Range не збігся — повний файл
+    resp = client.get(url, headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert resp.status_code == 200
+    assert resp.content == content
+
+    resp = client.get(url, headers={"Range": "bytes=5000-"})
+    assert resp.status_code == 416
+    assert resp.headers["content-range"] == "bytes */1024"
+
+
+def test_archive_download_falls_back_to_stat_without_index_row(tmp_path, monkeypatch):
+    client, url, content = _client(tmp_path, monkeypatch, indexed=False)
+
+    resp = client.get(url, headers={"Range": "bytes=1000-"})
+    assert resp.status_code == 206
+    assert resp.content == content[1000:]
+    assert resp.headers["content-range"] == f"bytes 1000-1023/{os.path.getsize(tmp_path / FILENAME)}"
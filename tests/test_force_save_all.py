@@ -0,0 +1,60 @@
+"""Concurrent force-save of several users' lists."""
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+
+@pytest.mark.asyncio
+async def test_force_save_all_bounds_concurrency_and_notifies_after_saves(monkeypatch):
+    from utils import force_save_helper as fsh
+
+    running = 0
+    peak = 0
+    events = []
+
+    async def fake_save(user_id):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        events.append(("saved", user_id))
+        return fsh.SAVE_EMPTY if user_id == 3 else fsh.SAVE_SAVED
+
+    monkeypatch.setattr(fsh, "_save_list", fake_save)
+
+    bot = MagicMock()
+
+    async def send_message(user_id, *args, **kwargs):
+        events.append(("notified", user_id))
+
+    bot.send_message = AsyncMock(side_effect=send_message)
+    progress = AsyncMock()
+
+    results = await fsh.force_save_all([1, 2, 3, 4, 5, 1], bot, progress=progress, concurrency=2)
+
+    assert results == {1: True, 2: True, 3: True, 4: True, 5: True}
+    assert peak == 2
+    # Усі повідомлення — після всіх збережень
+    first_notify = next(i for i, e in enumerate(events) if e[0] == "notified")
+    assert all(e[0] == "saved" for e in events[:first_notify])
+    assert [c.args for c in progress.await_args_list][-1] == (5, 5)
+    # Веб-варіант (без storage): користувач без списку теж отримує повідомлення
+    assert bot.send_message.await_count == 5
+
+
+@pytest.mark.asyncio
+async def test_force_save_all_reports_failures(monkeypatch):
+    from utils import force_save_helper as fsh
+
+    async def fake_save(user_id):
+        return fsh.SAVE_TRANSACTION_ERROR if user_id == 2 else fsh.SAVE_SAVED
+
+    monkeypatch.setattr(fsh, "_save_list", fake_save)
+    bot = MagicMock()
+    bot.send_message = AsyncMock()
+
+    results = await fsh.force_save_all([1, 2], bot)
+
+    assert results == {1: True, 2: False}
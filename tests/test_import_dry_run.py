@@ -0,0 +1,46 @@
+"""Import dry-run endpoint: summary without writes and the downloadable CSV of changes."""
+from io import BytesIO
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+
+def test_dry_run_returns_summary_and_serves_csv(tmp_path):
+    from webapp.api import app
+    from webapp.routers import admin
+
+    calls = []
+
+    async def fake_import(paths, progress=None, dry_run=False, diff_path=None):
+        calls.append(dry_run)
+        with open(diff_path, "w", encoding="utf-8") as f:
+            f.write("дія,артикул,назва,відділ,кількість_було,кількість_стане\nadded,52250196,Склянка,7,,2\n")
+        return {"added": 1, "updated": 0, "unchanged": 3, "deactivated": 2, "reactivated": 0,
+                "total_in_file": 4, "department_stats": {7: 4},
+                "affected_departments": {7: {"added": 1}, 9: {"deactivated": 2}}, "dry_run": True}
+
+    with patch("webapp.routers.admin.ADMIN_IDS", [333]), \
+         patch.object(admin, "IMPORT_DIFF_DIR", str(tmp_path)), \
+         patch("webapp.routers.admin.read_import_headers", return_value=[["Артикул", "Кількість"]]), \
+         patch("webapp.routers.admin.orm_smart_import_sources", side_effect=fake_import):
+        client = TestClient(app)
+        resp = client.post(
+            "/api/admin/import/dry-run",
+            params={"user_id": 333},
+            files={"file": ("stock.xlsx", BytesIO(b"dummy"),
+                            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")},
+        )
+        assert resp.status_code == 200
+        data = resp.json()
+        assert calls == [True]
+        assert data["dry_run"] and data["added"] == 1 and data["deactivated"] == 2
+        assert "total_in_db" not in data
+        assert data["affected_departments"] == {"7": {"added": 1}, "9": {"deactivated": 2}}
+
+        csv_resp = client.get(f"/api/admin/import/dry-run/{data['diff_id']}", params={"user_id": 333})
+        assert csv_resp.status_code == 200
+        assert csv_resp.headers["content-type"].startswith("text/csv")
+        assert "52250196" in csv_resp.text
+
+        assert client.get("/api/admin/import/dry-run/..%2Fetc", params={"user_id": 333}).status_code in (400, 404)
+        assert client.get("/api/admin/import/dry-run/" + "0" * 32, params={"user_id": 333}).status_code == 404
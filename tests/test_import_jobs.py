@@ -0,0 +1,194 @@
+"""Background stock import: progress reporting, cancellation with rollback, job API."""
+from contextlib import contextmanager
+from io import BytesIO
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from openpyxl import Workbook
+
+
+def _write_stock(path, rows=5):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["Артикул", "Відділ", "Кількість", "Сума"])
+    for i in range(rows):
+        ws.append([f"{10000000 + i} - Товар {i}", 7, i + 1, 10 * (i + 1)])
+    wb.save(path)
+
+
+def _patch_staging(monkeypatch, executed, on_merge=None):
+    from database.orm import products
+
+    class FakeSession:
+        def execute(self, stmt, params=None):
+            executed.append("SQL")
+            return SimpleNamespace(scalar_one=lambda: 5)
+
+        def commit(self):
+            executed.append("COMMIT")
+
+    @contextmanager
+    def fake_sync_session():
+        try:
+            yield FakeSession()
+        except BaseException:
+            executed.append("ROLLBACK")
+            raise
+
+    def fake_merge(session):
+        if on_merge:
+            on_merge()
+        return {"added": 5, "updated": 0, "unchanged": 0, "deactivated": 0, "reactivated": 0,
+                "total_in_file": 5, "department_stats": {7: 5}}
+
+    monkeypatch.setattr(products, "IMPORT_WRITE_MODE", "inplace")
+    monkeypatch.setattr(products, "sync_session", fake_sync_session)
+    monkeypatch.setattr(products, "create_staging", lambda session: None)
+    monkeypatch.setattr(products, "copy_rows", lambda session, rows, start_seq=0: start_seq + len(rows))
+    monkeypatch.setattr(products, "merge_staged_products", fake_merge)
+
+
+@pytest.mark.asyncio
+async def test_import_job_reports_stages_and_rows(tmp_path, monkeypatch):
+    from utils import excel_reader, import_jobs, jobs
+
+    path = tmp_path / "stock.xlsx"
+    _write_stock(path)
+    executed = []
+    _patch_staging(monkeypatch, executed)
+    monkeypatch.setattr(excel_reader, "BATCH_SIZE", 2)
+    monkeypatch.setattr(import_jobs, "PROGRESS_INTERVAL", 0)
+
+    seen = []
+
+    async def on_update(job):
+        seen.append((job["stage"], job["rows"]))
+
+    job = await jobs.create_job(import_jobs.IMPORT_JOB_KIND, 1)
+
+    async def work():
+        return {"result": await import_jobs.run_import_job(job["id"], [str(path)], on_update)}
+
+    await jobs.run_job(job, work)
+
+    done = await jobs.get_job(job["id"])
+    assert done["status"] == jobs.JOB_DONE
+    assert done["total_rows"] == 5 and done["rows"] == 5
+    assert done["result"]["added"] == 5
+    assert seen[0] == ("mapping", 0)
+    assert ("parsing", 2) in seen and ("parsing", 4) in seen and ("merging", 5) in seen
+    assert seen[-1] == ("committing", 5)
+    assert "COMMIT" in executed and "ROLLBACK" not in executed
+
+
+@pytest.mark.asyncio
+async def test_cancel_before_commit_rolls_back(tmp_path, monkeypatch):
+    from utils import import_jobs, jobs
+
+    path = tmp_path / "stock.xlsx"
+    _write_stock(path)
+    job = await jobs.create_job(import_jobs.IMPORT_JOB_KIND, 1)
+    executed = []
+    # Запит на скасування надходить під час злиття — імпорт не має закомітитись
+    _patch_staging(monkeypatch, executed, on_merge=lambda: jobs._local_cancel_requests.add(job["id"]))
+
+    async def work():
+        return {"result": await import_jobs.run_import_job(job["id"], [str(path)])}
+
+    await jobs.run_job(job, work)
+
+    assert (await jobs.get_job(job["id"]))["status"] == jobs.JOB_CANCELLED
+    assert "COMMIT" not in executed and executed[-1] == "ROLLBACK"
+
+
+@pytest.mark.asyncio
+async def test_import_endpoint_returns_job_and_exposes_result():
+    import asyncio
+
+    import httpx
+
+    from utils import jobs
+    from webapp.api import app
+
+    result = {"added": 2, "updated": 1, "unchanged": 4, "deactivated": 0, "reactivated": 0,
+              "total_in_db": 7, "department_stats": {7: 7}}
+    transport = httpx.ASGITransport(app=app)
+    with patch("webapp.routers.admin.ADMIN_IDS", [333]), \
+         patch("webapp.routers.admin.read_import_headers", return_value=[["Артикул", "Кількість"]]), \
+         patch("webapp.routers.admin.run_import_job", new_callable=AsyncMock, return_value=result):
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            resp = await client.post(
+                "/api/admin/import",
+                params={"user_id": 333},
+                files={"file": ("stock.xlsx", BytesIO(b"dummy"),
+                                "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")},
+            )
+            assert resp.status_code == 202
+            job_id = resp.json()["job_id"]
+            await asyncio.gather(*jobs._running_tasks)
+
+            status = (await client.get(f"/api/admin/jobs/{job_id}", params={"user_id": 333})).json()
+            assert status["status"] == "done"
+            assert status["result"]["updated"] == 1 and status["result"]["unchanged"] == 4
+
+            # Завершений імпорт уже не скасувати
+            cancel = await client.post(f"/api/admin/jobs/{job_id}/cancel", params={"user_id": 333})
+            assert cancel.status_code == 409
+            missing = await client.get("/api/admin/jobs/missing", params={"user_id": 333})
+            assert missing.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_cancel_endpoint_flags_running_import_of_own_job_only():
+    from fastapi.testclient import TestClient
+
+    from utils import jobs
+    from utils.import_jobs import IMPORT_JOB_KIND
+    from webapp.api import app
+
+    job = await jobs.create_job(IMPORT_JOB_KIND, 222, stage="parsing", rows=100)
+    await jobs.update_job(job["id"], status=jobs.JOB_RUNNING)
+    moderator = SimpleNamespace(role="moderator")
+
+    with patch("webapp.routers.admin.ADMIN_IDS", []), \
+         patch("webapp.routers.admin.orm_get_user_by_id", new_callable=AsyncMock, return_value=moderator):
+        client = TestClient(app)
+        other = client.post(f"/api/admin/jobs/{job['id']}/cancel", params={"user_id": 444})
+        assert other.status_code == 404
+        assert not await jobs.is_cancel_requested(job["id"])
+
+        own = client.post(f"/api/admin/jobs/{job['id']}/cancel", params={"user_id": 222})
+        assert own.status_code == 202
+    assert await jobs.is_cancel_requested(job["id"])
+
+
+@pytest.mark.asyncio
+async def test_cancel_is_rejected_once_the_import_is_committing(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from utils import import_jobs, jobs
+    from webapp.api import app
+
+    path = tmp_path / "stock.xlsx"
+    _write_stock(path)
+    job = await jobs.create_job(import_jobs.IMPORT_JOB_KIND, 333)
+    executed = []
+    _patch_staging(monkeypatch, executed)
+    cancel_during_commit = []
+
+    # Скасування надходить, коли остання перевірка вже пройдена і йде коміт
+    async def on_update(state):
+        if state["stage"] == import_jobs.STAGE_COMMITTING:
+            with patch("webapp.routers.admin.ADMIN_IDS", [333]):
+                resp = TestClient(app).post(f"/api/admin/jobs/{job['id']}/cancel", params={"user_id": 333})
+            cancel_during_commit.append(resp.status_code)
+
+    async def work():
+        return {"result": await import_jobs.run_import_job(job["id"], [str(path)], on_update)}
+
+    await jobs.run_job(job, work)
+
+    assert cancel_during_commit == [409]
+    assert not await jobs.is_cancel_requested(job["id"])
+    assert (await jobs.get_job(job["id"]))["status"] == jobs.JOB_DONE and "COMMIT" in executed
@@ -0,0 +1,40 @@
+"""
+Golden-file test for import row normalization.
+
+tests/data/import_parse_golden.json holds messy sample imports (combined
+"article - name" cells, comma decimals, non-breaking spaces, text in numeric
+columns, missing values, duplicates) together with the output produced by the
+original per-row implementation. The vectorized parser must match it exactly,
+including value types.
+"""
+import json
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+GOLDEN_PATH = Path(__file__).parent / "data" / "import_parse_golden.json"
+GOLDEN = json.loads(GOLDEN_PATH.read_text(encoding="utf-8"))
+
+
+def _frame(entry) -> pd.DataFrame:
+    df = pd.DataFrame(entry["rows"], columns=entry["columns"])
+    # Як після pd.read_excel: порожні клітинки — NaN, а не None
+    return df.mask(df.isna())
+
+
+@pytest.mark.parametrize("entry", GOLDEN, ids=[entry["case"] for entry in GOLDEN])
+def test_parse_import_rows_matches_golden(entry):
+    from database.orm.products import _parse_import_rows
+
+    actual = _parse_import_rows(_frame(entry), entry["mapping"])
+
+    assert list(actual) == list(entry["expected"])
+    assert json.dumps(actual, ensure_ascii=False) == json.dumps(entry["expected"], ensure_ascii=False)
+
+
+def test_parse_import_rows_empty_frame():
+    from database.orm.products import _parse_import_rows
+
+    df = pd.DataFrame({"Артикул": [], "Кількість": []})
+    assert _parse_import_rows(df, {"article": "Артикул", "quantity": "Кількість"}) == {}
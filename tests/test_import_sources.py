@@ -0,0 +1,145 @@
+"""Multi-sheet and ZIP import sources: extraction, sheet listing, parallel per-sheet import."""
+import zipfile
+
+import pytest
+from openpyxl import Workbook
+
+from tests.test_import_jobs import _patch_staging
+
+
+def _write_book(path, sheets):
+    wb = Workbook()
+    wb.remove(wb.active)
+    for title, rows in sheets.items():
+        ws = wb.create_sheet(title)
+        for row in rows:
+            ws.append(row)
+    wb.save(path)
+
+
+def _stock_rows(department, start, count):
+    rows = [["Артикул", "Відділ", "Кількість", "Сума"]]
+    for i in range(start, start + count):
+        rows.append([f"{10000000 + i} - Товар {i}", department, i + 1, 10 * (i + 1)])
+    return rows
+
+
+def test_plain_workbook_is_its_own_source(tmp_path):
+    from utils.import_sources import list_import_sheets, prepare_import_files
+
+    path = tmp_path / "stock.xlsx"
+    _write_book(path, {"Відділ 7": _stock_rows(7, 0, 2), "Відділ 9": _stock_rows(9, 2, 2)})
+
+    assert prepare_import_files(str(path), str(tmp_path)) == [str(path)]
+    assert [s["label"] for s in list_import_sheets([str(path)])] == ["Відділ 7", "Відділ 9"]
+
+
+def test_zip_extracts_only_workbooks_without_leaving_workdir(tmp_path):
+    from utils.import_sources import list_import_sheets, prepare_import_files
+
+    book = tmp_path / "book.xlsx"
+    _write_book(book, {"Аркуш": _stock_rows(7, 0, 1)})
+    archive = tmp_path / "upload.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.write(book, "b/second.xlsx")
+        zf.write(book, "../../a_first.xlsx")
+        zf.writestr("readme.txt", "ignored")
+        zf.writestr("__MACOSX/b/._second.xlsx", "ignored")
+
+    workdir = tmp_path / "work"
+    workdir.mkdir()
+    paths = prepare_import_files(str(archive), str(workdir))
+
+    assert [p.rsplit("/", 1)[1] for p in paths] == ["a_first.xlsx", "second.xlsx"]
+    assert all(p.startswith(str(workdir)) for p in paths)
+    assert [s["label"] for s in list_import_sheets(paths)] == ["a_first.xlsx / Аркуш", "second.xlsx / Аркуш"]
+
+
+def test_zip_without_workbooks_is_rejected(tmp_path):
+    from utils.import_sources import ImportSourceError, prepare_import_files
+
+    archive = tmp_path / "upload.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("notes.txt", "nothing to import")
+
+    with pytest.raises(ImportSourceError):
+        prepare_import_files(str(archive), str(tmp_path))
+
+
+def test_sheets_are_parsed_in_parallel_and_reported_per_sheet(tmp_path, monkeypatch):
+    from database.orm import products
+
+    path = tmp_path / "stock.xlsx"
+    _write_book(path, {
+        "Відділ 7": _stock_rows(7, 0, 3),
+        "Примітки": [["Коментар"], ["без даних"]],
+        "Відділ 9": _stock_rows(9, 3, 2),
+    })
+    executed = []
+    _patch_staging(monkeypatch, executed)
+    staged = []
+    monkeypatch.setattr(products, "copy_rows",
+                        lambda session, rows, start_seq=0: staged.append(sorted(rows)) or start_seq + len(rows))
+    monkeypatch.setattr(products, "orm_get_column_mapping_sync", lambda fingerprint: None)
+    monkeypatch.setattr(products, "orm_save_column_mapping_sync", lambda *args: None)
+    monkeypatch.setattr(products.SmartColumnMapper, "_cache", {})
+    monkeypatch.setattr(products, "IMPORT_WORKERS", 2)
+
+    progress = []
+    result = products._sync_smart_import_sources(
+        [str(path)], lambda stage, rows, sheets=None: progress.append((stage, rows))
+    )
+
+    assert result["sheets"] == [
+        {"sheet": "Відділ 7", "rows": 3, "products": 3, "status": "done"},
+        {"sheet": "Примітки", "rows": 0, "products": 0, "status": "skipped"},
+        {"sheet": "Відділ 9", "rows": 2, "products": 2, "status": "done"},
+    ]
+    # Staging заповнюється в порядку аркушів, незалежно від порядку завершення воркерів
+    assert staged == [["10000000", "10000001", "10000002"], ["10000003", "10000004"]]
+    assert ("parsing", 3) in progress and ("merging", 5) in progress
+    assert "COMMIT" in executed
+
+
+def test_in_flight_sheets_are_capped_to_the_worker_count(tmp_path, monkeypatch):
+    from concurrent.futures import Future
+
+    from database.orm import products
+
+    class InlinePool:
+        """Виконує задачі одразу й рахує, скільки результатів не забрано."""
+        def __init__(self, max_workers, mp_context=None):
+            self.outstanding = self.peak = 0
+
+        def submit(self, fn, *args):
+            future = Future()
+            future.set_result(fn(*args))
+            self.outstanding += 1
+            self.peak = max(self.peak, self.outstanding)
+            original = future.result
+
+            def result(*a):
+                self.outstanding -= 1
+                return original(*a)
+            future.result = result
+            return future
+
+        def shutdown(self, wait=True, cancel_futures=False):
+            pass
+
+    pools = []
+    monkeypatch.setattr(products, "ProcessPoolExecutor",
+                        lambda **kwargs: pools.append(InlinePool(**kwargs)) or pools[-1])
+    path = tmp_path / "stock.xlsx"
+    _write_book(path, {f"Відділ {d}": _stock_rows(d, d * 10, 2) for d in range(5)})
+    _patch_staging(monkeypatch, [])
+    monkeypatch.setattr(products, "copy_rows", lambda session, rows, start_seq=0: start_seq + len(rows))
+    monkeypatch.setattr(products, "orm_get_column_mapping_sync", lambda fingerprint: None)
+    monkeypatch.setattr(products, "orm_save_column_mapping_sync", lambda *args: None)
+    monkeypatch.setattr(products.SmartColumnMapper, "_cache", {})
+    monkeypatch.setattr(products, "IMPORT_WORKERS", 2)
+
+    result = products._sync_smart_import_sources([str(path)])
+
+    assert [s["status"] for s in result["sheets"]] == ["done"] * 5
+    assert pools[0].peak == 2
@@ -0,0 +1,155 @@
+"""Background job registry (in-process backend, Redis disabled)."""
+import asyncio
+
+import pytest
+
+
+@pytest.mark.asyncio
+async def test_run_job_records_result_and_hides_from_active():
+    from utils import jobs
+
+    job = await jobs.create_job("test_kind", 7, files=["a.xlsx"])
+    assert job["status"] == jobs.JOB_PENDING
+    assert [j["id"] for j in await jobs.list_user_jobs("test_kind", 7, active_only=True)] == [job["id"]]
+
+    release = asyncio.Event()
+
+    async def work():
+        await release.wait()
+        return {"files": ["a.xlsx"], "rows": 3}
+
+    task = jobs.run_job(job, work)
+    await asyncio.sleep(0)
+    assert (await jobs.get_job(job["id"]))["status"] == jobs.JOB_RUNNING
+
+    release.set()
+    await task
+    done = await jobs.get_job(job["id"])
+    assert done["status"] == jobs.JOB_DONE
+    assert done["rows"] == 3
+    assert await jobs.list_user_jobs("test_kind", 7, active_only=True) == []
+
+
+@pytest.mark.asyncio
+async def test_run_job_marks_failure():
+    from utils import jobs
+
+    job = await jobs.create_job("test_kind", 8)
+
+    async def work():
+        raise RuntimeError("boom")
+
+    await jobs.run_job(job, work)
+    failed = await jobs.get_job(job["id"])
+    assert failed["status"] == jobs.JOB_FAILED
+    assert failed["error"] == "boom"
+
+
+def test_save_job_status_unknown_id_returns_404():
+    from fastapi.testclient import TestClient
+    from webapp.api import app
+
+    client = TestClient(app)
+    r = client.get("/api/save/jobs/does-not-exist")
+    assert r.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_save_job_fails_when_a_non_empty_group_produced_no_file(monkeypatch):
+    from utils import jobs
+    from webapp.routers import client as client_router
+
+    async def fake_render(snapshot):
+        return "/archives/5_7_01-01-2026_10-00.xlsx", None  # лишки не відрендерились
+
+    monkeypatch.setattr(client_router, "render_saved_list", fake_render)
+    snapshot = {"in_stock_items": [{"Артикул": "1"}], "surplus_items": [{"Артикул": "2"}]}
+
+    job = await jobs.create_job(client_router.SAVE_JOB_KIND, 7)
+    await jobs.run_job(job, lambda: client_router._render_save_job(snapshot))
+    failed = await jobs.get_job(job["id"])
+    assert failed["status"] == jobs.JOB_FAILED and failed["error"]
+
+    job = await jobs.create_job(client_router.SAVE_JOB_KIND, 7)
+    await jobs.run_job(job, lambda: client_router._render_save_job({**snapshot, "surplus_items": []}))
+    done = await jobs.get_job(job["id"])
+    assert done["status"] == jobs.JOB_DONE and done["files"] == ["5_7_01-01-2026_10-00.xlsx"]
+
+
+async def _abandon(jobs, job, **fields):
+    """Задача, чий процес зупинився посеред роботи: running, без heartbeat, давно не оновлювалась."""
+    await jobs.update_job(job["id"], status=jobs.JOB_RUNNING, owner="dead-host:1", **fields)
+    jobs._local_jobs[job["id"]]["updated_at"] -= jobs.JOB_STALE_SECONDS + 1
+
+
+@pytest.mark.asyncio
+async def test_interrupted_job_without_resumer_is_marked_failed():
+    from utils import jobs
+
+    job = await jobs.create_job("test_kind", 9)
+    await _abandon(jobs, job)
+
+    failed = await jobs.get_job(job["id"])
+    assert failed["status"] == jobs.JOB_FAILED
+    assert failed["error"] == jobs.INTERRUPTED_ERROR
+
+
+@pytest.mark.asyncio
+async def test_running_job_with_heartbeat_is_not_touched():
+    from utils import jobs
+
+    job = await jobs.create_job("test_kind", 10)
+    release = asyncio.Event()
+
+    async def work():
+        await release.wait()
+        return {}
+
+    task = jobs.run_job(job, work)
+    while jobs._local_jobs[job["id"]]["status"] != jobs.JOB_RUNNING:
+        await asyncio.sleep(0)
+    jobs._local_jobs[job["id"]]["updated_at"] -= jobs.JOB_STALE_SECONDS + 1
+
+    try:
+        assert (await jobs.get_job(job["id"]))["status"] == jobs.JOB_RUNNING
+    finally:
+        release.set()
+        await task
+
+
+@pytest.mark.asyncio
+async def test_interrupted_save_job_is_rerendered_from_saved_list(monkeypatch):
+    from utils import jobs
+    from webapp.routers import client as client_router
+
+    restored = []
+
+    async def fake_snapshot(list_id, user_id, department_id, timestamp):
+        restored.append((list_id, user_id, department_id, timestamp))
+        return {"in_stock_items": [{"Артикул": "1"}], "surplus_items": []}
+
+    async def fake_render(snapshot):
+        return "/archives/5_11_01-01-2026_10-00.xlsx", None
+
+    monkeypatch.setattr(client_router, "saved_list_snapshot", fake_snapshot)
+    monkeypatch.setattr(client_router, "render_saved_list", fake_render)
+
+    job = await jobs.create_job(client_router.SAVE_JOB_KIND, 11, timestamp="01-01-2026_10-00",
+                                files=["5_11_01-01-2026_10-00.xlsx"], list_id=42, department_id=5)
+    await _abandon(jobs, job, attempts=1)
+
+    # Вкладка «Архів» бачить задачу знову активною — її вже перезапущено
+    assert [j["id"] for j in await jobs.list_user_jobs(client_router.SAVE_JOB_KIND, 11, active_only=True)] == [job["id"]]
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*(task for task in jobs._running_tasks if task.get_loop() is loop))
+
+    done = await jobs.get_job(job["id"])
+    assert restored == [(42, 11, 5, "01-01-2026_10-00")]
+    assert done["status"] == jobs.JOB_DONE and done["files"] == ["5_11_01-01-2026_10-00.xlsx"]
+    assert done["attempts"] == 2 and done["owner"] == jobs.OWNER
+
+    # Після вичерпання спроб задача не перезапускається нескінченно
+    job = await jobs.create_job(client_router.SAVE_JOB_KIND, 11, timestamp="01-01-2026_10-00",
+                                files=[], list_id=43, department_id=5)
+    await _abandon(jobs, job, attempts=jobs.JOB_MAX_ATTEMPTS)
+    assert (await jobs.get_job(job["id"]))["status"] == jobs.JOB_FAILED
@@ -0,0 +1,74 @@
+"""Rendering of saved list snapshots into xlsx files (off the event loop)."""
+import os
+
+import pytest
+from openpyxl import load_workbook
+
+
+@pytest.mark.asyncio
+async def test_render_saved_list_keeps_naming_and_layout(tmp_path, monkeypatch):
+    from utils import archive_manager, list_processor
+
+    monkeypatch.setattr(archive_manager, "ACTIVE_DIR", str(tmp_path))
+    rotated = []
+    monkeypatch.setattr(list_processor, "rotate_user_files", lambda uid, limit: rotated.append((uid, limit)))
+    indexed = []
+    monkeypatch.setattr(list_processor, "register_archive_file", lambda path, **kw: indexed.append((path, kw)))
+
+    snapshot = {
+        "user_id": 42,
+        "department_id": 7,
+        "timestamp": "01-02-2026_10-30",
+        "in_stock_items": [
+            {"Артикул": "12345678", "Кількість": 2, "Ціна": 10.0, "Сума": 20.0},
+        ],
+        "surplus_items": [
+            {"Артикул": "87654321", "Кількість": 1, "Ціна": 5.5, "Сума": 5.5},
+        ],
+        "total_in_stock_sum": 20.0,
+        "total_surplus_sum": 5.5,
+        "product_ids": [1, 2],
+    }
+
+    main_path, surplus_path = await list_processor.render_saved_list(snapshot)
+
+    assert main_path == os.path.join(str(tmp_path), "42", "42", "2026-02", "7_42_01-02-2026_10-30.xlsx")
+    assert os.path.basename(surplus_path) == "лишки_7_42_01-02-2026_10-30.xlsx"
+    assert rotated == [(42, 10)]
+    assert indexed == [
+        (main_path, {"items_count": 1, "total_sum": 20.0, "saved_list_id": None}),
+        (surplus_path, {"items_count": 1, "total_sum": 5.5, "saved_list_id": None}),
+    ]
+    assert not [name for _, _, files in os.walk(tmp_path) for name in files if name.endswith(".part")]
+
+    rows = list(load_workbook(main_path).active.iter_rows(values_only=True))
+    assert rows[0] == ("Артикул", "Кількість", "Ціна", "Сума")
+    assert rows[1] == ("12345678", 2, 10, 20)
+    assert rows[-2][:2] == ("К-ть артикулів:", 1)
+    assert rows[-1][0] == "Зібрано на суму:"
+    assert rows[-1][3] == "20.00 грн"
+
+
+@pytest.mark.asyncio
+async def test_render_saved_list_skips_empty_surplus(tmp_path, monkeypatch):
+    from utils import archive_manager, list_processor
+
+    monkeypatch.setattr(archive_manager, "ACTIVE_DIR", str(tmp_path))
+    monkeypatch.setattr(list_processor, "rotate_user_files", lambda uid, limit: None)
+    monkeypatch.setattr(list_processor, "register_archive_file", lambda path, **kw: None)
+
+    snapshot = {
+        "user_id": 1,
+        "department_id": None,
+        "timestamp": "01-02-2026_10-30",
+        "in_stock_items": [{"Артикул": "1", "Кількість": 1, "Ціна": 1.0, "Сума": 1.0}],
+        "surplus_items": [],
+        "total_in_stock_sum": 1.0,
+        "total_surplus_sum": 0.0,
+        "product_ids": [1],
+    }
+
+    main_path, surplus_path = await list_processor.render_saved_list(snapshot)
+
+    assert os.path.basename(main_path) == "list_1_01-02-2026_10-30.xlsx"
+    assert surplus_path is None
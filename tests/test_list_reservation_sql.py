@@ -0,0 +1,57 @@
+"""Set-based locking and reservation statements used by prepare_list_for_save."""
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+
+def _compile(stmt) -> str:
+    return str(stmt.compile(dialect=postgresql.dialect()))
+
+
+@pytest.mark.asyncio
+async def test_lock_products_uses_single_ordered_for_update():
+    from database.orm.products import orm_lock_products_for_update
+
+    session = MagicMock()
+    result = MagicMock()
+    result.scalars.return_value = []
+    session.execute = AsyncMock(return_value=result)
+
+    await orm_lock_products_for_update(session, [5, 3, 5, 9])
+
+    session.execute.assert_awaited_once()
+    stmt = session.execute.await_args.args[0]
+    sql = _compile(stmt)
+    assert "ORDER BY products.id" in sql
+    assert "FOR UPDATE" in sql
+    assert stmt.compile().params["id_1"] == [3, 5, 9]
+
+
+@pytest.mark.asyncio
+async def test_lock_products_skips_empty_set():
+    from database.orm.products import orm_lock_products_for_update
+
+    session = MagicMock()
+    session.execute = AsyncMock()
+    assert await orm_lock_products_for_update(session, []) == {}
+    session.execute.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_reserved_quantity_is_one_update_from_values():
+    from database.orm.archives import orm_update_reserved_quantity
+
+    session = MagicMock()
+    session.execute = AsyncMock()
+
+    await orm_update_reserved_quantity(session, [
+        {"product_id": 2, "quantity": 1},
+        {"product_id": 1, "quantity": 4},
+        {"product_id": 2, "quantity": 3},
+    ])
+
+    session.execute.assert_awaited_once()
+    sql = _compile(session.execute.await_args.args[0])
+    assert sql.startswith("UPDATE products SET")
+    assert "FROM (VALUES" in sql
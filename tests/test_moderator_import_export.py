@@ -35,7 +35,7 @@ def test_import_allowed_for_admin_by_id():
     mock_result.success = False
 
     with patch("webapp.routers.admin.ADMIN_IDS", [333]), \
-         patch("webapp.routers.admin.orm_smart_import", new_callable=AsyncMock, return_value=None):
+         patch("webapp.routers.admin.run_import_job", new_callable=AsyncMock, return_value={}):
         client = TestClient(app, raise_server_exceptions=False)
         resp = client.post(
             "/api/admin/import",
@@ -53,7 +53,7 @@ def test_import_allowed_for_moderator():
 
     with patch("webapp.routers.admin.ADMIN_IDS", []), \
          patch("webapp.routers.admin.orm_get_user_by_id", new_callable=AsyncMock, return_value=_make_mock_user("moderator")), \
-         patch("webapp.routers.admin.orm_smart_import", new_callable=AsyncMock, return_value=None):
+         patch("webapp.routers.admin.run_import_job", new_callable=AsyncMock, return_value={}):
         client = TestClient(app, raise_server_exceptions=False)
         resp = client.post(
             "/api/admin/import",
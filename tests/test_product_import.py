@@ -0,0 +1,273 @@
+"""Staging-table import: COPY batches and the wiring of _sync_smart_import."""
+import csv
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+
+def _row(**overrides):
+    row = {
+        "назва": "Склянка", "відділ": 7, "група": "", "кількість": "2.5",
+        "місяці_без_руху": None, "сума_залишку": 25.0, "ціна": 10.0, "активний": True,
+    }
+    row.update(overrides)
+    return row
+
+
+def test_copy_batches_are_bounded_and_keep_nulls_apart_from_empty_strings():
+    from database.orm.product_import import STAGING_COLUMNS, content_hash, iter_copy_batches
+
+    rows = {f"{10000 + i}": _row() for i in range(5)}
+    rows["10001"] = _row(назва='Кухоль "великий", 0,5', місяці_без_руху=3)
+
+    batches = list(iter_copy_batches(rows, start_seq=100, batch_size=2))
+    assert [len(b.getvalue().splitlines()) for b in batches] == [2, 2, 1]
+
+    lines = batches[0].getvalue().splitlines()
+    first = next(csv.reader([lines[0]]))
+    assert len(first) == len(STAGING_COLUMNS)
+    # група "" і місяці None обидва стають "", але місяці — через FORCE_NULL
+    assert lines[0].startswith('100,"10000","Склянка",7,"","2.5",2.5,"",25.0,10.0,"')
+    assert first[-1] == content_hash(rows["10000"])
+    assert next(csv.reader([lines[1]]))[2] == 'Кухоль "великий", 0,5'
+    assert next(csv.reader([lines[1]]))[7] == "3"
+
+
+def test_content_hash_tracks_every_imported_value():
+    from database.orm.product_import import content_hash
+
+    base = content_hash(_row())
+    assert content_hash(_row()) == base
+    for field, value in [("назва", "Кухоль"), ("відділ", 8), ("група", "Посуд"), ("кількість", "3"),
+                         ("місяці_без_руху", 0), ("сума_залишку", 25.01), ("ціна", 10.5)]:
+        assert content_hash(_row(**{field: value})) != base, field
+    # активність не входить у хеш — її перевіряє сам UPDATE
+    assert content_hash(_row(активний=False)) == base
+
+
+def _patch_staging(monkeypatch, products, staged, executed):
+    class FakeSession:
+        def execute(self, stmt, params=None):
+            executed.append(str(stmt))
+            return SimpleNamespace(scalar_one=lambda: 2)
+
+        def commit(self):
+            executed.append("COMMIT")
+
+        def rollback(self):
+            executed.append("ROLLBACK")
+
+    @contextmanager
+    def fake_sync_session():
+        yield FakeSession()
+
+    def fake_copy_rows(session, rows, start_seq=0):
+        staged.append(dict(rows))
+        return start_seq + len(rows)
+
+    stats = {"added": 1, "updated": 1, "unchanged": 0, "deactivated": 0, "reactivated": 0,
+             "total_in_file": 2, "department_stats": {7: 2}}
+    monkeypatch.setattr(products, "IMPORT_WRITE_MODE", "inplace")
+    monkeypatch.setattr(products, "sync_session", fake_sync_session)
+    monkeypatch.setattr(products, "create_staging", lambda session: executed.append("CREATE"))
+    monkeypatch.setattr(products, "copy_rows", fake_copy_rows)
+    monkeypatch.setattr(products, "merge_staged_products", lambda session: stats)
+
+
+def test_sync_smart_import_streams_parsed_rows_into_staging(monkeypatch):
+    from database.orm import products
+
+    staged, executed = [], []
+    _patch_staging(monkeypatch, products, staged, executed)
+
+    df = pd.DataFrame({
+        "Артикул": ["52250196 - Склянка", "11111", None],
+        "Відділ": [7, 7, 7],
+        "Кількість": ["2", "1,5", "3"],
+        "Сума": [20, 15, 30],
+    })
+    result = products._sync_smart_import(df)
+
+    assert set(staged[0]) == {"52250196", "11111"}
+    assert staged[0]["11111"]["кількість"] == "1.5"
+    assert result["total_in_db"] == 2 and result["department_stats"] == {7: 2}
+    # Злиття на місці — під advisory-блокуванням до кінця транзакції
+    assert "pg_try_advisory_xact_lock" in executed[0]
+    assert executed[1] == "CREATE" and "COMMIT" in executed
+
+
+def test_sync_smart_import_file_copies_batch_by_batch(tmp_path, monkeypatch):
+    from openpyxl import Workbook
+
+    from database.orm import products
+    from utils import excel_reader
+
+    path = tmp_path / "stock.xlsx"
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["Артикул", "Відділ", "Кількість", "Сума"])
+    for i in range(5):
+        ws.append([f"{10000000 + i} - Товар {i}", 7, i + 1, 10 * (i + 1)])
+    wb.save(path)
+
+    staged, executed = [], []
+    _patch_staging(monkeypatch, products, staged, executed)
+    monkeypatch.setattr(excel_reader, "BATCH_SIZE", 2)
+
+    result = products._sync_smart_import_file(str(path))
+
+    assert [len(batch) for batch in staged] == [2, 2, 1]
+    assert staged[2]["10000004"]["кількість"] == "5"
+    assert result["added"] == 1
+
+
+def test_diff_summary_counts_like_the_real_merge(tmp_path):
+    from database.orm import product_import
+
+    summary_rows = [
+        ("added", 7, 2), ("updated", 7, 3), ("reactivated", 8, 1),
+        ("unchanged", 7, 10), ("unchanged", 8, 4), ("deactivated", 9, 5),
+    ]
+    copied = []
+
+    class FakeCursor:
+        def copy_expert(self, sql, f):
+            copied.append(sql)
+            f.write("дія,артикул\nadded,1\n")
+
+        def close(self):
+            pass
+
+    class FakeSession:
+        def execute(self, stmt):
+            return summary_rows if "GROUP BY дія" in str(stmt) else None
+
+        def connection(self):
+            return SimpleNamespace(connection=SimpleNamespace(cursor=FakeCursor))
+
+    diff_path = tmp_path / "diff.csv"
+    diff = product_import.diff_staged_products(FakeSession(), str(diff_path))
+
+    # updated, як і rowcount реального UPDATE, включає повторно активовані
+    assert (diff["added"], diff["updated"], diff["reactivated"], diff["deactivated"], diff["unchanged"]) == (2, 4, 1, 5, 14)
+    assert diff["total_in_file"] == 20 and diff["department_stats"] == {7: 15, 8: 5}
+    assert diff["affected_departments"] == {7: {"added": 2, "updated": 3}, 8: {"reactivated": 1}, 9: {"deactivated": 5}}
+    assert "TO STDOUT" in copied[0] and "<> 'unchanged'" in copied[0]
+    assert diff_path.read_text(encoding="utf-8").startswith("дія,артикул")
+
+
+def test_dry_run_never_merges_and_rolls_back(monkeypatch):
+    from database.orm import products
+
+    staged, executed = [], []
+    _patch_staging(monkeypatch, products, staged, executed)
+    monkeypatch.setattr(products, "merge_staged_products", lambda session: pytest.fail("merge у dry-run"))
+    monkeypatch.setattr(products, "diff_staged_products",
+                        lambda session, diff_path: {"added": 2, "diff_path": diff_path})
+
+    df = pd.DataFrame({"Артикул": ["52250196", "11111"], "Кількість": ["2", "1"]})
+    result = products._sync_smart_import(df, dry_run=True, diff_path="/tmp/x.csv")
+
+    assert result == {"added": 2, "diff_path": "/tmp/x.csv", "dry_run": True}
+    assert len(staged[0]) == 2
+    assert "COMMIT" not in executed and executed[-1] == "ROLLBACK"
+
+
+class _ShadowSession:
+    """Записує SQL тіньового імпорту; lock_free=False — блокування зайняте."""
+
+    def __init__(self, executed, lock_free=True):
+        self.executed = executed
+        self.lock_free = lock_free
+
+    def execute(self, stmt, params=None):
+        sql = " ".join(str(stmt).split())
+        self.executed.append(sql)
+        return _Result(self.lock_free if "pg_try_advisory" in sql else 1)
+
+    def commit(self):
+        self.executed.append("COMMIT")
+
+    def rollback(self):
+        self.executed.append("ROLLBACK")
+
+
+class _Result(list):
+    """rowcount і scalar_one() для DML/лічильників, ітерація — (відділ, кількість)."""
+
+    rowcount = 1
+
+    def __init__(self, scalar):
+        super().__init__([(7, 2)])
+        self._scalar = scalar
+
+    def scalar_one(self):
+        return self._scalar
+
+
+def _patch_shadow(monkeypatch, products, executed, lock_free=True):
+    @contextmanager
+    def fake_pinned_session():
+        yield _ShadowSession(executed, lock_free)
+
+    monkeypatch.setattr(products, "IMPORT_WRITE_MODE", "shadow")
+    monkeypatch.setattr(products, "_pinned_sync_session", fake_pinned_session)
+    monkeypatch.setattr(products, "copy_rows",
+                        lambda session, rows, start_seq=0: executed.append("COPY") or start_seq + len(rows))
+
+
+def test_shadow_import_touches_products_only_in_one_final_transaction(monkeypatch):
+    from database.orm import products
+
+    executed = []
+    _patch_shadow(monkeypatch, products, executed)
+
+    parsed = [({"1": _row()}, 1), ({"2": _row()}, 1)]
+    result = products._sync_import_parsed(iter(parsed))
+
+    assert "pg_try_advisory_lock" in executed[0] and "pg_advisory_unlock" in executed[-1]
+    assert "ON COMMIT PRESERVE ROWS" in executed[1]
+    # Кожен пакет — окрема коротка транзакція
+    assert executed[2:7] == ["COMMIT", "COPY", "COMMIT", "COPY", "COMMIT"]
+
+    writes = [i for i, sql in enumerate(executed) if sql.startswith(("UPDATE products", "INSERT INTO products"))]
+    commits = [i for i, sql in enumerate(executed) if sql == "COMMIT"]
+    build = next(i for i, sql in enumerate(executed) if "CREATE TEMP TABLE products_import_shadow" in sql)
+    final_commit = next(i for i in commits if i > writes[0])
+    assert build < writes[0] and writes[-1] < final_commit
+    assert not [i for i in commits if build < i < writes[0]][1:]  # лише коміт побудови тіні
+    assert any(sql.startswith("DROP TABLE IF EXISTS products_import_shadow") for sql in executed[final_commit:])
+    assert result["added"] == 1 and result["department_stats"] == {7: 2}
+
+
+def test_shadow_import_refuses_to_overlap(monkeypatch):
+    from database.orm import product_import, products
+
+    executed = []
+    _patch_shadow(monkeypatch, products, executed, lock_free=False)
+
+    with pytest.raises(product_import.ImportInProgressError):
+        products._sync_import_parsed(iter([({"1": _row()}, 1)]))
+    assert len(executed) == 1 and "pg_try_advisory_lock" in executed[0]
+
+
+def test_shadow_import_cancelled_at_last_point_rolls_back_and_cleans_up(monkeypatch):
+    from database.orm import products
+    from utils.jobs import JobCancelled
+
+    executed = []
+    _patch_shadow(monkeypatch, products, executed)
+    def progress(stage, rows):
+        if stage == "committing":  # після apply_shadow, перед комітом
+            raise JobCancelled()
+
+    with pytest.raises(JobCancelled):
+        products._sync_import_parsed(iter([({"1": _row()}, 1)]), progress)
+
+    last_write = max(i for i, sql in enumerate(executed) if sql.startswith(("UPDATE products", "INSERT INTO products")))
+    assert executed[last_write + 1] == "ROLLBACK"
+    assert "COMMIT" not in executed[last_write:executed.index("ROLLBACK", last_write)]
+    assert any(sql.startswith("DROP TABLE IF EXISTS") for sql in executed[last_write:])
+    assert "pg_advisory_unlock" in executed[-1]
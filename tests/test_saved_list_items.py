@@ -0,0 +1,158 @@
+"""Saved list line items: bulk insert in the save transaction and SQL reports."""
+from contextlib import contextmanager
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+
+def _compile(stmt) -> str:
+    return str(stmt.compile(dialect=postgresql.dialect()))
+
+
+@pytest.mark.asyncio
+async def test_add_saved_list_inserts_header_and_items_in_two_statements():
+    from database.orm.archives import orm_add_saved_list
+
+    session = MagicMock()
+    header_result = MagicMock()
+    header_result.scalar_one.return_value = 7
+    session.execute = AsyncMock(return_value=header_result)
+    items = [
+        {"product_id": 1, "article_name": "111", "quantity": 2, "price": 10.0, "is_surplus": False},
+        {"product_id": 1, "article_name": "111", "quantity": 1.5, "price": 10.0, "is_surplus": True},
+    ]
+
+    assert await orm_add_saved_list(session, 42, "5_42_01-01-2026_10-00.xlsx", "/a/b.xlsx", items) == 7
+
+    assert session.execute.await_count == 2
+    header_sql = _compile(session.execute.await_args_list[0].args[0])
+    assert header_sql.startswith("INSERT INTO saved_lists")
+    assert "RETURNING saved_lists.id" in header_sql
+    items_stmt, rows = session.execute.await_args_list[1].args
+    assert _compile(items_stmt).startswith("INSERT INTO saved_list_items")
+    assert [row["list_id"] for row in rows] == [7, 7]
+    assert rows[1]["is_surplus"] is True
+
+
+def test_collected_report_is_single_aggregate_without_surplus(monkeypatch):
+    from database.orm import archives
+
+    executed = []
+    session = MagicMock()
+    session.execute.side_effect = lambda stmt: executed.append(stmt) or []
+
+    @contextmanager
+    def fake_sync_session():
+        yield session
+
+    monkeypatch.setattr(archives, "sync_session", fake_sync_session)
+
+    assert archives.orm_get_all_collected_items_sync() == []
+    sql = _compile(executed[0])
+    assert "JOIN saved_list_items ON saved_list_items.product_id = products.id" in sql
+    assert "saved_list_items.is_surplus IS false" in sql
+    assert "sum(saved_list_items.quantity) AS quantity" in sql
+    assert "GROUP BY products.id" in sql
+
+
+@pytest.fixture
+def sqlite_archive(monkeypatch):
+    """Справжні таблиці users / products / saved_lists / saved_list_items у SQLite з увімкненими FK."""
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.orm import sessionmaker
+
+    from database import models
+    from database.orm import archives
+
+    engine = create_engine("sqlite://")
+    event.listen(engine, "connect", lambda conn, _: conn.execute("PRAGMA foreign_keys=ON"))
+    tables = [models.User.__table__, models.Product.__table__, models.SavedList.__table__,
+              models.SavedListItem.__table__, models.ArchiveFile.__table__]
+    models.Base.metadata.create_all(engine, tables=tables)
+    session_factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(archives, "sync_session", session_factory)
+    return session_factory
+
+
+def _save_list_with_items(session_factory, created_at):
+    from database.models import SavedList, SavedListItem, User
+
+    with session_factory() as session:
+        if session.get(User, 1) is None:
+            session.add(User(id=1, first_name="Тест"))
+        saved = SavedList(user_id=1, file_name="list.xlsx", file_path="/a/list.xlsx", created_at=created_at)
+        session.add(saved)
+        session.flush()
+        session.add_all([SavedListItem(list_id=saved.id, article_name="111", quantity=2),
+                         SavedListItem(list_id=saved.id, article_name="222", quantity=1.5)])
+        session.commit()
+        return saved.id
+
+
+def _count(session_factory, model):
+    from sqlalchemy import func, select
+
+    with session_factory() as session:
+        return session.execute(select(func.count()).select_from(model)).scalar_one()
+
+
+def test_deleting_lists_with_items_cascades_to_items(sqlite_archive):
+    from datetime import datetime, timedelta
+
+    from database.models import SavedList, SavedListItem
+    from database.orm import archives
+
+    _save_list_with_items(sqlite_archive, datetime.utcnow() - timedelta(hours=48))
+    _save_list_with_items(sqlite_archive, datetime.utcnow())
+
+    assert archives.orm_delete_lists_older_than_sync(24) is True
+    assert _count(sqlite_archive, SavedList) == 1 and _count(sqlite_archive, SavedListItem) == 2
+
+    assert archives.orm_delete_all_saved_lists_sync() is True
+    assert _count(sqlite_archive, SavedList) == 0 and _count(sqlite_archive, SavedListItem) == 0
+
+
+def test_lists_backing_live_deferred_archives_are_kept(sqlite_archive):
+    from datetime import datetime, timedelta
+
+    from database.models import ArchiveFile, SavedList
+    from database.orm import archives
+
+    old = datetime.utcnow() - timedelta(hours=48)
+    deferred_id = _save_list_with_items(sqlite_archive, old)
+    on_disk_id = _save_list_with_items(sqlite_archive, old)
+    trashed_id = _save_list_with_items(sqlite_archive, old)
+    with sqlite_archive() as session:
+        for name, list_id, size, trashed in (("a.xlsx", deferred_id, 0, False),
+                                             ("b.xlsx", on_disk_id, 2048, False),
+                                             ("c.xlsx", trashed_id, 0, True)):
+            session.add(ArchiveFile(filename=name, user_id=1, department="5", created_at=old,
+                                    size=size, saved_list_id=list_id, is_trashed=trashed))
+        session.commit()
+
+    assert archives.orm_delete_lists_older_than_sync(24) is True
+    with sqlite_archive() as session:
+        assert [row.id for row in session.query(SavedList)] == [deferred_id]
+
+    assert archives.orm_delete_all_saved_lists_sync() is True
+    assert _count(sqlite_archive, SavedList) == 1
+
+
+def test_snapshot_for_interrupted_save_is_rebuilt_from_items(sqlite_archive):
+    from datetime import datetime
+
+    from database.models import SavedListItem
+    from utils.list_processor import _saved_list_snapshot_sync, saved_list_file_names
+
+    list_id = _save_list_with_items(sqlite_archive, datetime.utcnow())
+    with sqlite_archive() as session:
+        session.add(SavedListItem(list_id=list_id, article_name="333", quantity=4, price=2.5, is_surplus=True))
+        session.commit()
+
+    snapshot = _saved_list_snapshot_sync(list_id, 1, 7, "01-01-2026_10-00")
+
+    assert [row["Артикул"] for row in snapshot["in_stock_items"]] == ["111", "222"]
+    assert snapshot["surplus_items"] == [{"Артикул": "333", "Кількість": 4, "Ціна": 2.5, "Сума": 10.0}]
+    assert snapshot["total_surplus_sum"] == 10.0 and snapshot["list_id"] == list_id
+    assert saved_list_file_names(snapshot) == ["7_1_01-01-2026_10-00.xlsx", "лишки_7_1_01-01-2026_10-00.xlsx"]
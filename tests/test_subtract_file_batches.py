@@ -0,0 +1,119 @@
+"""Bot subtract file: streaming batches, header formats and all-or-nothing rollback."""
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+from openpyxl import Workbook
+
+
+def _write(path, rows):
+    wb = Workbook()
+    ws = wb.active
+    for row in rows:
+        ws.append(list(row))
+    wb.save(path)
+
+
+def _patch_stock(monkeypatch, products_map, executed):
+    """Fake sync session: SELECT → товар з products_map, UPDATE і COMMIT записуються."""
+    from database.orm import products
+
+    class FakeSession:
+        def execute(self, stmt):
+            if stmt.is_select:
+                article = stmt.whereclause.clauses[0].right.value
+                return SimpleNamespace(scalar_one_or_none=lambda: products_map.get(article))
+            executed.append("UPDATE")
+
+        def commit(self):
+            executed.append("COMMIT")
+
+    @contextmanager
+    def fake_sync_session():
+        try:
+            yield FakeSession()
+        except BaseException:
+            executed.append("ROLLBACK")
+            raise
+
+    monkeypatch.setattr(products, "sync_session", fake_sync_session)
+    monkeypatch.setattr(products, "orm_get_column_mapping_sync", lambda fingerprint: None)
+    monkeypatch.setattr(products, "orm_save_column_mapping_sync", lambda *args: None)
+
+
+def _product(product_id, stock="10"):
+    return SimpleNamespace(id=product_id, кількість=stock, ціна=2.0)
+
+
+def test_named_file_is_read_in_batches(tmp_path, monkeypatch):
+    from database.orm.products import _sync_subtract_collected_from_stock
+    from handlers.admin import report_handlers
+    from utils import excel_reader
+
+    path = tmp_path / "collected.xlsx"
+    _write(path, [
+        ("Назва", "Кількість"),
+        ("12345678 - Склянка", 2),
+        ("без артикула", 1),
+        ("87654321 - Тарілка", 3),
+        ("11112222 - Ложка", 1),
+    ])
+    monkeypatch.setattr(excel_reader, "BATCH_SIZE", 1)
+    monkeypatch.setattr(excel_reader, "read_excel_frame", None)  # цілий файл не читається
+
+    batches = list(report_handlers._iter_subtract_batches(str(path)))
+    assert [len(batch) for batch in batches] == [1, 0, 1, 1]
+
+    executed = []
+    _patch_stock(monkeypatch, {"12345678": _product(1), "87654321": _product(2)}, executed)
+    result = _sync_subtract_collected_from_stock(report_handlers._iter_subtract_batches(str(path)))
+
+    assert result == {"processed": 2, "not_found": 1, "errors": 0, "product_ids": [1, 2]}
+    assert executed == ["UPDATE", "UPDATE", "COMMIT"]
+
+
+def test_plain_file_keeps_first_row_as_data(tmp_path, monkeypatch):
+    from handlers.admin import report_handlers
+    from utils import excel_reader
+
+    path = tmp_path / "collected.xlsx"
+    _write(path, [(12345678, 2), (87654321, 3), (11112222, 1)])
+    monkeypatch.setattr(excel_reader, "BATCH_SIZE", 1)
+
+    batches = list(report_handlers._iter_subtract_batches(str(path)))
+
+    assert [batch.values.tolist() for batch in batches] == [
+        [[12345678, 2]], [[87654321, 3]], [[11112222, 1]],
+    ]
+    assert all(list(batch.columns) == ["артикул", "кількість"] for batch in batches)
+
+
+def test_invalid_later_batch_rolls_back_whole_file(tmp_path, monkeypatch):
+    from database.orm.products import _sync_subtract_collected_from_stock
+    from handlers.admin import report_handlers
+    from utils import excel_reader
+
+    path = tmp_path / "collected.xlsx"
+    _write(path, [
+        ("Назва", "Кількість"),
+        ("12345678 - Склянка", 2),
+        ("87654321 - Тарілка", "багато"),
+    ])
+    monkeypatch.setattr(excel_reader, "BATCH_SIZE", 1)
+    executed = []
+    _patch_stock(monkeypatch, {"12345678": _product(1)}, executed)
+
+    with pytest.raises(report_handlers.SubtractFileError):
+        _sync_subtract_collected_from_stock(report_handlers._iter_subtract_batches(str(path)))
+
+    assert executed == ["UPDATE", "ROLLBACK"]
+
+
+def test_unknown_layout_is_rejected_before_reading_rows(tmp_path):
+    from handlers.admin import report_handlers
+
+    path = tmp_path / "collected.xlsx"
+    _write(path, [("Артикул", "Відділ", "Кількість"), (12345678, 7, 1)])
+
+    with pytest.raises(report_handlers.SubtractFileError):
+        next(report_handlers._iter_subtract_batches(str(path)))
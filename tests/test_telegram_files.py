@@ -0,0 +1,90 @@
+"""Telegram file_id reuse: resend by id, rebuild only when the manifest changes or the id is rejected."""
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+from aiogram.exceptions import TelegramBadRequest
+
+
+def _archive(filename, size=100, items_count=2, total_sum=20.0):
+    return SimpleNamespace(filename=filename, size=size, items_count=items_count, total_sum=total_sum)
+
+
+def test_manifest_key_ignores_order_and_tracks_changes():
+    from utils.telegram_files import manifest_key
+
+    a, b = _archive("a.xlsx"), _archive("b.xlsx")
+    assert manifest_key("zip:1", [a, b]) == manifest_key("zip:1", [b, a])
+    assert manifest_key("zip:1", [a, b]) != manifest_key("zip:1", [a])
+    assert manifest_key("zip:1", [a]) != manifest_key("zip:1", [_archive("a.xlsx", size=101)])
+    assert manifest_key("zip:1", [a]) != manifest_key("zip:2", [a])
+
+
+def _patch_cache(monkeypatch, stored=None):
+    from utils import telegram_files
+
+    cache = dict(stored or {})
+
+    async def get(key):
+        return cache.get(key)
+
+    async def save(key, file_id):
+        cache[key] = file_id
+
+    async def delete(key):
+        cache.pop(key, None)
+
+    monkeypatch.setattr(telegram_files, "orm_get_telegram_file_id", get)
+    monkeypatch.setattr(telegram_files, "orm_save_telegram_file_id", save)
+    monkeypatch.setattr(telegram_files, "orm_delete_telegram_file_id", delete)
+    return cache
+
+
+@pytest.mark.asyncio
+async def test_send_cached_document_uploads_once_then_reuses_file_id(tmp_path, monkeypatch):
+    from utils.telegram_files import send_cached_document
+
+    cache = _patch_cache(monkeypatch)
+    path = tmp_path / "a.zip"
+    path.write_bytes(b"zip")
+    build = AsyncMock(return_value=str(path))
+    bot = SimpleNamespace(send_document=AsyncMock(
+        return_value=SimpleNamespace(document=SimpleNamespace(file_id="FILE1"))
+    ))
+
+    assert await send_cached_document(bot, 1, "zip:k", build, "cap")
+    assert cache == {"zip:k": "FILE1"}
+    assert await send_cached_document(bot, 1, "zip:k", build, "cap")
+
+    assert build.await_count == 1
+    assert bot.send_document.await_args.kwargs["document"] == "FILE1"
+
+
+@pytest.mark.asyncio
+async def test_send_cached_document_rebuilds_when_file_id_rejected(tmp_path, monkeypatch):
+    from utils.telegram_files import send_cached_document
+
+    cache = _patch_cache(monkeypatch, {"zip:k": "STALE"})
+    path = tmp_path / "a.zip"
+    path.write_bytes(b"zip")
+    build = AsyncMock(return_value=str(path))
+    uploaded = SimpleNamespace(document=SimpleNamespace(file_id="FRESH"))
+    bot = SimpleNamespace(send_document=AsyncMock(side_effect=[
+        TelegramBadRequest(method=None, message="wrong file identifier"),
+        uploaded,
+    ]))
+
+    assert await send_cached_document(bot, 1, "zip:k", build, "cap")
+    assert build.await_count == 1
+    assert cache == {"zip:k": "FRESH"}
+
+
+@pytest.mark.asyncio
+async def test_send_cached_document_reports_missing_file(monkeypatch):
+    from utils.telegram_files import send_cached_document
+
+    _patch_cache(monkeypatch)
+    bot = SimpleNamespace(send_document=AsyncMock())
+
+    assert not await send_cached_document(bot, 1, "archive:k", AsyncMock(return_value=None), "cap")
+    bot.send_document.assert_not_awaited()
@@ -0,0 +1,30 @@
+"""Streaming ZIP generation for archive bundles."""
+import io
+import os
+import zipfile
+
+
+def test_iter_zip_streams_valid_archive_with_stored_xlsx(tmp_path):
+    from utils.zip_stream import iter_zip
+
+    xlsx = tmp_path / "5_1_01-01-2026_10-00.xlsx"
+    xlsx.write_bytes(os.urandom(150_000))
+    txt = tmp_path / "notes.txt"
+    txt.write_bytes(b"abc" * 1000)
+
+    chunks = list(iter_zip(
+        [(str(xlsx), xlsx.name), (str(txt), txt.name), (str(tmp_path / "missing.xlsx"), "missing.xlsx")],
+        chunk_size=16 * 1024,
+    ))
+
+    # Жоден шматок не містить увесь файл — дані йдуть потоково
+    assert len(chunks) > 5
+    assert max(len(c) for c in chunks) < 150_000
+
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+    assert archive.testzip() is None
+    infos = {i.filename: i for i in archive.infolist()}
+    assert set(infos) == {xlsx.name, txt.name}
+    assert infos[xlsx.name].compress_type == zipfile.ZIP_STORED
+    assert infos[txt.name].compress_type == zipfile.ZIP_DEFLATED
+    assert archive.read(xlsx.name) == xlsx.read_bytes()
@@ -0,0 +1,91 @@
+# epicservice/utils/archive_cache.py
+"""
+Дисковий кеш xlsx, відрендерених на вимогу (ARCHIVE_STORAGE_MODE=deferred).
+
+Файли лежать в archives/cache у тій самій шардованій структурі, що й архів.
+Час доступу (atime) файлу — час останнього звернення: при кожному зверненні
+він виставляється явно (не залежить від noatime), а при перевищенні
+ARCHIVE_CACHE_MAX_MB витісняються файли з найстарішим atime (LRU), доки кеш
+не стане меншим за 90% ліміту. Час модифікації лишається часом рендерингу —
+з нього serve_file() бере стабільні Last-Modified/ETag.
+
+Кеш можна видалити повністю в будь-який момент — файли відрендеряться знову.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from config import ARCHIVE_CACHE_MAX_MB
+from utils.archive_manager import CACHE_DIR, prune_empty_dirs, sharded_path
+
+logger = logging.getLogger(__name__)
+
+CACHE_MAX_BYTES = ARCHIVE_CACHE_MAX_MB * 1024 * 1024
+# Після витіснення кеш займає не більше цієї частки ліміту
+EVICT_TO_RATIO = 0.9
+
+_lock = threading.Lock()
+# Приблизний розмір кешу з точки зору процесу (None — ще не рахувався).
+# Точний розмір перераховується скануванням лише при витісненні.
+_cache_bytes: Optional[int] = None
+
+
+def cache_path(filename: str) -> str:
+    return sharded_path(CACHE_DIR, filename)
+
+
+def get_cached(filename: str) -> Optional[str]:
+    """Шлях до файлу в кеші (з оновленням часу доступу, mtime не змінюється) або None."""
+    path = cache_path(filename)
+    try:
+        os.utime(path, ns=(time.time_ns(), os.stat(path).st_mtime_ns))
+    except FileNotFoundError:
+        return None
+    return path
+
+
+def _scan() -> List[Tuple[float, int, str]]:
+    entries = []
+    for root, _, files in os.walk(CACHE_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                stat_result = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat_result.st_atime, stat_result.st_size, path))
+    return entries
+
+
+def register_cached(path: str) -> None:
+    """Враховує щойно відрендерений файл і за потреби витісняє найстаріші."""
+    global _cache_bytes
+    with _lock:
+        if _cache_bytes is None:
+            _cache_bytes = sum(size for _, size, _ in _scan())
+        else:
+            _cache_bytes += os.path.getsize(path)
+        if _cache_bytes <= CACHE_MAX_BYTES:
+            return
+
+        entries = sorted(_scan())
+        total = sum(size for _, size, _ in entries)
+        target = CACHE_MAX_BYTES * EVICT_TO_RATIO
+        evicted = 0
+        for _, size, entry_path in entries:
+            if total <= target:
+                break
+            if entry_path == path:
+                continue  # щойно відрендерений файл зараз віддаватиметься
+            try:
+                os.remove(entry_path)
+            except FileNotFoundError:
+                pass
+            prune_empty_dirs(os.path.dirname(entry_path), CACHE_DIR)
+            total -= size
+            evicted += 1
+        _cache_bytes = total
+        logger.info(f"Кеш архіву: витіснено {evicted} файлів, зайнято {total // 1024} КБ")
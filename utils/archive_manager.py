@@ -1,18 +1,56 @@
 # epicservice/utils/archive_manager.py
+"""
+Керування файлами архіву списків (archives/active, archives/trash).
+
+Файли лежать у шардованій структурі
+`<active|trash>/<user_id % SHARD_COUNT>/<user_id>/<yyyy-mm>/<filename>`,
+щоб жодна директорія не розросталась. Ім'я файлу лишається унікальним
+ключем (індекс, URL завантаження), а шлях на диску визначає
+resolve_archive_path(); файли старої пласкої структури теж знаходяться
+(переносяться скриптом scripts/migrate_archive_layout.py).
+
+У режимі ARCHIVE_STORAGE_MODE=deferred запис індексу може не мати файлу:
+xlsx рендериться з saved_list_items при першому завантаженні в
+archives/cache (list_processor.materialize_archive, utils/archive_cache.py).
+
+Перелік файлів береться з індексу archive_files у БД, а не зі сканування
+директорій: індекс оновлюється при збереженні, ротації та видаленні.
+Звірка індексу з файловою системою — reconcile_archive_index()
+(scripts/reconcile_archive_index.py), а не частина запитів.
+"""
 
 import logging
 import os
 import shutil
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Tuple
+from typing import Dict, List, Tuple
+
+import openpyxl
 
 from config import ARCHIVES_PATH
+from database.orm import (orm_delete_archive_files,
+                          orm_delete_archive_files_sync,
+                          orm_get_all_archive_files,
+                          orm_get_all_archive_files_sync,
+                          orm_get_archive_file,
+                          orm_get_archive_files_without_summary_sync,
+                          orm_get_trashed_archive_files_before_sync,
+                          orm_get_user_archive_files,
+                          orm_get_user_archive_files_sync,
+                          orm_mark_archive_files_trashed_sync,
+                          orm_set_archive_file_summary_sync,
+                          orm_upsert_archive_file_sync)
 
 logger = logging.getLogger(__name__)
 
 ACTIVE_DIR = os.path.join(ARCHIVES_PATH, "active")
 TRASH_DIR = os.path.join(ARCHIVES_PATH, "trash")
+# xlsx, відрендерені на вимогу з БД (ARCHIVE_STORAGE_MODE=deferred), див. utils/archive_cache.py
+CACHE_DIR = os.path.join(ARCHIVES_PATH, "cache")
+
+# Кількість шардів верхнього рівня: active/<user_id % SHARD_COUNT>/...
+SHARD_COUNT = 256
 
 
 def ensure_archive_dirs():
@@ -23,6 +61,7 @@ def ensure_archive_dirs():
     try:
         os.makedirs(ACTIVE_DIR, exist_ok=True)
         os.makedirs(TRASH_DIR, exist_ok=True)
+        os.makedirs(CACHE_DIR, exist_ok=True)
         logger.info(f"Архівні директорії готові: {ACTIVE_DIR}, {TRASH_DIR}")
     except Exception as e:
         logger.error(f"Помилка створення архівних папок: {e}", exc_info=True)
@@ -64,76 +103,233 @@ def parse_filename(filename: str) -> dict | None:
         return None
 
 
-def get_user_archives(user_id: int) -> List[Tuple[str, datetime]]:
+def sharded_path(base: str, filename: str) -> str:
+    """
+    Шлях файлу в шардованій структурі директорії base:
+    <base>/<user_id % SHARD_COUNT>/<user_id>/<yyyy-mm>/<filename>.
+    Файли з назвою не за форматом архіву лежать у корені base.
+    """
+    parsed = parse_filename(filename)
+    if not parsed:
+        return os.path.join(base, filename)
+    user_id = parsed["user_id"]
+    return os.path.join(
+        base, str(user_id % SHARD_COUNT), str(user_id), parsed["timestamp"].strftime("%Y-%m"), filename
+    )
+
+
+def archive_path(filename: str, trashed: bool = False) -> str:
+    """Шлях, за яким файл має лежати в archives/active (або trash)."""
+    return sharded_path(TRASH_DIR if trashed else ACTIVE_DIR, filename)
+
+
+def resolve_archive_path(filename: str, trashed: bool = False) -> str | None:
+    """
+    Шлях до наявного файлу архіву за його назвою: спочатку шардована
+    структура, потім стара пласка (ще не перенесені файли).
+    Повертає None, якщо файлу немає або назва містить шлях.
+    """
+    if not filename or os.path.basename(filename) != filename:
+        return None
+    base = TRASH_DIR if trashed else ACTIVE_DIR
+    for candidate in (archive_path(filename, trashed), os.path.join(base, filename)):
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def prune_empty_dirs(directory: str, base: str) -> None:
+    """Прибирає порожні директорії шардів від directory вгору до base (не включно)."""
+    base = os.path.abspath(base)
+    directory = os.path.abspath(directory)
+    while directory != base and directory.startswith(base + os.sep):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            return  # не порожня або вже видалена
+        directory = os.path.dirname(directory)
+
+
+def _remove_archive(file_path: str, base: str) -> None:
+    os.remove(file_path)
+    prune_empty_dirs(os.path.dirname(file_path), base)
+
+
+def _discard_cached(filename: str) -> None:
+    """Прибирає відрендерену на вимогу копію файлу з кешу, якщо вона є."""
+    file_path = sharded_path(CACHE_DIR, filename)
+    if os.path.isfile(file_path):
+        _remove_archive(file_path, CACHE_DIR)
+
+
+def _iter_archive_files(base: str):
+    """Всі xlsx у директорії архіву рекурсивно: (filename, шлях)."""
+    for root, _, files in os.walk(base):
+        for filename in files:
+            if filename.endswith(".xlsx"):
+                yield filename, os.path.join(root, filename)
+
+
+# Підсумкові рядки, які write_list_workbook дописує в кінець файлу
+SUMMARY_LABELS = ("", "К-ть артикулів:", "Зібрано на суму:")
+
+
+def read_archive_summary(file_path: str) -> Tuple[int, float]:
+    """
+    Рахує кількість позицій і суму з xlsx-файлу архіву.
+    Використовується лише для backfill старих файлів — нові файли
+    отримують підсумки при збереженні.
+    """
+    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        items_count = 0
+        total_sum = 0.0
+        for row in wb.active.iter_rows(min_row=2, values_only=True):
+            if not row or not row[0] or str(row[0]).strip() in SUMMARY_LABELS:
+                continue
+            items_count += 1
+            try:
+                if len(row) > 3 and row[3]:
+                    sum_value = row[3]
+                    if isinstance(sum_value, str):
+                        sum_value = sum_value.replace(' грн', '').replace(',', '.').strip()
+                    total_sum += float(sum_value)
+                else:
+                    qty = float(row[1]) if len(row) > 1 and row[1] else 0
+                    price = float(row[2]) if len(row) > 2 and row[2] else 0
+                    total_sum += qty * price
+            except (ValueError, TypeError, IndexError):
+                pass
+        return items_count, round(total_sum, 2)
+    finally:
+        wb.close()
+
+
+def register_archive_file(
+    file_path: str,
+    items_count: int | None = None,
+    total_sum: float | None = None,
+    saved_list_id: int | None = None,
+) -> None:
+    """
+    Додає щойно записаний файл archives/active до індексу разом з підсумками.
+    Синхронна — викликається з потоку рендерингу після запису файлу.
+    Помилка індексації лише логується: файл уже на диску, звірка його підхопить.
+    """
+    filename = os.path.basename(file_path)
+    try:
+        _upsert_index(filename, os.path.getsize(file_path), items_count, total_sum, saved_list_id)
+    except Exception as e:
+        logger.error(f"Помилка індексації архіву {filename}: {e}", exc_info=True)
+
+
+def register_deferred_archive(filename: str, items_count: int, total_sum: float, saved_list_id: int) -> None:
+    """
+    Додає до індексу архів без файлу на диску (ARCHIVE_STORAGE_MODE=deferred):
+    xlsx відрендериться з saved_list_items при першому завантаженні.
+    size=0 — розмір невідомий, доки файл не відрендерено.
+    Помилка пробрасується: без запису в індексі архів не буде видно.
+    """
+    _upsert_index(filename, 0, items_count, total_sum, saved_list_id)
+
+
+def _upsert_index(filename, size, items_count, total_sum, saved_list_id) -> None:
+    parsed = parse_filename(filename)
+    if not parsed:
+        logger.warning(f"Файл {filename} не відповідає формату архіву — не індексовано")
+        return
+    orm_upsert_archive_file_sync(
+        filename=filename,
+        user_id=parsed["user_id"],
+        department=parsed["department"],
+        created_at=parsed["timestamp"],
+        size=size,
+        is_surplus=filename.startswith("лишки_"),
+        items_count=items_count,
+        total_sum=total_sum,
+        saved_list_id=saved_list_id,
+    )
+
+
+async def get_user_archives(user_id: int) -> List[Tuple[str, datetime]]:
     """
-    Повертає список файлів конкретного юзера з archives/active/.
+    Повертає список активних файлів конкретного юзера (з індексу).
     
     Returns:
         Список кортежів (filename, timestamp), відсортований за датою (новіші спочатку)
     """
     try:
-        files = []
-        for filename in os.listdir(ACTIVE_DIR):
-            if not filename.endswith(".xlsx"):
-                continue
-            
-            parsed = parse_filename(filename)
-            if parsed and parsed["user_id"] == user_id:
-                files.append((filename, parsed["timestamp"]))
-        
-        # Сортуємо за датою (новіші спочатку)
-        files.sort(key=lambda x: x[1], reverse=True)
-        return files
+        return [(f.filename, f.created_at) for f in await orm_get_user_archive_files(user_id)]
     except Exception as e:
         logger.error(f"Помилка отримання архівів для user_id={user_id}: {e}", exc_info=True)
         return []
 
 
-def get_all_archives() -> List[Tuple[str, datetime, int]]:
+async def get_all_archives() -> List[Tuple[str, datetime, int]]:
     """
-    Повертає всі файли з archives/active/ (для адміна).
+    Повертає всі активні файли архіву (для адміна, з індексу).
     
     Returns:
         Список кортежів (filename, timestamp, user_id), відсортований за датою
     """
     try:
-        files = []
-        for filename in os.listdir(ACTIVE_DIR):
-            if not filename.endswith(".xlsx"):
-                continue
-            
-            parsed = parse_filename(filename)
-            if parsed:
-                files.append((filename, parsed["timestamp"], parsed["user_id"]))
-        
-        files.sort(key=lambda x: x[1], reverse=True)
-        return files
+        return [(f.filename, f.created_at, f.user_id) for f in await orm_get_all_archive_files()]
     except Exception as e:
         logger.error(f"Помилка отримання всіх архівів: {e}", exc_info=True)
         return []
 
 
+async def archive_download_validators(filename: str) -> Dict[str, object]:
+    """
+    Валідатори HTTP-кешу (size, last_modified) з індексу для serve_file().
+    Для архівів без файлу (size=0, deferred) повертає {} — відрендерений файл
+    може перегенеруватись після витіснення з кешу, тож беруться його stat:
+    mtime файлу в кеші — час рендерингу (звернення змінюють лише atime).
+    """
+    archive = await orm_get_archive_file(filename)
+    if not archive or not archive.size:
+        return {}
+    return {"size": archive.size, "last_modified": archive.created_at}
+
+
+async def delete_archive_file(filename: str) -> bool:
+    """
+    Видаляє файл з archives/active (і кешу) та його запис в індексі.
+    Повертає False, якщо не було ні файлу на диску, ні запису в індексі.
+    """
+    file_path = resolve_archive_path(filename)
+    if file_path:
+        _remove_archive(file_path, ACTIVE_DIR)
+    _discard_cached(filename)
+    deleted = await orm_delete_archive_files([filename])
+    return file_path is not None or deleted > 0
+
+
 def rotate_user_files(user_id: int, limit: int = 10):
     """
     Ротація файлів юзера: залишає найновіші `limit` файлів,
     решту переміщує в trash/.
     """
     try:
-        user_files = get_user_archives(user_id)
+        user_files = orm_get_user_archive_files_sync(user_id)
         
         if len(user_files) <= limit:
             return  # Ротація не потрібна
         
         # Файли, які треба перемістити в trash
-        files_to_move = user_files[limit:]
+        files_to_move = [f.filename for f in user_files[limit:]]
         
-        for filename, _ in files_to_move:
-            src = os.path.join(ACTIVE_DIR, filename)
-            dst = os.path.join(TRASH_DIR, filename)
-            
-            if os.path.exists(src):
+        for filename in files_to_move:
+            src = resolve_archive_path(filename)
+            if src:
+                dst = archive_path(filename, trashed=True)
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
                 shutil.move(src, dst)
+                prune_empty_dirs(os.path.dirname(src), ACTIVE_DIR)
                 logger.info(f"Переміщено в trash: {filename}")
+            _discard_cached(filename)
+
+        orm_mark_archive_files_trashed_sync(files_to_move)
         
         logger.info(f"Ротація для user_id={user_id}: переміщено {len(files_to_move)} файлів")
     except Exception as e:
@@ -142,25 +338,22 @@ def rotate_user_files(user_id: int, limit: int = 10):
 
 def cleanup_trash(days: int = 14):
     """
-    Видаляє файли з trash/, які старіше вказаної кількості днів.
+    Видаляє файли з trash/, переміщені туди раніше ніж `days` днів тому.
     """
     try:
         cutoff_date = datetime.now() - timedelta(days=days)
+        expired = [f.filename for f in orm_get_trashed_archive_files_before_sync(cutoff_date)]
         deleted_count = 0
         
-        for filename in os.listdir(TRASH_DIR):
-            if not filename.endswith(".xlsx"):
-                continue
-            
-            filepath = os.path.join(TRASH_DIR, filename)
-            
-            # Перевіряємо дату модифікації файлу
-            file_mtime = datetime.fromtimestamp(os.path.getmtime(filepath))
-            
-            if file_mtime < cutoff_date:
-                os.remove(filepath)
+        for filename in expired:
+            filepath = resolve_archive_path(filename, trashed=True)
+            if filepath:
+                _remove_archive(filepath, TRASH_DIR)
                 deleted_count += 1
                 logger.info(f"Видалено з trash: {filename}")
+            _discard_cached(filename)
+
+        orm_delete_archive_files_sync(expired)
         
         if deleted_count > 0:
             logger.info(f"Очищення trash: видалено {deleted_count} файлів (старіше {days} днів)")
@@ -168,3 +361,125 @@ def cleanup_trash(days: int = 14):
             logger.info("Очищення trash: немає файлів для видалення")
     except Exception as e:
         logger.error(f"Помилка очищення trash: {e}", exc_info=True)
+
+
+def reconcile_archive_index() -> Dict[str, int]:
+    """
+    Звіряє індекс archive_files з вмістом archives/active та archives/trash.
+    - файли без запису в індексі додаються (trash: trashed_at = mtime файлу);
+    - записи, для яких файлу немає на диску, видаляються;
+    - розмір і стан trash оновлюються за фактичним розташуванням
+      (підсумки таких файлів перераховуються з xlsx).
+
+    Операція обслуговування (повне сканування) — не викликати в запитах.
+    """
+    ensure_archive_dirs()
+    indexed = {f.filename: f for f in orm_get_all_archive_files_sync()}
+    stats = {"added": 0, "updated": 0, "removed": 0, "skipped": 0}
+    seen = set()
+
+    for directory, is_trashed in ((ACTIVE_DIR, False), (TRASH_DIR, True)):
+        for filename, file_path in _iter_archive_files(directory):
+            if filename in seen:
+                continue
+            parsed = parse_filename(filename)
+            if not parsed:
+                stats["skipped"] += 1
+                continue
+            seen.add(filename)
+            size = os.path.getsize(file_path)
+            current = indexed.get(filename)
+            if current and current.size == size and current.is_trashed == is_trashed:
+                continue
+            try:
+                items_count, total_sum = read_archive_summary(file_path)
+            except Exception as e:
+                logger.warning(f"Не вдалося прочитати підсумки {filename}: {e}")
+                items_count, total_sum = None, None
+            trashed_at = None
+            if is_trashed:
+                trashed_at = (current.trashed_at if current and current.trashed_at
+                              else datetime.fromtimestamp(os.path.getmtime(file_path)))
+            orm_upsert_archive_file_sync(
+                filename=filename,
+                user_id=parsed["user_id"],
+                department=parsed["department"],
+                created_at=parsed["timestamp"],
+                size=size,
+                is_surplus=filename.startswith("лишки_"),
+                is_trashed=is_trashed,
+                trashed_at=trashed_at,
+                items_count=items_count,
+                total_sum=total_sum,
+            )
+            stats["updated" if current else "added"] += 1
+
+    # Записи без файлу, але з посиланням на збережений список, лишаються:
+    # xlsx рендериться з БД при завантаженні (ARCHIVE_STORAGE_MODE=deferred)
+    missing = [
+        filename for filename, archive in indexed.items()
+        if filename not in seen and not archive.saved_list_id
+    ]
+    orm_delete_archive_files_sync(missing)
+    stats["removed"] = len(missing)
+
+    logger.info(f"Звірка індексу архіву: {stats}")
+    return stats
+
+
+def backfill_archive_summaries() -> int:
+    """
+    Заповнює items_count / total_sum для записів індексу, де їх ще немає
+    (файли, збережені до появи підсумків). Повертає кількість оновлених.
+    """
+    updated = 0
+    for archive in orm_get_archive_files_without_summary_sync():
+        file_path = resolve_archive_path(archive.filename, trashed=archive.is_trashed)
+        if not file_path:
+            continue
+        try:
+            items_count, total_sum = read_archive_summary(file_path)
+        except Exception as e:
+            logger.warning(f"Не вдалося прочитати підсумки {archive.filename}: {e}")
+            continue
+        orm_set_archive_file_summary_sync(archive.filename, items_count, total_sum)
+        updated += 1
+    logger.info(f"Backfill підсумків архіву: оновлено {updated} файлів")
+    return updated
+
+
+def purge_active_archives() -> int:
+    """
+    Видаляє всі файли з archives/active (danger zone) разом з
+    директоріями шардів і весь кеш відрендерених файлів.
+    Індекс чиститься окремо. Повертає кількість файлів в archives/active.
+    """
+    deleted = 0
+    for _, file_path in list(_iter_archive_files(ACTIVE_DIR)):
+        _remove_archive(file_path, ACTIVE_DIR)
+        deleted += 1
+    shutil.rmtree(CACHE_DIR, ignore_errors=True)
+    return deleted
+
+
+def migrate_to_sharded_layout() -> Dict[str, int]:
+    """
+    Переносить файли старої пласкої структури (корінь active/ та trash/)
+    у шарди. Індекс не змінюється — він зберігає лише назви файлів.
+    Повторний запуск безпечний: перенесені файли вже не в корені.
+    """
+    ensure_archive_dirs()
+    stats = {"moved": 0, "skipped": 0}
+    for base, trashed in ((ACTIVE_DIR, False), (TRASH_DIR, True)):
+        for entry in list(os.scandir(base)):
+            if not entry.is_file() or not entry.name.endswith(".xlsx"):
+                continue
+            dst = archive_path(entry.name, trashed=trashed)
+            if dst == entry.path:
+                stats["skipped"] += 1  # назва не за форматом — лишається в корені
+                continue
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            os.replace(entry.path, dst)
+            stats["moved"] += 1
+    logger.info(f"Перенесення архіву в шардовану структуру: {stats}")
+    return stats
@@ -0,0 +1,184 @@
+# epicservice/utils/availability_events.py
+"""
+Живі оновлення доступних залишків для Mini App (Server-Sent Events).
+
+Шляхи, що змінюють відкладено чи кількість (збереження й примусове
+збереження списків, віднімання зібраного), публікують компактні дельти
+{product_id, available} у Redis pub/sub канал відділу; імпорт залишків
+змінює забагато товарів для дельт і публікує одну подію {"refresh": true}
+для всіх відділів. Тимчасові списки на `available` інших користувачів не
+впливають, тож додавання/видалення позицій нічого не публікує. Кожен процес webapp
+тримає ОДНУ підписку на Redis і роздає повідомлення локальним SSE-сесіям
+через черги, тож кількість з'єднань з Redis не залежить від кількості
+відкритих Mini App.
+
+Якщо Redis вимкнено (dev/тести) — повідомлення роздаються лише в межах
+поточного процесу з тим самим інтерфейсом.
+
+`available` у дельті = кількість − відкладено (як у /api/search без
+резерву самого користувача); клієнт сам віднімає власний резерв.
+"""
+
+import asyncio
+import contextlib
+import json
+import logging
+from collections import defaultdict
+from typing import AsyncIterator, Dict, Iterable, List, Set
+
+from sqlalchemy import select
+
+from config import REDIS_ENABLED, REDIS_URL
+from database.engine import async_session
+from database.models import Product
+
+logger = logging.getLogger(__name__)
+
+# Префікс каналу Redis: availability:{відділ}
+CHANNEL_PREFIX = "availability:"
+# Канал подій для всіх відділів (availability:all)
+ALL_DEPARTMENTS = "all"
+# Максимальна кількість непрочитаних пакетів на одну SSE-сесію
+SUBSCRIBER_QUEUE_SIZE = 100
+
+_redis = None
+_listener_task: asyncio.Task | None = None
+_subscribers: Dict[int, Set[asyncio.Queue]] = defaultdict(set)
+
+
+def _channel(department: int) -> str:
+    return f"{CHANNEL_PREFIX}{department}"
+
+
+def _get_redis():
+    """Ліниво створює Redis-клієнт процесу (або None, якщо Redis вимкнено)."""
+    global _redis
+    if not REDIS_ENABLED:
+        return None
+    if _redis is None:
+        from redis.asyncio import Redis
+        _redis = Redis.from_url(REDIS_URL, decode_responses=True)
+    return _redis
+
+
+def _dispatch_local(department, payload: dict) -> None:
+    """Кладе пакет у черги локальних підписників відділу (або всіх — для ALL_DEPARTMENTS)."""
+    if department == ALL_DEPARTMENTS:
+        queues = set().union(*_subscribers.values())
+    else:
+        queues = _subscribers.get(department, ())
+    for queue in list(queues):
+        if queue.full():
+            # Повільний клієнт: відкидаємо найстаріший пакет, а не блокуємо шину
+            with contextlib.suppress(asyncio.QueueEmpty):
+                queue.get_nowait()
+        queue.put_nowait(payload)
+
+
+async def _redis_listener() -> None:
+    """Єдина на процес підписка на availability:* з роздачею по відділах."""
+    redis = _get_redis()
+    pubsub = redis.pubsub()
+    await pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+    try:
+        async for message in pubsub.listen():
+            if message.get("type") != "pmessage":
+                continue
+            try:
+                department = str(message["channel"])[len(CHANNEL_PREFIX):]
+                if department != ALL_DEPARTMENTS:
+                    department = int(department)
+                payload = json.loads(message["data"])
+            except (ValueError, TypeError) as e:
+                logger.warning("Некоректне повідомлення availability: %s", e)
+                continue
+            _dispatch_local(department, payload)
+    finally:
+        with contextlib.suppress(Exception):
+            await pubsub.punsubscribe()
+            await pubsub.aclose()
+
+
+def _ensure_listener() -> None:
+    global _listener_task
+    if _get_redis() is None:
+        return
+    if _listener_task is None or _listener_task.done():
+        _listener_task = asyncio.create_task(_redis_listener())
+
+
+async def _publish(department, payload: dict) -> None:
+    redis = _get_redis()
+    if redis is None:
+        _dispatch_local(department, payload)
+        return
+    await redis.publish(_channel(department), json.dumps(payload))
+
+
+async def publish_availability(department: int, updates: List[dict]) -> None:
+    """Публікує пакет дельт {product_id, available} для відділу."""
+    if not updates:
+        return
+    await _publish(department, {"department": department, "updates": updates})
+
+
+async def publish_availability_refresh() -> None:
+    """
+    Подія {"refresh": true} для всіх відділів: клієнти перезапитують пошук.
+    Для масових змін (імпорт залишків), де дельти по товарах завеликі.
+    """
+    try:
+        await _publish(ALL_DEPARTMENTS, {"refresh": True})
+    except Exception as e:
+        logger.warning("Не вдалося опублікувати оновлення залишків після імпорту: %s", e)
+
+
+async def publish_products_availability(product_ids: Iterable[int]) -> None:
+    """
+    Зчитує актуальні залишки товарів і публікує дельти по їхніх відділах.
+    Викликається ПІСЛЯ коміту змін. Помилки лише логуються — живі оновлення
+    не повинні ламати основний сценарій.
+    """
+    ids = sorted({pid for pid in product_ids if pid})
+    if not ids:
+        return
+    try:
+        async with async_session() as session:
+            result = await session.execute(
+                select(Product.id, Product.відділ, Product.кількість, Product.відкладено)
+                .where(Product.id.in_(ids))
+            )
+            rows = result.all()
+
+        by_department: Dict[int, List[dict]] = defaultdict(list)
+        for product_id, department, quantity, reserved in rows:
+            try:
+                stock_qty = float(str(quantity).replace(',', '.'))
+            except (ValueError, TypeError):
+                stock_qty = 0.0
+            by_department[department].append({
+                "product_id": product_id,
+                "available": stock_qty - (reserved or 0),
+            })
+
+        for department, updates in by_department.items():
+            await publish_availability(department, updates)
+    except Exception as e:
+        logger.warning("Не вдалося опублікувати оновлення залишків %s: %s", ids, e)
+
+
+@contextlib.asynccontextmanager
+async def availability_subscription(departments: Iterable[int]) -> AsyncIterator[asyncio.Queue]:
+    """Реєструє чергу SSE-сесії для вказаних відділів на час контексту."""
+    queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+    dept_ids = set(departments)
+    for department in dept_ids:
+        _subscribers[department].add(queue)
+    _ensure_listener()
+    try:
+        yield queue
+    finally:
+        for department in dept_ids:
+            _subscribers[department].discard(queue)
+            if not _subscribers[department]:
+                _subscribers.pop(department, None)
@@ -0,0 +1,189 @@
+# epicservice/utils/excel_reader.py
+"""
+Потокове читання Excel для імпорту, віднімання та завантаження списків.
+Читається перший аркуш або заданий індексом sheet (list_sheets — назви).
+
+pd.read_excel відкриває книгу openpyxl у повному режимі: у пам'яті опиняються
+всі клітинки зі стилями. Тут рядки читаються послідовно — python-calamine,
+якщо встановлений (швидший, підтримує і .xls), інакше openpyxl read_only —
+і віддаються пакетами DataFrame по batch_size рядків, тож пам'ять
+обмежена розміром пакета, а не файлу.
+
+Значення наближені до pd.read_excel: перший рядок — заголовок (порожні →
+"Unnamed: N", дублікати → "X.1"), повністю порожні рядки пропускаються,
+порожні рядки-значення → NaN, цілі float → int.
+"""
+
+import logging
+from io import BytesIO
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:  # необов'язкова залежність
+    CalamineWorkbook = None
+
+BATCH_SIZE = 20_000
+
+ExcelSource = Union[str, bytes, BinaryIO]
+
+
+def _open_calamine(source: ExcelSource):
+    if isinstance(source, str):
+        return CalamineWorkbook.from_path(source)
+    return CalamineWorkbook.from_filelike(BytesIO(source) if isinstance(source, bytes) else source)
+
+
+def _open_openpyxl(source: ExcelSource, data_only: bool = True):
+    import openpyxl
+
+    return openpyxl.load_workbook(
+        BytesIO(source) if isinstance(source, bytes) else source,
+        read_only=True,
+        data_only=data_only,
+    )
+
+
+def _iter_raw_rows_calamine(source: ExcelSource, sheet: int = 0) -> Iterator[tuple]:
+    yield from _open_calamine(source).get_sheet_by_index(sheet).iter_rows()
+
+
+def _iter_raw_rows_openpyxl(source: ExcelSource, sheet: int = 0) -> Iterator[tuple]:
+    workbook = _open_openpyxl(source)
+    try:
+        yield from workbook.worksheets[sheet].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def list_sheets(source: ExcelSource) -> List[str]:
+    """Назви аркушів книги в порядку файлу."""
+    if CalamineWorkbook is not None:
+        return list(_open_calamine(source).sheet_names)
+    workbook = _open_openpyxl(source)
+    try:
+        return list(workbook.sheetnames)
+    finally:
+        workbook.close()
+
+
+def _convert_cell(value):
+    if isinstance(value, str):
+        return value if value != "" else None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def iter_rows(source: ExcelSource, sheet: int = 0) -> Iterator[list]:
+    """Непорожні рядки аркуша (за замовчуванням першого) як списки значень (заголовок включно)."""
+    if CalamineWorkbook is not None:
+        raw_rows = _iter_raw_rows_calamine(source, sheet)
+    else:
+        raw_rows = _iter_raw_rows_openpyxl(source, sheet)
+    for raw in raw_rows:
+        row = [_convert_cell(value) for value in raw]
+        if any(value is not None for value in row):
+            yield row
+
+
+def _make_headers(row: list) -> List[str]:
+    """Заголовки як у pandas: порожні → "Unnamed: N", дублікати → "X.1", "X.2"."""
+    headers = []
+    seen = {}
+    for position, value in enumerate(row):
+        header = f"Unnamed: {position}" if value is None else value
+        if header in seen:
+            seen[header] += 1
+            header = f"{header}.{seen[header]}"
+        else:
+            seen[header] = 0
+        headers.append(header)
+    return headers
+
+
+def _frame(rows: List[list], headers: List[str]) -> pd.DataFrame:
+    width = len(headers)
+    # Рядки з read_only можуть бути коротші або довші за заголовок
+    rows = [row[:width] + [None] * (width - len(row)) for row in rows]
+    df = pd.DataFrame(rows, columns=headers)
+    return df.mask(df.isna())
+
+
+def iter_excel_batches(
+    source: ExcelSource, batch_size: Optional[int] = None, sheet: int = 0
+) -> Tuple[List[str], Iterator[pd.DataFrame]]:
+    """
+    Повертає (заголовки, генератор пакетів DataFrame).
+    Заголовки доступні одразу — для SmartColumnMapper досить першого рядка.
+    """
+    batch_size = batch_size or BATCH_SIZE
+    rows = iter_rows(source, sheet)
+    first = next(rows, None)
+    headers = _make_headers(first) if first is not None else []
+
+    def batches() -> Iterator[pd.DataFrame]:
+        try:
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    yield _frame(batch, headers)
+                    batch = []
+            if batch:
+                yield _frame(batch, headers)
+        finally:
+            rows.close()  # закриває книгу і при достроковій зупинці
+
+    return headers, batches()
+
+
+def read_excel_headers(source: ExcelSource, sheet: int = 0) -> List[str]:
+    """Лише рядок заголовків (файл далі не читається)."""
+    rows = iter_rows(source, sheet)
+    first = next(rows, None)
+    rows.close()
+    return _make_headers(first) if first is not None else []
+
+
+def read_excel_frame(source: ExcelSource, max_rows: Optional[int] = None) -> pd.DataFrame:
+    """
+    Весь аркуш (або перші max_rows рядків) одним DataFrame без стилів.
+    Для невеликих файлів, які обробляються цілком.
+    """
+    headers, batches = iter_excel_batches(source)
+    frames = []
+    total = 0
+    for frame in batches:
+        frames.append(frame)
+        total += len(frame)
+        if max_rows is not None and total >= max_rows:
+            batches.close()
+            break
+    if not frames:
+        return pd.DataFrame(columns=headers)
+    df = pd.concat(frames, ignore_index=True)
+    return df if max_rows is None else df.head(max_rows)
+
+
+def estimate_data_rows(source: ExcelSource, sheet: int = 0) -> Optional[int]:
+    """
+    Орієнтовна кількість рядків даних (без заголовка) за розмірністю аркуша
+    з XML .xlsx — сам аркуш не читається. Для прогресу/ETA; None, якщо
+    розмірність невідома (.xls, файл без <dimension>).
+    """
+    try:
+        workbook = _open_openpyxl(source, data_only=False)
+    except Exception:
+        return None
+    try:
+        max_row = workbook.worksheets[sheet].max_row
+    except Exception:
+        max_row = None
+    finally:
+        workbook.close()
+    return max(max_row - 1, 0) if max_row else None
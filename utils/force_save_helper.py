@@ -1,20 +1,44 @@
 # epicservice/utils/force_save_helper.py
 
+import asyncio
 import logging
 import os
 import shutil
+from typing import Awaitable, Callable, Dict, Iterable, Optional
 
 from aiogram import Bot
 from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
 from sqlalchemy.exc import SQLAlchemyError
 
+from config import FORCE_SAVE_CONCURRENCY
 from database.engine import async_session
 from handlers.common import clean_previous_keyboard
 from lexicon.lexicon import LEXICON
-from utils.list_processor import process_and_save_list
+from utils.availability_events import publish_products_availability
+from utils.list_processor import prepare_list_for_save, render_saved_list
 
 logger = logging.getLogger(__name__)
 
+# Результати фази збереження (до надсилання повідомлень)
+SAVE_SAVED = "saved"
+SAVE_EMPTY = "empty"
+SAVE_TRANSACTION_ERROR = "transaction_error"
+SAVE_UNEXPECTED_ERROR = "unexpected_error"
+
+FORCE_SAVED_MESSAGE = (
+    "✅ <b>Ваш список було примусово збережено адміністратором</b>\n\n"
+    "📁 Файл Excel доступний у розділі:\n"
+    "<b>Архів → Мої списки</b>\n\n"
+    "Відкрийте Mini App для перегляду."
+)
+FORCE_SAVED_MESSAGE_WEB = (
+    "✅ <b>Ваш список було примусово збережено адміністратором</b>\n\n"
+    "📁 Файл Excel доступний у розділі:\n"
+    "<b>Архів → Мої списки</b>\n\n"
+    "Відкрийте Mini App для перегляду та завантаження."
+)
+
 # Директорія для архівів (та ж сама що у archive_manager.py)
 ARCHIVES_DIR = os.path.join("archives", "active")
 
@@ -47,142 +71,148 @@ def _move_to_archives(temp_file_path: str) -> str:
     return archive_path
 
 
-async def force_save_user_list(user_id: int, bot: Bot, state: FSMContext) -> bool:
+async def _save_list(user_id: int) -> str:
     """
-    Примусово зберігає тимчасовий список користувача.
-    Використовується в боті з FSMContext.
-    Файли зберігаються в archives/active/ і автоматично відображаються в Mini App.
-    Користувач отримує повідомлення БЕЗ файлу з інструкцією.
+    Фаза збереження без Telegram: транзакція з резервами, публікація
+    залишків і рендеринг файлів після коміту. Повертає один із SAVE_*.
     """
-    main_list_path = None
-    surplus_list_path = None
-    archive_main_path = None
-    archive_surplus_path = None
-    
     try:
-        user_state = state
-        
         async with async_session() as session:
             async with session.begin():
-                # Генеруємо файли (вже зберігаються в ACTIVE_DIR)
-                main_list_path, surplus_list_path = await process_and_save_list(session, user_id)
-                
-                if not main_list_path and not surplus_list_path:
-                    return True
-                
-                # Файли вже збережено в archives/active/ — просто фіксуємо шляхи,
-                # щоб блок finally не видалив їх.
-                archive_main_path = main_list_path
-                archive_surplus_path = surplus_list_path
-
-        # Прибираємо клавіатуру з попереднього головного меню користувача
-        await clean_previous_keyboard(user_state, bot, user_id)
-        
-        # Надсилаємо повідомлення БЕЗ файлу
-        message = (
-            "✅ <b>Ваш список було примусово збережено адміністратором</b>\n\n"
-            "📁 Файл Excel доступний у розділі:\n"
-            "<b>Архів → Мої списки</b>\n\n"
-            "Відкрийте Mini App для перегляду."
-        )
-        
-        await bot.send_message(
-            user_id,
-            message,
-            parse_mode="HTML"
-        )
+                snapshot = await prepare_list_for_save(session, user_id)
 
-        logger.info(f"Примусове збереження завершено для користувача {user_id}")
-        return True
+        if not snapshot:
+            return SAVE_EMPTY
+
+        await publish_products_availability(snapshot["product_ids"])
+        # Файли рендеряться після коміту, поза event loop
+        await render_saved_list(snapshot)
+        return SAVE_SAVED
 
     except (SQLAlchemyError, ValueError) as e:
         logger.error("Помилка транзакції при примусовому збереженні для %s: %s", user_id, e, exc_info=True)
-        try:
-            await bot.send_message(user_id, LEXICON.TRANSACTION_ERROR)
-        except Exception as bot_error:
-            logger.warning("Не вдалося надіслати повідомлення про помилку користувачу %s: %s", user_id, bot_error)
-        return False
+        return SAVE_TRANSACTION_ERROR
     except Exception as e:
         logger.error("Неочікувана помилка при примусовому збереженні для %s: %s", user_id, e, exc_info=True)
-        try:
-            await bot.send_message(user_id, LEXICON.UNEXPECTED_ERROR)
-        except Exception as bot_error:
-            logger.warning("Не вдалося надіслати повідомлення про помилку користувачу %s: %s", user_id, bot_error)
-        return False
-    finally:
-        # Видаляємо ТІЛЬКИ якщо переміщення не відбулось (rollback)
-        if main_list_path and os.path.exists(main_list_path) and not archive_main_path:
-            os.remove(main_list_path)
-        if surplus_list_path and os.path.exists(surplus_list_path) and not archive_surplus_path:
-            os.remove(surplus_list_path)
+        return SAVE_UNEXPECTED_ERROR
 
 
-async def force_save_user_list_web(user_id: int, bot: Bot) -> bool:
+async def _notify_user(
+    user_id: int,
+    bot: Bot,
+    outcome: str,
+    state: Optional[FSMContext] = None,
+    web: bool = False
+) -> bool:
     """
-    Спрощена версія для виклику з веб-API без FSMContext.
-    Файли зберігаються в archives/active/ і автоматично відображаються в Mini App.
-    Користувач отримує повідомлення БЕЗ файлу з інструкцією.
+    Надсилає користувачу повідомлення про результат примусового збереження.
+    Повертає True, якщо збереження було успішним (або списку не було).
     """
-    main_list_path = None
-    surplus_list_path = None
-    archive_main_path = None
-    archive_surplus_path = None
-    
     try:
-        async with async_session() as session:
-            async with session.begin():
-                # Генеруємо файли (вже зберігаються в ACTIVE_DIR)
-                main_list_path, surplus_list_path = await process_and_save_list(session, user_id)
-
-                if not main_list_path and not surplus_list_path:
-                    # Файли відсутні — виходимо з транзакції перед викликом Telegram API
-                    archive_main_path = None
-                    archive_surplus_path = None
-                else:
-                    # Файли вже збережено в archives/active/ — просто фіксуємо шляхи,
-                    # щоб блок finally не видалив їх.
-                    archive_main_path = main_list_path
-                    archive_surplus_path = surplus_list_path
-
-        # Телеграм-повідомлення надсилаємо ПІСЛЯ завершення транзакції
-        if not archive_main_path and not archive_surplus_path:
-            await bot.send_message(user_id, "⚠️ У вас немає активного списку для збереження")
+        if outcome == SAVE_SAVED:
+            if state is not None:
+                # Прибираємо клавіатуру з попереднього головного меню користувача
+                await clean_previous_keyboard(state, bot, user_id)
+            # Надсилаємо повідомлення БЕЗ файлу
+            await bot.send_message(
+                user_id,
+                FORCE_SAVED_MESSAGE_WEB if web else FORCE_SAVED_MESSAGE,
+                parse_mode="HTML"
+            )
+            return True
+        if outcome == SAVE_EMPTY:
+            if web:
+                await bot.send_message(user_id, "⚠️ У вас немає активного списку для збереження")
             return True
-        
-        # Надсилаємо повідомлення БЕЗ файлу
-        message = (
-            "✅ <b>Ваш список було примусово збережено адміністратором</b>\n\n"
-            "📁 Файл Excel доступний у розділі:\n"
-            "<b>Архів → Мої списки</b>\n\n"
-            "Відкрийте Mini App для перегляду та завантаження."
-        )
-        
         await bot.send_message(
             user_id,
-            message,
-            parse_mode="HTML"
+            LEXICON.TRANSACTION_ERROR if outcome == SAVE_TRANSACTION_ERROR else LEXICON.UNEXPECTED_ERROR
         )
-        
+    except Exception as bot_error:
+        logger.warning("Не вдалося надіслати повідомлення користувачу %s: %s", user_id, bot_error)
+        # Помилка Telegram не скасовує вже збережений список
+        return outcome in (SAVE_SAVED, SAVE_EMPTY)
+    return False
+
+
+async def force_save_user_list(user_id: int, bot: Bot, state: FSMContext) -> bool:
+    """
+    Примусово зберігає тимчасовий список користувача.
+    Використовується в боті з FSMContext.
+    Файли зберігаються в archives/active/ і автоматично відображаються в Mini App.
+    Користувач отримує повідомлення БЕЗ файлу з інструкцією.
+    """
+    outcome = await _save_list(user_id)
+    success = await _notify_user(user_id, bot, outcome, state=state)
+    if outcome == SAVE_SAVED:
+        logger.info(f"Примусове збереження завершено для користувача {user_id}")
+    return success
+
+
+async def force_save_user_list_web(user_id: int, bot: Bot) -> bool:
+    """
+    Спрощена версія для виклику з веб-API без FSMContext.
+    Файли зберігаються в archives/active/ і автоматично відображаються в Mini App.
+    Користувач отримує повідомлення БЕЗ файлу з інструкцією.
+    """
+    outcome = await _save_list(user_id)
+    # Телеграм-повідомлення надсилаємо ПІСЛЯ завершення транзакції
+    success = await _notify_user(user_id, bot, outcome, web=True)
+    if outcome == SAVE_SAVED:
         logger.info(f"Примусове збереження (веб) завершено для користувача {user_id}")
-        return True
+    return success
 
-    except (SQLAlchemyError, ValueError) as e:
-        logger.error("Помилка транзакції при примусовому збереженні (веб) для %s: %s", user_id, e, exc_info=True)
-        try:
-            await bot.send_message(user_id, LEXICON.TRANSACTION_ERROR)
-        except Exception as bot_error:
-            logger.warning("Не вдалося надіслати повідомлення про помилку користувачу %s: %s", user_id, bot_error)
-        return False
-    except Exception as e:
-        logger.error("Неочікувана помилка при примусовому збереженні (веб) для %s: %s", user_id, e, exc_info=True)
-        try:
-            await bot.send_message(user_id, LEXICON.UNEXPECTED_ERROR)
-        except Exception as bot_error:
-            logger.warning("Не вдалося надіслати повідомлення про помилку користувачу %s: %s", user_id, bot_error)
-        return False
-    finally:
-        # Видаляємо ТІЛЬКИ якщо переміщення не відбулось (rollback)
-        if main_list_path and os.path.exists(main_list_path) and not archive_main_path:
-            os.remove(main_list_path)
-        if surplus_list_path and os.path.exists(surplus_list_path) and not archive_surplus_path:
-            os.remove(surplus_list_path)
+
+async def force_save_all(
+    user_ids: Iterable[int],
+    bot: Bot,
+    storage: Optional[BaseStorage] = None,
+    progress: Optional[Callable[[int, int], Awaitable[None]]] = None,
+    concurrency: int = FORCE_SAVE_CONCURRENCY
+) -> Dict[int, bool]:
+    """
+    Примусово зберігає списки кількох користувачів паралельно.
+
+    Збереження (транзакція + файли) виконуються одночасно, але не більше
+    ніж `concurrency` за раз — щоб не вичерпати пул з'єднань БД.
+    Після кожного завершеного збереження викликається progress(done, total).
+    Повідомлення в Telegram надсилаються пакетом ПІСЛЯ всіх комітів.
+    storage (FSM бота) потрібен, щоб прибрати клавіатуру попереднього меню;
+    без нього використовується веб-варіант повідомлення.
+
+    Повертає {user_id: успіх}.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    total = len(user_ids)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    outcomes: Dict[int, str] = {}
+    done = 0
+
+    async def _save_one(user_id: int) -> None:
+        nonlocal done
+        async with semaphore:
+            outcomes[user_id] = await _save_list(user_id)
+        done += 1
+        if progress:
+            try:
+                await progress(done, total)
+            except Exception as e:
+                logger.warning("Не вдалося оновити прогрес примусового збереження: %s", e)
+
+    await asyncio.gather(*(_save_one(user_id) for user_id in user_ids))
+
+    async def _notify_one(user_id: int) -> bool:
+        state = None
+        if storage is not None:
+            state = FSMContext(
+                storage=storage,
+                key=StorageKey(bot_id=bot.id, chat_id=user_id, user_id=user_id)
+            )
+        async with semaphore:
+            return await _notify_user(user_id, bot, outcomes[user_id], state=state, web=storage is None)
+
+    results = await asyncio.gather(*(_notify_one(user_id) for user_id in user_ids))
+    saved = sum(1 for outcome in outcomes.values() if outcome == SAVE_SAVED)
+    logger.info("Масове примусове збереження: %s/%s збережено, %s без списку", saved, total,
+                sum(1 for outcome in outcomes.values() if outcome == SAVE_EMPTY))
+    return dict(zip(user_ids, results))
@@ -0,0 +1,115 @@
+# epicservice/utils/import_jobs.py
+"""
+Фоновий імпорт залишків як задача utils.jobs — спільний для Mini App і бота.
+
+Імпорт іде в потоці (sync_session); ImportProgress — його колбек прогресу:
+пише у стан задачі стадію, кількість прочитаних рядків і ETA, а також
+перевіряє прапорець скасування. Скасування спрацьовує після чергового
+пакета або перед комітом — потік піднімає JobCancelled, і транзакція
+разом зі staging-таблицею відкочується повністю.
+
+Стадії: mapping → parsing → merging → committing → notifying (лише з
+розсилкою). committing повідомляється разом з останньою перевіркою
+скасування перед комітом: з цієї стадії скасування відповідає 409.
+Для кількох аркушів/книг у стані задачі є sheets — прогрес по аркушах.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, List, Optional
+
+from database.orm import orm_smart_import_sources
+from utils.availability_events import publish_availability_refresh
+from utils.import_sources import estimate_import_rows
+from utils.jobs import JobCancelled, is_cancel_requested, update_job
+
+logger = logging.getLogger(__name__)
+
+IMPORT_JOB_KIND = "import"
+
+STAGE_MAPPING = "mapping"
+STAGE_PARSING = "parsing"
+STAGE_MERGING = "merging"
+STAGE_COMMITTING = "committing"
+STAGE_NOTIFYING = "notifying"
+# Після останньої перевірки перед комітом скасування вже нічого не відкотить
+CANCELLABLE_STAGES = (STAGE_MAPPING, STAGE_PARSING, STAGE_MERGING)
+
+# Не частіше ніж раз на стільки секунд пишемо прогрес (зміна стадії — завжди)
+PROGRESS_INTERVAL = 1.0
+
+OnJobUpdate = Callable[[dict], Awaitable[None]]
+
+
+class ImportProgress:
+    """
+    progress(stage, rows) для потоку імпорту. Виклики з потоку передаються
+    в event loop через run_coroutine_threadsafe і чекають на нього, тож
+    скасування перевіряється синхронно в кожній точці.
+    """
+
+    def __init__(
+        self,
+        job_id: str,
+        loop: asyncio.AbstractEventLoop,
+        total_rows: Optional[int] = None,
+        on_update: Optional[OnJobUpdate] = None,
+        interval: Optional[float] = None,
+    ):
+        self.job_id = job_id
+        self.total_rows = total_rows
+        self._loop = loop
+        self._on_update = on_update
+        self._interval = PROGRESS_INTERVAL if interval is None else interval
+        self._stage = None
+        self._last_report = 0.0
+        self._parsing_started = None
+
+    def __call__(self, stage: str, rows: int = 0, sheets: Optional[list] = None) -> None:
+        if self._wait(is_cancel_requested(self.job_id)):
+            raise JobCancelled()
+        now = time.monotonic()
+        if stage == STAGE_PARSING and self._parsing_started is None:
+            self._parsing_started = now
+        if stage == self._stage and now - self._last_report < self._interval:
+            return
+        self._stage, self._last_report = stage, now
+        details = {"sheets": sheets} if sheets is not None else {}
+        self._wait(self._publish(stage, rows, self.eta_seconds(stage, rows, now), details))
+
+    def eta_seconds(self, stage: str, rows: int, now: float) -> Optional[int]:
+        """Залишок часу читання файлу за поточною швидкістю (None — невідомо)."""
+        if stage != STAGE_PARSING or not self.total_rows or not rows or self._parsing_started is None:
+            return None
+        elapsed = now - self._parsing_started
+        remaining = max(self.total_rows - rows, 0)
+        return round(elapsed / rows * remaining)
+
+    async def _publish(self, stage: str, rows: int, eta: Optional[int], details: dict) -> None:
+        job = await update_job(self.job_id, stage=stage, rows=rows, eta_seconds=eta, **details)
+        if job is not None and self._on_update is not None:
+            try:
+                await self._on_update(job)
+            except Exception as e:
+                logger.warning("Не вдалося показати прогрес імпорту %s: %s", self.job_id, e)
+
+    def _wait(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+
+async def run_import_job(job_id: str, paths: List[str], on_update: Optional[OnJobUpdate] = None) -> dict:
+    """
+    Імпортує книги paths (див. utils.import_sources) у межах задачі job_id
+    і повертає результат імпорту. Піднімає JobCancelled (зміни відкочено)
+    або RuntimeError, якщо дані у файлах не розпізнано.
+    """
+    total_rows = await asyncio.to_thread(estimate_import_rows, paths)
+    await update_job(job_id, stage=STAGE_MAPPING, rows=0, total_rows=total_rows, eta_seconds=None)
+    progress = ImportProgress(job_id, asyncio.get_running_loop(), total_rows, on_update)
+    result = await orm_smart_import_sources(paths, progress)
+    if not result:
+        raise RuntimeError("Не вдалося розпізнати дані у файлі")
+    # Імпорт змінив кількість і скинув відкладено — відкриті Mini App перезапитують пошук
+    await publish_availability_refresh()
+    return result
@@ -0,0 +1,95 @@
+# epicservice/utils/import_sources.py
+"""
+Джерела імпорту залишків: одна книга (можливо, з аркушем на кожен відділ)
+або ZIP з кількома книгами.
+
+prepare_import_files розпаковує ZIP у робочу теку (лише .xlsx/.xls, без
+шляхів усередині архіву, з обмеженнями проти zip-бомб), list_import_sheets
+перелічує аркуші всіх книг у стабільному порядку — у ньому ж рядки
+потрапляють у staging, тож при дублікатах артикулу виграє пізніший аркуш.
+"""
+
+import logging
+import os
+import zipfile
+from typing import Dict, List, Optional
+
+from utils.excel_reader import estimate_data_rows, list_sheets, read_excel_headers
+
+logger = logging.getLogger(__name__)
+
+EXCEL_EXTENSIONS = (".xlsx", ".xls")
+UPLOAD_EXTENSIONS = EXCEL_EXTENSIONS + (".zip",)
+
+# Обмеження для ZIP: кількість книг і сумарний розмір після розпакування
+MAX_ZIP_FILES = 50
+MAX_ZIP_UNCOMPRESSED_BYTES = 1024 * 1024 * 1024
+
+
+class ImportSourceError(ValueError):
+    """Файл не можна використати як джерело імпорту (порожній/завеликий ZIP тощо)."""
+
+
+def prepare_import_files(path: str, workdir: str) -> List[str]:
+    """
+    Книги для імпорту: сам файл або книги з ZIP, розпаковані у workdir
+    (у порядку імен). Піднімає ImportSourceError для непридатного архіву.
+    """
+    if not zipfile.is_zipfile(path) or _is_excel_zip(path):
+        return [path]
+
+    with zipfile.ZipFile(path) as archive:
+        members = sorted(
+            (info for info in archive.infolist()
+             if not info.is_dir()
+             and not os.path.basename(info.filename).startswith((".", "~$"))
+             and "__MACOSX" not in info.filename
+             and info.filename.lower().endswith(EXCEL_EXTENSIONS)),
+            key=lambda info: info.filename,
+        )
+        if not members:
+            raise ImportSourceError("В архіві немає файлів Excel (.xlsx, .xls)")
+        if len(members) > MAX_ZIP_FILES:
+            raise ImportSourceError(f"Забагато файлів в архіві (максимум {MAX_ZIP_FILES})")
+        if sum(info.file_size for info in members) > MAX_ZIP_UNCOMPRESSED_BYTES:
+            raise ImportSourceError("Архів завеликий після розпакування")
+
+        paths = []
+        for position, info in enumerate(members):
+            # Лише базове ім'я у підтеці-позиції: без виходу за workdir і колізій імен
+            target_dir = os.path.join(workdir, f"{position:03d}")
+            os.makedirs(target_dir, exist_ok=True)
+            target = os.path.join(target_dir, os.path.basename(info.filename))
+            with archive.open(info) as src, open(target, "wb") as dst:
+                while chunk := src.read(1024 * 1024):
+                    dst.write(chunk)
+            paths.append(target)
+    return paths
+
+
+def _is_excel_zip(path: str) -> bool:
+    """.xlsx — теж ZIP; відрізняємо його за [Content_Types].xml у корені."""
+    with zipfile.ZipFile(path) as archive:
+        return "[Content_Types].xml" in archive.namelist()
+
+
+def list_import_sheets(paths: List[str]) -> List[Dict]:
+    """[{label, path, sheet}] — аркуші всіх книг; label «файл / аркуш» для кількох книг."""
+    sheets = []
+    for path in paths:
+        for index, name in enumerate(list_sheets(path)):
+            label = f"{os.path.basename(path)} / {name}" if len(paths) > 1 else name
+            sheets.append({"label": label, "path": path, "sheet": index})
+    return sheets
+
+
+def read_import_headers(paths: List[str]) -> List[List[str]]:
+    """Рядки заголовків усіх аркушів (для валідації до запуску імпорту)."""
+    return [read_excel_headers(s["path"], sheet=s["sheet"]) for s in list_import_sheets(paths)]
+
+
+def estimate_import_rows(paths: List[str]) -> Optional[int]:
+    """Сума оцінок рядків по всіх аркушах; None, якщо жодної оцінки немає."""
+    estimates = [estimate_data_rows(s["path"], sheet=s["sheet"]) for s in list_import_sheets(paths)]
+    known = [e for e in estimates if e is not None]
+    return sum(known) if known else None
@@ -0,0 +1,308 @@
+# epicservice/utils/jobs.py
+"""
+Реєстр фонових задач (збереження списків, імпорт тощо).
+
+Стан задачі — простий dict, що зберігається в Redis (`job:{id}` у JSON з TTL),
+тож статус видно з будь-якого воркера uvicorn. Якщо Redis вимкнено — стан
+живе в пам'яті поточного процесу з тим самим інтерфейсом.
+
+Статуси: pending → running → done | failed | cancelled.
+Скасування кооперативне: request_cancel ставить прапорець, а сама задача
+перевіряє is_cancel_requested у безпечних точках і піднімає JobCancelled.
+
+Задача виконується в процесі, що її запустив. Поки вона працює, процес
+оновлює heartbeat (`job:{id}:heartbeat` з коротким TTL) і записує себе в
+owner. Якщо процес зупинився посеред роботи, heartbeat зникає, і при
+наступному читанні (get_job, list_user_jobs, resume_stale_jobs на старті
+webapp) задача або перезапускається — для типів з register_job_resumer,
+не більше JOB_MAX_ATTEMPTS разів, — або завершується failed.
+"""
+
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from config import REDIS_ENABLED, REDIS_URL
+
+logger = logging.getLogger(__name__)
+
+# Скільки зберігається стан задачі після останнього оновлення
+JOB_TTL_SECONDS = 24 * 60 * 60
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+ACTIVE_STATUSES = (JOB_PENDING, JOB_RUNNING)
+
+# Як часто працююча задача оновлює heartbeat і через скільки без нього вона вважається перерваною
+JOB_HEARTBEAT_SECONDS = 15
+JOB_STALE_SECONDS = 60
+# Скільки разів задачу можна запустити (з урахуванням перезапусків після збою)
+JOB_MAX_ATTEMPTS = 3
+INTERRUPTED_ERROR = "Задачу перервано: обробник зупинився"
+
+# Процес, що виконує задачу (для діагностики)
+OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+_redis = None
+_local_jobs: Dict[str, dict] = {}
+_local_cancel_requests: set = set()
+_local_heartbeats: Dict[str, float] = {}
+# kind → resume(job) -> work: як продовжити перервану задачу цього типу
+_resumers: Dict[str, Callable[[dict], Callable[[], Awaitable[Dict[str, Any]]]]] = {}
+# Посилання на запущені задачі, щоб їх не прибрав GC до завершення
+_running_tasks: set = set()
+
+
+class JobCancelled(Exception):
+    """Задачу скасовано на вимогу користувача (піднімає сама задача)."""
+
+
+def _get_redis():
+    """Ліниво створює Redis-клієнт процесу (або None, якщо Redis вимкнено)."""
+    global _redis
+    if not REDIS_ENABLED:
+        return None
+    if _redis is None:
+        from redis.asyncio import Redis
+        _redis = Redis.from_url(REDIS_URL, decode_responses=True)
+    return _redis
+
+
+def _job_key(job_id: str) -> str:
+    return f"job:{job_id}"
+
+
+def _cancel_key(job_id: str) -> str:
+    return f"job:{job_id}:cancel"
+
+
+def _heartbeat_key(job_id: str) -> str:
+    return f"job:{job_id}:heartbeat"
+
+
+def _index_key(kind: str, user_id: int) -> str:
+    return f"jobs:{kind}:{user_id}"
+
+
+async def _store(job: dict) -> None:
+    redis = _get_redis()
+    if redis is None:
+        expired_before = time.time() - JOB_TTL_SECONDS
+        for job_id in [k for k, v in _local_jobs.items() if v["updated_at"] < expired_before]:
+            _local_jobs.pop(job_id, None)
+        _local_jobs[job["id"]] = job
+        return
+    await redis.set(_job_key(job["id"]), json.dumps(job, ensure_ascii=False), ex=JOB_TTL_SECONDS)
+
+
+async def create_job(kind: str, user_id: int, **data: Any) -> dict:
+    """Створює задачу зі статусом pending і додатковими полями data."""
+    now = time.time()
+    job = {
+        "id": uuid.uuid4().hex,
+        "kind": kind,
+        "user_id": user_id,
+        "status": JOB_PENDING,
+        "created_at": now,
+        "updated_at": now,
+        "error": None,
+        **data,
+    }
+    await _store(job)
+    redis = _get_redis()
+    if redis is not None:
+        index_key = _index_key(kind, user_id)
+        await redis.sadd(index_key, job["id"])
+        await redis.expire(index_key, JOB_TTL_SECONDS)
+    return job
+
+
+async def _load(job_id: str) -> Optional[dict]:
+    redis = _get_redis()
+    if redis is None:
+        return _local_jobs.get(job_id)
+    raw = await redis.get(_job_key(job_id))
+    return json.loads(raw) if raw else None
+
+
+async def get_job(job_id: str) -> Optional[dict]:
+    """
+    Повертає стан задачі або None, якщо її не існує (чи минув TTL).
+    Перервану задачу (без heartbeat) перезапускає або завершує failed.
+    """
+    job = await _load(job_id)
+    return await _recover_if_stale(job) if job else None
+
+
+async def update_job(job_id: str, **fields: Any) -> Optional[dict]:
+    """Оновлює поля задачі. Повертає новий стан або None."""
+    job = await _load(job_id)
+    if job is None:
+        return None
+    job.update(fields)
+    job["updated_at"] = time.time()
+    await _store(job)
+    return job
+
+
+async def request_cancel(job_id: str) -> None:
+    """
+    Просить задачу зупинитись. Прапорець зберігається окремо від стану задачі,
+    щоб його не перезаписали оновлення прогресу з іншого воркера.
+    """
+    redis = _get_redis()
+    if redis is None:
+        _local_cancel_requests.add(job_id)
+        return
+    await redis.set(_cancel_key(job_id), "1", ex=JOB_TTL_SECONDS)
+
+
+async def is_cancel_requested(job_id: str) -> bool:
+    redis = _get_redis()
+    if redis is None:
+        return job_id in _local_cancel_requests
+    return bool(await redis.exists(_cancel_key(job_id)))
+
+
+def register_job_resumer(kind: str, resume: Callable[[dict], Callable[[], Awaitable[Dict[str, Any]]]]) -> None:
+    """
+    Дозволяє перезапускати перервані задачі типу kind: resume(job) повертає
+    work для run_job, що доробляє задачу за даними з її стану.
+    """
+    _resumers[kind] = resume
+
+
+async def _beat(job_id: str) -> None:
+    redis = _get_redis()
+    if redis is None:
+        _local_heartbeats[job_id] = time.time()
+        return
+    await redis.set(_heartbeat_key(job_id), OWNER, ex=JOB_STALE_SECONDS)
+
+
+async def _claim(job_id: str) -> bool:
+    """Атомарно забирає перервану задачу (лише один процес перезапускає її)."""
+    redis = _get_redis()
+    if redis is None:
+        if time.time() - _local_heartbeats.get(job_id, 0) < JOB_STALE_SECONDS:
+            return False
+        _local_heartbeats[job_id] = time.time()
+        return True
+    return bool(await redis.set(_heartbeat_key(job_id), OWNER, ex=JOB_STALE_SECONDS, nx=True))
+
+
+async def _is_alive(job: dict) -> bool:
+    # Щойно створена задача ще могла не встигнути стартувати
+    if time.time() - job["updated_at"] < JOB_STALE_SECONDS:
+        return True
+    redis = _get_redis()
+    if redis is None:
+        return time.time() - _local_heartbeats.get(job["id"], 0) < JOB_STALE_SECONDS
+    return bool(await redis.exists(_heartbeat_key(job["id"])))
+
+
+async def _recover_if_stale(job: dict) -> dict:
+    if job["status"] not in ACTIVE_STATUSES or await _is_alive(job):
+        return job
+    resume = _resumers.get(job["kind"])
+    if resume is None or job.get("attempts", 0) >= JOB_MAX_ATTEMPTS:
+        logger.warning("Фонову задачу %s (%s) перервано, власник %s", job["id"], job["kind"], job.get("owner"))
+        return await update_job(job["id"], status=JOB_FAILED, error=INTERRUPTED_ERROR) or job
+    if not await _claim(job["id"]):
+        return job  # її вже перезапускає інший процес
+    logger.warning("Перезапуск перерваної задачі %s (%s), власник був %s", job["id"], job["kind"], job.get("owner"))
+    job = await update_job(job["id"], status=JOB_PENDING) or job
+    run_job(job, resume(job))
+    return job
+
+
+async def resume_stale_jobs() -> int:
+    """
+    Перевіряє всі активні задачі в Redis (викликається при старті webapp):
+    перервані перезапускаються або завершуються failed. Повертає кількість
+    переглянутих задач. Без Redis стан задач не переживає перезапуск — нічого робити.
+    """
+    redis = _get_redis()
+    if redis is None:
+        return 0
+    checked = 0
+    async for key in redis.scan_iter(match="job:*", count=500):
+        if key.count(":") != 1:
+            continue  # job:{id}:cancel / :heartbeat
+        await get_job(key.split(":", 1)[1])
+        checked += 1
+    return checked
+
+
+async def list_user_jobs(kind: str, user_id: int, active_only: bool = False) -> List[dict]:
+    """Повертає задачі користувача певного типу (від найстаріших)."""
+    redis = _get_redis()
+    if redis is None:
+        jobs = [await _recover_if_stale(j) for j in list(_local_jobs.values())
+                if j["kind"] == kind and j["user_id"] == user_id]
+    else:
+        index_key = _index_key(kind, user_id)
+        job_ids = await redis.smembers(index_key)
+        jobs = []
+        for job_id in job_ids:
+            job = await get_job(job_id)
+            if job is None:
+                # TTL задачі минув — прибираємо з індексу
+                await redis.srem(index_key, job_id)
+                continue
+            jobs.append(job)
+    if active_only:
+        jobs = [j for j in jobs if j["status"] in ACTIVE_STATUSES]
+    return sorted(jobs, key=lambda j: j["created_at"])
+
+
+def run_job(job: dict, work: Callable[[], Awaitable[Dict[str, Any]]]) -> asyncio.Task:
+    """
+    Запускає work() у фоні в поточному event loop і веде статус задачі.
+    Результат work() (dict) записується в поля задачі при завершенні;
+    JobCancelled з work() переводить задачу у cancelled. Поки work()
+    виконується, задача тримає heartbeat (див. опис модуля).
+    """
+    async def _heartbeat():
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+            try:
+                await _beat(job["id"])
+            except Exception as e:
+                logger.warning("Не вдалося оновити heartbeat задачі %s: %s", job["id"], e)
+
+    async def _runner():
+        job_id = job["id"]
+        heartbeat = asyncio.create_task(_heartbeat())
+        try:
+            await _beat(job_id)
+            current = await _load(job_id) or job
+            await update_job(job_id, status=JOB_RUNNING, owner=OWNER, attempts=current.get("attempts", 0) + 1)
+            result = await work() or {}
+            await update_job(job_id, status=JOB_DONE, **result)
+        except JobCancelled:
+            logger.info("Фонову задачу %s (%s) скасовано", job_id, job["kind"])
+            await update_job(job_id, status=JOB_CANCELLED)
+        except Exception as e:
+            logger.error("Фонова задача %s (%s) завершилась з помилкою: %s", job_id, job["kind"], e, exc_info=True)
+            await update_job(job_id, status=JOB_FAILED, error=str(e))
+        finally:
+            heartbeat.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await heartbeat
+            _local_cancel_requests.discard(job_id)
+            _local_heartbeats.pop(job_id, None)
+
+    task = asyncio.create_task(_runner())
+    _running_tasks.add(task)
+    task.add_done_callback(_running_tasks.discard)
+    return task
@@ -1,86 +1,223 @@
 # epicservice/utils/list_processor.py
 
+import asyncio
 import logging
 import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Any, Dict, List, Optional, Tuple
 
-import pandas as pd
+from openpyxl import Workbook
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from database.orm import (orm_clear_temp_list, orm_get_product_by_id,
-                          orm_get_temp_list, orm_update_reserved_quantity)
-from utils.archive_manager import ACTIVE_DIR, rotate_user_files
+from config import ARCHIVE_STORAGE_MODE, EXCEL_RENDER_WORKERS
+from database.orm import (orm_add_saved_list, orm_clear_temp_list,
+                          orm_get_archive_file_sync,
+                          orm_get_saved_list_items_sync, orm_get_temp_list,
+                          orm_lock_products_for_update,
+                          orm_update_reserved_quantity)
+from utils import archive_cache
+from utils.archive_manager import (archive_path, register_archive_file,
+                                   register_deferred_archive,
+                                   resolve_archive_path, rotate_user_files)
 
 logger = logging.getLogger(__name__)
 
+# Окремий пул для рендерингу xlsx: openpyxl не блокує event loop
+# і не конкурує з дефолтним executor'ом (імпорти, звіти).
+_EXCEL_EXECUTOR = ThreadPoolExecutor(
+    max_workers=EXCEL_RENDER_WORKERS, thread_name_prefix="excel-render"
+)
 
-async def _save_list_to_excel(
+EXCEL_HEADER = ["Артикул", "Кількість", "Ціна", "Сума"]
+
+
+def _list_file_name(user_id: int, department_id: Optional[int], timestamp: str, prefix: str = "") -> str:
+    department = department_id if department_id is not None else "list"
+    return f"{prefix}{department}_{user_id}_{timestamp}.xlsx"
+
+
+def saved_list_file_names(snapshot: Dict[str, Any]) -> List[str]:
+    """Імена файлів, які створить render_saved_list() для цього знімка."""
+    names = []
+    if snapshot["in_stock_items"]:
+        names.append(_list_file_name(snapshot["user_id"], snapshot["department_id"], snapshot["timestamp"]))
+    if snapshot["surplus_items"]:
+        names.append(_list_file_name(snapshot["user_id"], snapshot["department_id"], snapshot["timestamp"], "лишки_"))
+    return names
+
+
+def write_list_workbook(items: List[Dict[str, Any]], total_sum: float, file_path: str) -> None:
+    """
+    Записує xlsx списку: колонки Артикул, Кількість, Ціна, Сума + підсумки.
+
+    Використовує write-only режим openpyxl: рядки пишуться потоково,
+    пам'ять не залежить від розміру списку. Файл спочатку пишеться
+    під тимчасовим ім'ям і атомарно перейменовується.
+    """
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path), suffix=".part")
+    os.close(fd)
+    try:
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet()
+        ws.append(EXCEL_HEADER)
+        for item in items:
+            ws.append([item[column] for column in EXCEL_HEADER])
+
+        # Підсумки з порожніми клітинками для вирівнювання
+        ws.append([])
+        ws.append(["К-ть артикулів:", len(items)])
+        ws.append(["Зібрано на суму:", None, None, f"{total_sum:.2f} грн"])
+
+        wb.save(tmp_path)
+        os.replace(tmp_path, file_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _save_list_to_excel(
     items: List[Dict[str, Any]],
     user_id: int,
     department_id: Optional[int],
     total_sum: float,
-    prefix: str = ""
+    timestamp: str,
+    prefix: str = "",
+    list_id: Optional[int] = None,
 ) -> Optional[str]:
     """
-    Зберігає список товарів у файл Excel з новим форматом назви.
+    Синхронно зберігає список товарів у файл Excel (виконується в _EXCEL_EXECUTOR).
     Формат: {prefix}{department}_{user_id}_{dd-mm-yyyy}_{hh-mm}.xlsx
-    Зберігає в archives/active/
-    Колонки: Артикул, Кількість, Ціна, Сума
+    Зберігає в archives/active/ (шлях у шарді — archive_path)
+
+    У режимі ARCHIVE_STORAGE_MODE=deferred файл не пишеться: в індекс
+    додається запис із посиланням на збережений список, а xlsx рендериться
+    при першому завантаженні (materialize_archive).
     """
     if not items:
         return None
+    file_name = _list_file_name(user_id, department_id, timestamp, prefix)
+    file_path = archive_path(file_name)
+    summary = {"items_count": len(items), "total_sum": round(total_sum, 2), "saved_list_id": list_id}
     try:
-        timestamp = datetime.now().strftime("%d-%m-%Y_%H-%M")
-        
-        department = department_id if department_id is not None else "list"
-        file_name = f"{prefix}{department}_{user_id}_{timestamp}.xlsx"
-        
-        file_path = os.path.join(ACTIVE_DIR, file_name)
+        if ARCHIVE_STORAGE_MODE == "deferred" and list_id is not None:
+            register_deferred_archive(file_name, **summary)
+            logger.info(f"Список збережено без файлу (deferred): {file_name}, {len(items)} товарів")
+            return file_path
 
-        df = pd.DataFrame(items)
-        
-        # Підсумки з порожніми клітинками для вирівнювання
-        summary_df = pd.DataFrame([
-            {"Артикул": "", "Кількість": "", "Ціна": "", "Сума": ""},
-            {"Артикул": "К-ть артикулів:", "Кількість": len(df), "Ціна": "", "Сума": ""},
-            {"Артикул": "Зібрано на суму:", "Кількість": "", "Ціна": "", "Сума": f"{total_sum:.2f} грн"}
-        ])
-        
-        df_final = pd.concat([df, summary_df], ignore_index=True)
+        write_list_workbook(items, total_sum, file_path)
+        register_archive_file(file_path, **summary)
 
-        df_final.to_excel(file_path, index=False, header=['Артикул', 'Кількість', 'Ціна', 'Сума'])
-        
-        logger.info(f"Файл успішно збережено: {file_path} з {len(df)} товарами на суму {total_sum:.2f} грн")
+        logger.info(f"Файл успішно збережено: {file_path} з {len(items)} товарами на суму {total_sum:.2f} грн")
         return file_path
     except Exception as e:
         logger.error(f"Помилка збереження Excel файлу для користувача {user_id}: {e}", exc_info=True)
         return None
 
 
-async def process_and_save_list(
+def _render_saved_list_sync(snapshot: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+    """Рендерить обидва файли списку (основний + лишки) і виконує ротацію."""
+    user_id = snapshot["user_id"]
+    list_id = snapshot.get("list_id")
+    main_list_path = _save_list_to_excel(
+        snapshot["in_stock_items"], user_id, snapshot["department_id"],
+        snapshot["total_in_stock_sum"], snapshot["timestamp"], list_id=list_id
+    )
+    surplus_list_path = _save_list_to_excel(
+        snapshot["surplus_items"], user_id, snapshot["department_id"],
+        snapshot["total_surplus_sum"], snapshot["timestamp"], "лишки_", list_id=list_id
+    )
+
+    # Ротація файлів юзера (залишаємо 10 новіших, решту в trash)
+    rotate_user_files(user_id, limit=10)
+
+    return main_list_path, surplus_list_path
+
+
+def _archive_row(item) -> Dict[str, Any]:
+    """Рядок xlsx з позиції saved_list_items (як при збереженні)."""
+    quantity = int(item.quantity) if float(item.quantity).is_integer() else item.quantity
+    price = item.price or 0.0
+    return {"Артикул": item.article_name, "Кількість": quantity, "Ціна": price, "Сума": quantity * price}
+
+
+def materialize_archive_sync(filename: str) -> Optional[str]:
+    """
+    Шлях до файлу архіву, за потреби відрендереного з БД:
+    файл в archives/active → файл у кеші → рендер з saved_list_items у кеш.
+    None — файлу немає і відрендерити нема з чого (або він у trash).
+    """
+    path = resolve_archive_path(filename)
+    if path:
+        return path
+    path = archive_cache.get_cached(filename)
+    if path:
+        return path
+    archive = orm_get_archive_file_sync(filename)
+    if not archive or archive.is_trashed or not archive.saved_list_id:
+        return None
+    rows = [_archive_row(item) for item in orm_get_saved_list_items_sync(archive.saved_list_id, archive.is_surplus)]
+    if not rows:
+        return None
+    path = archive_cache.cache_path(filename)
+    write_list_workbook(rows, sum(row["Сума"] for row in rows), path)
+    archive_cache.register_cached(path)
+    logger.info(f"Архів відрендерено на вимогу: {filename}")
+    return path
+
+
+async def materialize_archive(filename: str) -> Optional[str]:
+    """materialize_archive_sync() у пулі рендерингу xlsx."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_EXCEL_EXECUTOR, materialize_archive_sync, filename)
+
+
+def _saved_item(product, quantity: float, price: float, is_surplus: bool) -> Dict[str, Any]:
+    """Рядок saved_list_items для позиції списку."""
+    return {
+        "product_id": product.id,
+        "article_name": product.артикул,
+        "quantity": quantity,
+        "price": price,
+        "is_surplus": is_surplus,
+    }
+
+
+async def prepare_list_for_save(
     session: AsyncSession,
     user_id: int
-) -> Tuple[Optional[str], Optional[str]]:
+) -> Optional[Dict[str, Any]]:
     """
-    Централізована функція для обробки та збереження тимчасового списку.
-    Всі операції з БД відбуваються в переданій сесії.
-    Після збереження викликає rotate_user_files для автоочищення.
+    Транзакційна частина збереження списку: блокує товари, розподіляє позиції
+    на основний список і лишки, записує список з позиціями (saved_lists /
+    saved_list_items), оновлює резерви та очищує тимчасовий список.
+    Всі операції з БД відбуваються в переданій сесії; файли НЕ пишуться.
+
+    Повертає знімок списку для render_saved_list() (або None, якщо список порожній).
+    Рендеринг слід викликати ПІСЛЯ коміту, щоб не тримати блокування рядків.
     """
     temp_list = await orm_get_temp_list(user_id, session=session)
     if not temp_list:
-        return None, None
+        return None
 
     department_id = temp_list[0].product.відділ
 
     in_stock_items, surplus_items = [], []
+    saved_items = []
     reservation_updates = []
     
     total_in_stock_sum = 0.0
     total_surplus_sum = 0.0
 
+    # Один запит блокує всі товари списку (ORDER BY id — без взаємних блокувань)
+    locked_products = await orm_lock_products_for_update(
+        session, [item.product_id for item in temp_list]
+    )
+
     for item in temp_list:
-        product = await orm_get_product_by_id(session, item.product_id, for_update=True)
+        product = locked_products.get(item.product_id)
         if not product:
             continue
 
@@ -102,6 +239,7 @@ async def process_and_save_list(
                 "Ціна": price,
                 "Сума": item_sum
             })
+            saved_items.append(_saved_item(product, item.quantity, price, is_surplus=False))
             total_in_stock_sum += item_sum
         else:
             if available > 0:
@@ -112,6 +250,7 @@ async def process_and_save_list(
                     "Ціна": price,
                     "Сума": available_sum
                 })
+                saved_items.append(_saved_item(product, available, price, is_surplus=False))
                 total_in_stock_sum += available_sum
             
             surplus_quantity = item.quantity - available
@@ -122,18 +261,64 @@ async def process_and_save_list(
                 "Ціна": price,
                 "Сума": surplus_sum
             })
+            saved_items.append(_saved_item(product, surplus_quantity, price, is_surplus=True))
             total_surplus_sum += surplus_sum
 
-
     if reservation_updates:
         await orm_update_reserved_quantity(session, reservation_updates)
 
-    main_list_path = await _save_list_to_excel(in_stock_items, user_id, department_id, total_in_stock_sum)
-    surplus_list_path = await _save_list_to_excel(surplus_items, user_id, department_id, total_surplus_sum, "лишки_")
+    await orm_clear_temp_list(user_id, session=session)
 
-    # Ротація файлів юзера (залишаємо 10 новіших, решту в trash)
-    rotate_user_files(user_id, limit=10)
+    snapshot = {
+        "user_id": user_id,
+        "department_id": department_id,
+        # Час збереження фіксується тут, а не в момент рендерингу
+        "timestamp": datetime.now().strftime("%d-%m-%Y_%H-%M"),
+        "in_stock_items": in_stock_items,
+        "surplus_items": surplus_items,
+        "total_in_stock_sum": total_in_stock_sum,
+        "total_surplus_sum": total_surplus_sum,
+        "product_ids": [update["product_id"] for update in reservation_updates],
+    }
+    snapshot["list_id"] = None
+    file_names = saved_list_file_names(snapshot)
+    if file_names:
+        snapshot["list_id"] = await orm_add_saved_list(
+            session, user_id, file_names[0], archive_path(file_names[0]), saved_items
+        )
+    return snapshot
 
-    await orm_clear_temp_list(user_id, session=session)
 
-    return main_list_path, surplus_list_path
+def _saved_list_snapshot_sync(list_id: int, user_id: int, department_id: Optional[int], timestamp: str) -> Dict[str, Any]:
+    groups = {}
+    for is_surplus in (False, True):
+        rows = [_archive_row(item) for item in orm_get_saved_list_items_sync(list_id, is_surplus)]
+        groups[is_surplus] = (rows, sum(row["Сума"] for row in rows))
+    return {
+        "user_id": user_id,
+        "department_id": department_id,
+        "timestamp": timestamp,
+        "in_stock_items": groups[False][0],
+        "surplus_items": groups[True][0],
+        "total_in_stock_sum": groups[False][1],
+        "total_surplus_sum": groups[True][1],
+        "product_ids": [],
+        "list_id": list_id,
+    }
+
+
+async def saved_list_snapshot(list_id: int, user_id: int, department_id: Optional[int], timestamp: str) -> Dict[str, Any]:
+    """
+    Знімок для render_saved_list(), відновлений із saved_list_items — щоб
+    доробити збереження, перерване після коміту (див. utils.jobs).
+    """
+    return await asyncio.to_thread(_saved_list_snapshot_sync, list_id, user_id, department_id, timestamp)
+
+
+async def render_saved_list(snapshot: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Рендерить файли збереженого списку в окремому пулі потоків.
+    Повертає (шлях основного списку, шлях лишків).
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_EXCEL_EXECUTOR, _render_saved_list_sync, snapshot)
@@ -0,0 +1,61 @@
+# epicservice/utils/telegram_files.py
+"""
+Повторна відправка документів у Telegram за file_id.
+
+Після першого завантаження Telegram повертає file_id, за яким той самий
+документ можна надіслати будь-якому чату без повторного завантаження.
+file_id зберігається в telegram_file_cache під ключем — хешем маніфесту
+(назва, розмір, підсумки) архівних файлів, тож зміна набору файлів
+дає новий ключ і новий документ, а незмінний — миттєву відправку.
+"""
+
+import hashlib
+import logging
+from typing import Awaitable, Callable, Iterable, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile
+
+from database.orm import (orm_delete_telegram_file_id, orm_get_telegram_file_id,
+                          orm_save_telegram_file_id)
+
+logger = logging.getLogger(__name__)
+
+
+def manifest_key(kind: str, archives: Iterable) -> str:
+    """Ключ кешу для набору записів archive_files: "<kind>:<sha256 маніфесту>"."""
+    manifest = "\n".join(sorted(
+        f"{a.filename}|{a.size}|{a.items_count}|{a.total_sum}" for a in archives
+    ))
+    return f"{kind}:{hashlib.sha256(manifest.encode()).hexdigest()}"
+
+
+async def send_cached_document(
+    bot: Bot,
+    chat_id: int,
+    cache_key: str,
+    build: Callable[[], Awaitable[Optional[str]]],
+    caption: str,
+) -> bool:
+    """
+    Надсилає документ за збереженим file_id; якщо його немає або Telegram
+    його відхилив — викликає build() (шлях до файлу або None), завантажує
+    файл і запам'ятовує новий file_id. Повертає False, якщо файлу немає.
+    """
+    file_id = await orm_get_telegram_file_id(cache_key)
+    if file_id:
+        try:
+            await bot.send_document(chat_id=chat_id, document=file_id, caption=caption)
+            return True
+        except TelegramBadRequest as e:
+            logger.warning("file_id для %s відхилено Telegram (%s), завантажуємо заново", cache_key, e)
+            await orm_delete_telegram_file_id(cache_key)
+
+    file_path = await build()
+    if not file_path:
+        return False
+    message = await bot.send_document(chat_id=chat_id, document=FSInputFile(file_path), caption=caption)
+    if message.document:
+        await orm_save_telegram_file_id(cache_key, message.document.file_id)
+    return True
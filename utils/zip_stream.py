@@ -0,0 +1,80 @@
+# epicservice/utils/zip_stream.py
+"""
+Потокова генерація ZIP-архівів для віддачі через StreamingResponse.
+
+ZIP пишеться в «несікабельний» буфер, з якого після кожного шматка файлу
+забираються готові байти, тож у пам'яті одночасно тримається лише один
+шматок (CHUNK_SIZE), незалежно від кількості та розміру файлів.
+
+xlsx вже стиснуті deflate всередині, тому додаються як ZIP_STORED —
+повторне стискання лише витрачає CPU.
+
+Генератор синхронний: StreamingResponse виконує його в пулі потоків,
+тож читання файлів не блокує event loop.
+"""
+
+import io
+import logging
+import os
+import zipfile
+from typing import Iterable, Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+# Розширення, які вже стиснуті і додаються без повторного стискання
+STORED_EXTENSIONS = (".xlsx", ".zip", ".jpg", ".jpeg", ".png", ".webp")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Буфер лише для запису без seek: zipfile пише дескриптори даних після файлів."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip(entries: Iterable[Tuple[str, str]], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Генерує ZIP з файлів entries = [(шлях на диску, ім'я в архіві), ...].
+    Відсутні файли пропускаються з попередженням.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, mode="w") as zf:
+        for path, arcname in entries:
+            if not os.path.isfile(path):
+                logger.warning(f"Файл для ZIP не знайдено, пропущено: {path}")
+                continue
+            zinfo = zipfile.ZipInfo.from_file(path, arcname)
+            zinfo.compress_type = (
+                zipfile.ZIP_STORED if arcname.lower().endswith(STORED_EXTENSIONS) else zipfile.ZIP_DEFLATED
+            )
+            with open(path, "rb") as src, zf.open(zinfo, mode="w") as dst:
+                while True:
+                    chunk = src.read(chunk_size)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    data = sink.take()
+                    if data:
+                        yield data
+            data = sink.take()
+            if data:
+                yield data
+    # Центральний каталог записується при закритті архіву
+    data = sink.take()
+    if data:
+        yield data
@@ -73,6 +73,13 @@ async def startup_event():
     except Exception:
         app.state.bot = None
 
+    # Фонові задачі, перервані зупинкою попереднього процесу (див. utils/jobs.py)
+    try:
+        from utils.jobs import resume_stale_jobs
+        await resume_stale_jobs()
+    except Exception as e:
+        print(f"⚠️ Не вдалося перевірити перервані фонові задачі: {e}")
+
 
 @app.on_event("shutdown")
 async def shutdown_event():
@@ -6,10 +6,11 @@
 import asyncio
 import logging
 import os
+import re
 import shutil
 import tempfile
-import zipfile
-from datetime import datetime
+import uuid
+from datetime import date, datetime, time, timedelta
 from pathlib import Path
 from typing import List, Optional
 
@@ -17,8 +18,8 @@ import openpyxl
 import pandas as pd
 from aiogram import Bot
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
-from fastapi import APIRouter, Depends, File, Header, HTTPException, UploadFile, Query
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import APIRouter, Depends, File, Header, HTTPException, Query, Request, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.background import BackgroundTasks
 from pydantic import BaseModel
 from sqlalchemy import text
@@ -26,12 +27,19 @@ from sqlalchemy.exc import SQLAlchemyError
 
 from config import ADMIN_IDS, ARCHIVES_PATH, BOT_TOKEN, WEBAPP_URL
 from database.orm import (
+    orm_delete_archive_files,
+    orm_delete_column_mapping,
+    orm_get_column_mapping,
+    orm_get_column_mappings,
+    orm_pin_column_mapping,
+    orm_get_archive_files_page,
     orm_get_all_collected_items_sync,
     orm_get_all_products_sync,
     orm_get_all_temp_list_items_sync,
     orm_get_all_users_sync,
     orm_get_users_with_active_lists,
-    orm_smart_import,
+    orm_get_users_with_archive_totals,
+    orm_smart_import_sources,
     orm_subtract_collected,
     orm_get_user_by_id,
 )
@@ -39,7 +47,17 @@ from database.orm.products import SmartColumnMapper
 from database.engine import async_session
 from database.models import Product, ProductPhoto
 from lexicon.lexicon import LEXICON
-from utils.force_save_helper import force_save_user_list_web
+from utils.archive_manager import (archive_download_validators, archive_path, get_all_archives,
+                                   purge_active_archives)
+from utils.availability_events import publish_products_availability
+from utils.force_save_helper import force_save_all, force_save_user_list_web
+from utils.import_sources import UPLOAD_EXTENSIONS, ImportSourceError, prepare_import_files, read_import_headers
+from utils.import_jobs import (CANCELLABLE_STAGES, IMPORT_JOB_KIND, STAGE_MAPPING, STAGE_NOTIFYING,
+                               run_import_job)
+from utils.jobs import ACTIVE_STATUSES, create_job, get_job, request_cancel, run_job, update_job
+from utils.list_processor import materialize_archive, materialize_archive_sync
+from utils.zip_stream import iter_zip
+from webapp.utils.file_serving import XLSX_MEDIA_TYPE, serve_file
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -93,6 +111,11 @@ class ForceSaveRequest(BaseModel):
     user_id: int
 
 
+class ColumnMappingRequest(BaseModel):
+    user_id: int
+    mapping: dict[str, str]  # {поле: заголовок колонки файлу}
+
+
 # === Допоміжні функції ===
 
 def cleanup_file(file_path: str):
@@ -105,9 +128,9 @@ def cleanup_file(file_path: str):
         logger.error(f"Помилка видалення файлу {file_path}: {e}")
 
 
-def _validate_excel_columns(df: pd.DataFrame) -> tuple[bool, str]:
+def _validate_excel_columns(headers: list) -> tuple[bool, str]:
     """Використовує SmartColumnMapper для перевірки наявності необхідних колонок."""
-    mapping = SmartColumnMapper.map_columns(df)
+    mapping = SmartColumnMapper.map_headers(headers)
     has_identity = "article" in mapping or "name" in mapping
     has_quantity = "quantity" in mapping or "stock_sum" in mapping
     if not has_identity:
@@ -117,6 +140,37 @@ def _validate_excel_columns(df: pd.DataFrame) -> tuple[bool, str]:
     return True, ""
 
 
+def _save_upload(source, destination: str) -> None:
+    with open(destination, "wb") as f:
+        shutil.copyfileobj(source, f, length=1024 * 1024)
+
+
+async def _stage_import_upload(file: UploadFile, user_id: int) -> tuple[str, list[str]]:
+    """
+    Зберігає завантаження у власну робочу теку і повертає (тека, книги):
+    сам файл або книги, розпаковані з ZIP. Теку прибирає викликач.
+    """
+    workdir = tempfile.mkdtemp(prefix=f"import_{user_id}_")
+    upload_path = os.path.join(workdir, "upload" + Path(file.filename).suffix.lower())
+    # Копіюванням шматками, без читання в пам'ять
+    await asyncio.to_thread(_save_upload, file.file, upload_path)
+    paths = await asyncio.to_thread(prepare_import_files, upload_path, workdir)
+    return workdir, paths
+
+
+def _validate_import_sheets(header_rows: list[list]) -> tuple[bool, str, list]:
+    """
+    Імпорт можливий, якщо хоча б один аркуш має потрібні колонки.
+    Повертає (успіх, помилка, заголовки першого придатного аркуша).
+    """
+    error_msg = "Файл не містить аркушів з даними."
+    for headers in header_rows:
+        is_valid, error_msg = _validate_excel_columns(headers)
+        if is_valid:
+            return True, "", headers
+    return False, error_msg, []
+
+
 def _format_import_report(result: dict) -> dict:
     """Форматує результат імпорту для JSON відповіді."""
     if not result:
@@ -126,10 +180,13 @@ def _format_import_report(result: dict) -> dict:
         "success": True,
         "added": result.get('added', 0),
         "updated": result.get('updated', 0),
+        "unchanged": result.get('unchanged', 0),
         "deactivated": result.get('deactivated', 0),
         "reactivated": result.get('reactivated', 0),
         "total_in_db": result.get('total_in_db', 0),
-        "department_stats": result.get('department_stats', {})
+        "department_stats": result.get('department_stats', {}),
+        # Лише для книг з кількома аркушами / ZIP
+        **({"sheets": result["sheets"]} if "sheets" in result else {}),
     }
 
 
@@ -317,40 +374,54 @@ async def get_active_users(user_id: int = Query(...)):
 
 
 @router.get("/archives")
-async def list_archives(user_id: int = Query(...)):
+async def list_archives(
+    user_id: int = Query(...),
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+    owner_id: Optional[int] = Query(None, description="Фільтр за користувачем-власником"),
+    department: Optional[str] = Query(None),
+    date_from: Optional[date] = Query(None),
+    date_to: Optional[date] = Query(None, description="Включно"),
+    surplus: Optional[bool] = Query(None, description="true — лише лишки, false — лише основні"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+):
     """
-    Отримати список всіх архівів користувачів.
-    Читає файли з /home/anubis/epicservice/archives/active.
+    Сторінка архівів користувачів з фільтрами та сортуванням за часом створення.
+    Читає індекс archive_files (без сканування archives/active).
     """
     verify_admin(user_id)
     try:
-        archives_dir = os.path.join(ARCHIVES_PATH, "active")
-        
-        if not os.path.exists(archives_dir):
-            return JSONResponse(content={
-                "success": True,
-                "files": [],
-                "message": "Папка архівів не існує"
-            })
-        
-        files = []
-        for filename in os.listdir(archives_dir):
-            filepath = os.path.join(archives_dir, filename)
-            if os.path.isfile(filepath) and filename.endswith('.xlsx'):
-                stat = os.stat(filepath)
-                files.append({
-                    "filename": filename,
-                    "size": stat.st_size,
-                    "modified": datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
-                })
-        
-        # Сортуємо за датою модифікації (новіші першими)
-        files.sort(key=lambda x: x['modified'], reverse=True)
-        
+        files, total = await orm_get_archive_files_page(
+            limit=limit,
+            offset=offset,
+            user_id=owner_id,
+            department=department.strip() if department and department.strip() else None,
+            date_from=datetime.combine(date_from, time.min) if date_from else None,
+            date_to=datetime.combine(date_to + timedelta(days=1), time.min) if date_to else None,
+            is_surplus=surplus,
+            newest_first=order == "desc",
+        )
         return JSONResponse(content={
             "success": True,
-            "files": files,
-            "count": len(files)
+            "files": [
+                {
+                    "filename": f.filename,
+                    "user_id": f.user_id,
+                    "department": f.department,
+                    "size": f.size,
+                    "items_count": f.items_count,
+                    "total_sum": f.total_sum,
+                    "is_surplus": f.is_surplus,
+                    "created_at": f.created_at.isoformat(),
+                    "modified": f.created_at.strftime('%Y-%m-%d %H:%M:%S')
+                }
+                for f in files
+            ],
+            "count": len(files),
+            "total": total,
+            "limit": limit,
+            "offset": offset,
+            "has_more": offset + len(files) < total
         })
     
     except Exception as e:
@@ -362,9 +433,10 @@ async def list_archives(user_id: int = Query(...)):
 
 
 @router.get("/archives/download/{filename}")
-async def download_archive(filename: str, user_id: int = Query(...)):
+async def download_archive(filename: str, request: Request, user_id: int = Query(...)):
     """
     Скачати конкретний файл архіву.
+    Підтримує ETag/Last-Modified (304) та Range (206) — валідатори з індексу.
     """
     verify_admin(user_id)
     try:
@@ -372,15 +444,17 @@ async def download_archive(filename: str, user_id: int = Query(...)):
         if '/' in filename or '\\' in filename or '..' in filename:
             raise HTTPException(status_code=400, detail="Недозволене ім'я файлу")
         
-        filepath = os.path.join(ARCHIVES_PATH, "active", filename)
+        filepath = await materialize_archive(filename)
         
-        if not os.path.exists(filepath):
+        if not filepath:
             raise HTTPException(status_code=404, detail="Файл не знайдено")
         
-        return FileResponse(
-            path=filepath,
-            filename=filename,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        return await serve_file(
+            request,
+            filepath,
+            filename,
+            XLSX_MEDIA_TYPE,
+            **await archive_download_validators(filename),
         )
     
     except HTTPException:
@@ -394,34 +468,27 @@ async def download_archive(filename: str, user_id: int = Query(...)):
 
 
 @router.get("/archives/download-all")
-async def download_all_archives(user_id: int = Query(...), background_tasks: BackgroundTasks = None):
+async def download_all_archives(user_id: int = Query(...)):
     """
     Скачати всі архіви одним ZIP файлом.
+    ZIP генерується потоково під час віддачі (без тимчасового файлу,
+    xlsx без повторного стискання).
     """
     verify_admin(user_id)
     try:
-        archives_dir = os.path.join(ARCHIVES_PATH, "active")
+        archives = await get_all_archives()
         
-        if not os.path.exists(archives_dir):
-            raise HTTPException(status_code=404, detail="Папка архівів не існує")
+        if not archives:
+            raise HTTPException(status_code=404, detail="Архівів немає")
         
-        # Створюємо тимчасовий ZIP файл
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        zip_path = os.path.join(tempfile.gettempdir(), f"archives_{timestamp}.zip")
+        # Шляхи резолвляться ліниво (з рендером deferred-архівів) — в потоці генерації ZIP
+        entries = ((materialize_archive_sync(filename) or archive_path(filename), filename) for filename, _, _ in archives)
         
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for filename in os.listdir(archives_dir):
-                if filename.endswith('.xlsx'):
-                    filepath = os.path.join(archives_dir, filename)
-                    zipf.write(filepath, arcname=filename)
-        
-        if background_tasks:
-            background_tasks.add_task(cleanup_file, zip_path)
-        
-        return FileResponse(
-            path=zip_path,
-            filename=f"archives_{timestamp}.zip",
-            media_type="application/zip"
+        return StreamingResponse(
+            iter_zip(entries),
+            media_type="application/zip",
+            headers={"Content-Disposition": f"attachment; filename=archives_{timestamp}.zip"}
         )
     
     except HTTPException:
@@ -441,30 +508,28 @@ async def import_products(
     notify_users: bool = Query(False)
 ):
     """
-    Імпорт товарів з Excel файлу.
-    Підтримує розумне розпізнавання колонок.
-    Опціонально розсилає сповіщення користувачам.
+    Імпорт товарів з Excel файлу у фоновій задачі.
+    Файл зберігається і перевіряється за заголовками одразу, сам імпорт
+    (і опціональна розсилка) — у фоні; повертає 202 з job_id для
+    GET /api/admin/jobs/{job_id} (стадія, рядки, ETA) та скасування.
     """
     await verify_admin_or_moderator(user_id)
     
-    if not file.filename.endswith((".xlsx", ".xls")):
+    if not file.filename.lower().endswith(UPLOAD_EXTENSIONS):
         return JSONResponse(
-            content={"error": "Невірний формат файлу. Потрібен Excel (.xlsx або .xls)"},
+            content={"error": "Невірний формат файлу. Потрібен Excel (.xlsx або .xls) або ZIP з ними"},
             status_code=400
         )
 
-    tmp_fd, temp_file_path = tempfile.mkstemp(suffix=".xlsx", prefix=f"import_{user_id}_")
-    os.close(tmp_fd)
+    workdir = None
+    job_started = False
 
     try:
-        # Зберігаємо завантажений файл
-        contents = await file.read()
-        with open(temp_file_path, 'wb') as f:
-            f.write(contents)
-
-        # Читаємо та валідуємо
-        df = await asyncio.to_thread(pd.read_excel, temp_file_path)
-        is_valid, error_msg = _validate_excel_columns(df)
+        workdir, paths = await _stage_import_upload(file, user_id)
+
+        # Валідуємо лише за рядками заголовків (мапінг може звернутись до кешу в БД)
+        header_rows = await asyncio.to_thread(read_import_headers, paths)
+        is_valid, error_msg, _ = await asyncio.to_thread(_validate_import_sheets, header_rows)
         
         if not is_valid:
             return JSONResponse(
@@ -472,39 +537,243 @@ async def import_products(
                 status_code=400
             )
 
-        # Виконуємо імпорт
-        result = await orm_smart_import(df)
-        if not result:
-            return JSONResponse(
-                content={"error": "Не вдалося розпізнати дані у файлі"},
-                status_code=500
-            )
+        job = await create_job(
+            IMPORT_JOB_KIND, user_id,
+            stage=STAGE_MAPPING, rows=0, total_rows=None, eta_seconds=None,
+            notify_users=notify_users,
+        )
+
+        async def work() -> dict:
+            try:
+                result = await run_import_job(job["id"], paths)
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+            report = _format_import_report(result)
+            if notify_users:
+                await update_job(job["id"], stage=STAGE_NOTIFYING, eta_seconds=None)
+                await broadcast_import_update(result)
+            return {"result": report}
+
+        run_job(job, work)
+        job_started = True
+        return JSONResponse(content={"success": True, "job_id": job["id"]}, status_code=202)
+
+    except ImportSourceError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+    except Exception as e:
+        logger.error("Критична помилка при імпорті: %s", e, exc_info=True)
+        return JSONResponse(
+            content={"error": f"Помилка обробки файлу: {str(e)}"},
+            status_code=500
+        )
+    finally:
+        # Після запуску задачі файли належать їй
+        if not job_started and workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
 
-        # Формуємо відповідь
-        response_data = _format_import_report(result)
 
-        # Опціонально розсилаємо сповіщення
-        if notify_users:
-            asyncio.create_task(broadcast_import_update(result))
-            response_data["notification"] = "Розсилка запущена у фоновому режимі"
+def _job_status_payload(job: dict) -> dict:
+    return {
+        "job_id": job["id"],
+        "kind": job.get("kind"),
+        "status": job["status"],
+        "stage": job.get("stage"),
+        "rows": job.get("rows", 0),
+        "total_rows": job.get("total_rows"),
+        "eta_seconds": job.get("eta_seconds"),
+        "sheets": job.get("sheets"),
+        "result": job.get("result"),
+        "error": job.get("error"),
+    }
+
 
-        return JSONResponse(content=response_data)
+async def _get_own_import_job(job_id: str, user_id: int) -> Optional[dict]:
+    """Задача імпорту; модератор бачить лише власні, адмін — усі."""
+    await verify_admin_or_moderator(user_id)
+    job = await get_job(job_id)
+    if not job or job.get("kind") != IMPORT_JOB_KIND:
+        return None
+    if user_id not in ADMIN_IDS and job.get("user_id") != user_id:
+        return None
+    return job
 
-    except SQLAlchemyError as e:
-        logger.critical("Помилка БД під час імпорту: %s", e, exc_info=True)
+
+@router.get("/jobs/{job_id}")
+async def import_job_status(job_id: str, user_id: int = Query(...)):
+    """Стан фонового імпорту: статус, стадія, прочитані рядки, ETA, звіт."""
+    job = await _get_own_import_job(job_id, user_id)
+    if job is None:
+        return JSONResponse(content={"error": "Задачу не знайдено"}, status_code=404)
+    return JSONResponse(content=_job_status_payload(job))
+
+
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_import_job(job_id: str, user_id: int = Query(...)):
+    """
+    Скасовує імпорт. Задача зупиняється після поточного пакета і відкочує
+    транзакцію; після злиття (розсилка) скасування вже неможливе.
+    """
+    job = await _get_own_import_job(job_id, user_id)
+    if job is None:
+        return JSONResponse(content={"error": "Задачу не знайдено"}, status_code=404)
+    if job["status"] not in ACTIVE_STATUSES or job.get("stage") not in CANCELLABLE_STAGES:
         return JSONResponse(
-            content={"error": f"Помилка бази даних: {str(e)}"},
-            status_code=500
+            content={"error": "Імпорт уже завершено, скасування неможливе", **_job_status_payload(job)},
+            status_code=409
+        )
+    await request_cancel(job_id)
+    return JSONResponse(content={"success": True, "job_id": job_id}, status_code=202)
+
+
+# CSV змін пробного імпорту живуть у тимчасовій теці добу
+IMPORT_DIFF_DIR = os.path.join(tempfile.gettempdir(), "epicservice_import_diffs")
+IMPORT_DIFF_TTL_SECONDS = 24 * 60 * 60
+
+
+def _import_diff_path(diff_id: str) -> str:
+    return os.path.join(IMPORT_DIFF_DIR, f"{diff_id}.csv")
+
+
+def _purge_old_import_diffs() -> None:
+    expired_before = datetime.now().timestamp() - IMPORT_DIFF_TTL_SECONDS
+    for entry in os.scandir(IMPORT_DIFF_DIR):
+        if entry.is_file() and entry.stat().st_mtime < expired_before:
+            cleanup_file(entry.path)
+
+
+@router.post("/import/dry-run")
+async def import_dry_run(
+    file: UploadFile = File(...),
+    user_id: int = Query(...)
+):
+    """
+    Пробний імпорт: скільки товарів буде додано, оновлено, деактивовано та
+    повторно активовано і які відділи зачеплено — без змін у базі.
+    Порівняння йде лише за артикулом, активністю та content_hash; CSV змін
+    доступний за GET /api/admin/import/dry-run/{diff_id}.
+    """
+    await verify_admin_or_moderator(user_id)
+
+    if not file.filename.lower().endswith(UPLOAD_EXTENSIONS):
+        return JSONResponse(
+            content={"error": "Невірний формат файлу. Потрібен Excel (.xlsx або .xls) або ZIP з ними"},
+            status_code=400
         )
+
+    workdir = None
+
+    try:
+        workdir, paths = await _stage_import_upload(file, user_id)
+        header_rows = await asyncio.to_thread(read_import_headers, paths)
+        is_valid, error_msg, headers = await asyncio.to_thread(_validate_import_sheets, header_rows)
+        if not is_valid:
+            return JSONResponse(
+                content={"error": f"Невірна структура файлу: {error_msg}"},
+                status_code=400
+            )
+
+        os.makedirs(IMPORT_DIFF_DIR, exist_ok=True)
+        await asyncio.to_thread(_purge_old_import_diffs)
+        diff_id = uuid.uuid4().hex
+        diff = await orm_smart_import_sources(paths, dry_run=True, diff_path=_import_diff_path(diff_id))
+        if not diff:
+            return JSONResponse(
+                content={"error": "Не вдалося розпізнати дані у файлі"},
+                status_code=500
+            )
+
+        report = _format_import_report(diff)
+        report.pop("total_in_db", None)  # каталог не змінювався
+        return JSONResponse(content={
+            **report,
+            "dry_run": True,
+            "total_in_file": diff.get("total_in_file", 0),
+            "affected_departments": diff.get("affected_departments", {}),
+            "diff_id": diff_id,
+            # Відбиток макета (першого придатного аркуша) — для закріплення
+            # мапінгу через /column-mappings
+            "fingerprint": SmartColumnMapper.fingerprint(headers),
+            "mapping": await asyncio.to_thread(SmartColumnMapper.map_headers, headers),
+        })
+
+    except ImportSourceError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
     except Exception as e:
-        logger.error("Критична помилка при імпорті: %s", e, exc_info=True)
+        logger.error("Помилка пробного імпорту: %s", e, exc_info=True)
         return JSONResponse(
             content={"error": f"Помилка обробки файлу: {str(e)}"},
             status_code=500
         )
     finally:
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+@router.get("/import/dry-run/{diff_id}")
+async def download_import_diff(diff_id: str, request: Request, user_id: int = Query(...)):
+    """CSV змін пробного імпорту (без незмінених товарів)."""
+    await verify_admin_or_moderator(user_id)
+    # diff_id — лише uuid hex, тож шлях за межі теки неможливий
+    if not re.fullmatch(r"[0-9a-f]{32}", diff_id):
+        raise HTTPException(status_code=400, detail="Невірний ідентифікатор")
+    path = _import_diff_path(diff_id)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Файл не знайдено")
+    return await serve_file(request, path, f"import_diff_{diff_id[:8]}.csv", "text/csv; charset=utf-8")
+
+
+@router.get("/column-mappings")
+async def list_column_mappings(user_id: int = Query(...)):
+    """Відомі макети заголовків імпорту та їхні мапінги колонок."""
+    verify_admin(user_id)
+    rows = await orm_get_column_mappings()
+    return JSONResponse(content={"mappings": [
+        {**row, "columns": {field: row["headers"][pos] for field, pos in row["mapping"].items()}}
+        for row in rows
+    ]})
+
+
+@router.put("/column-mappings/{fingerprint}")
+async def pin_column_mapping(fingerprint: str, request: ColumnMappingRequest):
+    """
+    Закріплює (перевизначає) мапінг для макета: евристики для нього більше
+    не запускаються, а зміна синонімів його не скидає.
+    """
+    verify_admin(request.user_id)
+    stored = await orm_get_column_mapping(fingerprint)
+    if stored is None:
+        return JSONResponse(content={"error": "Макет не знайдено"}, status_code=404)
+
+    headers = stored["headers"]
+    unknown_fields = set(request.mapping) - set(SmartColumnMapper.TARGET_FIELDS)
+    unknown_headers = [h for h in request.mapping.values() if h not in headers]
+    if unknown_fields or unknown_headers:
+        return JSONResponse(content={
+            "error": "Невідомі поля або колонки",
+            "unknown_fields": sorted(unknown_fields),
+            "unknown_headers": unknown_headers,
+        }, status_code=400)
+    if len(set(request.mapping.values())) != len(request.mapping):
+        return JSONResponse(content={"error": "Одна колонка призначена кільком полям"}, status_code=400)
+
+    positions = {field: headers.index(header) for field, header in request.mapping.items()}
+    if not ({"article", "name"} & positions.keys() and {"quantity", "stock_sum"} & positions.keys()):
+        return JSONResponse(content={"error": "Потрібні Артикул або Назва та Кількість або Сума"}, status_code=400)
+
+    row = await orm_pin_column_mapping(fingerprint, positions)
+    SmartColumnMapper.forget(fingerprint)
+    return JSONResponse(content={"success": True, "fingerprint": fingerprint, "pinned": row["pinned"]})
+
+
+@router.delete("/column-mappings/{fingerprint}")
+async def delete_column_mapping(fingerprint: str, user_id: int = Query(...)):
+    """Забуває мапінг (і закріплення) — макет знову пройде евристики."""
+    verify_admin(user_id)
+    deleted = await orm_delete_column_mapping(fingerprint)
+    SmartColumnMapper.forget(fingerprint)
+    if not deleted:
+        return JSONResponse(content={"error": "Макет не знайдено"}, status_code=404)
+    return JSONResponse(content={"success": True})
 
 
 @router.post("/subtract-collected")
@@ -612,6 +881,7 @@ async def subtract_collected(
     skipped_not_found = 0
     skipped_inactive = 0
     set_to_zero_list = []
+    changed_ids = []
 
     try:
         async with async_session() as session:
@@ -648,6 +918,9 @@ async def subtract_collected(
                     else:
                         product.кількість = str(new_qty)
                         updated += 1
+                    # Наступний імпорт має перезаписати залишок, навіть якщо рядок файлу той самий
+                    product.content_hash = None
+                    changed_ids.append(product.id)
 
     except SQLAlchemyError as e:
         logger.critical("Помилка БД під час subtract-collected: %s", e, exc_info=True)
@@ -655,6 +928,7 @@ async def subtract_collected(
             content={"error": f"Помилка бази даних: {str(e)}"},
             status_code=500
         )
+    await publish_products_availability(changed_ids)
 
     return JSONResponse(content={
         "success": True,
@@ -676,7 +950,7 @@ async def subtract_collected(
 
 
 @router.get("/export/stock")
-async def export_stock_report(user_id: int = Query(...), background_tasks: BackgroundTasks = None):
+async def export_stock_report(request: Request, user_id: int = Query(...), background_tasks: BackgroundTasks = None):
     """
     Експорт звіту про залишки на складі.
     Враховує резерви з temp_list.
@@ -695,10 +969,13 @@ async def export_stock_report(user_id: int = Query(...), background_tasks: Backg
         if background_tasks:
             background_tasks.add_task(cleanup_file, report_path)
 
-        return FileResponse(
-            path=report_path,
-            filename=os.path.basename(report_path),
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        # Звіт щоразу новий і видаляється після віддачі — не кешується
+        return await serve_file(
+            request,
+            report_path,
+            os.path.basename(report_path),
+            XLSX_MEDIA_TYPE,
+            cache_control="no-store",
         )
 
     except Exception as e:
@@ -799,6 +1076,72 @@ async def force_save_user_list_endpoint(
         )
 
 
+# Тип фонової задачі масового примусового збереження (див. utils/jobs.py)
+FORCE_SAVE_ALL_JOB_KIND = "force_save_all"
+
+
+@router.post("/force-save-all")
+async def force_save_all_endpoint(request: ForceSaveRequest):
+    """
+    Примусово зберегти списки ВСІХ користувачів з активними списками.
+    Збереження йдуть паралельно у фоні; повертає job_id для
+    GET /api/admin/force-save-all/{job_id} з прогресом done/total.
+    """
+    verify_admin(request.user_id)
+
+    try:
+        active_users = await orm_get_users_with_active_lists()
+        user_ids = [row[0] for row in active_users]
+        if not user_ids:
+            return JSONResponse(content={
+                "success": True,
+                "message": "Немає активних списків для збереження",
+                "total": 0
+            })
+
+        job = await create_job(FORCE_SAVE_ALL_JOB_KIND, request.user_id, done=0, total=len(user_ids))
+
+        async def report_progress(done: int, total: int) -> None:
+            await update_job(job["id"], done=done, total=total)
+
+        async def work() -> dict:
+            results = await force_save_all(user_ids, bot, progress=report_progress)
+            failed = [uid for uid, ok in results.items() if not ok]
+            return {"saved": len(results) - len(failed), "failed": failed}
+
+        run_job(job, work)
+        return JSONResponse(content={
+            "success": True,
+            "job_id": job["id"],
+            "total": len(user_ids)
+        }, status_code=202)
+
+    except Exception as e:
+        logger.error("Помилка запуску масового примусового збереження: %s", e, exc_info=True)
+        return JSONResponse(
+            content={"error": "Помилка збереження списків"},
+            status_code=500
+        )
+
+
+@router.get("/force-save-all/{job_id}")
+async def force_save_all_status(job_id: str, user_id: int = Query(...)):
+    """Прогрес масового примусового збереження."""
+    verify_admin(user_id)
+    job = await get_job(job_id)
+    if not job or job.get("kind") != FORCE_SAVE_ALL_JOB_KIND:
+        return JSONResponse(content={"error": "Задачу не знайдено"}, status_code=404)
+    return JSONResponse(content={
+        "job_id": job["id"],
+        "status": job["status"],
+        "done": job.get("done", 0),
+        "total": job.get("total", 0),
+        "saved": job.get("saved"),
+        "failed": job.get("failed", []),
+        "error": job.get("error"),
+    })
+
+
 @router.post("/broadcast")
 async def broadcast_message(
     request: BroadcastRequest
@@ -882,63 +1225,23 @@ async def get_system_statistics(user_id: int = Query(...)):
 
 
 @router.get("/users/all")
-async def get_all_users_with_stats(user_id: int = Query(...)):
+async def get_all_users_with_stats(
+    user_id: int = Query(...),
+    limit: int = Query(100, ge=1, le=500),
+    offset: int = Query(0, ge=0)
+):
     """
-    Отримати всіх користувачів з історією архівів та загальною сумою.
-    Формат файлів: {відділ}_{user_id}_{дата}_{час}.xlsx
+    Отримати користувачів з кількістю архівів, загальною сумою та останньою активністю.
+    Один запит до users + archive_user_totals (агрегат оновлюється при збереженні,
+    ротації та видаленні архівів) з пагінацією limit/offset.
     """
     verify_admin(user_id)
     try:
-        loop = asyncio.get_running_loop()
-        user_ids = await loop.run_in_executor(None, orm_get_all_users_sync)
-        
-        # Витягуємо username/first_name з БД
-        async with async_session() as session:
-            result = await session.execute(
-                text("SELECT id, username, first_name FROM users")
-            )
-            users_info = {row[0]: {"username": row[1], "first_name": row[2]} for row in result.fetchall()}
+        rows, total = await orm_get_users_with_archive_totals(limit=limit, offset=offset)
         
         users_data = []
-        archives_dir = os.path.join(ARCHIVES_PATH, "active")
-        
-        for uid in user_ids:
-            # Підраховуємо архіви користувача
-            archives_count = 0
-            total_amount = 0.0
-            last_activity = None
-            
-            if os.path.exists(archives_dir):
-                # Шукаємо файли за патерном: *_{user_id}_*.xlsx
-                user_files = [f for f in os.listdir(archives_dir) 
-                             if f.endswith('.xlsx') and f"_{uid}_" in f]
-                archives_count = len(user_files)
-                
-                # Знаходимо останній файл
-                if user_files:
-                    latest_file = max(user_files, key=lambda f: os.path.getmtime(os.path.join(archives_dir, f)))
-                    last_activity = datetime.fromtimestamp(
-                        os.path.getmtime(os.path.join(archives_dir, latest_file))
-                    ).strftime('%d.%m.%Y %H:%M')
-                    
-                    # Читаємо всі файли користувача для підрахунку суми
-                    for filename in user_files:
-                        try:
-                            filepath = os.path.join(archives_dir, filename)
-                            df = pd.read_excel(filepath)
-                            if 'Сума' in df.columns:
-                                # Конвертуємо в числа, ігноруючи помилки, фільтруємо NaN
-                                suma_column = pd.to_numeric(df['Сума'], errors='coerce').dropna()
-                                total_amount += suma_column.sum()
-                        except Exception as e:
-                            logger.warning(f"Не вдалося прочитати {filename}: {e}")
-            
-            # Формуємо display name
-            user_info = users_info.get(uid, {})
+        for uid, username, first_name, archives_count, total_amount, last_activity in rows:
             # Формуємо комбо: Ім'я (@username)
-            first_name = user_info.get('first_name', '')
-            username = user_info.get('username', '')
-            
             if first_name and username:
                 display_name = f"{first_name} (@{username})"
             elif first_name:
@@ -953,15 +1256,16 @@ async def get_all_users_with_stats(user_id: int = Query(...)):
                 "username": display_name,
                 "archives_count": archives_count,
                 "total_amount": round(total_amount, 2),
-                "last_activity": last_activity
+                "last_activity": last_activity.strftime('%d.%m.%Y %H:%M') if last_activity else None
             })
         
-        # Сортуємо за кількістю архівів
-        users_data.sort(key=lambda x: x['archives_count'], reverse=True)
-        
         return JSONResponse(content={
             "success": True,
-            "users": users_data
+            "users": users_data,
+            "total": total,
+            "limit": limit,
+            "offset": offset,
+            "has_more": offset + len(users_data) < total
         })
     
     except Exception as e:
@@ -1273,15 +1577,8 @@ async def danger_delete_all_archives(user_id: int = Query(...)):
     try:
         logger.critical("⚠️ DANGER ZONE: User %s initiated DELETE ALL ARCHIVES operation", user_id)
         
-        archives_dir = os.path.join(ARCHIVES_PATH, "active")
-        deleted_files = 0
-        
-        if os.path.exists(archives_dir):
-            for filename in os.listdir(archives_dir):
-                if filename.endswith('.xlsx'):
-                    filepath = os.path.join(archives_dir, filename)
-                    os.remove(filepath)
-                    deleted_files += 1
+        deleted_files = await asyncio.to_thread(purge_active_archives)
+        await orm_delete_archive_files()
         
         logger.critical("✅ All archives deleted: %d files removed by admin %s", deleted_files, user_id)
         
@@ -1348,13 +1645,8 @@ async def danger_full_wipe(user_id: int = Query(...)):
             await session.commit()
         
         # 4. Архіви
-        archives_dir = os.path.join(ARCHIVES_PATH, "active")
-        if os.path.exists(archives_dir):
-            for filename in os.listdir(archives_dir):
-                if filename.endswith('.xlsx'):
-                    filepath = os.path.join(archives_dir, filename)
-                    os.remove(filepath)
-                    deleted_archives += 1
+        deleted_archives = await asyncio.to_thread(purge_active_archives)
+        await orm_delete_archive_files()
         
         logger.critical(
             "✅ FULL WIPE completed by admin %s: Products=%d, Photo files=%d, Photo records=%d, Archives=%d",
@@ -4,17 +4,16 @@
 Містить ендпоїнти для пошуку товарів, управління списками та архівами.
 """
 
+import asyncio
+import json
 import os
 import traceback
-import zipfile
 from datetime import datetime, timedelta
-from io import BytesIO
 from typing import List, Optional
 
-import openpyxl
 from aiogram import Bot
-from fastapi import APIRouter, Header, HTTPException
-from fastapi.responses import FileResponse, JSONResponse, Response
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy import select, func, Float, cast
@@ -27,17 +26,29 @@ from database.orm import (
     orm_clear_temp_list,
     orm_delete_temp_list_item,
     orm_find_products,
+    orm_get_archive_file,
     orm_get_temp_list,
     orm_get_temp_list_department,
+    orm_get_user_archive_files,
     orm_get_user_by_id,
+    orm_get_user_saved_lists_summary,
     orm_update_temp_list_item_quantity,
 )
-from utils.archive_manager import ACTIVE_DIR, get_user_archives as fetch_user_archives, parse_filename
-from utils.list_processor import process_and_save_list
+from utils.archive_manager import (archive_download_validators, archive_path, delete_archive_file,
+                                   get_user_archives as fetch_user_archives, parse_filename)
+from utils.availability_events import availability_subscription, publish_products_availability
+from utils.jobs import create_job, get_job, list_user_jobs, register_job_resumer, run_job
+from utils.list_processor import (materialize_archive, materialize_archive_sync, prepare_list_for_save,
+                                  render_saved_list, saved_list_file_names, saved_list_snapshot)
+from utils.zip_stream import iter_zip
+from webapp.utils.file_serving import XLSX_MEDIA_TYPE, serve_file
 
 router = APIRouter()
 bot = Bot(token=BOT_TOKEN)
 
+# Інтервал keep-alive коментарів у SSE-потоці (секунди)
+SSE_HEARTBEAT_SECONDS = 15
+
 
 # === Pydantic Models ===
 
@@ -376,6 +387,39 @@ async def get_user_list_department(user_id: int):
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
 
+@router.get("/stream/availability")
+async def stream_availability(request: Request, departments: str = Query(...)):
+    """
+    SSE-потік живих оновлень доступних залишків.
+    departments — відділи, які користувач зараз переглядає ("310" або "10,20").
+    Події `availability`: {"department": 310, "updates": [{"product_id": 1, "available": 5.0}]}
+    або {"refresh": true} після імпорту залишків (перезапитати пошук).
+    """
+    try:
+        dept_ids = sorted({int(d) for d in departments.split(",") if d.strip()})
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid departments")
+    if not dept_ids:
+        raise HTTPException(status_code=400, detail="Invalid departments")
+
+    async def event_stream():
+        async with availability_subscription(dept_ids) as queue:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    payload = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield f"event: availability\ndata: {json.dumps(payload)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.post("/add")
 async def add_to_list(req: AddToListRequest):
     """Додати товар до списку."""
@@ -432,28 +476,93 @@ async def clear_list(user_id: int):
         return JSONResponse(content={"error": "Помилка очищення", "details": str(e)}, status_code=500)
 
 
+# Тип фонової задачі збереження списку (див. utils/jobs.py)
+SAVE_JOB_KIND = "list_save"
+
+
+async def _render_save_job(snapshot: dict) -> dict:
+    """
+    Фонова частина збереження. Список уже закомічено, тож якщо непорожня
+    група позицій не дала файлу (помилка рендерингу/індексації лише
+    логується в _save_list_to_excel), задача завершується failed, а не done.
+    """
+    main_list_path, surplus_list_path = await render_saved_list(snapshot)
+    groups = (("in_stock_items", main_list_path), ("surplus_items", surplus_list_path))
+    if any(snapshot[items] and not path for items, path in groups):
+        raise RuntimeError("Не вдалося сформувати файл списку")
+    return {
+        "files": [os.path.basename(path) for path in (main_list_path, surplus_list_path) if path],
+    }
+
+
+def _resume_save_job(job: dict):
+    """
+    Перерване збереження (воркер зупинився після коміту) доробляється
+    з saved_list_items: резерви й список уже в БД, бракує лише файлів.
+    """
+    async def work() -> dict:
+        snapshot = await saved_list_snapshot(job["list_id"], job["user_id"], job["department_id"], job["timestamp"])
+        return await _render_save_job(snapshot)
+    return work
+
+
+register_job_resumer(SAVE_JOB_KIND, _resume_save_job)
+
+
 @router.post("/save/{user_id}")
-async def save_list_to_excel(user_id: int):
+async def save_list_to_excel(user_id: int, async_mode: bool = Query(False)):
     """
     Зберегти список в Excel.
     WebApp: НЕ відправляє в Telegram, тільки зберігає в archives/active/.
     Файл доступний через вкладку "Архів".
+
+    async_mode=true: резерви і знімок списку комітяться одразу, а генерація
+    файлів виконується у фоні — відповідь 202 з job_id для
+    GET /api/save/jobs/{job_id}. До завершення файли показуються в архіві
+    як pending.
     """
     try:
-        print(f"💾 Save list request for user_id={user_id} (webapp - archive only)")
+        print(f"💾 Save list request for user_id={user_id} (webapp - archive only, async={async_mode})")
         async with async_session() as session:
             async with session.begin():
-                main_list_path, surplus_list_path = await process_and_save_list(session, user_id)
-        if not main_list_path and not surplus_list_path:
+                snapshot = await prepare_list_for_save(session, user_id)
+        if not snapshot:
             print(f"⚠️ List is empty for user {user_id}")
             return JSONResponse(content={"success": False, "message": "Список порожній"}, status_code=400)
+        await publish_products_availability(snapshot["product_ids"])
+
+        has_main = bool(snapshot["in_stock_items"])
+        has_surplus = bool(snapshot["surplus_items"])
+
+        if async_mode:
+            job = await create_job(
+                SAVE_JOB_KIND, user_id,
+                timestamp=snapshot["timestamp"],
+                files=saved_list_file_names(snapshot),
+                list_id=snapshot["list_id"],
+                department_id=snapshot["department_id"],
+            )
+            run_job(job, lambda: _render_save_job(snapshot))
+            print(f"⏳ Save job {job['id']} queued for user {user_id}")
+            return JSONResponse(content={
+                "success": True,
+                "message": "✅ Список збережено! Файли формуються...",
+                "cleared": True,
+                "job_id": job["id"],
+                "status": job["status"],
+                "has_main": has_main,
+                "has_surplus": has_surplus
+            }, status_code=202)
+
+        # Рендеринг xlsx — після коміту, в окремому пулі потоків
+        main_list_path, surplus_list_path = await render_saved_list(snapshot)
         print(f"✅ Files saved: main={main_list_path}, surplus={surplus_list_path}")
         return JSONResponse(content={
             "success": True,
             "message": "✅ Список збережено!",
             "cleared": True,
-            "has_main": bool(main_list_path),
-            "has_surplus": bool(surplus_list_path)
+            "has_main": has_main,
+            "has_surplus": has_surplus
         }, status_code=200)
     except Exception as e:
         print(f"❌ ERROR in save_list_to_excel: {type(e).__name__}: {e}")
@@ -461,23 +570,57 @@ async def save_list_to_excel(user_id: int):
         return JSONResponse(content={"error": "Помилка збереження списку", "details": str(e)}, status_code=500)
 
 
+@router.get("/save/jobs/{job_id}")
+async def get_save_job_status(job_id: str):
+    """Статус фонового збереження списку: pending / running / done / failed."""
+    job = await get_job(job_id)
+    if not job or job.get("kind") != SAVE_JOB_KIND:
+        return JSONResponse(content={"error": "Задачу не знайдено"}, status_code=404)
+    return JSONResponse(content={
+        "job_id": job["id"],
+        "status": job["status"],
+        "files": job.get("files", []),
+        "error": job.get("error"),
+    }, status_code=200)
+
+
 @router.get("/archives/{user_id}")
 async def get_user_archives(user_id: int):
     """Отримати список архівних файлів користувача."""
     try:
         print(f"📁 Archives request for user_id={user_id}")
-        archives = fetch_user_archives(user_id)
-        if not archives:
-            return JSONResponse(content={"archives": []}, status_code=200)
+        archives = await orm_get_user_archive_files(user_id)
+        ready_files = {archive.filename for archive in archives}
         result = []
-        for filename, timestamp in archives:
-            is_surplus = filename.startswith("лишки_")
+
+        # Файли фонових збережень, які ще формуються — показуємо першими
+        for job in reversed(await list_user_jobs(SAVE_JOB_KIND, user_id, active_only=True)):
+            timestamp = datetime.strptime(job["timestamp"], "%d-%m-%Y_%H-%M")
+            for filename in job.get("files", []):
+                if filename in ready_files:
+                    continue
+                is_surplus = filename.startswith("лишки_")
+                result.append({
+                    "filename": filename,
+                    "date": timestamp.strftime("%d.%m.%Y %H:%M"),
+                    "timestamp": timestamp.isoformat(),
+                    "is_surplus": is_surplus,
+                    "type": "Лишки" if is_surplus else "Основний список",
+                    "pending": True,
+                    "job_id": job["id"]
+                })
+
+        for archive in archives:
             result.append({
-                "filename": filename,
-                "date": timestamp.strftime("%d.%m.%Y %H:%M"),
-                "timestamp": timestamp.isoformat(),
-                "is_surplus": is_surplus,
-                "type": "Лишки" if is_surplus else "Основний список"
+                "filename": archive.filename,
+                "date": archive.created_at.strftime("%d.%m.%Y %H:%M"),
+                "timestamp": archive.created_at.isoformat(),
+                "is_surplus": archive.is_surplus,
+                "type": "Лишки" if archive.is_surplus else "Основний список",
+                "pending": False,
+                "department": archive.department,
+                "items_count": archive.items_count,
+                "total_sum": archive.total_sum
             })
         print(f"✅ Returning {len(result)} archives")
         return JSONResponse(content={"archives": result}, status_code=200)
@@ -489,9 +632,12 @@ async def get_user_archives(user_id: int):
 
 @router.get("/statistics/{user_id}")
 async def get_user_statistics(user_id: int):
-    """Отримати статистику користувача: кількість списків, загальна сума, популярні відділи."""
+    """
+    Отримати статистику користувача: кількість списків, загальна сума, популярні відділи.
+    Читає лише підсумки з індексу archive_files — xlsx-файли не відкриваються.
+    """
     try:
-        archives = fetch_user_archives(user_id)
+        archives = await orm_get_user_archive_files(user_id)
         
         if not archives:
             return JSONResponse(content={
@@ -513,58 +659,16 @@ async def get_user_statistics(user_id: int):
         this_month_lists = 0
         this_month_amount = 0.0
         
-        for filename, timestamp in archives:
-            file_path = os.path.join(ACTIVE_DIR, filename)
-            if not os.path.exists(file_path):
-                continue
+        for archive in archives:
+            file_amount = archive.total_sum or 0.0
+            total_amount += file_amount
+            total_items += archive.items_count or 0
             
-            try:
-                # Парсимо Excel для підрахунку
-                wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
-                ws = wb.active
-                
-                file_amount = 0.0
-                file_items = 0
-                
-                # Рахуємо товари та суму (пропускаємо заголовок)
-                for row in ws.iter_rows(min_row=2, values_only=True):
-                    if not row or not row[0]:
-                        continue
-                    if str(row[0]).strip() in ["", "К-ть артикулів:", "Зібрано на суму:"]:
-                        continue
-                    
-                    file_items += 1
-                    
-                    try:
-                        if len(row) > 3 and row[3]:
-                            sum_value = row[3]
-                            if isinstance(sum_value, str):
-                                sum_value = sum_value.replace(' грн', '').replace(',', '.').strip()
-                            file_amount += float(sum_value)
-                        else:
-                            qty = float(row[1]) if len(row) > 1 and row[1] else 0
-                            price = float(row[2]) if len(row) > 2 and row[2] else 0
-                            file_amount += qty * price
-                    except (ValueError, TypeError, IndexError):
-                        pass
-                
-                wb.close()
-                
-                total_amount += file_amount
-                total_items += file_items
-                
-                if timestamp >= month_ago:
-                    this_month_lists += 1
-                    this_month_amount += file_amount
-                
-                parsed = parse_filename(filename)
-                if parsed and "department" in parsed:
-                    dept = parsed["department"]
-                    departments[dept] = departments.get(dept, 0) + 1
-                    
-            except Exception as e:
-                print(f"⚠️ Error parsing {filename}: {e}")
-                continue
+            if archive.created_at >= month_ago:
+                this_month_lists += 1
+                this_month_amount += file_amount
+            
+            departments[archive.department] = departments.get(archive.department, 0) + 1
         
         popular_department = max(departments, key=departments.get) if departments else None
         
@@ -587,28 +691,24 @@ async def get_user_statistics(user_id: int):
 
 @router.get("/archives/download-all/{user_id}")
 async def download_all_archives(user_id: int):
-    """Завантажити всі архіви користувача як ZIP."""
+    """
+    Завантажити всі архіви користувача як ZIP.
+    ZIP генерується потоково під час віддачі (xlsx без повторного стискання).
+    """
     try:
-        archives = fetch_user_archives(user_id)
+        archives = await fetch_user_archives(user_id)
         
         if not archives:
             raise HTTPException(status_code=404, detail="No archives found")
         
-        zip_buffer = BytesIO()
-        
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            for filename, timestamp in archives:
-                file_path = os.path.join(ACTIVE_DIR, filename)
-                if os.path.exists(file_path):
-                    zip_file.write(file_path, filename)
-        
-        zip_buffer.seek(0)
+        # Шляхи резолвляться ліниво (з рендером deferred-архівів) — в потоці генерації ZIP
+        entries = ((materialize_archive_sync(filename) or archive_path(filename), filename) for filename, _ in archives)
         zip_filename = f"epicservice_archives_{user_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
         
-        print(f"📦 Created ZIP with {len(archives)} files for user {user_id}")
+        print(f"📦 Streaming ZIP with {len(archives)} files for user {user_id}")
         
-        return Response(
-            content=zip_buffer.getvalue(),
+        return StreamingResponse(
+            iter_zip(entries),
             media_type="application/zip",
             headers={"Content-Disposition": f"attachment; filename={zip_filename}"}
         )
@@ -623,7 +723,7 @@ async def download_all_archives(user_id: int):
 
 @router.get("/archive/stats/{filename}")
 async def get_archive_stats(filename: str, user_id: int):
-    """Отримати статистику з Excel файлу архіву."""
+    """Отримати статистику архівного файлу (з індексу archive_files)."""
     try:
         if ".." in filename or "/" in filename or "\\" in filename:
             raise HTTPException(status_code=400, detail="Invalid filename")
@@ -632,23 +732,12 @@ async def get_archive_stats(filename: str, user_id: int):
         if not parsed or parsed["user_id"] != user_id:
             raise HTTPException(status_code=403, detail="Access denied")
         
-        file_path = os.path.join(ACTIVE_DIR, filename)
-        if not os.path.exists(file_path):
+        archive = await orm_get_archive_file(filename)
+        if not archive or archive.is_trashed:
             raise HTTPException(status_code=404, detail="File not found")
         
-        wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
-        ws = wb.active
-        
-        items_count = 0
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            if not row or not row[0]:
-                continue
-            if str(row[0]).strip() in ["", "К-ть артикулів:", "Зібрано на суму:"]:
-                continue
-            items_count += 1
-        
-        wb.close()
-        department = parsed.get("department", "Невідомо")
+        items_count = archive.items_count or 0
+        department = archive.department or "Невідомо"
         
         print(f"📊 Stats for {filename}: {items_count} items, department={department}, author={user_id}")
         
@@ -668,19 +757,24 @@ async def get_archive_stats(filename: str, user_id: int):
 
 
 @router.get("/archive/download/{filename}")
-async def download_archive(filename: str):
-    """Завантажити архівний файл."""
+async def download_archive(filename: str, request: Request):
+    """
+    Завантажити архівний файл.
+    Підтримує ETag/Last-Modified (304) та Range (206) — валідатори з індексу.
+    """
     try:
         if ".." in filename or "/" in filename or "\\" in filename:
             raise HTTPException(status_code=400, detail="Invalid filename")
-        file_path = os.path.join(ACTIVE_DIR, filename)
-        if not os.path.exists(file_path):
+        file_path = await materialize_archive(filename)
+        if not file_path:
             raise HTTPException(status_code=404, detail="File not found")
         print(f"📥 Download request: {filename}")
-        return FileResponse(
-            path=file_path,
-            filename=filename,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        return await serve_file(
+            request,
+            file_path,
+            filename,
+            XLSX_MEDIA_TYPE,
+            **await archive_download_validators(filename),
         )
     except HTTPException:
         raise
@@ -702,12 +796,9 @@ async def delete_archive(filename: str, user_id: int):
             print(f"⚠️ User {user_id} tried to delete file not owned by them: {filename}")
             raise HTTPException(status_code=403, detail="Access denied")
         
-        file_path = os.path.join(ACTIVE_DIR, filename)
-        
-        if not os.path.exists(file_path):
+        if not await delete_archive_file(filename):
             raise HTTPException(status_code=404, detail="File not found")
         
-        os.remove(file_path)
         print(f"🗑️ Deleted archive: {filename} by user {user_id}")
         
         return JSONResponse(content={"success": True, "message": "Файл видалено"}, status_code=200)
@@ -816,20 +907,19 @@ async def mobile_get_saved_lists(authorization: str = Header(...)):
     """
     user_id = _get_user_id_from_token(authorization)
     try:
-        async with async_session() as session:
-            result = await session.execute(
-                select(SavedList)
-                .where(SavedList.user_id == user_id)
-                .order_by(SavedList.created_at.desc())
-            )
-            lists = result.scalars().all()
+        # Підсумки рахуються агрегатом по saved_list_items, без читання файлів
+        lists = await orm_get_user_saved_lists_summary(user_id)
         return JSONResponse({
             "lists": [
                 {
-                    "id": sl.id,
-                    "name": sl.file_name,
-                    "file_name": sl.file_name,
-                    "created_at": sl.created_at.isoformat() if sl.created_at else None,
+                    "id": sl["id"],
+                    "name": sl["file_name"],
+                    "file_name": sl["file_name"],
+                    "created_at": sl["created_at"].isoformat() if sl["created_at"] else None,
+                    "items_count": sl["items_count"],
+                    "total_sum": round(sl["total_sum"], 2),
+                    "surplus_count": sl["surplus_count"],
+                    "surplus_sum": round(sl["surplus_sum"], 2),
                 }
                 for sl in lists
             ]
@@ -901,7 +991,7 @@ async def mobile_download_saved_list(
             )
             items = items_result.scalars().all()
 
-        lines = [f"{item.article_name}\t{item.quantity}" for item in items]
+        lines = [f"{item.article_name}\t{item.quantity:g}" for item in items]
         content = "\n".join(lines).encode("utf-8")
         filename = saved_list.file_name or f"list_{list_id}.txt"
 
@@ -77,7 +77,11 @@ async function loadAdminActiveUsers() {
             return;
         }
         
-        container.innerHTML = data.users.map(user => `
+        container.innerHTML = `
+            <button class="btn btn-success" id="forceSaveAllBtn" style="width: 100%; margin-bottom: 12px;" onclick="forceSaveAll()">
+                💾 Зберегти всі (${data.users.length})
+            </button>
+        ` + data.users.map(user => `
             <div class="user-item">
                 <div class="user-info">
                     <div class="user-name">👤 ${user.username || 'User ' + user.user_id}</div>
@@ -119,6 +123,47 @@ async function forceSave(targetUserId) {
     }
 }
 
+async function forceSaveAll() {
+    if (!confirm('Примусово зберегти списки ВСІХ активних користувачів?')) return;
+    const btn = document.getElementById('forceSaveAllBtn');
+
+    try {
+        const response = await fetch('/api/admin/force-save-all', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({ user_id: userId })
+        });
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+        const data = await response.json();
+        if (!data.job_id) {
+            tg.showAlert('ℹ️ ' + (data.message || 'Немає активних списків'));
+            return;
+        }
+        if (btn) btn.disabled = true;
+
+        const poll = async () => {
+            const r = await fetch(`/api/admin/force-save-all/${data.job_id}?user_id=${userId}`);
+            if (!r.ok) throw new Error(`HTTP ${r.status}`);
+            const job = await r.json();
+            if (btn) btn.textContent = `⏳ Збережено ${job.done}/${job.total}`;
+            if (job.status === 'pending' || job.status === 'running') {
+                setTimeout(() => poll().catch(e => tg.showAlert('❌ Помилка: ' + e.message)), 1000);
+                return;
+            }
+            if (job.status === 'done' && (!job.failed || job.failed.length === 0)) {
+                tg.showAlert(`✅ Збережено списків: ${job.saved}`);
+            } else {
+                tg.showAlert(`⚠️ Збережено ${job.saved || 0}/${job.total}, помилки: ${(job.failed || []).join(', ') || job.error}`);
+            }
+            loadAdminActiveUsers();
+        };
+        await poll();
+    } catch (error) {
+        if (btn) btn.disabled = false;
+        tg.showAlert('❌ Помилка: ' + error.message);
+    }
+}
+
 // File upload
 const dropZone = document.getElementById('dropZone');
 
@@ -155,6 +200,7 @@ function updateFileInfo() {
         document.getElementById('fileInfo').textContent = `📄 ${selectedFile.name} (${(selectedFile.size / 1024).toFixed(2)} KB)`;
         document.getElementById('fileInfo').style.display = 'block';
         document.getElementById('uploadBtn').disabled = false;
+        document.getElementById('dryRunBtn').disabled = false;
     }
 }
 
@@ -163,54 +209,180 @@ function cancelUpload(clearAlert = false) {
     document.getElementById('fileInput').value = '';
     document.getElementById('fileInfo').style.display = 'none';
     document.getElementById('uploadBtn').disabled = true;
+    document.getElementById('dryRunBtn').disabled = true;
     if (clearAlert) {
         document.getElementById('importAlert').innerHTML = '';
     }
 }
 
+const IMPORT_STAGE_LABELS = {
+    mapping: 'розпізнавання колонок',
+    parsing: 'читання файлу',
+    merging: 'злиття з базою',
+    committing: 'фіксація змін',
+    notifying: 'розсилка сповіщень'
+};
+
+function formatImportProgress(job) {
+    const stage = IMPORT_STAGE_LABELS[job.stage] || job.stage || '';
+    let text = `⏳ ${stage}: ${job.rows || 0}${job.total_rows ? ' з ~' + job.total_rows : ''} рядків`;
+    if (job.eta_seconds !== null && job.eta_seconds !== undefined) text += `, залишилось ≈ ${job.eta_seconds} с`;
+    if (job.sheets) text += formatImportSheets(job.sheets);
+    return text;
+}
+
+const IMPORT_SHEET_STATUSES = { pending: '⏳', done: '✅', skipped: '⏭️' };
+
+// Розбивка по аркушах (книга з кількома аркушами або ZIP)
+function formatImportSheets(sheets) {
+    return sheets.map(s =>
+        `<br><small>${IMPORT_SHEET_STATUSES[s.status] || s.status} ${String(s.sheet).replace(/&/g, '&amp;').replace(/</g, '&lt;')}: ${s.rows} рядків</small>`
+    ).join('');
+}
+
+// Опитує фоновий імпорт до завершення; onProgress(job) — на кожну відповідь
+async function pollImportJob(jobId, onProgress) {
+    while (true) {
+        const r = await fetch(`/api/admin/jobs/${jobId}?user_id=${userId}`);
+        if (!r.ok) throw new Error(`HTTP ${r.status}`);
+        const job = await r.json();
+        if (job.status !== 'pending' && job.status !== 'running') return job;
+        onProgress(job);
+        await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+}
+
+async function cancelImportJob(jobId) {
+    const r = await fetch(`/api/admin/jobs/${jobId}/cancel?user_id=${userId}`, { method: 'POST' });
+    if (r.status === 409) tg.showAlert('ℹ️ Імпорт уже завершено — скасувати неможливо');
+}
+
+// Запускає імпорт і повертає фінальний стан задачі (або {error} при відмові)
+async function startImportJob(file, notifyUsers, onProgress) {
+    const formData = new FormData();
+    formData.append('file', file);
+    const response = await fetch(`/api/admin/import?user_id=${userId}&notify_users=${notifyUsers}`, {
+        method: 'POST',
+        body: formData
+    });
+    const data = await response.json();
+    if (!data.job_id) return { status: 'failed', error: data.error || data.message || 'Помилка імпорту' };
+    return pollImportJob(data.job_id, onProgress);
+}
+
+function formatImportResult(result) {
+    const text = `Додано: ${result.added || 0}, Оновлено: ${result.updated || 0}, Без змін: ${result.unchanged || 0}, Деактивовано: ${result.deactivated || 0}`;
+    return result.sheets ? text + formatImportSheets(result.sheets) : text;
+}
+
+const IMPORT_ACTION_LABELS = {
+    added: 'додано',
+    updated: 'оновлено',
+    reactivated: 'повторно активовано',
+    deactivated: 'деактивовано'
+};
+
+// Пробний імпорт: зведення змін без запису в базу + посилання на CSV
+async function dryRunImport() {
+    if (!selectedFile) {
+        tg.showAlert('❌ Оберіть файл для завантаження');
+        return;
+    }
+    const alertEl = document.getElementById('importAlert');
+    const btn = document.getElementById('dryRunBtn');
+    btn.disabled = true;
+    btn.textContent = '⌛ Перевірка...';
+
+    try {
+        const formData = new FormData();
+        formData.append('file', selectedFile);
+        const response = await fetch(`/api/admin/import/dry-run?user_id=${userId}`, {
+            method: 'POST',
+            body: formData
+        });
+        const data = await response.json();
+        if (!data.success) throw new Error(data.error || data.message || 'Помилка перевірки');
+
+        const departments = Object.entries(data.affected_departments || {}).map(([dep, actions]) => {
+            const parts = Object.entries(actions).map(([action, count]) => `${IMPORT_ACTION_LABELS[action] || action}: ${count}`);
+            return `<li>Відділ ${dep}: ${parts.join(', ')}</li>`;
+        }).join('');
+        alertEl.innerHTML = `
+            <div class="alert">
+                <span style="font-size: 20px;">🔍</span>
+                <div>Пробний імпорт (база не змінювалась)<br>
+                    <small>${formatImportResult({ ...data, sheets: null })}, Повторно активовано: ${data.reactivated || 0}</small>
+                    ${data.sheets ? formatImportSheets(data.sheets) : ''}
+                    ${departments ? `<ul style="margin: 6px 0; padding-left: 18px; font-size: 13px;">${departments}</ul>` : ''}
+                    <a href="/api/admin/import/dry-run/${data.diff_id}?user_id=${userId}" download>⬇️ Завантажити CSV змін</a>
+                </div>
+            </div>
+        `;
+    } catch (error) {
+        alertEl.innerHTML = `
+            <div class="alert alert-error">
+                <span style="font-size: 20px;">❌</span>
+                <div>Помилка: ${error.message}</div>
+            </div>
+        `;
+    } finally {
+        btn.disabled = false;
+        btn.textContent = '🔍 Перевірити зміни';
+    }
+}
+
 async function uploadFile() {
     if (!selectedFile) {
         tg.showAlert('❌ Оберіть файл для завантаження');
         return;
     }
     
-    const formData = new FormData();
-    formData.append('file', selectedFile);
     const notifyChecked = document.getElementById('notifyUsers').checked;
+    const alertEl = document.getElementById('importAlert');
     
     document.getElementById('uploadBtn').disabled = true;
     document.getElementById('uploadBtn').textContent = '⌛ Завантаження...';
     
     try {
-        const response = await fetch(`/api/admin/import?user_id=${userId}&notify_users=${notifyChecked}`, {
-            method: 'POST',
-            body: formData
+        const job = await startImportJob(selectedFile, notifyChecked, (progress) => {
+            alertEl.innerHTML = `
+                <div class="alert">
+                    <div>${formatImportProgress(progress)}</div>
+                    <button class="btn btn-secondary" onclick="cancelImportJob('${progress.job_id}')">⛔ Скасувати</button>
+                </div>
+            `;
         });
-        if (!response.ok) throw new Error(`HTTP ${response.status}`);
-        const data = await response.json();
         
-        if (data.success || data.added !== undefined) {
-            document.getElementById('importAlert').innerHTML = `
+        if (job.status === 'done' && job.result && job.result.success) {
+            alertEl.innerHTML = `
                 <div class="alert alert-success">
                     <span style="font-size: 20px;">✅</span>
-                    <div>Імпорт успішний<br><small>Додано: ${data.added || 0}, Оновлено: ${data.updated || 0}, Деактивовано: ${data.deactivated || 0}</small></div>
+                    <div>Імпорт успішний<br><small>${formatImportResult(job.result)}</small></div>
                 </div>
             `;
             selectedFile = null;
             document.getElementById('fileInput').value = '';
             document.getElementById('fileInfo').style.display = 'none';
             document.getElementById('uploadBtn').disabled = true;
+            document.getElementById('dryRunBtn').disabled = true;
             loadAdminStats();
+        } else if (job.status === 'cancelled') {
+            alertEl.innerHTML = `
+                <div class="alert">
+                    <span style="font-size: 20px;">⛔</span>
+                    <div>Імпорт скасовано, зміни в базі відкочено</div>
+                </div>
+            `;
         } else {
-            document.getElementById('importAlert').innerHTML = `
+            alertEl.innerHTML = `
                 <div class="alert alert-error">
                     <span style="font-size: 20px;">❌</span>
-                    <div>${data.error || data.message || 'Помилка імпорту'}</div>
+                    <div>${job.error || 'Помилка імпорту'}</div>
                 </div>
             `;
         }
     } catch (error) {
-        document.getElementById('importAlert').innerHTML = `
+        alertEl.innerHTML = `
             <div class="alert alert-error">
                 <span style="font-size: 20px;">❌</span>
                 <div>Помилка: ${error.message}</div>
@@ -231,50 +403,129 @@ async function exportStock() {
     }
 }
 
+const ADMIN_ARCHIVES_PAGE_SIZE = 50;
+
+function adminArchivesQuery(offset) {
+    const params = new URLSearchParams({ user_id: userId, limit: ADMIN_ARCHIVES_PAGE_SIZE, offset });
+    const value = id => (document.getElementById(id)?.value || '').trim();
+    if (value('archFilterOwner')) params.set('owner_id', value('archFilterOwner'));
+    if (value('archFilterDept')) params.set('department', value('archFilterDept'));
+    if (value('archFilterFrom')) params.set('date_from', value('archFilterFrom'));
+    if (value('archFilterTo')) params.set('date_to', value('archFilterTo'));
+    if (value('archFilterSurplus')) params.set('surplus', value('archFilterSurplus'));
+    if (value('archFilterOrder')) params.set('order', value('archFilterOrder'));
+    return params.toString();
+}
+
+async function fetchAdminArchivesPage(offset) {
+    const response = await fetch(`/api/admin/archives?${adminArchivesQuery(offset)}`);
+    return response.json();
+}
+
+function renderAdminArchiveItems(files) {
+    return files.map(file => {
+        const created = new Date(file.created_at).toLocaleString('uk-UA');
+        const size = file.size ? `${(file.size / 1024).toFixed(1)} KB` : '—';
+        const sum = file.total_sum != null ? ` | 💰 ${file.total_sum.toLocaleString('uk-UA')} ₴` : '';
+        let html = `<div style="background: var(--secondary-bg-color); padding: 12px; margin-bottom: 8px; border-radius: 8px; display: flex; justify-content: space-between; align-items: center;">`;
+        html += `<div><div style="font-weight: 600;">${file.is_surplus ? '📦' : '📄'} ${file.filename}</div>`;
+        html += `<div style="font-size: 12px; color: var(--hint-color);">👤 ${file.user_id} | 🏢 ${file.department} | ${size}${sum} | ${created}</div></div>`;
+        html += `<button class="btn btn-primary" style="padding: 6px 12px; font-size: 12px; min-width: auto;" onclick="downloadAdminArchive('${file.filename}')">📥</button></div>`;
+        return html;
+    }).join('');
+}
+
+function renderAdminArchivesPage(data, offset) {
+    const list = document.getElementById('adminArchivesList');
+    const items = renderAdminArchiveItems(data.files);
+    if (offset === 0) {
+        list.innerHTML = items || '<div style="text-align: center; color: var(--hint-color); padding: 16px;">📁 Нічого не знайдено</div>';
+        document.getElementById('adminArchivesTotal').textContent = data.total;
+    } else {
+        list.insertAdjacentHTML('beforeend', items);
+    }
+    const btn = document.getElementById('adminArchivesMoreBtn');
+    btn.style.display = data.has_more ? '' : 'none';
+    btn.disabled = false;
+    btn.setAttribute('onclick', `loadMoreAdminArchives(${offset + data.files.length})`);
+}
+
 async function showAdminArchives() {
+    const input = 'padding: 8px; border-radius: 6px; border: 1px solid var(--hint-color); background: var(--bg-color); color: var(--text-color); width: 100%; box-sizing: border-box;';
+    let html = '<h2 style="margin-bottom: 16px;">🗄 Архіви користувачів (<span id="adminArchivesTotal">…</span>)</h2>';
+    html += '<button class="btn btn-primary" style="width: 100%; margin-bottom: 16px;" onclick="downloadAllAdminArchives(); closeAdminArchivesModal();">📥 Завантажити всі (ZIP)</button>';
+    html += '<div style="display: grid; grid-template-columns: 1fr 1fr; gap: 8px; margin-bottom: 12px;">';
+    html += `<input id="archFilterOwner" type="number" placeholder="ID користувача" style="${input}">`;
+    html += `<input id="archFilterDept" type="text" placeholder="Відділ" style="${input}">`;
+    html += `<input id="archFilterFrom" type="date" title="З дати" style="${input}">`;
+    html += `<input id="archFilterTo" type="date" title="По дату" style="${input}">`;
+    html += `<select id="archFilterSurplus" style="${input}"><option value="">Всі файли</option><option value="false">Основні</option><option value="true">Лишки</option></select>`;
+    html += `<select id="archFilterOrder" style="${input}"><option value="desc">Новіші спочатку</option><option value="asc">Старіші спочатку</option></select>`;
+    html += '</div>';
+    html += '<button class="add-btn" style="margin-bottom: 12px;" onclick="applyAdminArchivesFilters()">🔍 Застосувати</button>';
+    html += '<div id="adminArchivesList" style="max-height: 400px; overflow-y: auto;"></div>';
+    html += '<button class="add-btn" id="adminArchivesMoreBtn" style="margin-top: 12px; display: none;">Показати ще</button>';
+    html += '<button class="add-btn cancel-btn" style="margin-top: 16px;" onclick="closeAdminArchivesModal()">Закрити</button>';
+
+    document.getElementById('adminArchivesModalContent').innerHTML = html;
+    document.getElementById('adminArchivesModal').classList.add('active');
+    await applyAdminArchivesFilters();
+}
+
+async function applyAdminArchivesFilters() {
     try {
-        const response = await fetch(`/api/admin/archives?user_id=${userId}`);
-        const data = await response.json();
-        
-        if (data.success && data.files && data.files.length > 0) {
-            let html = '<h2 style="margin-bottom: 16px;">🗄 Архіви користувачів</h2>';
-            html += '<button class="btn btn-primary" style="width: 100%; margin-bottom: 16px;" onclick="downloadAllAdminArchives(); closeAdminArchivesModal();">📥 Завантажити всі (ZIP)</button>';
-            html += '<div style="max-height: 400px; overflow-y: auto;">';
-            data.files.forEach(file => {
-                html += `<div style="background: var(--secondary-bg-color); padding: 12px; margin-bottom: 8px; border-radius: 8px; display: flex; justify-content: space-between; align-items: center;">`;
-                html += `<div><div style="font-weight: 600;">📄 ${file.filename}</div><div style="font-size: 12px; color: var(--hint-color);">${(file.size / 1024).toFixed(1)} KB | ${file.modified}</div></div>`;
-                html += `<button class="btn btn-primary" style="padding: 6px 12px; font-size: 12px; min-width: auto;" onclick="downloadAdminArchive('${file.filename}')">📥</button></div>`;
-            });
-            html += '</div>';
-            html += '<button class="add-btn cancel-btn" style="margin-top: 16px;" onclick="closeAdminArchivesModal()">Закрити</button>';
-            
-            document.getElementById('adminArchivesModalContent').innerHTML = html;
-            document.getElementById('adminArchivesModal').classList.add('active');
-        } else {
-            tg.showAlert('📁 Немає архівів');
-        }
+        const data = await fetchAdminArchivesPage(0);
+        if (!data.success) throw new Error(data.error || 'Помилка');
+        renderAdminArchivesPage(data, 0);
+    } catch (error) {
+        tg.showAlert('❌ Помилка: ' + error.message);
+    }
+}
+
+async function loadMoreAdminArchives(offset) {
+    const btn = document.getElementById('adminArchivesMoreBtn');
+    try {
+        btn.disabled = true;
+        const data = await fetchAdminArchivesPage(offset);
+        if (!data.success) throw new Error(data.error || 'Помилка');
+        renderAdminArchivesPage(data, offset);
     } catch (error) {
+        btn.disabled = false;
         tg.showAlert('❌ Помилка: ' + error.message);
     }
 }
 
+const ALL_USERS_PAGE_SIZE = 100;
+
+function renderAllUsersItems(users) {
+    return users.map(user => {
+        let html = `<div style="background: var(--secondary-bg-color); padding: 12px; margin-bottom: 8px; border-radius: 8px;">`;
+        html += `<div style="font-weight: 600;">👤 ID: ${user.user_id}${user.username ? ' (@' + user.username + ')' : ''}</div>`;
+        html += `<div style="font-size: 12px; color: var(--hint-color); margin-top: 4px;">`;
+        html += `📁 Архівів: ${user.archives_count || 0} | 💰 Сума: ${(user.total_amount || 0).toLocaleString('uk-UA')} ₴`;
+        if (user.last_activity) html += ` | 🕐 ${user.last_activity}`;
+        html += `</div></div>`;
+        return html;
+    }).join('');
+}
+
+async function fetchAllUsersPage(offset) {
+    const response = await fetch(`/api/admin/users/all?user_id=${userId}&limit=${ALL_USERS_PAGE_SIZE}&offset=${offset}`);
+    return response.json();
+}
+
 async function showAllUsers() {
     try {
-        const response = await fetch(`/api/admin/users/all?user_id=${userId}`);
-        const data = await response.json();
+        const data = await fetchAllUsersPage(0);
         
         if (data.success && data.users && data.users.length > 0) {
-            let html = '<h2 style="margin-bottom: 16px;">👥 Всі користувачі</h2>';
-            html += '<div style="max-height: 450px; overflow-y: auto;">';
-            data.users.forEach(user => {
-                html += `<div style="background: var(--secondary-bg-color); padding: 12px; margin-bottom: 8px; border-radius: 8px;">`;
-                html += `<div style="font-weight: 600;">👤 ID: ${user.user_id}${user.username ? ' (@' + user.username + ')' : ''}</div>`;
-                html += `<div style="font-size: 12px; color: var(--hint-color); margin-top: 4px;">`;
-                html += `📁 Архівів: ${user.archives_count || 0} | 💰 Сума: ${(user.total_amount || 0).toLocaleString('uk-UA')} ₴`;
-                if (user.last_activity) html += ` | 🕐 ${user.last_activity}`;
-                html += `</div></div>`;
-            });
+            let html = `<h2 style="margin-bottom: 16px;">👥 Всі користувачі (${data.total})</h2>`;
+            html += '<div id="allUsersList" style="max-height: 450px; overflow-y: auto;">';
+            html += renderAllUsersItems(data.users);
             html += '</div>';
+            if (data.has_more) {
+                html += `<button class="add-btn" id="allUsersMoreBtn" style="margin-top: 12px;" onclick="loadMoreAllUsers(${data.users.length})">Показати ще</button>`;
+            }
             html += '<button class="add-btn cancel-btn" style="margin-top: 16px;" onclick="closeStatsModal()">Закрити</button>';
             
             document.getElementById('statsModalContent').innerHTML = html;
@@ -287,6 +538,27 @@ async function showAllUsers() {
     }
 }
 
+async function loadMoreAllUsers(offset) {
+    const btn = document.getElementById('allUsersMoreBtn');
+    try {
+        if (btn) btn.disabled = true;
+        const data = await fetchAllUsersPage(offset);
+        if (!data.success) throw new Error(data.error || 'Помилка');
+        document.getElementById('allUsersList').insertAdjacentHTML('beforeend', renderAllUsersItems(data.users));
+        if (btn) {
+            if (data.has_more) {
+                btn.disabled = false;
+                btn.setAttribute('onclick', `loadMoreAllUsers(${offset + data.users.length})`);
+            } else {
+                btn.remove();
+            }
+        }
+    } catch (error) {
+        if (btn) btn.disabled = false;
+        tg.showAlert('❌ Помилка: ' + error.message);
+    }
+}
+
 async function showActiveUsers() {
     try {
         const response = await fetch(`/api/admin/users/active?user_id=${userId}`);
@@ -629,20 +901,17 @@ async function uploadModeratorFile() {
     const alertEl = document.getElementById('moderatorImportAlert');
     alertEl.innerHTML = '<div class="loader">Завантаження...</div>';
 
-    const formData = new FormData();
-    formData.append('file', moderatorSelectedFile);
-
     try {
-        const response = await fetch(`/api/admin/import?user_id=${userId}&notify_users=${notifyUsers}`, {
-            method: 'POST',
-            body: formData
+        const job = await startImportJob(moderatorSelectedFile, notifyUsers, (progress) => {
+            alertEl.innerHTML = `<div style="padding:8px 0">${formatImportProgress(progress)} <button class="btn btn-secondary" onclick="cancelImportJob('${progress.job_id}')">⛔ Скасувати</button></div>`;
         });
-        const data = await response.json();
-        if (data.success || data.added !== undefined) {
-            alertEl.innerHTML = `<div style="color:var(--button-color);padding:8px 0">✅ Імпорт завершено! Додано: ${data.added || 0}, Оновлено: ${data.updated || 0}, Деактивовано: ${data.deactivated || 0}</div>`;
+        if (job.status === 'done' && job.result && job.result.success) {
+            alertEl.innerHTML = `<div style="color:var(--button-color);padding:8px 0">✅ Імпорт завершено! ${formatImportResult(job.result)}</div>`;
             _resetModeratorFileSelection();
+        } else if (job.status === 'cancelled') {
+            alertEl.innerHTML = `<div style="padding:8px 0">⛔ Імпорт скасовано, зміни в базі відкочено</div>`;
         } else {
-            alertEl.innerHTML = `<div style="color:#ff3b30;padding:8px 0">❌ ${data.error || 'Помилка імпорту'}</div>`;
+            alertEl.innerHTML = `<div style="color:#ff3b30;padding:8px 0">❌ ${job.error || 'Помилка імпорту'}</div>`;
         }
     } catch (error) {
         alertEl.innerHTML = `<div style="color:#ff3b30;padding:8px 0">❌ Помилка: ${error.message}</div>`;
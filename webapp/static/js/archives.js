@@ -35,7 +35,9 @@ async function loadStatistics() {
     }
 }
 
-async function loadArchiveStats(filename) { try { const r = await fetch(`/api/archive/stats/${filename}?user_id=${userId}`); const d = await r.json(); if (d.success) { return `<div class="stat-row"><span class="stat-label">📦 Товарів:</span><span class="stat-value">${d.items_count}</span></div><div class="stat-row"><span class="stat-label">🏢 Відділ:</span><span class="stat-value">${d.department}</span></div><div class="stat-row"><span class="stat-label">👤 Автор:</span><span class="stat-value">ID ${d.author_id}</span></div>`; } return ''; } catch (e) { return ''; } }
+function archiveStatsHtml(itemsCount, department, authorId) { return `<div class="stat-row"><span class="stat-label">📦 Товарів:</span><span class="stat-value">${itemsCount}</span></div><div class="stat-row"><span class="stat-label">🏢 Відділ:</span><span class="stat-value">${department}</span></div><div class="stat-row"><span class="stat-label">👤 Автор:</span><span class="stat-value">ID ${authorId}</span></div>`; }
+
+async function loadArchiveStats(filename) { try { const r = await fetch(`/api/archive/stats/${filename}?user_id=${userId}`); const d = await r.json(); if (d.success) { return archiveStatsHtml(d.items_count, d.department, d.author_id); } return ''; } catch (e) { return ''; } }
 
 async function loadArchives() { 
     const el = document.getElementById('archivesContent'); 
@@ -59,15 +61,47 @@ async function loadArchives() {
         let html = `<button class="download-all-btn" onclick="downloadAllArchives()">📦 Завантажити всі архіви (${d.archives.length})</button>`;
         
         for (const a of d.archives) { 
-            const stats = await loadArchiveStats(a.filename); 
+            if (a.pending) {
+                html += `<div class="archive-item pending"><div class="archive-header"><strong>📄 ${a.date}</strong><span class="archive-badge ${a.is_surplus ? 'surplus' : 'main'}">${a.type}</span><span class="archive-badge pending">⏳ Формується</span></div></div>`;
+                continue;
+            }
+            const stats = a.items_count != null ? archiveStatsHtml(a.items_count, a.department, userId) : await loadArchiveStats(a.filename); 
             html += `<div class="archive-item"><div class="archive-header"><strong>📄 ${a.date}</strong><span class="archive-badge ${a.is_surplus ? 'surplus' : 'main'}">${a.type}</span></div>${stats ? `<div class="archive-stats">${stats}</div>` : ''}<div class="archive-actions"><button class="download-btn" onclick="downloadArchive('${a.filename}')">📥 Завантажити</button><button class="delete-archive-btn" onclick="deleteArchive('${a.filename}')">🗑️ Видалити</button></div></div>`; 
         } 
         el.innerHTML = html; 
+        const pendingJobs = [...new Set(d.archives.filter(a => a.pending).map(a => a.job_id))];
+        pendingJobs.forEach(watchSaveJob);
     } catch (e) { 
         el.innerHTML = '<div class="empty-state"><div class="empty-icon">❌</div>Помилка</div>'; 
     } 
 }
 
+// Опитування статусу фонового збереження списку (POST /api/save?async_mode=true)
+const SAVE_JOB_POLL_MS = 1500;
+const watchedSaveJobs = new Set();
+
+function watchSaveJob(jobId) {
+    if (!jobId || watchedSaveJobs.has(jobId)) return;
+    watchedSaveJobs.add(jobId);
+    const poll = async () => {
+        try {
+            const r = await fetch(`/api/save/jobs/${jobId}`);
+            const d = r.ok ? await r.json() : { status: 'failed' };
+            if (d.status === 'pending' || d.status === 'running') {
+                setTimeout(poll, SAVE_JOB_POLL_MS);
+                return;
+            }
+            watchedSaveJobs.delete(jobId);
+            if (d.status === 'failed') tg.showAlert('❌ Не вдалося сформувати файл списку');
+            const archivesEl = document.getElementById('archivesContent');
+            if (archivesEl && archivesEl.offsetParent !== null) loadArchives();
+        } catch (e) {
+            setTimeout(poll, SAVE_JOB_POLL_MS * 2);
+        }
+    };
+    setTimeout(poll, SAVE_JOB_POLL_MS);
+}
+
 function downloadAllArchives() {
     window.open(`/api/archives/download-all/${userId}`, '_blank');
     tg.HapticFeedback.notificationOccurred('success');
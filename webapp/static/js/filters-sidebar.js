@@ -309,6 +309,9 @@ function displayFilteredProducts(products, isNewFilter = false) {
     if (typeof window.cachedProducts !== 'undefined') {
         window.cachedProducts = availableProducts;
     }
+    if (typeof window.syncAvailabilityStream === 'function') {
+        window.syncAvailabilityStream();
+    }
     
     // Використовуємо існуючу функцію renderProduct з index.html
     if (typeof window.renderProduct === 'function') {
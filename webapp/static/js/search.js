@@ -162,6 +162,47 @@ function updateSearchResults() {
     }
     
     results.innerHTML = visibleProducts.map(p => renderProduct(p)).join('');
+    syncAvailabilityStream();
+}
+
+// Живі оновлення доступних залишків (SSE) — тільки для відділів на екрані
+let availabilitySource = null, availabilityDepartmentsKey = '';
+
+function syncAvailabilityStream() {
+    if (!window.EventSource || !userId) return;
+    const departments = [...new Set(cachedProducts.map(p => p.department))].sort((a, b) => a - b);
+    const key = departments.join(',');
+    if (key === availabilityDepartmentsKey) return;
+    if (availabilitySource) { availabilitySource.close(); availabilitySource = null; }
+    availabilityDepartmentsKey = key;
+    if (!key) return;
+    availabilitySource = new EventSource(`/api/stream/availability?departments=${key}`);
+    availabilitySource.addEventListener('availability', e => {
+        const data = JSON.parse(e.data);
+        if (data.refresh) refreshSearchResults();
+        else applyAvailabilityUpdates(data.updates);
+    });
+}
+
+function refreshSearchResults() {
+    // Імпорт залишків змінив увесь каталог — перезапитуємо поточний пошук
+    const query = document.getElementById('searchInput').value.trim();
+    if (query.length >= 2 && (!window.filterState || !window.filterState.isActive)) search(query);
+}
+
+function applyAvailabilityUpdates(updates) {
+    // Сервер надсилає залишок без резерву цього користувача — віднімаємо власний резерв
+    updates.forEach(u => {
+        const p = cachedProducts.find(x => x.id === u.product_id);
+        if (!p) return;
+        const available = u.available - (p.user_reserved || 0);
+        if (p.available === available) return;
+        p.available = available;
+        const card = document.querySelector(`.product-card[data-product-id="${p.id}"]`);
+        if (!card) return;
+        if (available <= 0) card.remove();
+        else card.outerHTML = renderProduct(p);
+    });
 }
 
 async function search(query) { 
@@ -326,7 +367,31 @@ async function confirmDelete() {
         tg.showAlert('❌ ' + e.message); 
     } 
 }
-async function saveList() { try { const r = await fetch(`/api/save/${userId}`, { method: 'POST' }); const d = await r.json(); if (d.success) { tg.HapticFeedback.notificationOccurred('success'); if (d.cleared) { loadList(); updateDepartmentInfo(null, 0); } document.getElementById('successModal').classList.add('active'); } else { tg.showAlert('❌ ' + d.message); } } catch (e) { tg.showAlert('❌ ' + e.message); } }
+async function saveList() { 
+    try { 
+        const r = await fetch(`/api/save/${userId}?async_mode=true`, { method: 'POST' }); 
+        const d = await r.json(); 
+        if (d.success) { 
+            tg.HapticFeedback.notificationOccurred('success'); 
+            if (d.cleared) { 
+                // Резерв переїхав у відкладено — доступний залишок той самий, але
+                // подія збереження вже його враховує, тож власний резерв обнуляємо
+                cachedProducts.forEach(p => {
+                    p.user_reserved = 0;
+                    p.user_reserved_sum = 0;
+                });
+                loadList(); 
+                updateDepartmentInfo(null, 0); 
+            } 
+            if (d.job_id) watchSaveJob(d.job_id); 
+            document.getElementById('successModal').classList.add('active'); 
+        } else { 
+            tg.showAlert('❌ ' + d.message); 
+        } 
+    } catch (e) { 
+        tg.showAlert('❌ ' + e.message); 
+    } 
+}
 async function clearList() { 
     if (!confirm('Очистити весь список?')) return; 
     try { 
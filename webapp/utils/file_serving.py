@@ -0,0 +1,178 @@
+# epicservice/webapp/utils/file_serving.py
+"""
+Віддача файлів з умовними запитами та діапазонами байтів.
+
+- ETag / Last-Modified: If-None-Match / If-Modified-Since → 304 Not Modified;
+- Range: bytes=... (один діапазон) → 206 Partial Content, If-Range враховується;
+  недосяжний діапазон → 416, кілька діапазонів → повний файл (200).
+
+Валідатори можна передати з індексу архіву (archive_files: size, created_at):
+файли архіву після запису не змінюються, тож назва + розмір + час
+однозначно визначають вміст. Якщо їх не передано — stat файлу виконується
+в пулі потоків, а не в event loop.
+"""
+
+import asyncio
+import hashlib
+import os
+from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Iterator, Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+CHUNK_SIZE = 64 * 1024
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+class RangeNotSatisfiable(Exception):
+    """Діапазон поза межами файлу (відповідь 416)."""
+
+
+def make_etag(filename: str, size: int, last_modified: float) -> str:
+    digest = hashlib.md5(f"{filename}:{size}:{int(last_modified)}".encode(), usedforsecurity=False).hexdigest()
+    return f'"{digest}"'
+
+
+def content_disposition(filename: str) -> str:
+    """attachment з RFC 5987 кодуванням для не-ASCII назв (напр. «лишки_...»)."""
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+
+def _http_date_to_timestamp(value: str) -> Optional[float]:
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def is_not_modified(request: Request, etag: str, last_modified: float) -> bool:
+    """
+    Чи можна відповісти 304. If-None-Match має пріоритет над
+    If-Modified-Since (слабке порівняння ETag).
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        since = _http_date_to_timestamp(if_modified_since)
+        return since is not None and int(last_modified) <= since
+    return False
+
+
+def _if_range_allows(request: Request, etag: str, last_modified: float) -> bool:
+    """If-Range: діапазон віддається лише якщо файл не змінився (сильне порівняння)."""
+    if_range = request.headers.get("if-range")
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        return if_range == etag
+    since = _http_date_to_timestamp(if_range)
+    return since is not None and int(last_modified) == int(since)
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Розбирає Range у (start, end) включно.
+    None — заголовок некоректний або кілька діапазонів (віддаємо весь файл);
+    RangeNotSatisfiable — діапазон за межами файлу.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    start_str, sep, end_str = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if not start_str:
+            # Суфікс: bytes=-N — останні N байт
+            suffix = int(end_str)
+            if suffix <= 0 or size == 0:
+                raise RangeNotSatisfiable()
+            return max(size - suffix, 0), size - 1
+        start = int(start_str)
+        end = int(end_str) if end_str else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def _iter_file_range(path: str, start: int, end: int, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Синхронний генератор шматків [start, end]: StreamingResponse читає його в пулі потоків."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+async def serve_file(
+    request: Request,
+    path: str,
+    filename: str,
+    media_type: str,
+    size: Optional[int] = None,
+    last_modified: datetime | float | None = None,
+    cache_control: str = "private, no-cache",
+) -> Response:
+    """
+    Відповідь з файлом з урахуванням умовних заголовків і Range.
+    size / last_modified — валідатори з індексу; якщо не передані, беруться з stat.
+    """
+    if size is None or last_modified is None:
+        stat_result = await asyncio.to_thread(os.stat, path)
+        size = stat_result.st_size if size is None else size
+        last_modified = stat_result.st_mtime if last_modified is None else last_modified
+    if isinstance(last_modified, datetime):
+        last_modified = last_modified.timestamp()
+
+    etag = make_etag(filename, size, last_modified)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(last_modified, usegmt=True),
+        "Accept-Ranges": "bytes",
+        "Cache-Control": cache_control,
+    }
+
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if range_header and _if_range_allows(request, etag, last_modified):
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        if byte_range:
+            start, end = byte_range
+            headers.update({
+                "Content-Range": f"bytes {start}-{end}/{size}",
+                "Content-Length": str(end - start + 1),
+                "Content-Disposition": content_disposition(filename),
+            })
+            return StreamingResponse(
+                _iter_file_range(path, start, end),
+                status_code=206,
+                media_type=media_type,
+                headers=headers,
+            )
+
+    return FileResponse(path=path, filename=filename, media_type=media_type, headers=headers)